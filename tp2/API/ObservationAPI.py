@@ -218,8 +218,10 @@ class ObservationAPI:
                 if mission_id in self.nms_server.tasks:
                     del self.nms_server.tasks[mission_id]
             
-            # Missões pendentes
-            for mission_data in self.nms_server.pendingMissions:
+            # Missões pendentes (cópia: a fila é alterada pelas threads do MissionLink)
+            with self.nms_server.pendingLock:
+                pending_missions = list(self.nms_server.pendingMissions)
+            for mission_data in pending_missions:
                 if isinstance(mission_data, str):
                     try:
                         mission_data = json.loads(mission_data)
@@ -261,7 +263,9 @@ class ObservationAPI:
                 return jsonify(mission_info), 200
             
             # Procurar em missões pendentes
-            for mission_data in self.nms_server.pendingMissions:
+            with self.nms_server.pendingLock:
+                pending_missions = list(self.nms_server.pendingMissions)
+            for mission_data in pending_missions:
                 if isinstance(mission_data, str):
                     try:
                         mission_data = json.loads(mission_data)
@@ -354,7 +358,8 @@ class ObservationAPI:
             """
             total_rovers = len(self.nms_server.agents)
             active_missions = len(self.nms_server.tasks)
-            pending_missions = len(self.nms_server.pendingMissions)
+            with self.nms_server.pendingLock:
+                pending_missions = len(self.nms_server.pendingMissions)
             
             # Contar missões concluídas (missões com progresso "completed")
             completed_missions = 0
@@ -222,7 +222,8 @@ class NMS_Agent:
         self.ipAddress = self.getinterfaces()[0].split(" ")[1]
         self.serverAddress = serverAddress
         self.missionLink = MissionLink.MissionLink(self.ipAddress,storeFolder)
-        self.telemetryStream = TelemetryStream.TelemetryStream(self.ipAddress,storeFolder)
+        # Ligação persistente à Nave-Mãe: as amostras de telemetria seguem todas pela mesma ligação TCP
+        self.telemetryStream = TelemetryStream.TelemetryStream(self.ipAddress,storeFolder,persistent=True)
         self.tasks = dict()
         self.frequency = frequency
         
@@ -239,6 +240,14 @@ class NMS_Agent:
         self.telemetry_thread = None  # Thread para monitorização contínua
         self.telemetry_running = False  # Flag para controlar loop
         self.telemetry_interval = 5  # Intervalo padrão em segundos (telemetria a cada 5 segundos)
+        # Amostras que não foi possível enviar (ligação à Nave-Mãe em baixo): guardadas em disco
+        # e reenviadas, por ordem, a seguir à próxima amostra enviada com sucesso
+        self.telemetry_spool = os.path.join(storeFolder, "telemetry_spool")
+        self.telemetry_spool_limit = 1000  # Acima disto as amostras mais antigas são descartadas
+        self.telemetry_spool_lock = threading.Lock()
+        # Amostras em telemetry_spool, para só ler o disco quando há alguma por reenviar
+        # (None = ainda não contadas: podem ter ficado amostras de uma execução anterior)
+        self.telemetry_spooled = None
         self.current_mission = None  # Missão atualmente em execução
         self.mission_queue = []  # Fila de missões pendentes (rover executa uma de cada vez)
         self.mission_executing = False  # Flag para indicar se há missão em execução
@@ -314,25 +323,25 @@ class NMS_Agent:
         Solicita uma missão à Nave-Mãe através do MissionLink.
         Implementa o requisito: "O rover deve ser capaz de solicitar uma missão à Nave-Mãe."
         
-        A Nave-Mãe responderá enviando a missão através do MissionLink, que será recebida
-        pelo recvMissionLink() que está a correr numa thread separada.
+        O pedido é feito com MissionLink.request(): a Nave-Mãe responde com a missão (ou
+        "no_mission") pela mesma sessão e a resposta chega a esta chamada, que inicia logo
+        a missão (ver acceptMission()). Uma Nave-Mãe sem "rpc" responde numa mensagem nova,
+        recebida pelo recvMissionLink() que está a correr numa thread separada.
         
         Args:
             ip (str): Endereço IP da Nave-Mãe
             
         Returns:
-            bool: True se o pedido foi enviado com sucesso, False caso contrário
+            bool: True se o pedido foi atendido (ou enviado, sem "rpc"), False caso contrário
         """
-        # Delay maior para garantir que a Nave-Mãe está pronta e evitar conflitos
-        time.sleep(1.0)
-        
         # Enviar solicitação de missão com retry
+        # O mesmo id em todas as tentativas: um pedido que já foi atendido (e cuja resposta se
+        # perdeu) recebe outra vez a mesma missão, em vez de a Nave-Mãe atribuir uma nova
         max_retries = 3
+        request_id = self.missionLink.newRequestId()
         for attempt in range(max_retries):
             try:
-                # Enviar apenas o pedido - a resposta virá através do recvMissionLink()
-                self.missionLink.send(ip, self.missionLink.port, self.missionLink.requestMission, self.id, "000", "request")
-                return True
+                lista = self.missionLink.request(ip, self.missionLink.port, self.missionLink.requestMission, self.id, "000", "request", requestId=request_id)
             except TimeoutError as e:
                 if attempt < max_retries - 1:
                     print(f"[INFO] Tentativa {attempt + 1}/{max_retries} falhou, a tentar novamente...")
@@ -349,6 +358,15 @@ class NMS_Agent:
                 else:
                     print(f"[ERRO] requestMission: Erro ao solicitar missão após {max_retries} tentativas: {e}")
                     return False
+
+            if lista is None:
+                # Nave-Mãe sem "rpc": a resposta virá através do recvMissionLink()
+                return True
+            if lista[2] == self.missionLink.taskRequest:
+                self.acceptMission(lista, confirm=False)
+            else:
+                print(f"[INFO] Nave-Mãe sem missões para o rover {self.id}")
+            return True
         
         return False
 
@@ -356,7 +374,24 @@ class NMS_Agent:
         """
         Recebe uma mensagem através do MissionLink.
         Se for um pedido de tarefa (taskRequest), valida o formato da missão,
-        armazena a missão e envia confirmação.
+        armazena a missão e envia confirmação (ver acceptMission()).
+        
+        NOTA: O idAgent é usado apenas no handshake. Nas mensagens de dados,
+              apenas idMission é enviado no protocolo.
+        
+        Returns:
+            dict or None: Dicionário com dados da missão validada, ou None se não for missão válida
+        """
+        lista = self.missionLink.recv()
+        
+        if lista[2] == self.missionLink.taskRequest:
+            return self.acceptMission(lista)
+        
+        return None
+
+    def acceptMission(self, lista, confirm=True):
+        """
+        Valida, armazena e inicia (ou põe na fila) uma missão recebida da Nave-Mãe.
         
         Formato esperado da missão (conforme PDF):
         {
@@ -367,60 +402,63 @@ class NMS_Agent:
             "duration_minutes": integer (obrigatório, > 0),
         }
         
-        NOTA: O idAgent é usado apenas no handshake. Nas mensagens de dados,
-              apenas idMission é enviado no protocolo.
+        Args:
+            lista (list): Mensagem da missão, no formato de MissionLink.recv()
+            confirm (bool, optional): Enviar a confirmação (ou o erro) à Nave-Mãe numa mensagem
+                                      nova. False para a resposta a um request(), já confirmada
+                                      pelo próprio MissionLink. Defaults to True
         
         Returns:
             dict or None: Dicionário com dados da missão validada, ou None se não for missão válida
         """
-        lista = self.missionLink.recv()
+        mission_message = lista[3]
+        mission_id = lista[1]
         
-        if lista[2] == self.missionLink.taskRequest:
-            mission_message = lista[3]
-            mission_id = lista[1]
-            
-            # Validar formato da missão
-            is_valid, error_msg = validateMission(mission_message)
-            
-            if not is_valid:
+        # Validar formato da missão
+        is_valid, error_msg = validateMission(mission_message)
+        
+        if not is_valid:
+            if confirm:
                 self.missionLink.send(lista[4], self.missionLink.port, None, self.id, mission_id, "invalid")
-                return None
-            
-            # Parse do JSON da missão
-            try:
-                if isinstance(mission_message, str):
-                    mission_data = json.loads(mission_message)
-                else:
-                    mission_data = mission_message
-            except json.JSONDecodeError:
+            else:
+                print(f"[ERRO] Missão {mission_id} inválida: {error_msg}")
+            return None
+        
+        # Parse do JSON da missão
+        try:
+            if isinstance(mission_message, str):
+                mission_data = json.loads(mission_message)
+            else:
+                mission_data = mission_message
+        except json.JSONDecodeError:
+            if confirm:
                 self.missionLink.send(lista[4], self.missionLink.port, None, self.id, mission_id, "parse_error")
-                return None
-            
-            # Armazenar missão validada
-            self.tasks[mission_id] = mission_data
-            
-            # Enviar ACK de confirmação
+            return None
+        
+        # Armazenar missão validada
+        self.tasks[mission_id] = mission_data
+        
+        # Enviar ACK de confirmação
+        if confirm:
             self.missionLink.send(lista[4], self.missionLink.port, None, self.id, mission_id, mission_id)
+        
+        # Verificar se já há missão em execução
+        if self.mission_executing:
+            self.mission_queue.append(mission_data)
+            print(f"[INFO] Missão {mission_id} adicionada à fila")
+        else:
+            self.mission_executing = True
+            self.current_mission = mission_data
+            print(f"[INFO] Missão ID: {mission_id} recebida - iniciando execução")
             
-            # Verificar se já há missão em execução
-            if self.mission_executing:
-                self.mission_queue.append(mission_data)
-                print(f"[INFO] Missão {mission_id} adicionada à fila")
-            else:
-                self.mission_executing = True
-                self.current_mission = mission_data
-                print(f"[INFO] Missão ID: {mission_id} recebida - iniciando execução")
-                
-                # Reiniciar telemetria se estiver parada
-                if not self.telemetry_running:
-                    self.startContinuousTelemetry(self.serverAddress, interval_seconds=self.telemetry_interval)
-                
-                mission_thread = threading.Thread(target=self.executeMission, args=(mission_data, self.serverAddress), daemon=True)
-                mission_thread.start()
+            # Reiniciar telemetria se estiver parada
+            if not self.telemetry_running:
+                self.startContinuousTelemetry(self.serverAddress, interval_seconds=self.telemetry_interval)
             
-            return mission_data
+            mission_thread = threading.Thread(target=self.executeMission, args=(mission_data, self.serverAddress), daemon=True)
+            mission_thread.start()
         
-        return None
+        return mission_data
     
     def executeMission(self, mission_data, server_ip):
         """
@@ -609,7 +647,7 @@ class NMS_Agent:
                 progress_json = json.dumps(progress_data)
                 # Enviar via MissionLink (UDP) - tipo "P" (Progress)
                 # O MissionLink fragmenta automaticamente se a mensagem for grande
-                success = self.missionLink.send(server_ip, self.missionLink.port, self.missionLink.reportProgress, self.id, mission_id, progress_json)
+                success = self.missionLink.send(server_ip, self.missionLink.port, self.missionLink.reportProgress, self.id, mission_id, progress_json, requestId=self.missionLink.newRequestId())
                 if success:
                     print(f"[INFO] Update de Missao {mission_id} (Progresso: {current_progress_percent}%, Bateria: {self.battery:.1f}%) enviada para a NaveMae")
                 else:
@@ -697,6 +735,8 @@ class NMS_Agent:
         time.sleep(0.5)
         max_retries = 3
         progress_reported = False
+        # O mesmo id em todas as tentativas: a Nave-Mãe regista a conclusão uma única vez
+        request_id = self.missionLink.newRequestId()
         for retry in range(max_retries):
             try:
                 progress_data = {
@@ -710,7 +750,7 @@ class NMS_Agent:
                     }
                 }
                 progress_json = json.dumps(progress_data)
-                self.missionLink.send(server_ip, self.missionLink.port, self.missionLink.reportProgress, self.id, mission_id, progress_json)
+                self.missionLink.send(server_ip, self.missionLink.port, self.missionLink.reportProgress, self.id, mission_id, progress_json, requestId=request_id)
                 progress_reported = True
                 break
             except Exception as e:
@@ -749,11 +789,11 @@ class NMS_Agent:
                 
                 print(f"[INFO] Missão concluída - solicitando próxima missão à Nave-Mãe")
                 try:
-                    # Enviar pedido de missão - a resposta virá através do recvMissionLink()
+                    # Pedir a próxima missão - a resposta chega ao próprio requestMission(),
+                    # que inicia a missão recebida
                     request_sent = self.requestMission(server_ip)
                     if request_sent:
-                        print(f"[INFO] Pedido de missão enviado - aguardando resposta da Nave-Mãe")
-                        # A missão será recebida pelo recvMissionLink() e iniciada automaticamente
+                        print(f"[INFO] Pedido de missão atendido pela Nave-Mãe")
                     else:
                         # Não foi possível enviar o pedido
                         print(f"[INFO] Não foi possível solicitar próxima missão")
@@ -842,23 +882,23 @@ class NMS_Agent:
     
     def createAndSendTelemetry(self, server_ip, metrics=None, filename=None):
         """
-        Cria ficheiro de telemetria conforme requisitos do PDF e envia via TelemetryStream.
+        Cria mensagem de telemetria conforme requisitos do PDF e envia via TelemetryStream.
         
         COMO FUNCIONA:
         - Cria mensagem de telemetria completa usando createTelemetryMessage()
-        - Salva em ficheiro JSON
-        - Envia via TelemetryStream (TCP)
-        - Remove ficheiro temporário após envio
+        - Envia-a diretamente da memória com sendTelemetryRecord() (JSON compacto, sem
+          ficheiro temporário); só vai para disco se a Nave-Mãe estiver inacessível
         
         PORQUÊ:
         - Automatiza processo completo de criação e envio de telemetria
         - Garante que estrutura cumpre requisitos do PDF
         - Facilita uso em loops de monitorização contínua
+        - Escrever, reler e apagar um ficheiro a cada amostra desgasta a memória flash do rover
         
         Args:
             server_ip (str): Endereço IP da Nave-Mãe
             metrics (dict, optional): Dicionário com métricas técnicas recolhidas
-            filename (str, optional): Nome do ficheiro. Se None, gera automaticamente
+            filename (str, optional): Nome do ficheiro no servidor. Se None, gera automaticamente
         
         Returns:
             bool: True se telemetria foi criada e enviada com sucesso, False em caso de erro
@@ -875,29 +915,88 @@ class NMS_Agent:
                 timestamp_str = f"{timestamp:.6f}".replace('.', '_')  # Remover ponto decimal
                 filename = f"telemetry_{self.id}_{timestamp_str}.json"
             
-            # Garantir que filename está na pasta correta
-            if not os.path.dirname(filename):
-                filename = os.path.join(".", filename)
-            
-            # Salvar em ficheiro JSON
-            with open(filename, "w") as f:
-                json.dump(telemetry, f, indent=2)
-            
-            # Enviar via TelemetryStream
-            success = self.sendTelemetry(server_ip, filename)
-            
-            if success:
-                # Remover ficheiro após envio bem-sucedido
-                try:
-                    os.remove(filename)
-                except:
-                    pass
-            
-            return success
+            return self.sendTelemetryRecord(server_ip, telemetry, os.path.basename(filename))
             
         except Exception as e:
             print(f"[ERRO] Erro ao criar e enviar telemetria: {e}")
             return False
+
+    def sendTelemetryRecord(self, server_ip, record, filename):
+        """
+        Envia uma amostra de telemetria a partir da memória, pela ligação persistente do
+        TelemetryStream (ver TelemetryStream.sendRecord()).
+        
+        COMO FUNCIONA:
+        - O dicionário é codificado diretamente para o registo enviado: no formato binário se
+          a Nave-Mãe o aceitar na ligação, senão em JSON compacto (ver TelemetryStream.encodeRecord())
+        - Se a Nave-Mãe estiver inacessível, a amostra é guardada em telemetry_spool (em JSON)
+          e reenviada depois da próxima amostra que for enviada com sucesso
+        
+        Args:
+            server_ip (str): Endereço IP da Nave-Mãe
+            record (dict or bytes): Amostra de telemetria (dicionário ou JSON já codificado)
+            filename (str): Nome do ficheiro no servidor (sem caminho)
+        
+        Returns:
+            bool: True se a amostra foi enviada, False se ficou guardada para reenvio
+        """
+        if self.telemetryStream.sendRecord(server_ip, filename, record):
+            self.flushTelemetrySpool(server_ip)
+            return True
+        self.spoolTelemetry(filename, self.telemetryStream.encodeRecord(record))
+        return False
+
+    def spoolTelemetry(self, filename, content):
+        """
+        Guarda em disco uma amostra que não foi possível enviar.
+        
+        Args:
+            filename (str): Nome do ficheiro (sem caminho)
+            content (bytes): Amostra codificada
+        """
+        with self.telemetry_spool_lock:
+            try:
+                os.makedirs(self.telemetry_spool, exist_ok=True)
+                pending = sorted(os.listdir(self.telemetry_spool))
+                # Espaço limitado: descartar as amostras mais antigas
+                discard = max(0, len(pending) - self.telemetry_spool_limit + 1)
+                for old in pending[:discard]:
+                    os.remove(os.path.join(self.telemetry_spool, old))
+                with open(os.path.join(self.telemetry_spool, filename), "wb") as f:
+                    f.write(content)
+                self.telemetry_spooled = len(pending) - discard + (filename not in pending[discard:])
+            except OSError as e:
+                print(f"[ERRO] Não foi possível guardar a telemetria {filename}: {e}")
+
+    def flushTelemetrySpool(self, server_ip):
+        """
+        Reenvia, por ordem, as amostras guardadas enquanto a Nave-Mãe esteve inacessível.
+        Pára na primeira que falhar (fica para a próxima vez).
+        
+        PORQUÊ:
+        - É chamado depois de cada amostra enviada: sem amostras guardadas (telemetry_spooled
+          a 0), não toca no disco nem no lock
+        
+        Args:
+            server_ip (str): Endereço IP da Nave-Mãe
+        """
+        if self.telemetry_spooled == 0:
+            return
+        with self.telemetry_spool_lock:
+            if not os.path.isdir(self.telemetry_spool):
+                self.telemetry_spooled = 0
+                return
+            pending = sorted(os.listdir(self.telemetry_spool))
+            self.telemetry_spooled = len(pending)
+            for name in pending:
+                path = os.path.join(self.telemetry_spool, name)
+                if not self.telemetryStream.send(server_ip, path):
+                    return
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                self.telemetry_spooled -= 1
     
     def updatePosition(self, x, y, z=0.0):
         """
@@ -18,7 +18,31 @@ tests = [
     "send_long",
     "send_file",
     "recv_message",
-    "recv_file"
+    "recv_file",
+    "window",
+    "rto",
+    "sessions",
+    "persistent",
+    "async",
+    "mtu",
+    "binary",
+    "reassembly",
+    "wrap",
+    "sack",
+    "congestion",
+    "zerortt",
+    "fec",
+    "reader",
+    "timers",
+    "batch",
+    "rpc",
+    "replay",
+    "zlib",
+    "telemetry",
+    "records",
+    "sinks",
+    "eventloop",
+    "telemetrybin"
 ]
 
 results = {}
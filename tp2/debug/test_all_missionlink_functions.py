@@ -28,6 +28,30 @@ Testes disponíveis:
     - send_file: Testa send() com ficheiro
     - recv_message: Testa recv() com mensagem
     - recv_file: Testa recv() com ficheiro
+    - window: Testa send()/recv() em modo selective-repeat com perdas
+    - rto: Testa o RTO adaptativo (RttEstimator) e a recuperação de perdas
+    - sessions: Testa várias transferências em paralelo na mesma porta (tabela de sessões)
+    - persistent: Testa a reutilização da sessão, os keepalives e o fecho por inatividade
+    - async: Testa o AsyncMissionLink (event loop), o SyncMissionLink e a compatibilidade com MissionLink
+    - mtu: Testa a negociação do tamanho dos datagramas e o recuo quando os grandes se perdem
+    - binary: Testa o envio de ficheiros binários (mmap/pwrite) com perdas e reordenação
+    - reassembly: Testa a montagem de mensagens de vários MB num buffer reservado
+    - wrap: Testa a aritmética de números de série e a volta do seq de 32 bits
+    - sack: Testa os ACKs cumulativos com mapa de bits e o fast retransmit
+    - congestion: Testa a janela de congestionamento (AIMD), o pacing e o envio para a frota
+    - zerortt: Testa o envio da primeira mensagem no SYN (0-RTT) e a deteção de duplicados
+    - fec: Testa a reconstrução de chunks perdidos com pacotes de paridade (FEC adaptativa)
+    - reader: Testa a thread de leitura dedicada (envios e receções em paralelo, fecho do socket)
+    - timers: Testa a roda de temporizadores das sessões (TimerWheel)
+    - batch: Testa a receção em lote (esvaziar o socket, ACKs agrupados, buffers do socket)
+    - rpc: Testa os pedidos com resposta correlacionada (request()/reply())
+    - replay: Testa as mensagens idempotentes (reenvios com o mesmo id entregues uma vez)
+    - zlib: Testa a compressão das mensagens negociada no handshake
+    - telemetry: Testa a ligação persistente do TelemetryStream (registos com tamanho, religação)
+    - records: Testa o envio de telemetria do rover a partir da memória (sem ficheiros temporários)
+    - sinks: Testa os destinos da telemetria recebida (ficheiros, log em segmentos, memória)
+    - eventloop: Testa o servidor TelemetryStream com ciclo de eventos (workers, limite de ligações)
+    - telemetrybin: Testa as amostras de telemetria em binário (TelemetryCodec, negociação, recuo para JSON)
     - all: Executa todos os testes
 """
 
@@ -37,13 +61,22 @@ import time
 import threading
 import json
 import socket
+import tempfile
+import zlib
 from datetime import datetime
 
 # Adicionar diretório pai ao path para importar módulos
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from protocol import MissionLink
+from protocol import AsyncMissionLink
 from otherEntities import Limit
+from otherEntities import RttEstimator
+from otherEntities import CongestionControl
+from otherEntities import TokenBucket
+from otherEntities import FecControl
+from otherEntities import Session
+from otherEntities import TimerWheel
 
 # Configuração de debug
 DEBUG = True
@@ -84,44 +117,13 @@ def create_missionlink_with_port(serverAddress, port, storeFolder="."):
     Returns:
         MissionLink: Instância com porta especificada
     """
-    # Criar instância MissionLink básica (sem bind ainda)
-    ml = MissionLink.MissionLink.__new__(MissionLink.MissionLink)
-    
-    # Inicializar atributos básicos
-    ml.serverAddress = serverAddress
-    ml.port = port
-    ml.limit = Limit.Limit()
-    
-    # Configurar storeFolder
-    if storeFolder.endswith("/"):
-        ml.storeFolder = storeFolder
-    else:
-        ml.storeFolder = storeFolder + "/"
-    
-    # Inicializar tipos de operação e flags (copiado de __init__)
-    ml.registerAgent = "R"
-    ml.taskRequest = "T"
-    # ml.sendMetrics = "M"
-    ml.requestMission = "Q"
-    ml.reportProgress = "P"
-    ml.noneType = "N"
-    ml.datakey = "D"
-    ml.synkey = "S"
-    ml.ackkey = "A"
-    ml.finkey = "F"
-    ml.synackkey = "Z"
-    ml.eofkey = '\0'
-    
-    # Criar socket e fazer bind na porta especificada
-    ml.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    try:
-        ml.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    except Exception as e:
-        debug_print(f"Aviso: Não foi possível habilitar SO_REUSEADDR: {e}", "WARNING")
-    
-    # Fazer bind na porta especificada
-    ml.sock.bind((ml.serverAddress, ml.port))
+    # O construtor aceita a porta local, por isso a instância é criada normalmente
+    # (inicializa todos os atributos, incluindo a tabela de sessões e peerCaps, e faz bind na porta)
+    ml = MissionLink.MissionLink(serverAddress, storeFolder, port)
     ml.sock.settimeout(ml.limit.timeout)
+    # Os testes do transporte contam chunks de mensagens repetitivas (ex: "A" * N), que a
+    # compressão reduziria a um só chunk: fica desligada (o teste "zlib" liga-a)
+    ml.limit.compression = False
     
     return ml
 
@@ -219,14 +221,20 @@ def test_getHeaderSize():
         
         header_size = ml.getHeaderSize()
         
-        # Cálculo esperado: flag(1) + |(1) + idMission(3) + |(1) + seq(4) + |(1) + 
-        #                   ack(4) + |(1) + size(4) + |(1) + missionType(1) + |(1) = 23
-        expected_size = 23
+        # Cálculo esperado: flag(1) + missionType(1) + connId(2) + seq(4) + ack(4) + size(2) + idLen(1) = 15
+        expected_size = 15
         
         assert header_size == expected_size, f"Tamanho incorreto: {header_size} (esperado: {expected_size})"
+        assert header_size == MissionLink.header.size, "getHeaderSize() não corresponde ao struct do cabeçalho"
         
-        debug_print(f"✓ Tamanho do cabeçalho: {header_size} bytes", "SUCCESS")
-        debug_print(f"  - Tamanho útil para dados: {ml.limit.buffersize - header_size} bytes", "INFO")
+        # O idMission vai logo a seguir à parte fixa
+        assert ml.getHeaderSize("M01") == expected_size + 3, f"Tamanho incorreto com idMission: {ml.getHeaderSize('M01')}"
+        
+        # O tamanho reportado é o tamanho real do pacote sem payload
+        assert len(ml.formatMessage("T", "D", "M01", 101, 101, b"")) == ml.getHeaderSize("M01"), "Tamanho real do pacote difere"
+        
+        debug_print(f"✓ Tamanho do cabeçalho: {header_size} bytes (+ idMission)", "SUCCESS")
+        debug_print(f"  - Tamanho útil para dados (M01): {ml.limit.buffersize - ml.getHeaderSize('M01')} bytes", "INFO")
         
         return True
         
@@ -237,7 +245,7 @@ def test_getHeaderSize():
         return False
 
 def test_formatMessage():
-    """TESTE 4: formatMessage() - Formatação de mensagens"""
+    """TESTE 4: formatMessage()/parseMessage() - Formatação de mensagens"""
     print("\n" + "="*70)
     print("TESTE 4: formatMessage() - Formatação de Mensagens")
     print("="*70)
@@ -249,39 +257,38 @@ def test_formatMessage():
         debug_print("Teste 4.1: Mensagem com missionType='T'...", "TEST")
         message = "Hello World"
         formatted = ml.formatMessage("T", "D", "M01", 101, 101, message)
-        decoded = formatted.decode()
+        assert isinstance(formatted, bytes), f"formatMessage() deveria devolver bytes: {type(formatted)}"
+        parts = ml.parseMessage(formatted)
         
-        expected = f"D|M01|101|101|{len(message)}|T|{message}"
-        assert decoded == expected, f"Formato incorreto:\n  Esperado: {expected}\n  Recebido: {decoded}"
-        debug_print(f"✓ Mensagem formatada: {decoded[:50]}...", "SUCCESS")
+        expected = ["D", "M01", 101, 101, len(message), "T"]
+        assert parts[:6] == expected, f"Cabeçalho incorreto:\n  Esperado: {expected}\n  Recebido: {parts[:6]}"
+        assert bytes(parts[MissionLink.messagePos]) == message.encode(), "Payload incorreto"
+        debug_print(f"✓ Mensagem formatada: {formatted[:50]}...", "SUCCESS")
         
         # Teste 4.2: Mensagem com missionType=None (ACK)
         debug_print("Teste 4.2: Mensagem com missionType=None (ACK)...", "TEST")
-        formatted = ml.formatMessage(None, "A", "M01", 102, 101, "\0")
-        decoded = formatted.decode()
+        parts = ml.parseMessage(ml.formatMessage(None, "A", "M01", 102, 101, "\0"))
         
-        expected = f"A|M01|102|101|1|N|\0"
-        assert decoded == expected, f"Formato ACK incorreto:\n  Esperado: {expected}\n  Recebido: {decoded}"
-        debug_print(f"✓ ACK formatado: {decoded}", "SUCCESS")
+        expected = ["A", "M01", 102, 101, 1, "N"]
+        assert parts[:6] == expected, f"Formato ACK incorreto:\n  Esperado: {expected}\n  Recebido: {parts[:6]}"
+        assert bytes(parts[MissionLink.messagePos]) == b"\0", "Payload do ACK incorreto"
+        debug_print(f"✓ ACK formatado: {parts[:6]}", "SUCCESS")
         
         # Teste 4.3: Mensagem com missionType=None (FIN)
         debug_print("Teste 4.3: Mensagem com missionType=None (FIN)...", "TEST")
-        formatted = ml.formatMessage(None, "F", "M01", 103, 103, "\0")
-        decoded = formatted.decode()
+        parts = ml.parseMessage(ml.formatMessage(None, "F", "M01", 103, 103, "\0"))
         
-        expected = f"F|M01|103|103|1|N|\0"
-        assert decoded == expected, f"Formato FIN incorreto:\n  Esperado: {expected}\n  Recebido: {decoded}"
-        debug_print(f"✓ FIN formatado: {decoded}", "SUCCESS")
+        expected = ["F", "M01", 103, 103, 1, "N"]
+        assert parts[:6] == expected, f"Formato FIN incorreto:\n  Esperado: {expected}\n  Recebido: {parts[:6]}"
+        debug_print(f"✓ FIN formatado: {parts[:6]}", "SUCCESS")
         
         # Teste 4.4: Mensagem grande
         debug_print("Teste 4.4: Mensagem grande (verificar size)...", "TEST")
         large_message = "A" * 500
-        formatted = ml.formatMessage("M", "D", "M01", 104, 104, large_message)
-        decoded = formatted.decode()
+        parts = ml.parseMessage(ml.formatMessage("M", "D", "M01", 104, 104, large_message))
         
-        parts = decoded.split("|")
-        assert len(parts) == 7, f"Número de campos incorreto: {len(parts)}"
-        assert parts[4] == str(len(large_message)), f"Size incorreto: {parts[4]} (esperado: {len(large_message)})"
+        assert len(parts) == 8, f"Número de campos incorreto: {len(parts)}"
+        assert parts[MissionLink.sizePos] == len(large_message), f"Size incorreto: {parts[4]} (esperado: {len(large_message)})"
         debug_print(f"✓ Mensagem grande formatada corretamente (size={parts[4]})", "SUCCESS")
         
         # Teste 4.5: Todos os missionTypes
@@ -295,14 +302,28 @@ def test_formatMessage():
         }
         
         for name, value in mission_types.items():
-            formatted = ml.formatMessage(value, "D", "M01", 105, 105, "test")
-            decoded = formatted.decode()
-            parts = decoded.split("|")
-            assert parts[5] == value, f"missionType incorreto para {name}: {parts[5]}"
-            debug_print(f"  ✓ {name} ({value}): {decoded[:40]}...", "INFO")
+            parts = ml.parseMessage(ml.formatMessage(value, "D", "M01", 105, 105, "test"))
+            assert parts[MissionLink.missionTypePos] == value, f"missionType incorreto para {name}: {parts[5]}"
+            debug_print(f"  ✓ {name} ({value}): {parts[:6]}", "INFO")
         
         debug_print("✓ Todos os missionTypes formatados corretamente", "SUCCESS")
         
+        # Teste 4.6: Payload com "|" e bytes arbitrários (impossível no formato de texto antigo)
+        debug_print("Teste 4.6: Payload binário com '|'...", "TEST")
+        payload = b"a|b|c|" + bytes(range(256))
+        parts = ml.parseMessage(ml.formatMessage("T", "D", "M-001", 106, 106, payload))
+        assert parts[MissionLink.idMissionPos] == "M-001", f"idMission incorreto: {parts[1]}"
+        assert bytes(parts[MissionLink.messagePos]) == payload, "Payload binário alterado"
+        debug_print("✓ Payload binário preservado", "SUCCESS")
+        
+        # Teste 4.7: Datagramas truncados ou inválidos são rejeitados
+        debug_print("Teste 4.7: Datagramas inválidos...", "TEST")
+        formatted = ml.formatMessage("T", "D", "M01", 107, 107, "Hello")
+        assert ml.parseMessage(formatted[:-1]) is None, "Datagrama truncado aceite"
+        assert ml.parseMessage(formatted + b"x") is None, "Datagrama com bytes a mais aceite"
+        assert ml.parseMessage(b"D|M01") is None, "Datagrama curto aceite"
+        debug_print("✓ Datagramas inválidos rejeitados", "SUCCESS")
+        
         return True
         
     except Exception as e:
@@ -792,6 +813,2536 @@ def test_send_file():
         traceback.print_exc()
         return False
 
+class LossySocket:
+    """
+    Envolve um socket UDP e descarta datagramas enviados segundo uma regra.
+    Permite simular perdas na ligação sem alterar o MissionLink.
+    """
+    def __init__(self, sock, drop):
+        self.sock = sock
+        self.drop = drop    # função (datagrama, número do envio) -> True para descartar
+        self.sent = 0
+        self.dropped = 0
+
+    def sendto(self, data, address):
+        self.sent += 1
+        if self.drop(data, self.sent):
+            self.dropped += 1
+            return len(data)
+        return self.sock.sendto(data, address)
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+def test_window_transfer():
+    """TESTE 12: send()/recv() - Modo Selective-Repeat (janela negociada)
+
+    Envia uma mensagem de vários chunks com janela 8 e descarta um em cada sete
+    datagramas de dados do emissor. Os chunks perdidos devem ser os únicos reenviados
+    e a mensagem deve chegar completa e por ordem.
+    """
+    print("\n" + "="*70)
+    print("TESTE 12: Selective-Repeat (janela negociada no handshake)")
+    print("="*70)
+
+    try:
+        os.makedirs("./debug/test_files/", exist_ok=True)
+
+        server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+        client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+
+        # Descartar um em cada sete pacotes de dados (apenas a primeira transmissão de cada)
+        seen = set()
+        def drop(data, count):
+            if data[0] not in (ord("D"), ord("E")) or data in seen:
+                return False
+            seen.add(data)
+            return count % 7 == 0
+        client.sock = LossySocket(client.sock, drop)
+
+        max_useful = client.limit.buffersize - client.getHeaderSize()
+        test_message = "".join(chr(ord("a") + i % 26) * max_useful for i in range(20))
+
+        server_result = [None]
+        server_error = [None]
+        client_error = [None]
+
+        def server_thread():
+            try:
+                server_result[0] = server.recv()
+            except Exception as e:
+                server_error[0] = e
+                import traceback
+                traceback.print_exc()
+
+        def client_thread():
+            time.sleep(0.5)
+            try:
+                assert client.send("127.0.0.1", 8080, "T", "r1", "M01", test_message) == True, "send() deveria retornar True"
+            except Exception as e:
+                client_error[0] = e
+                import traceback
+                traceback.print_exc()
+
+        start_time = time.time()
+        t_server = threading.Thread(target=server_thread)
+        t_client = threading.Thread(target=client_thread)
+        t_server.start()
+        t_client.start()
+        t_server.join(timeout=30)
+        t_client.join(timeout=30)
+        elapsed = time.time() - start_time
+
+        if server_error[0] or client_error[0]:
+            debug_print(f"[ERRO] SERVER: {server_error[0]} | CLIENT: {client_error[0]}", "ERROR")
+            return False
+
+        assert client.getPeerWindow("127.0.0.1", 8080) == client.limit.windowSize, "Janela não negociada pelo cliente"
+        assert server.getPeerWindow("127.0.0.1", 8081) == server.limit.windowSize, "Janela não negociada pelo servidor"
+        # Cada sessão guarda as capacidades do seu handshake: um handshake posterior com o
+        # mesmo peer (que reescreve peerCaps) não as muda
+        session = client.idleSessions[("127.0.0.1", 8080, "r1")]
+        client.peerCaps[("127.0.0.1", 8080)] = {}
+        assert session.window == client.limit.windowSize and session.sack and session.rpc, "Capacidades fora da sessão"
+        assert client.getPeerWindow("127.0.0.1", 8080) == 1
+        assert server_result[0] is not None, "Mensagem não recebida"
+        idAgent, idMission, missionType, message, ip = server_result[0]
+        assert idMission == "M01", f"idMission incorreto: {idMission}"
+        assert missionType == "T", f"missionType incorreto: {missionType}"
+        assert message == test_message, f"Mensagem incorreta ({len(message)} vs {len(test_message)} bytes)"
+
+        debug_print(f"[OK] {len(test_message)} bytes em 20 chunks recebidos em {elapsed:.2f}s", "SUCCESS")
+        debug_print(f"  - datagramas enviados: {client.sock.sent}, descartados: {client.sock.dropped}", "INFO")
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_adaptive_rto():
+    """TESTE 13: RttEstimator e retransmissão com RTO adaptativo
+
+    Verifica o cálculo do RTO (RFC 6298) e que a perda do único chunk de uma
+    mensagem curta é recuperada ao fim do RTO medido no handshake, e não ao fim
+    do timeout fixo (Limit.timeout).
+    """
+    print("\n" + "="*70)
+    print("TESTE 13: RTO adaptativo (RTT suavizado, Karn, backoff)")
+    print("="*70)
+
+    try:
+        # Teste 13.1: Cálculo do RTO
+        debug_print("Teste 13.1: Cálculo do RTO...", "TEST")
+        rtt = RttEstimator.RttEstimator(initialRto=1.0, minRto=0.05, maxRto=16.0)
+        assert rtt.getTimeout() == 1.0, f"RTO inicial incorreto: {rtt.getTimeout()}"
+        rtt.addSample(0.1)
+        assert abs(rtt.srtt - 0.1) < 1e-9 and abs(rtt.rttvar - 0.05) < 1e-9, "Primeira amostra incorreta"
+        assert abs(rtt.getTimeout() - 0.3) < 1e-9, f"RTO incorreto: {rtt.getTimeout()} (esperado: 0.3)"
+        rtt.addSample(0.1)
+        assert abs(rtt.getTimeout() - 0.25) < 1e-9, f"RTO incorreto: {rtt.getTimeout()} (esperado: 0.25)"
+        debug_print("✓ srtt/rttvar/RTO segundo o RFC 6298", "SUCCESS")
+
+        # Teste 13.2: Backoff exponencial e limites
+        debug_print("Teste 13.2: Backoff e limites...", "TEST")
+        assert abs(rtt.getBackoffTimeout(1) - 0.5) < 1e-9, f"Backoff incorreto: {rtt.getBackoffTimeout(1)}"
+        assert rtt.getBackoffTimeout(40) == 16.0, "Backoff de uma sessão não limitado a maxRto"
+        assert abs(rtt.getTimeout() - 0.25) < 1e-9, "O backoff de uma sessão não deveria alterar o RTO partilhado"
+        rtt.addSample(0.0001)
+        assert rtt.getTimeout() >= 0.05, f"RTO abaixo de minRto: {rtt.getTimeout()}"
+        assert abs(rtt.getBackoffTimeout(2) - min(16.0, rtt.getTimeout() * 4)) < 1e-9, "Backoff de uma sessão incorreto"
+        debug_print("✓ Cada reenvio duplica o RTO da sessão, sem alterar o RTO partilhado", "SUCCESS")
+
+        # Teste 13.3: Perda de um chunk recuperada ao fim do RTO medido
+        debug_print("Teste 13.3: Recuperação de perda numa ligação local...", "TEST")
+        os.makedirs("./debug/test_files/", exist_ok=True)
+        server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+        client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+
+        # Descartar a primeira transmissão do único pacote de dados
+        def drop(data, count):
+            return data[0] in (ord("D"), ord("E")) and client.sock.dropped == 0
+        client.sock = LossySocket(client.sock, drop)
+
+        server_result = [None]
+        send_time = [None]
+        errors = []
+
+        def server_thread():
+            try:
+                server_result[0] = server.recv()
+            except Exception as e:
+                errors.append(e)
+
+        def client_thread():
+            time.sleep(0.5)
+            try:
+                # Handshake antes do envio: a mensagem curta iria no SYN (0-RTT), sem pacote de dados
+                client.startConnection("r1", "127.0.0.1", 8080)
+                start = time.time()
+                assert client.send("127.0.0.1", 8080, "T", "r1", "M01", "mensagem curta") == True, "send() deveria retornar True"
+                send_time[0] = time.time() - start
+            except Exception as e:
+                errors.append(e)
+
+        t_server = threading.Thread(target=server_thread)
+        t_client = threading.Thread(target=client_thread)
+        t_server.start()
+        t_client.start()
+        t_server.join(timeout=30)
+        t_client.join(timeout=30)
+
+        assert not errors, f"Erros: {errors}"
+        assert server_result[0] is not None and server_result[0][3] == "mensagem curta", f"Mensagem incorreta: {server_result[0]}"
+        assert client.sock.dropped == 1, f"Pacote não descartado: {client.sock.dropped}"
+        estimator = client.getRttEstimator("127.0.0.1", 8080)
+        assert estimator.srtt is not None, "Handshake não produziu amostra de RTT"
+        assert send_time[0] < client.limit.timeout, f"Recuperação demorou {send_time[0]:.2f}s (timeout fixo: {client.limit.timeout}s)"
+        debug_print(f"✓ Perda recuperada: send() em {send_time[0]:.3f}s (srtt={estimator.srtt*1000:.2f}ms, RTO={estimator.getTimeout()*1000:.0f}ms)", "SUCCESS")
+        # A regra de descarte referencia o cliente: fechar já para libertar a porta
+        server.sock.close()
+        client.sock.close()
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_concurrent_sessions():
+    """TESTE 14: Tabela de sessões - várias transferências em paralelo na mesma porta
+
+    Três clientes enviam mensagens de vários chunks ao mesmo servidor ao mesmo tempo,
+    enquanto o servidor envia uma mensagem a um deles. Cada datagrama tem de chegar à
+    sessão (ip, porta, connId) certa, seja qual for a thread que leu o socket.
+    """
+    print("\n" + "="*70)
+    print("TESTE 14: Sessões concorrentes (desmultiplexagem por ip, porta, connId)")
+    print("="*70)
+
+    try:
+        os.makedirs("./debug/test_files/", exist_ok=True)
+
+        # Teste 14.1: connId no cabeçalho
+        debug_print("Teste 14.1: connId no cabeçalho...", "TEST")
+        ml = MissionLink.MissionLink("127.0.0.1", "./debug/test_files/", 8090)
+        parts = ml.parseMessage(ml.formatMessage("T", "D", "M01", 1, 1, "x", 0x8001))
+        assert parts[MissionLink.connIdPos] == 0x8001, f"connId incorreto: {parts[MissionLink.connIdPos]}"
+        ml.sock.close()
+        debug_print("✓ connId preservado", "SUCCESS")
+
+        # Teste 14.2: Transferências em paralelo
+        debug_print("Teste 14.2: 3 clientes + 1 envio do servidor em paralelo...", "TEST")
+        server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+        clients = [create_missionlink_with_port("127.0.0.1", 8081 + i, "./debug/test_files/client/") for i in range(3)]
+
+        max_useful = server.limit.buffersize - server.getHeaderSize("M00")
+        messages = [chr(ord("a") + i) * (max_useful * 10) for i in range(3)]
+
+        received = []
+        client_received = [None]
+        errors = []
+
+        def server_recv():
+            try:
+                for _ in range(3):
+                    received.append(server.recv(timeout=20))
+            except Exception as e:
+                errors.append(e)
+
+        def server_send():
+            try:
+                assert server.send("127.0.0.1", 8081, "T", "nms", "M99", "resposta do servidor") == True
+            except Exception as e:
+                errors.append(e)
+
+        def client_send(i):
+            try:
+                assert clients[i].send("127.0.0.1", 8080, "P", f"r{i}", f"M0{i}", messages[i]) == True
+            except Exception as e:
+                errors.append(e)
+
+        def client_recv():
+            try:
+                client_received[0] = clients[0].recv(timeout=20)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=server_recv), threading.Thread(target=client_recv)]
+        threads += [threading.Thread(target=client_send, args=(i,)) for i in range(3)]
+        threads.append(threading.Thread(target=server_send))
+        start_time = time.time()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=30)
+        elapsed = time.time() - start_time
+
+        assert not errors, f"Erros: {errors}"
+        assert len(received) == 3, f"Mensagens recebidas: {len(received)}"
+        by_mission = {r[1]: r for r in received}
+        for i in range(3):
+            idAgent, idMission, missionType, message, ip = by_mission[f"M0{i}"]
+            assert idAgent == f"r{i}", f"idAgent incorreto: {idAgent}"
+            assert missionType == "P", f"missionType incorreto: {missionType}"
+            assert message == messages[i], f"Mensagem M0{i} corrompida ({len(message)} bytes)"
+        assert client_received[0] is not None, "Cliente não recebeu a mensagem do servidor"
+        assert client_received[0][1] == "M99" and client_received[0][3] == "resposta do servidor", f"Mensagem incorreta: {client_received[0]}"
+        debug_print(f"✓ 3 transferências + 1 envio em sentido contrário em {elapsed:.2f}s", "SUCCESS")
+
+        # Teste 14.3: Sessões fechadas saem da tabela
+        debug_print("Teste 14.3: Tabela de sessões vazia depois de closeSessions()...", "TEST")
+        closers = [threading.Thread(target=ml.closeSessions) for ml in [server] + clients]
+        for t in closers:
+            t.start()
+        deadline = time.time() + 10
+        while (
+            any(t.is_alive() for t in closers) or server.sessions or any(c.sessions for c in clients)
+        ) and time.time() < deadline:
+            # Alguém tem de ler o socket para processar os ACKs finais
+            server.waitFor(lambda: None, 0.05)
+            for c in clients:
+                c.waitFor(lambda: None, 0.05)
+        assert not server.sessions, f"Sessões por fechar no servidor: {list(server.sessions)}"
+        assert not any(c.sessions for c in clients), "Sessões por fechar nos clientes"
+        debug_print("✓ Todas as sessões fechadas", "SUCCESS")
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_persistent_sessions():
+    """TESTE 15: Sessões persistentes - reutilização, keepalive e fecho por inatividade
+
+    Duas mensagens seguidas para o mesmo servidor usam a mesma sessão: a segunda
+    não repete o handshake. A sessão inativa mantém-se viva com keepalives e é
+    fechada (nos dois lados) quando passa Limit.idleTimeout sem mensagens.
+    """
+    print("\n" + "="*70)
+    print("TESTE 15: Sessões persistentes (keepalive e idleTimeout)")
+    print("="*70)
+
+    try:
+        os.makedirs("./debug/test_files/", exist_ok=True)
+        server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+        client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+        client.limit.keepaliveInterval = 0.2
+        client.limit.idleTimeout = 1.5
+        client.limit.sessionTimeout = 1.0
+        server.limit.sessionTimeout = 1.0
+        client.sock = LossySocket(client.sock, lambda data, count: False)
+
+        received = []
+        errors = []
+
+        def server_thread():
+            try:
+                for _ in range(2):
+                    received.append(server.recv(timeout=10))
+            except Exception as e:
+                errors.append(e)
+
+        t_server = threading.Thread(target=server_thread)
+        t_server.start()
+
+        # Teste 15.1: A segunda mensagem reutiliza a sessão
+        debug_print("Teste 15.1: Segunda mensagem sem handshake...", "TEST")
+        assert client.send("127.0.0.1", 8080, "T", "r1", "M01", "primeira") == True
+        sent_first = client.sock.sent
+        assert client.send("127.0.0.1", 8080, "T", "r1", "M02", "segunda") == True
+        t_server.join(timeout=15)
+        assert not errors, f"Erros: {errors}"
+        assert [r[3] for r in received] == ["primeira", "segunda"], f"Mensagens incorretas: {received}"
+        assert client.sock.sent - sent_first == 1, f"Segunda mensagem usou {client.sock.sent - sent_first} datagramas (esperado: 1)"
+        assert len(client.idleSessions) == 1 and len(server.sessions) == 1, "Sessão não reutilizada"
+        debug_print("✓ Mensagem curta numa sessão aberta: 1 datagrama", "SUCCESS")
+
+        # Teste 15.2: Keepalives mantêm a sessão viva para lá do sessionTimeout
+        debug_print("Teste 15.2: Keepalives...", "TEST")
+        deadline = time.time() + 1.2
+        while time.time() < deadline:
+            server.waitFor(lambda: None, 0.05)
+            client.waitFor(lambda: None, 0.05)
+        assert len(client.idleSessions) == 1, "Sessão local descartada antes do idleTimeout"
+        assert len(server.sessions) == 1, "Sessão do servidor expirou apesar dos keepalives"
+        debug_print("✓ Sessão inativa mantida por keepalives", "SUCCESS")
+
+        # Teste 15.3: Fecho por inatividade
+        debug_print("Teste 15.3: Fecho ao fim de idleTimeout...", "TEST")
+        deadline = time.time() + 5
+        while (client.sessions or server.sessions) and time.time() < deadline:
+            server.waitFor(lambda: None, 0.05)
+            client.waitFor(lambda: None, 0.05)
+        assert not client.sessions and not client.idleSessions, "Sessão local não fechada"
+        assert not server.sessions, f"Sessão do servidor não fechada: {list(server.sessions)}"
+        debug_print("✓ Sessão fechada nos dois lados", "SUCCESS")
+        server.sock.close()
+        client.sock.close()
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_async_missionlink():
+    """TESTE 16: AsyncMissionLink - muitas sessões num único event loop
+
+    O servidor e os emissores correm no mesmo event loop, sem threads. O formato dos
+    pacotes é o mesmo, por isso o SyncMissionLink (usado pela Nave-Mãe) fala com o
+    MissionLink baseado em threads (usado pelos rovers).
+    """
+    print("\n" + "="*70)
+    print("TESTE 16: AsyncMissionLink (asyncio.DatagramProtocol)")
+    print("="*70)
+
+    import asyncio
+
+    try:
+        os.makedirs("./debug/test_files/", exist_ok=True)
+
+        # Teste 16.1: Mensagem longa e reutilização da sessão no event loop
+        debug_print("Teste 16.1: send()/recv() assíncronos...", "TEST")
+        threads_before = threading.active_count()
+        n_sessions = 200
+
+        async def scenario():
+            server = await AsyncMissionLink.AsyncMissionLink("127.0.0.1", "./debug/test_files/server/", 8080).start()
+            client = await AsyncMissionLink.AsyncMissionLink("127.0.0.1", "./debug/test_files/client/", 8081).start()
+            try:
+                max_useful = client.limit.buffersize - client.getHeaderSize("M01")
+                long_message = "".join(chr(ord("a") + i % 26) * max_useful for i in range(12))
+                assert await client.send("127.0.0.1", 8080, "T", "r1", "M01", long_message) == True
+                received = await server.recv(timeout=10)
+                assert received[1] == "M01" and received[3] == long_message, "Mensagem longa incorreta"
+                assert await client.send("127.0.0.1", 8080, "T", "r1", "M02", "segunda") == True
+                received = await server.recv(timeout=10)
+                assert received[3] == "segunda", f"Mensagem incorreta: {received}"
+                assert len(server.sessions) == 1, "Sessão não reutilizada"
+                debug_print("✓ Mensagem de 12 chunks e mensagem na mesma sessão", "SUCCESS")
+
+                # Teste 16.2: Muitas sessões em simultâneo, todas no mesmo loop
+                debug_print(f"Teste 16.2: {n_sessions} sessões em paralelo...", "TEST")
+                start = time.time()
+                sends = [client.send("127.0.0.1", 8080, "P", f"a{i}", "M03", f"msg {i}") for i in range(n_sessions)]
+                results = await asyncio.gather(*sends)
+                assert all(results), "Envio falhou"
+                messages = set()
+                for _ in range(n_sessions):
+                    messages.add((await server.recv(timeout=10))[3])
+                assert messages == {f"msg {i}" for i in range(n_sessions)}, "Mensagens em falta"
+                assert len(server.sessions) == n_sessions + 1, f"Sessões no servidor: {len(server.sessions)}"
+                debug_print(f"✓ {n_sessions} handshakes + mensagens em {time.time() - start:.2f}s", "SUCCESS")
+
+                await asyncio.gather(client.closeSessions(), server.closeSessions())
+                assert not client.sessions, "Sessões por fechar no cliente"
+            finally:
+                client.close()
+                server.close()
+
+        asyncio.run(scenario())
+        assert threading.active_count() == threads_before, "O event loop não deveria criar threads"
+
+        # Teste 16.3: SyncMissionLink <-> MissionLink (mesmo formato de pacotes)
+        debug_print("Teste 16.3: SyncMissionLink com MissionLink...", "TEST")
+        server = AsyncMissionLink.SyncMissionLink("127.0.0.1", "./debug/test_files/server/", 8080)
+        client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+        try:
+            assert server.port == 8080 and server.taskRequest == "T", "Atributos não delegados"
+            received = [None]
+
+            def client_recv():
+                received[0] = client.recv(timeout=10)
+
+            t = threading.Thread(target=client_recv)
+            t.start()
+            assert client.send("127.0.0.1", 8080, "R", "r1", "000", "registo") == True
+            lista = server.recv(timeout=10)
+            assert lista[0] == "r1" and lista[3] == "registo", f"Mensagem incorreta: {lista}"
+            assert server.send("127.0.0.1", 8081, None, "r1", "000", "Registered") == True
+            t.join(timeout=15)
+            assert received[0] is not None and received[0][3] == "Registered", f"Resposta incorreta: {received[0]}"
+            debug_print("✓ Mensagens trocadas nos dois sentidos", "SUCCESS")
+        finally:
+            server.close()
+            client.sock.close()
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_datagram_size():
+    """TESTE 17: Tamanho de datagrama negociado no handshake
+
+    O SYN propõe (e sonda) um tamanho de datagrama maior que Limit.buffersize; as duas
+    pontas usam o menor dos tamanhos. Quando os datagramas grandes se perdem no caminho,
+    o emissor recua para Limit.buffersize, no handshake ou a meio de uma mensagem.
+    """
+    print("\n" + "="*70)
+    print("TESTE 17: Tamanho de datagrama negociado (sonda e recuo)")
+    print("="*70)
+
+    try:
+        os.makedirs("./debug/test_files/", exist_ok=True)
+        test_message = "".join(chr(ord("a") + i % 26) for i in range(30000))
+
+        def transfer(client, server, idMission):
+            result = [None]
+            def server_thread():
+                result[0] = server.recv(timeout=20)
+            t = threading.Thread(target=server_thread)
+            t.start()
+            assert client.send("127.0.0.1", 8080, "T", "r1", idMission, test_message) == True
+            t.join(timeout=30)
+            assert result[0] is not None and result[0][3] == test_message, "Mensagem incorreta"
+
+        # Teste 17.1: Ambos os lados usam o menor tamanho proposto
+        debug_print("Teste 17.1: Negociação do tamanho...", "TEST")
+        server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+        client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+        server.limit.maxDatagramSize = 3000
+        client.limit.maxDatagramSize = 4000
+        sizes = []
+        def record(data, count):
+            sizes.append(len(data))
+            return False
+        client.sock = LossySocket(client.sock, record)
+        transfer(client, server, "M01")
+        assert sizes[0] == 4000, f"SYN não sondou o tamanho proposto: {sizes[0]}"
+        assert client.getPeerDatagramSize("127.0.0.1", 8080) == 3000, "Tamanho não negociado"
+        data_sizes = sizes[2:]
+        assert max(data_sizes) == 3000, f"Maior datagrama de dados: {max(data_sizes)}"
+        useful = 3000 - client.getHeaderSize("M01")
+        assert len(data_sizes) == -(-len(test_message) // useful), f"{len(data_sizes)} datagramas de dados"
+        debug_print(f"✓ {len(test_message)} bytes em {len(data_sizes)} datagramas de 3000 bytes (com 1024 seriam {-(-len(test_message) // (1024 - client.getHeaderSize('M01')))})", "SUCCESS")
+        server.sock.close()
+        client.sock.close()
+
+        # Teste 17.2: Os SYN grandes perdem-se - o handshake recua para buffersize
+        debug_print("Teste 17.2: Recuo no handshake...", "TEST")
+        server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+        client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+        server.limit.maxDatagramSize = client.limit.maxDatagramSize = 4000
+        client.limit.timeout = 0.2
+        blackhole = lambda data, count: len(data) > client.limit.buffersize
+        client.sock = LossySocket(client.sock, blackhole)
+        transfer(client, server, "M02")
+        assert client.sock.dropped == client.probeAttempts, f"SYN descartados: {client.sock.dropped}"
+        assert client.getPeerDatagramSize("127.0.0.1", 8080) == client.limit.buffersize, "Não recuou no handshake"
+        debug_print("✓ Handshake concluído com datagramas de Limit.buffersize", "SUCCESS")
+
+        # Teste 17.3: O caminho deixa de transportar datagramas grandes a meio da sessão
+        debug_print("Teste 17.3: Recuo a meio de uma mensagem...", "TEST")
+        client.sock.close()
+        client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+        client.limit.maxDatagramSize = 4000
+        client.sock = LossySocket(client.sock, lambda data, count: data[0] != ord("S") and blackhole(data, count))
+        transfer(client, server, "M03")
+        assert client.sock.dropped >= client.probeRetries, f"Datagramas descartados: {client.sock.dropped}"
+        assert client.getPeerDatagramSize("127.0.0.1", 8080) == client.limit.buffersize, "Não recuou a meio da mensagem"
+        debug_print(f"✓ Mensagem reenviada com datagramas de Limit.buffersize ({client.sock.dropped} perdidos)", "SUCCESS")
+        server.sock.close()
+        client.sock.close()
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_binary_file():
+    """TESTE 18: sendFile() - Ficheiros binários (mmap no emissor, pwrite no recetor)
+
+    Envia uma imagem (bytes aleatórios), um JSON com caracteres multibyte e um ficheiro
+    vazio. O cabeçalho do ficheiro (flag H) perde-se na primeira transmissão, por isso
+    os chunks de dados chegam antes dele; os ficheiros devem chegar idênticos.
+    """
+    print("\n" + "="*70)
+    print("TESTE 18: sendFile() - Ficheiros binários")
+    print("="*70)
+
+    # Pastas temporárias: os ficheiros enviados e recebidos não ficam em debug/test_files
+    tmp = tempfile.TemporaryDirectory()
+    client_folder = os.path.join(tmp.name, "client") + "/"
+    server_folder = os.path.join(tmp.name, "server") + "/"
+    server = client = None
+    try:
+        os.makedirs(client_folder)
+        os.makedirs(server_folder)
+
+        image = os.urandom(50000)
+        text = json.dumps({"mission_id": "M-ÇÃO", "notas": "ação → 北京 🚀" * 200}, ensure_ascii=False).encode()
+        files = {"image.png": image, "missão.json": text, "empty.bin": b""}
+        for name, content in files.items():
+            with open(client_folder + name, "wb") as f:
+                f.write(content)
+
+        server = create_missionlink_with_port("127.0.0.1", 8080, server_folder)
+        client = create_missionlink_with_port("127.0.0.1", 8081, client_folder)
+
+        # Descartar a primeira transmissão de cada cabeçalho e de um em cada cinco chunks de dados
+        seen = set()
+        def drop(data, count):
+            if data[0] not in (ord("H"), ord("D"), ord("E")) or data in seen:
+                return False
+            seen.add(data)
+            return data[0] == ord("H") or count % 5 == 0
+        client.sock = LossySocket(client.sock, drop)
+
+        results = []
+        def server_thread():
+            for _ in files:
+                results.append(server.recv(timeout=20))
+        t = threading.Thread(target=server_thread)
+        t.start()
+        assert client.sendFile("127.0.0.1", 8080, "M", "r1", "M01", client_folder + "image.png") == True
+        assert client.send("127.0.0.1", 8080, "M", "r1", "M02", client_folder + "missão.json") == True
+        assert client.sendFile("127.0.0.1", 8080, "M", "r1", "M03", client_folder + "empty.bin") == True
+        t.join(timeout=30)
+
+        assert [result[3] for result in results] == list(files), f"Ficheiros recebidos: {results}"
+        for name, content in files.items():
+            with open(server_folder + name, "rb") as f:
+                received = f.read()
+            assert received == content, f"{name}: {len(received)} bytes recebidos, esperados {len(content)}"
+            debug_print(f"✓ {name}: {len(content)} bytes idênticos", "SUCCESS")
+        debug_print(f"  - datagramas enviados: {client.sock.sent}, descartados: {client.sock.dropped}", "INFO")
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        for ml in (server, client):
+            if ml is not None:
+                ml.sock.close()
+        tmp.cleanup()
+
+def test_message_reassembly():
+    """TESTE 19: recv() - Montagem de mensagens grandes
+
+    Envia um catálogo de missões de vários MB (com caracteres multibyte) com perdas.
+    O primeiro chunk anuncia o tamanho total, o recetor reserva o buffer de uma vez e
+    copia cada chunk para a sua posição; acima de Limit.maxMessageSize usa a lista de chunks.
+    """
+    print("\n" + "="*70)
+    print("TESTE 19: Montagem de mensagens grandes (buffer reservado)")
+    print("="*70)
+
+    try:
+        os.makedirs("./debug/test_files/", exist_ok=True)
+        catalog = json.dumps([{"mission_id": f"M{i:05d}", "task": "análise térmica", "area": [i, i + 1, i + 2, i + 3]} for i in range(40000)], ensure_ascii=False)
+
+        server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+        client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+
+        seen = set()
+        def drop(data, count):
+            if data[0] not in (ord("D"), ord("E")) or data in seen:
+                return False
+            seen.add(data)
+            return count % 50 == 0
+        client.sock = LossySocket(client.sock, drop)
+
+        buffers = []
+        openBuffer = server.openBuffer
+        def record(session, lista):
+            openBuffer(session, lista)
+            buffers.append(None if session.buffer is None else len(session.buffer))
+        server.openBuffer = record
+
+        def transfer(idMission):
+            result = [None]
+            def server_thread():
+                result[0] = server.recv(timeout=30)
+            t = threading.Thread(target=server_thread)
+            t.start()
+            start_time = time.time()
+            assert client.send("127.0.0.1", 8080, "T", "r1", idMission, catalog) == True
+            t.join(timeout=60)
+            assert result[0] is not None and result[0][3] == catalog, "Catálogo incorreto"
+            return time.time() - start_time
+
+        # Teste 19.1: Tamanho anunciado - buffer reservado de uma vez
+        debug_print("Teste 19.1: Buffer reservado...", "TEST")
+        elapsed = transfer("M01")
+        # A sessão negociou "rpc": a mensagem leva o marcador de mensagem normal (1 byte)
+        size = len(catalog.encode()) + len(server.rpcPlainKey)
+        assert buffers == [size], f"Buffers reservados: {buffers}"
+        debug_print(f"✓ {size} bytes montados num buffer de {size} bytes em {elapsed:.2f}s", "SUCCESS")
+
+        # Teste 19.2: Acima de Limit.maxMessageSize - lista de chunks
+        debug_print("Teste 19.2: Lista de chunks...", "TEST")
+        server.limit.maxMessageSize = 1024 * 1024
+        elapsed = transfer("M02")
+        assert buffers[1] is None, f"Buffer reservado acima do limite: {buffers[1]}"
+        debug_print(f"✓ {size} bytes montados com a lista de chunks em {elapsed:.2f}s", "SUCCESS")
+        debug_print(f"  - datagramas enviados: {client.sock.sent}, descartados: {client.sock.dropped}", "INFO")
+
+        # Teste 19.3: Chunk fora do tamanho anunciado - não é escrito e a mensagem é descartada
+        debug_print("Teste 19.3: Chunk fora do tamanho anunciado...", "TEST")
+        delivered = []
+        server.deliverMessage = lambda *args: delivered.append(args)
+        chunk = lambda flag, seq, ack, payload: server.parseMessage(server.formatMessage("T", flag, "M03", seq, ack, payload))
+        session = Session.Session("10.0.0.1", 9000, 1, 1, False)
+        server.openBuffer(session, chunk("D", 1, 10, b"abcd"))
+        server.writeChunk(session, 1, chunk("D", 1, 10, b"abcd"))
+        server.writeChunk(session, 3, chunk("E", 3, 0, b"ijkl"))     # offset 8: passa do fim (10 bytes)
+        assert session.invalid and session.buffer == b"abcd" + bytes(6), f"Buffer: {bytes(session.buffer)}"
+        server.finishMessage(session)
+        assert delivered == [] and not session.invalid, f"Mensagem com falha entregue: {delivered}"
+        with tempfile.TemporaryDirectory() as folder:
+            server.storeFolder = folder + "/"
+            session = Session.Session("10.0.0.1", 9000, 1, 1, False)
+            server.openFile(session, chunk("H", 1, 0, server.formatFileHeader("f.bin", 10, 4)))
+            server.writeChunk(session, 2, chunk("D", 2, 0, b"abcd"))
+            server.writeChunk(session, 5, chunk("E", 5, 0, b"mnop"))  # offset 12: o ficheiro cresceria
+            assert session.invalid and os.path.getsize(folder + "/f.bin") == 10, "Ficheiro escrito para lá do tamanho"
+            server.finishMessage(session)
+            assert delivered == [] and not os.path.exists(folder + "/f.bin"), "Ficheiro com falha entregue"
+        debug_print("✓ Chunks fora do tamanho recusados; mensagem e ficheiro descartados", "SUCCESS")
+
+        server.sock.close()
+        client.sock.close()
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_sequence_wraparound():
+    """TESTE 20: Números de sequência de 32 bits com aritmética de números de série
+
+    Verifica seqDistance()/unwrapSeq() e transfere mensagens numa sessão cujo número de
+    sequência inicial está a poucos chunks de 2^32: o contador dá a volta a meio da
+    mensagem (com perdas) e as mensagens chegam completas.
+    """
+    print("\n" + "="*70)
+    print("TESTE 20: Números de sequência (32 bits, com volta)")
+    print("="*70)
+
+    try:
+        from unittest import mock
+        os.makedirs("./debug/test_files/", exist_ok=True)
+        modulus = MissionLink.seqModulus
+
+        # Teste 20.1: Aritmética de números de série
+        debug_print("Teste 20.1: seqDistance()/unwrapSeq()...", "TEST")
+        server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+        assert server.seqDistance(5, modulus - 6) == 11, "5 deveria estar 11 à frente de 2^32 - 6"
+        assert server.seqDistance(modulus - 6, 5) == -11, "2^32 - 6 deveria estar 11 atrás de 5"
+        assert server.seqDistance(modulus + 7, 7) == 0, "Valores congruentes módulo 2^32"
+        assert server.unwrapSeq(3, modulus - 2) == modulus + 3, "unwrapSeq() não deu a volta"
+        assert server.unwrapSeq(modulus - 2, modulus + 3) == modulus - 2, "unwrapSeq() com seq atrasado"
+        parts = server.parseMessage(server.formatMessage("T", "D", "M01", modulus + 7, modulus + 7, b"x"))
+        assert parts[2] == 7 and parts[3] == 7, f"seq/ack no cabeçalho: {parts[2]}, {parts[3]}"
+        debug_print("✓ Distâncias e valores completos corretos", "SUCCESS")
+
+        # Teste 20.2: Transferência com o seq a dar a volta a meio da mensagem
+        debug_print("Teste 20.2: Transferência através de 2^32...", "TEST")
+        client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+        seen = set()
+        def drop(data, count):
+            if data[0] not in (ord("D"), ord("E")) or data in seen:
+                return False
+            seen.add(data)
+            return count % 6 == 0
+        client.sock = LossySocket(client.sock, drop)
+
+        max_useful = client.limit.buffersize - client.getHeaderSize("M01")
+        messages = ["".join(chr(ord("a") + (i + n) % 26) * max_useful for i in range(30)) for n in range(2)]
+        results = []
+        def server_thread():
+            for _ in messages:
+                results.append(server.recv(timeout=20))
+        t = threading.Thread(target=server_thread)
+        t.start()
+        with mock.patch.object(MissionLink.random, "getrandbits", return_value=modulus - 10):
+            for message in messages:
+                assert client.send("127.0.0.1", 8080, "T", "r1", "M01", message) == True
+        t.join(timeout=30)
+
+        assert [result[3] for result in results] == messages, "Mensagens incorretas"
+        session = next(iter(client.sessions.values()))
+        assert session.seq > modulus, f"O seq não deu a volta: {session.seq}"
+        debug_print(f"✓ {len(messages)} mensagens recebidas com o seq a passar 2^32 (seq completo: {session.seq})", "SUCCESS")
+        debug_print(f"  - datagramas enviados: {client.sock.sent}, descartados: {client.sock.dropped}", "INFO")
+
+        server.sock.close()
+        client.sock.close()
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_fast_retransmit():
+    """TESTE 21: ACKs cumulativos com mapa de bits (SACK) e fast retransmit
+
+    Com o RTO mínimo em 2s, perde-se um chunk a meio de uma mensagem longa: os ACKs
+    duplicados dos chunks seguintes fazem o emissor reenviar só esse chunk, muito antes
+    de o temporizador expirar. Sem "sack" (peer antigo), a mensagem continua a chegar.
+    """
+    print("\n" + "="*70)
+    print("TESTE 21: SACK e fast retransmit")
+    print("="*70)
+
+    try:
+        os.makedirs("./debug/test_files/", exist_ok=True)
+
+        def transfer(client, server, message):
+            result = [None]
+            def server_thread():
+                result[0] = server.recv(timeout=20)
+            t = threading.Thread(target=server_thread)
+            t.start()
+            start_time = time.time()
+            assert client.send("127.0.0.1", 8080, "T", "r1", "M01", message) == True
+            elapsed = time.time() - start_time
+            t.join(timeout=30)
+            assert result[0] is not None and result[0][3] == message, "Mensagem incorreta"
+            return elapsed
+
+        # Teste 21.1: Uma perda custa um único reenvio, sem esperar pelo RTO
+        debug_print("Teste 21.1: Fast retransmit...", "TEST")
+        server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+        client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+        client.limit.minRto = 2
+        client.limit.maxDatagramSize = client.limit.buffersize
+        max_useful = client.limit.buffersize - client.getHeaderSize("M01")
+        # 40 chunks cheios, contando com o marcador de mensagem normal (sessão com "rpc")
+        message = "".join(chr(ord("a") + i % 26) * max_useful for i in range(40))[len(client.rpcPlainKey):]
+        data_sent = []
+        def drop(data, count):
+            if data[0] not in (ord("D"), ord("E")):
+                return False
+            data_sent.append(data)
+            return len(data_sent) == 15
+        client.sock = LossySocket(client.sock, drop)
+        elapsed = transfer(client, server, message)
+        assert client.getPeerSack("127.0.0.1", 8080) and server.getPeerSack("127.0.0.1", 8081), "sack não negociado"
+        assert len(data_sent) == 41, f"{len(data_sent)} datagramas de dados para 40 chunks e 1 perda"
+        assert data_sent[-1] != data_sent[14] and data_sent.count(data_sent[14]) == 2, "O reenvio não foi o chunk perdido"
+        assert elapsed < client.limit.minRto, f"A perda esperou pelo RTO ({elapsed:.2f}s)"
+        debug_print(f"✓ 40 chunks com 1 perda em {elapsed:.2f}s (RTO mínimo {client.limit.minRto}s), 1 reenvio", "SUCCESS")
+        server.sock.close()
+        client.sock.close()
+
+        # Teste 21.2: Peer sem "sack" - um ACK por chunk
+        debug_print("Teste 21.2: Peer sem sack...", "TEST")
+        server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+        client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+        negotiate = server.negotiateCapabilities
+        def without_sack(offered):
+            accepted = negotiate(offered)
+            accepted.pop("sack", None)
+            return accepted
+        server.negotiateCapabilities = without_sack
+        client.limit.maxDatagramSize = client.limit.buffersize
+        seen = set()
+        def drop_some(data, count):
+            if data[0] not in (ord("D"), ord("E")) or data in seen:
+                return False
+            seen.add(data)
+            return count % 7 == 0
+        client.sock = LossySocket(client.sock, drop_some)
+        transfer(client, server, message)
+        assert not client.getPeerSack("127.0.0.1", 8080), "sack não deveria ter sido aceite"
+        debug_print(f"✓ Mensagem recebida com um ACK por chunk ({client.sock.dropped} perdidos)", "SUCCESS")
+        server.sock.close()
+        client.sock.close()
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_congestion_control():
+    """TESTE 22: Controlo de congestionamento (AIMD) e pacing (token bucket)
+
+    Verifica a evolução da janela (slow start, additive increase, multiplicative decrease,
+    timeout), o token bucket e o envio de uma missão para vários rovers em simultâneo
+    através de um uplink que descarta datagramas quando a sua fila enche.
+    """
+    print("\n" + "="*70)
+    print("TESTE 22: Controlo de congestionamento e pacing")
+    print("="*70)
+
+    try:
+        os.makedirs("./debug/test_files/", exist_ok=True)
+
+        # Teste 22.1: Evolução da janela de congestionamento
+        debug_print("Teste 22.1: AIMD...", "TEST")
+        cc = CongestionControl.CongestionControl(2, 64)
+        cc.onAck(2)
+        assert cc.getWindow() == 4, f"Slow start: janela {cc.getWindow()} (esperado 4)"
+        cc.onAck(4)
+        assert cc.getWindow() == 8, f"Slow start: janela {cc.getWindow()} (esperado 8)"
+        cc.onLoss()
+        assert cc.getWindow() == 4 and cc.ssthresh == 4, f"Perda: janela {cc.getWindow()}, ssthresh {cc.ssthresh}"
+        cc.onAck(5)
+        assert cc.getWindow() == 5, f"Additive increase: janela {cc.getWindow()} (esperado 5)"
+        cc.onTimeout()
+        assert cc.getWindow() == 1, f"Timeout: janela {cc.getWindow()} (esperado 1)"
+        cc.onAck(5000)
+        assert cc.getWindow() == 64, f"Janela acima do máximo: {cc.getWindow()}"
+        debug_print("✓ Slow start, additive increase, multiplicative decrease e timeout", "SUCCESS")
+
+        # Teste 22.2: Token bucket
+        debug_print("Teste 22.2: Token bucket...", "TEST")
+        bucket = TokenBucket.TokenBucket(100000, 3000)
+        assert bucket.consume(1000) == 0 and bucket.consume(2000) == 0, "A rajada deveria sair sem espera"
+        delay = bucket.consume(1000)
+        assert 0.009 <= delay <= 0.011, f"Espera de {delay:.4f}s (esperado 0.01s)"
+        debug_print("✓ Rajada sem espera, depois um datagrama por cada 1000 bytes / 100 kB/s", "SUCCESS")
+
+        mission = json.dumps({"mission_id": "M-FLEET", "task": "capture_images", "waypoints": [[i, i * 2] for i in range(4000)]})
+
+        def fleet(pacingRate, queueSize, drain):
+            """Envia a missão para 8 rovers em simultâneo por um uplink com fila limitada"""
+            server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+            rovers = [create_missionlink_with_port("127.0.0.1", 8090 + i, "./debug/test_files/client/") for i in range(8)]
+            server.limit.pacingRate = pacingRate
+            server.limit.pacingBurst = 16 * 1024
+            # Uplink: uma fila de queueSize datagramas esvaziada a um datagrama por drain segundos
+            queue = {"size": 0.0, "at": time.time()}
+            queue_lock = threading.Lock()
+            def uplink(data, count):
+                with queue_lock:
+                    now = time.time()
+                    queue["size"] = max(0.0, queue["size"] - (now - queue["at"]) / drain)
+                    queue["at"] = now
+                    if queue["size"] >= queueSize:
+                        return True
+                    queue["size"] += 1
+                    return False
+            server.sock = LossySocket(server.sock, uplink)
+
+            results = [None] * len(rovers)
+            elapsed = [None] * len(rovers)
+            errors = []
+            def rover_thread(i):
+                try:
+                    results[i] = rovers[i].recv(timeout=30)
+                except Exception as e:
+                    errors.append(e)
+            def send_thread(i):
+                try:
+                    start_time = time.time()
+                    server.send("127.0.0.1", 8090 + i, "T", "NMS", "M01", mission)
+                    elapsed[i] = time.time() - start_time
+                except Exception as e:
+                    errors.append(e)
+            threads = [threading.Thread(target=rover_thread, args=(i,)) for i in range(len(rovers))]
+            threads += [threading.Thread(target=send_thread, args=(i,)) for i in range(len(rovers))]
+            start_time = time.time()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join(timeout=60)
+            total = time.time() - start_time
+
+            server.sock.close()
+            for rover in rovers:
+                rover.sock.close()
+            assert not errors, f"Erros: {errors}"
+            assert all(result is not None and result[3] == mission for result in results), "Missão incorreta num rover"
+            sessions = [session for session in server.sessions.values() if session.congestion is not None]
+            assert len(sessions) == len(rovers), f"{len(sessions)} sessões com janela de congestionamento"
+            reduced = sum(1 for session in sessions if session.congestion.ssthresh < session.window)
+            debug_print(f"✓ {len(rovers)} rovers receberam {len(mission)} bytes em {total:.2f}s ({len(mission) * len(rovers) / total / 1024:.0f} KiB/s úteis)", "SUCCESS")
+            debug_print(f"  - por rover: {min(elapsed):.2f}s a {max(elapsed):.2f}s; sessões que recuaram: {reduced}", "INFO")
+            debug_print(f"  - datagramas enviados: {server.sock.sent}, descartados no uplink: {server.sock.dropped}", "INFO")
+            return total, server.sock.dropped, reduced
+
+        # Teste 22.3: Sem pacing, a fila do uplink transborda e as sessões recuam (AIMD)
+        debug_print("Teste 22.3: Missão para a frota por um uplink congestionado...", "TEST")
+        total, dropped, reduced = fleet(None, 24, 0.0005)
+        assert dropped > 0 and reduced > 0, f"O uplink não congestionou ({dropped} descartados, {reduced} sessões recuaram)"
+
+        # Teste 22.4: Com pacing abaixo do débito do uplink, a fila não transborda
+        debug_print("Teste 22.4: Missão para a frota com pacing...", "TEST")
+        rate = 1024 * 1024
+        total, dropped, reduced = fleet(rate, 24, 0.0005)
+        expected = (len(mission) * 8 - 16 * 1024) / rate
+        assert total >= expected * 0.9, f"Pacing não respeitado: {total:.2f}s (mínimo {expected:.2f}s)"
+        assert dropped == 0, f"{dropped} datagramas descartados com pacing"
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_zero_rtt():
+    """TESTE 23: Dados 0-RTT no SYN
+
+    A primeira mensagem curta para um peer vai no próprio SYN e o SYN-ACK confirma-a:
+    nenhum pacote de dados é enviado. Se o SYN-ACK se perder, o SYN reenviado não volta
+    a entregar a mensagem, nem um SYN atrasado depois de a sessão ter sido descartada.
+    Mensagens longas e peers sem "early" usam o caminho normal.
+    """
+    print("\n" + "="*70)
+    print("TESTE 23: Dados 0-RTT no SYN")
+    print("="*70)
+
+    try:
+        os.makedirs("./debug/test_files/", exist_ok=True)
+
+        def exchange(client, server, message, idMission="M01"):
+            # O servidor continua a ler o socket até o envio terminar (para tratar SYNs
+            # reenviados) e guarda todas as mensagens entregues
+            received = []
+            done = threading.Event()
+            def server_thread():
+                deadline = time.time() + 30
+                while time.time() < deadline and not (done.is_set() and received):
+                    try:
+                        received.append(server.recv(timeout=0.2))
+                    except TimeoutError:
+                        pass
+            t = threading.Thread(target=server_thread)
+            t.start()
+            try:
+                assert client.send("127.0.0.1", 8080, "R", "r1", idMission, message) == True
+            finally:
+                time.sleep(0.3)
+                done.set()
+                t.join(timeout=35)
+            assert len(received) == 1, f"{len(received)} mensagens entregues"
+            idAgent, received_id, missionType, text, ip = received[0]
+            assert (idAgent, received_id, missionType) == ("r1", idMission, "R"), f"Campos incorretos: {received[0]}"
+            assert text == message, f"Mensagem incorreta: {text[:40]!r}"
+
+        def assert_no_message(server):
+            try:
+                lista = server.recv(timeout=1)
+            except TimeoutError:
+                return
+            raise AssertionError(f"Mensagem entregue outra vez: {lista}")
+
+        sent = []
+        def record(data, count):
+            sent.append(data)
+            return False
+
+        # Teste 23.1: A primeira mensagem vai no SYN
+        debug_print("Teste 23.1: Mensagem no SYN...", "TEST")
+        server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+        client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+        client.sock = LossySocket(client.sock, record)
+        exchange(client, server, "registo ção")
+        flags = [chr(data[0]) for data in sent]
+        assert flags == ["S", "A"], f"Pacotes do cliente: {flags}"
+        exchange(client, server, "segunda", "M02")
+        assert sent[2:] and all(data[0] in (ord("D"), ord("E")) for data in sent[2:]), "A sessão reutilizada deveria enviar só dados"
+        debug_print("✓ Mensagem entregue só com SYN + ACK; a seguinte usa a sessão aberta", "SUCCESS")
+        server.sock.close()
+        client.sock.close()
+
+        # Teste 23.2: SYN-ACK perdido e SYN atrasado - sem entregas duplicadas
+        debug_print("Teste 23.2: SYN-ACK perdido...", "TEST")
+        server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+        client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+        sent.clear()
+        client.sock = LossySocket(client.sock, record)
+        server.sock = LossySocket(server.sock, lambda data, count: data[0] == ord("Z") and count == 1)
+        exchange(client, server, "pedido")
+        # Recupera pelo SYN reenviado ou pelo SYN-ACK reenviado pelo servidor (o que expirar primeiro)
+        flags = [chr(data[0]) for data in sent]
+        assert server.sock.dropped == 1 and set(flags) == {"S", "A"} and flags[-1] == "A", f"Pacotes do cliente: {flags}"
+        with server.sessionsCond:
+            for session in list(server.sessions.values()):
+                server.removeSession(session)
+        client.sock.sock.sendto(sent[0], ("127.0.0.1", 8080))
+        assert_no_message(server)
+        debug_print("✓ SYN-ACK perdido e SYN atrasado não entregam a mensagem outra vez", "SUCCESS")
+        server.sock.close()
+        client.sock.close()
+
+        # Teste 23.3: Mensagem longa - handshake e dados
+        debug_print("Teste 23.3: Mensagem longa...", "TEST")
+        server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+        client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+        sent.clear()
+        client.sock = LossySocket(client.sock, record)
+        long_message = "x" * (3 * client.limit.buffersize)
+        exchange(client, server, long_message)
+        assert "early=1" not in str(sent[0], "utf-8", "replace"), "A mensagem longa não cabe no SYN"
+        assert sum(1 for data in sent if data[0] in (ord("D"), ord("E"))) > 1, "Faltam os chunks de dados"
+        debug_print("✓ Mensagem longa enviada depois do handshake", "SUCCESS")
+        server.sock.close()
+        client.sock.close()
+
+        # Teste 23.4: Peer sem "early" - a mensagem segue depois do handshake
+        debug_print("Teste 23.4: Peer sem early...", "TEST")
+        server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+        client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+        negotiate = server.negotiateCapabilities
+        def without_early(offered):
+            accepted = negotiate(offered)
+            accepted.pop("early", None)
+            return accepted
+        server.negotiateCapabilities = without_early
+        sent.clear()
+        client.sock = LossySocket(client.sock, record)
+        exchange(client, server, "registo")
+        assert any(data[0] in (ord("D"), ord("E")) for data in sent), "A mensagem deveria ir em dados"
+        debug_print("✓ Mensagem entregue uma vez pelo caminho normal", "SUCCESS")
+        server.sock.close()
+        client.sock.close()
+
+        # Teste 23.5: SyncMissionLink (AsyncMissionLink) também envia no SYN
+        debug_print("Teste 23.5: SyncMissionLink...", "TEST")
+        server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+        client = AsyncMissionLink.SyncMissionLink("127.0.0.1", "./debug/test_files/client/", 8081)
+        try:
+            sent.clear()
+            client.missionLink.sock = LossySocket(client.missionLink.sock, record)
+            exchange(client, server, "resposta")
+            assert [chr(data[0]) for data in sent] == ["S", "A"], f"Pacotes do cliente: {[chr(d[0]) for d in sent]}"
+            debug_print("✓ Mensagem entregue só com SYN + ACK", "SUCCESS")
+        finally:
+            client.close()
+            server.sock.close()
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_forward_error_correction():
+    """TESTE 24: Correção de erros (FEC) com pacotes de paridade XOR
+
+    Numa ligação que perde um em cada dez chunks, o emissor passa a juntar um pacote de
+    paridade a cada grupo de chunks e o recetor reconstrói os chunks perdidos sem
+    retransmissão. O tamanho do grupo acompanha a taxa de perda observada pela sessão.
+    """
+    print("\n" + "="*70)
+    print("TESTE 24: FEC (paridade XOR)")
+    print("="*70)
+
+    try:
+        os.makedirs("./debug/test_files/", exist_ok=True)
+
+        # Teste 24.1: Tamanho do grupo adaptado às perdas
+        debug_print("Teste 24.1: FecControl...", "TEST")
+        fec = FecControl.FecControl()
+        assert fec.getGroupSize(8) == 0, "Sem perdas não deveria haver paridade"
+        fec.onLoss()
+        assert fec.getGroupSize(8) == 8, f"Perda rara: grupo {fec.getGroupSize(8)}"
+        fec.onLoss(4)
+        high = fec.getGroupSize(8)
+        assert 2 <= high < 8, f"Perdas frequentes deveriam encurtar o grupo: {high}"
+        fec.onAck(200)
+        assert fec.getGroupSize(8) == 0, "Sem perdas a paridade deveria desligar-se"
+        debug_print(f"✓ Grupo: 0 sem perdas, 8 com perdas raras, {high} com perdas frequentes", "SUCCESS")
+
+        def run(client_fec, server_fec=True, dropFirst=False):
+            server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+            client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+            client.limit.fec = client_fec
+            client.limit.minRto = 2
+            client.limit.maxDatagramSize = client.limit.buffersize
+            if not server_fec:
+                negotiate = server.negotiateCapabilities
+                def without_fec(offered):
+                    accepted = negotiate(offered)
+                    accepted.pop("fec", None)
+                    return accepted
+                server.negotiateCapabilities = without_fec
+            seen = set()
+            stats = {"data": 0, "dropped": 0, "resent": 0, "parity": 0}
+            def drop(data, count):
+                if data[0] == ord("C"):
+                    stats["parity"] += 1
+                if data[0] not in (ord("D"), ord("E")):
+                    return False
+                if data in seen:
+                    stats["resent"] += 1
+                    return False
+                seen.add(data)
+                stats["data"] += 1
+                if stats["data"] % 10 == 5:
+                    stats["dropped"] += 1
+                    return True
+                return False
+            client.sock = LossySocket(client.sock, drop)
+            recovered = []
+            server.sock = LossySocket(server.sock, lambda data, count: data[0] == ord("A") and data[1] == ord("C") and recovered.append(data) and False)
+            max_useful = client.limit.buffersize - client.getHeaderSize("M01")
+            message = "".join(chr(ord("a") + i % 26) * max_useful for i in range(200))
+            result = [None]
+            def server_thread():
+                result[0] = server.recv(timeout=60)
+            try:
+                t = threading.Thread(target=server_thread)
+                t.start()
+                start = time.time()
+                assert client.send("127.0.0.1", 8080, "T", "r1", "M01", message) == True
+                elapsed = time.time() - start
+                t.join(timeout=70)
+                assert result[0] is not None and result[0][3] == message, "Mensagem incorreta"
+                if dropFirst:
+                    # Sessão reutilizada (paridade já ativa): perder o primeiro chunk, que
+                    # anuncia o tamanho da mensagem
+                    stats["data"] = 4
+                    before = len(recovered)
+                    second = "".join(chr(ord("A") + i % 26) * max_useful for i in range(12))
+                    t = threading.Thread(target=server_thread)
+                    t.start()
+                    assert client.send("127.0.0.1", 8080, "T", "r1", "M02", second) == True
+                    t.join(timeout=30)
+                    assert result[0] is not None and result[0][3] == second, "Segunda mensagem incorreta"
+                    assert len(recovered) > before, "O primeiro chunk não foi reconstruído"
+                return stats, len(recovered), elapsed
+            finally:
+                server.sock.close()
+                client.sock.close()
+
+        # Teste 24.2: Sem FEC - cada perda é reenviada
+        debug_print("Teste 24.2: Sem FEC...", "TEST")
+        stats, recovered, elapsed_plain = run(False)
+        assert stats["parity"] == 0 and recovered == 0, "Não deveria haver paridade"
+        assert stats["resent"] >= stats["dropped"], f"Perdas sem reenvio: {stats}"
+        debug_print(f"✓ {stats['dropped']} perdas, {stats['resent']} reenvios em {elapsed_plain:.2f}s", "SUCCESS")
+
+        # Teste 24.3: Com FEC - as perdas são reconstruídas pelo recetor
+        debug_print("Teste 24.3: Com FEC...", "TEST")
+        stats, recovered, elapsed_fec = run(True, dropFirst=True)
+        assert stats["parity"] > 0, "Nenhum pacote de paridade enviado"
+        assert recovered >= stats["dropped"] // 2, f"Poucas reconstruções: {recovered} de {stats['dropped']} perdas"
+        assert stats["resent"] < stats["dropped"] - recovered // 2, f"Reenvios a mais: {stats}, {recovered} reconstruídos"
+        debug_print(f"✓ {stats['dropped']} perdas: {recovered} reconstruídas, {stats['resent']} reenvios, "
+                    f"{stats['parity']} pacotes de paridade em {elapsed_fec:.2f}s", "SUCCESS")
+
+        # Teste 24.4: Peer sem "fec"
+        debug_print("Teste 24.4: Peer sem fec...", "TEST")
+        stats, recovered, elapsed = run(True, server_fec=False)
+        assert stats["parity"] == 0 and recovered == 0, "Paridade enviada a um peer sem fec"
+        debug_print(f"✓ Sem paridade: {stats['resent']} reenvios", "SUCCESS")
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_reader_thread():
+    """TESTE 25: Thread de leitura dedicada
+
+    Só uma thread lê o socket de cada endpoint e entrega cada datagrama à sessão a que
+    pertence: vários envios e uma receção em paralelo no mesmo endpoint não disputam o
+    socket. Fechar o socket termina a thread e liberta logo a porta.
+    """
+    print("\n" + "="*70)
+    print("TESTE 25: Thread de leitura dedicada")
+    print("="*70)
+
+    try:
+        os.makedirs("./debug/test_files/", exist_ok=True)
+        ports = [8080, 8082, 8083]
+        servers = [create_missionlink_with_port("127.0.0.1", port, "./debug/test_files/server/") for port in ports]
+        client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+        peer = create_missionlink_with_port("127.0.0.1", 8084, "./debug/test_files/client/")
+        max_useful = client.limit.buffersize - client.getHeaderSize("M01")
+        messages = ["".join(chr(ord("a") + (i + n) % 26) * max_useful for i in range(40)) for n in range(len(ports))]
+
+        # Teste 25.1: Envios em paralelo para três servidores e uma receção no mesmo endpoint
+        debug_print("Teste 25.1: Envios e receção em paralelo...", "TEST")
+        received = [None] * len(ports)
+        incoming = [None]
+        errors = []
+        def server_thread(i):
+            try:
+                received[i] = servers[i].recv(timeout=30)
+            except Exception as e:
+                errors.append(e)
+        def send_thread(i):
+            try:
+                assert client.send("127.0.0.1", ports[i], "T", "r1", f"M0{i}", messages[i]) == True
+            except Exception as e:
+                errors.append(e)
+        def recv_thread():
+            try:
+                incoming[0] = client.recv(timeout=30)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=server_thread, args=(i,)) for i in range(len(ports))]
+        threads += [threading.Thread(target=send_thread, args=(i,)) for i in range(len(ports))]
+        threads.append(threading.Thread(target=recv_thread))
+        for t in threads:
+            t.start()
+        assert peer.send("127.0.0.1", 8081, "T", "r2", "M09", "do peer") == True
+        for t in threads:
+            t.join(timeout=40)
+        assert not errors, f"Erros: {errors}"
+        for i in range(len(ports)):
+            assert received[i] is not None and received[i][3] == messages[i], f"Mensagem {i} incorreta"
+        assert incoming[0] is not None and incoming[0][3] == "do peer", f"Receção incorreta: {incoming[0]}"
+        readers = [t for t in threading.enumerate() if t.name == "MissionLink-8081"]
+        assert len(readers) == 1 and client.reader is readers[0], f"Threads de leitura: {readers}"
+        debug_print("✓ 3 envios e 1 receção em paralelo com uma única thread de leitura", "SUCCESS")
+
+        # Teste 25.2: Fechar o socket termina a thread e liberta a porta
+        debug_print("Teste 25.2: Fecho do socket...", "TEST")
+        reader = client.reader
+        client.sock.close()
+        assert not reader.is_alive(), "Thread de leitura ainda ativa depois do fecho"
+        reuse = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        reuse.bind(("127.0.0.1", 8081))
+        reuse.close()
+        debug_print("✓ Thread terminada e porta livre logo após o fecho", "SUCCESS")
+        for server in servers:
+            server.sock.close()
+        peer.sock.close()
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_timer_wheel():
+    """TESTE 26: Roda de temporizadores das sessões
+
+    Os temporizadores de todas as sessões ficam numa roda (TimerWheel): armar, rearmar e
+    cancelar são O(1) e cada tick só vê os temporizadores que expiraram, mesmo com
+    milhares de sessões na tabela.
+    """
+    print("\n" + "="*70)
+    print("TESTE 26: Roda de temporizadores (TimerWheel)")
+    print("="*70)
+
+    try:
+        # Teste 26.1: Agendar, reagendar, cancelar e voltas da roda
+        debug_print("Teste 26.1: TimerWheel...", "TEST")
+        wheel = TimerWheel.TimerWheel(0.05, slots=8)
+        now = time.time()
+        wheel.schedule("a", now + 0.1)
+        wheel.schedule("b", now + 0.1)
+        wheel.schedule("c", now + 0.05 * 8 + 0.1)   # mesma ranhura, volta seguinte
+        wheel.schedule("d", now - 1)                # já expirado
+        wheel.schedule("b", now + 0.3)              # reagendado
+        wheel.schedule("e", now + 0.1)
+        wheel.cancel("e")
+        assert len(wheel) == 4, f"Temporizadores: {len(wheel)}"
+        assert wheel.expire(now) == ["d"], "Só o temporizador já expirado deveria disparar"
+        assert wheel.expire(now + 0.15) == ["a"], "Esperado só 'a'"
+        assert wheel.expire(now + 0.35) == ["b"], "Esperado 'b' (reagendado)"
+        assert wheel.expire(now + 10) == ["c"], "Esperado 'c' (volta seguinte)"
+        assert len(wheel) == 0 and wheel.expire(now + 20) == [], "Roda deveria estar vazia"
+        debug_print("✓ Reagendar, cancelar e voltas da roda corretos", "SUCCESS")
+
+        # Teste 26.2: Muitas sessões - cada tick só processa as que expiram
+        debug_print("Teste 26.2: 20000 sessões na tabela...", "TEST")
+        server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+        try:
+            count = 20000
+            with server.sessionsLock:
+                for i in range(count):
+                    session = Session.Session("10.0.0.1", 1000 + i, i, i, False)
+                    session.state = Session.Session.ESTABLISHED
+                    server.sessions[session.getKey()] = session
+                    server.setTimer(session, time.time() + 60)
+                expiring = list(server.sessions.values())[:5]
+                for session in expiring:
+                    session.lastActivity = 0
+                    server.setTimer(session, time.time() - 1)
+                start = time.perf_counter()
+                server.runTimers()
+                elapsed = time.perf_counter() - start
+            assert len(server.sessions) == count - 5, f"Sessões expiradas: {count - len(server.sessions)}"
+            assert len(server.timers) == count - 5, f"Temporizadores: {len(server.timers)}"
+            assert elapsed < 0.05, f"runTimers() demorou {elapsed * 1000:.2f}ms com {count} sessões"
+            with server.sessionsLock:
+                for session in list(server.sessions.values()):
+                    server.removeSession(session)
+            assert len(server.timers) == 0, "removeSession() deveria cancelar o temporizador"
+            debug_print(f"✓ 5 de {count} sessões expiradas em {elapsed * 1000:.2f}ms", "SUCCESS")
+        finally:
+            server.sock.close()
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_batched_receive():
+    """TESTE 27: Receção em lote (esvaziar o socket e agrupar ACKs)
+
+    A thread de leitura lê de uma vez todos os datagramas que já estão no socket e
+    trata-os com uma só aquisição da tabela de sessões; os ACKs cumulativos de uma
+    sessão no mesmo lote são agrupados num só. Os buffers do socket são aumentados
+    para Limit.socketBuffer.
+    """
+    print("\n" + "="*70)
+    print("TESTE 27: Receção em lote")
+    print("="*70)
+
+    try:
+        os.makedirs("./debug/test_files/", exist_ok=True)
+        server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+        client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+        batches = []
+        handle = server.handleDatagrams
+        def record(datagrams):
+            if datagrams:
+                batches.append(len(datagrams))
+            handle(datagrams)
+        server.handleDatagrams = record
+
+        # Teste 27.1: Buffers do socket
+        debug_print("Teste 27.1: SO_RCVBUF/SO_SNDBUF...", "TEST")
+        default = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        default_size = default.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        default.close()
+        size = server.sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        try:
+            with open("/proc/sys/net/core/rmem_max") as f:
+                rmem_max = int(f.read())
+        except OSError:
+            rmem_max = None
+        if rmem_max is not None and rmem_max > default_size:
+            assert size > default_size, f"SO_RCVBUF não aumentou: {size}"
+        debug_print(f"✓ SO_RCVBUF {size} bytes (omissão: {default_size})", "SUCCESS")
+
+        # Teste 27.2: Rajada lida num só lote
+        debug_print("Teste 27.2: Esvaziar o socket...", "TEST")
+        server.startReader()
+        burst = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        with server.sessionsLock:
+            # A thread de leitura fica parada no primeiro datagrama; os restantes acumulam-se no socket
+            for _ in range(200):
+                burst.sendto(b"??", ("127.0.0.1", 8080))
+            time.sleep(0.2)
+        deadline = time.time() + 5
+        while sum(batches) < 200 and time.time() < deadline:
+            time.sleep(0.05)
+        burst.close()
+        assert sum(batches) == 200, f"Datagramas tratados: {sum(batches)}"
+        assert max(batches) == MissionLink.readerBatch, f"Lotes: {batches}"
+        debug_print(f"✓ 200 datagramas em {len(batches)} lotes", "SUCCESS")
+
+        # Teste 27.3: ACKs cumulativos agrupados num lote
+        debug_print("Teste 27.3: ACKs agrupados...", "TEST")
+        client.limit.maxDatagramSize = client.limit.buffersize
+        client.limit.initialWindow = 8
+        stats = {"data": 0, "acks": 0}
+        def count_data(data, count):
+            if data[0] in (ord("D"), ord("E")):
+                stats["data"] += 1
+            return False
+        def count_acks(data, count):
+            if data[0] == ord("A"):
+                stats["acks"] += 1
+            return False
+        client.sock = LossySocket(client.sock, count_data)
+        server.sock = LossySocket(server.sock, count_acks)
+        client.startConnection("r1", "127.0.0.1", 8080)
+        del batches[:]
+        max_useful = client.limit.buffersize - client.getHeaderSize("M01")
+        message = "".join(chr(ord("a") + i % 26) * max_useful for i in range(64))
+        result = [None]
+        def server_thread():
+            result[0] = server.recv(timeout=30)
+        t = threading.Thread(target=server_thread)
+        t.start()
+        with server.sessionsLock:
+            sender = threading.Thread(target=lambda: client.send("127.0.0.1", 8080, "T", "r1", "M01", message))
+            sender.start()
+            time.sleep(0.2)
+        sender.join(timeout=30)
+        t.join(timeout=30)
+        assert result[0] is not None and result[0][3] == message, "Mensagem incorreta"
+        assert max(batches) > 1, f"Nenhum lote com mais de um datagrama: {batches}"
+        assert stats["acks"] < stats["data"], f"ACKs não agrupados: {stats}"
+        debug_print(f"✓ {stats['data']} chunks confirmados com {stats['acks']} ACKs", "SUCCESS")
+        server.sock.close()
+        client.sock.close()
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_request_reply():
+    """TESTE 28: Pedido/resposta (request() e reply())
+
+    O rover pede e a Nave-Mãe responde ao mesmo pedido: a resposta chega à chamada
+    request() que está à espera dela (nunca a recv()), pelas sessões já abertas, sem
+    novos handshakes. Pedidos sem resposta esgotam o tempo e as respostas atrasadas são
+    descartadas.
+    """
+    print("\n" + "="*70)
+    print("TESTE 28: Pedido/resposta (rpc)")
+    print("="*70)
+
+    try:
+        os.makedirs("./debug/test_files/", exist_ok=True)
+
+        def serve(server, requests, answer=True):
+            # Responde a `requests` pedidos com a mensagem em maiúsculas
+            received = []
+            def run():
+                for _ in range(requests):
+                    lista = server.recv(timeout=15)
+                    received.append(lista)
+                    if answer:
+                        server.reply(lista, "T", lista[1], lista[3].upper())
+            t = threading.Thread(target=run)
+            t.start()
+            return t, received
+
+        # Teste 28.1: Resposta correlacionada, sem handshakes depois do primeiro pedido
+        debug_print("Teste 28.1: request()/reply()...", "TEST")
+        server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+        client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+        client.sock = LossySocket(client.sock, lambda data, count: False)
+        server.sock = LossySocket(server.sock, lambda data, count: False)
+        listener = []
+        def listen():
+            try:
+                listener.append(client.recv(timeout=1))
+            except TimeoutError:
+                pass
+        try:
+            t_listen = threading.Thread(target=listen)
+            t_listen.start()
+            t, received = serve(server, 2)
+            reply = client.request("127.0.0.1", 8080, "Q", "r1", "000", "primeiro", timeout=10)
+            assert reply[2] == "T" and reply[3] == "PRIMEIRO" and reply[4] == "127.0.0.1", f"Resposta incorreta: {reply}"
+            assert received[0][3] == "primeiro" and len(received[0]) == 6, f"Pedido incorreto: {received[0]}"
+            time.sleep(0.2)     # fim do handshake da primeira resposta
+            sent = (client.sock.sent, server.sock.sent)
+            start = time.time()
+            reply = client.request("127.0.0.1", 8080, "Q", "r1", "000", "segundo", timeout=10)
+            elapsed = time.time() - start
+            assert reply[3] == "SEGUNDO", f"Resposta incorreta: {reply}"
+            time.sleep(0.2)     # ACK da resposta
+            # Pedido e resposta numa sessão aberta: um datagrama e um ACK em cada sentido
+            assert client.sock.sent - sent[0] == 2 and server.sock.sent - sent[1] == 2, \
+                f"Datagramas: cliente {client.sock.sent - sent[0]}, servidor {server.sock.sent - sent[1]}"
+            t_listen.join(timeout=5)
+            assert not listener, f"A resposta não deveria chegar a recv(): {listener}"
+            debug_print(f"✓ Resposta correlacionada em {elapsed * 1000:.1f}ms (2 datagramas em cada sentido)", "SUCCESS")
+
+            # Teste 28.2: Sem resposta - timeout, e a resposta atrasada é descartada
+            debug_print("Teste 28.2: Timeout...", "TEST")
+            t.join(timeout=10)
+            late = []
+            def late_server():
+                lista = server.recv(timeout=15)
+                time.sleep(0.6)
+                late.append(server.reply(lista, "T", lista[1], "tarde"))
+            t = threading.Thread(target=late_server)
+            t.start()
+            try:
+                client.request("127.0.0.1", 8080, "Q", "r1", "000", "terceiro", timeout=0.3)
+                assert False, "Deveria ter esgotado o tempo"
+            except TimeoutError:
+                pass
+            t.join(timeout=10)
+            assert late == [True], "A resposta atrasada deveria ser entregue ao MissionLink do cliente"
+            time.sleep(0.1)
+            assert not client.delivered and not client.replies, "A resposta atrasada deveria ser descartada"
+            debug_print("✓ TimeoutError e resposta atrasada descartada", "SUCCESS")
+        finally:
+            server.sock.close()
+            client.sock.close()
+
+        # Teste 28.3: Peer sem "rpc"
+        debug_print("Teste 28.3: Peer sem rpc...", "TEST")
+        server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+        client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+        negotiate = server.negotiateCapabilities
+        def without_rpc(offered):
+            accepted = negotiate(offered)
+            accepted.pop("rpc", None)
+            return accepted
+        server.negotiateCapabilities = without_rpc
+        try:
+            t, received = serve(server, 3, answer=False)
+            # No SYN (0-RTT), na sessão já aberta e numa mensagem longa (vários chunks)
+            long_request = "pedido longo " * 400
+            for message in ("pedido", "outro", long_request):
+                assert client.request("127.0.0.1", 8080, "Q", "r1", "000", message, timeout=10) is None
+            t.join(timeout=10)
+            assert [lista[3] for lista in received] == ["pedido", "outro", long_request], \
+                f"Pedidos alterados: {[lista[3][:20] for lista in received]}"
+            assert all(len(lista) == 5 for lista in received), f"Pedido incorreto: {received}"
+            debug_print("✓ Pedidos entregues como mensagens normais, sem prefixo (request() devolve None)", "SUCCESS")
+        finally:
+            server.sock.close()
+            client.sock.close()
+
+        # Teste 28.4: SyncMissionLink (Nave-Mãe) responde a um MissionLink (rover)
+        debug_print("Teste 28.4: SyncMissionLink...", "TEST")
+        server = AsyncMissionLink.SyncMissionLink("127.0.0.1", "./debug/test_files/server/", 8080)
+        client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+        try:
+            t, received = serve(server, 2)
+            for message in ("missao", "outra"):
+                reply = client.request("127.0.0.1", 8080, "Q", "r1", "000", message, timeout=10)
+                assert reply[3] == message.upper(), f"Resposta incorreta: {reply}"
+            t.join(timeout=10)
+            # No sentido inverso: pedido feito pelo AsyncMissionLink
+            t, received = serve(client, 1)
+            reply = server.request("127.0.0.1", 8081, "Q", "nms", "000", "estado", timeout=10)
+            assert reply[3] == "ESTADO", f"Resposta incorreta: {reply}"
+            t.join(timeout=10)
+            debug_print("✓ Pedidos e respostas entre SyncMissionLink e MissionLink nos dois sentidos", "SUCCESS")
+        finally:
+            server.close()
+            client.sock.close()
+
+        # Teste 28.5: Mensagens normais que começam pelos bytes dos marcadores (sessão com "rpc")
+        debug_print("Teste 28.5: Mensagens com bytes de marcador...", "TEST")
+        server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+        client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+        try:
+            t, received = serve(server, 4, answer=False)
+            # A primeira vai no SYN (0-RTT); as outras na sessão aberta, uma delas com vários chunks
+            messages = ["\x01aberta", "\x017\x01corpo", "\x027\x02resposta", "\x01" + "longa " * 400]
+            for message in messages:
+                assert client.send("127.0.0.1", 8080, "P", "r1", "M01", message) == True
+            t.join(timeout=10)
+            assert [lista[3] for lista in received] == messages, f"Mensagens alteradas: {[lista[3][:20] for lista in received]}"
+            assert all(len(lista) == 5 for lista in received), "Mensagem normal tratada como pedido"
+            assert not server.replies, "Mensagem normal tratada como resposta"
+            debug_print("✓ Mensagens normais entregues intactas numa sessão com rpc", "SUCCESS")
+        finally:
+            server.sock.close()
+            client.sock.close()
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_replay_cache():
+    """TESTE 29: Mensagens idempotentes (replayCache)
+
+    Uma mensagem ou pedido reenviado com o mesmo id (porque a confirmação ou a resposta
+    se perdeu) é entregue uma única vez: o recetor descarta o duplicado ou responde-lhe
+    com a resposta guardada, sem voltar a executar o pedido. A cache é limitada (LRU).
+    """
+    print("\n" + "="*70)
+    print("TESTE 29: Mensagens idempotentes (replay)")
+    print("="*70)
+
+    try:
+        os.makedirs("./debug/test_files/", exist_ok=True)
+
+        def serve(server, received, answers):
+            # Responde a cada pedido com a resposta seguinte de `answers` (efeito lateral)
+            def run():
+                while True:
+                    try:
+                        lista = server.recv(timeout=2)
+                    except TimeoutError:
+                        return
+                    received.append(lista)
+                    if lista[2] == "Q":
+                        server.reply(lista, "T", lista[1], answers.pop(0))
+            t = threading.Thread(target=run)
+            t.start()
+            return t
+
+        for name, create_server in (
+            ("MissionLink", lambda: create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")),
+            ("SyncMissionLink", lambda: AsyncMissionLink.SyncMissionLink("127.0.0.1", "./debug/test_files/server/", 8080)),
+        ):
+            server = create_server()
+            client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+            try:
+                received = []
+                t = serve(server, received, ["M01", "M02"])
+
+                # Teste 29.1: Mensagem reenviada com o mesmo id é entregue uma vez
+                debug_print(f"Teste 29.1 ({name}): send() repetido...", "TEST")
+                request_id = client.newRequestId()
+                for _ in range(3):
+                    assert client.send("127.0.0.1", 8080, "P", "r1", "M01", "progresso 50%", requestId=request_id)
+                assert client.send("127.0.0.1", 8080, "P", "r1", "M01", "progresso 60%", requestId=client.newRequestId())
+                time.sleep(0.3)
+                messages = [lista[3] for lista in received]
+                assert messages == ["progresso 50%", "progresso 60%"], f"Mensagens entregues: {messages}"
+                debug_print("✓ 3 envios com o mesmo id, 1 entrega", "SUCCESS")
+
+                # Teste 29.2: Pedido repetido recebe a resposta guardada (não é executado outra vez)
+                debug_print(f"Teste 29.2 ({name}): request() repetido...", "TEST")
+                del received[:]
+                tracked = []
+                if name == "SyncMissionLink":
+                    # O reenvio da resposta corre numa tarefa guardada em tasks até terminar
+                    class TrackingSet(set):
+                        def add(self, task):
+                            tracked.append(task)
+                            set.add(self, task)
+                    server.missionLink.tasks = TrackingSet()
+                request_id = client.newRequestId()
+                first = client.request("127.0.0.1", 8080, "Q", "r1", "000", "request", timeout=10, requestId=request_id)
+                again = client.request("127.0.0.1", 8080, "Q", "r1", "000", "request", timeout=10, requestId=request_id)
+                other = client.request("127.0.0.1", 8080, "Q", "r1", "000", "request", timeout=10)
+                assert first[3] == "M01" and again[3] == "M01", f"Respostas: {first}, {again}"
+                assert other[3] == "M02", f"Pedido novo deveria ser executado: {other}"
+                assert len(received) == 2, f"Pedidos executados: {len(received)}"
+                if name == "SyncMissionLink":
+                    assert tracked and all(task.done() for task in tracked), f"Tarefas de reenvio: {tracked}"
+                    assert not server.missionLink.tasks, "Tarefa terminada continua guardada"
+                debug_print("✓ Pedido repetido respondido a partir da cache (executado 1 vez)", "SUCCESS")
+                t.join(timeout=10)
+            finally:
+                server.close() if name == "SyncMissionLink" else server.sock.close()
+                client.sock.close()
+
+        # Teste 29.3: A cache é limitada e esquece primeiro as entradas menos usadas
+        debug_print("Teste 29.3: Limite da cache (LRU)...", "TEST")
+        server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+        client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+        try:
+            server.replayCacheSize = 3
+            server.startReader()    # sem recv(): só a thread de leitura recebe as mensagens
+            ids = [client.newRequestId() for _ in range(4)]
+            for request_id in ids[:3] + [ids[0]] + ids[3:]:
+                client.send("127.0.0.1", 8080, "P", "r1", "000", "x", requestId=request_id)
+            time.sleep(0.2)
+            cached = [key[3] for key in server.replayCache]
+            assert cached == [ids[2], ids[0], ids[3]], f"Cache: {cached} (ids {ids})"
+            assert len(server.delivered) == 4, f"Entregues: {len(server.delivered)}"
+            # O id esquecido volta a ser entregue (o emissor já deixou de o reenviar há muito)
+            client.send("127.0.0.1", 8080, "P", "r1", "000", "x", requestId=ids[1])
+            time.sleep(0.2)
+            assert len(server.delivered) == 5 and len(server.replayCache) == 3
+            debug_print("✓ Cache limitada a replayCacheSize, entradas menos usadas esquecidas", "SUCCESS")
+        finally:
+            server.sock.close()
+            client.sock.close()
+
+        # Teste 29.4: Uma resposta que não foi entregue não fica em cache
+        debug_print("Teste 29.4: Resposta não entregue...", "TEST")
+        server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+        try:
+            request = ["r1", "000", "Q", "request", "127.0.0.1", (8081, "7")]
+            server.replayCache[("127.0.0.1", 8081, "r1", "7")] = None
+            def unreachable(*args):
+                raise TimeoutError("rover inacessível")
+                yield
+            server.sendContentSteps = unreachable
+            try:
+                server.reply(request, "T", "M01", "M01")
+                assert False, "Deveria ter falhado"
+            except TimeoutError:
+                pass
+            # O pedido repetido volta a recv() (a missão é atribuída outra vez) em vez de
+            # receber uma resposta que a Nave-Mãe julga não ter dado
+            assert ("127.0.0.1", 8081, "r1", "7") not in server.replayCache, f"Cache: {server.replayCache}"
+            debug_print("✓ Pedido esquecido quando a resposta falha", "SUCCESS")
+        finally:
+            server.sock.close()
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_compression():
+    """TESTE 30: Mensagens comprimidas (capacidade "zlib")
+
+    Uma missão grande em JSON vai comprimida, em menos chunks, e chega intacta com o
+    missionType original. Peers sem compressão recebem as mensagens sem alterações, e
+    dados comprimidos inválidos ou demasiado grandes são rejeitados.
+    """
+    print("\n" + "="*70)
+    print("TESTE 30: Mensagens comprimidas (zlib)")
+    print("="*70)
+
+    try:
+        os.makedirs("./debug/test_files/", exist_ok=True)
+        mission = {
+            "mission_id": "M42", "rover_id": "r1",
+            "geographic_area": {"x1": 0.0, "y1": 0.0, "x2": 100.0, "y2": 100.0},
+            "task": "capture_images", "duration_minutes": 30, "priority": "high",
+            "instructions": "Percorrer os pontos por ordem e capturar imagens em cada um",
+            "waypoints": [{"x": round(i * 1.7 % 100, 1), "y": round(i * 3.1 % 100, 1), "z": 0.0} for i in range(300)],
+        }
+        mission_json = json.dumps(mission)
+        progress_json = json.dumps({
+            "mission_id": "M42", "status": "in_progress", "progress_percent": 40,
+            "current_position": {"x": 12.5, "y": 40.0, "z": 0.0}, "operational_status": "em missão",
+            "battery": 81.5, "velocity": 1.2, "elapsed_time_seconds": 95,
+        })
+
+        def transfer(compression, sync_server=False):
+            # Envia a missão e um relatório de progresso; devolve (recebidos, datagramas de dados)
+            if sync_server:
+                server = AsyncMissionLink.SyncMissionLink("127.0.0.1", "./debug/test_files/server/", 8080)
+            else:
+                server = create_missionlink_with_port("127.0.0.1", 8080, "./debug/test_files/server/")
+            client = create_missionlink_with_port("127.0.0.1", 8081, "./debug/test_files/client/")
+            client.limit.compression = compression
+            server.limit.compression = compression
+            data = []
+            def count(packet, sent):
+                if packet[0] in (ord("D"), ord("E")):
+                    data.append(packet[1])
+                return False
+            try:
+                client.sock = LossySocket(client.sock, count)
+                received = []
+                t = threading.Thread(target=lambda: received.extend(server.recv(timeout=15) for _ in range(3)))
+                t.start()
+                assert client.send("127.0.0.1", 8080, "R", "r1", "000", "registo")
+                assert client.send("127.0.0.1", 8080, "T", "r1", "M42", mission_json)
+                assert client.send("127.0.0.1", 8080, "P", "r1", "M42", progress_json)
+                t.join(timeout=20)
+                return received, data
+            finally:
+                server.close() if sync_server else server.sock.close()
+                client.sock.close()
+
+        # Teste 30.1: Missão grande comprimida em menos chunks
+        debug_print("Teste 30.1: Missão comprimida...", "TEST")
+        raw, raw_data = transfer(False)
+        packed, packed_data = transfer(True)
+        assert [lista[3] for lista in packed] == ["registo", mission_json, progress_json], "Mensagens corrompidas"
+        assert [lista[2] for lista in packed] == ["R", "T", "P"], f"missionType: {[lista[2] for lista in packed]}"
+        assert all(t & MissionLink.compressedBit for t in packed_data), "Chunks sem compressedBit"
+        assert not any(t & MissionLink.compressedBit for t in raw_data), "Compressão sem ser negociada"
+        assert len(packed_data) * 2 < len(raw_data), f"Datagramas de dados: {len(packed_data)} vs {len(raw_data)}"
+        debug_print(f"✓ {len(mission_json)} bytes de missão: {len(packed_data)} datagramas de dados em vez de {len(raw_data)}", "SUCCESS")
+
+        # Teste 30.2: O dicionário pré-definido ajuda as mensagens curtas
+        debug_print("Teste 30.2: Dicionário...", "TEST")
+        plain = zlib.compress(progress_json.encode())
+        ml = create_missionlink_with_port("127.0.0.1", 8082, "./debug/test_files/")
+        try:
+            ml.limit.compression = True
+            ml.peerCaps[("127.0.0.1", 9)] = {"zlib": MissionLink.zlibVersion}
+            missionType, content = ml.compressMessage(ml.getPeerZlib("127.0.0.1", 9), "P", memoryview(progress_json.encode()))
+            assert missionType == chr(ord("P") | MissionLink.compressedBit)
+            assert len(content) < len(plain), f"Com dicionário: {len(content)}, sem: {len(plain)}"
+            assert ml.decompressMessage(content) == progress_json.encode()
+            assert ml.parseMissionType(missionType) == ("P", True)
+            # Mensagens curtas ou para peers sem "zlib" não são comprimidas
+            assert ml.compressMessage(ml.getPeerZlib("127.0.0.1", 9), "P", memoryview(b"curta"))[0] == "P"
+            assert ml.compressMessage(ml.getPeerZlib("127.0.0.1", 10), "P", memoryview(progress_json.encode()))[0] == "P"
+            debug_print(f"✓ Relatório de {len(progress_json)} bytes: {len(content)} com dicionário, {len(plain)} sem", "SUCCESS")
+
+            # Teste 30.3: Dados inválidos e bombas de descompressão são rejeitados
+            debug_print("Teste 30.3: Dados inválidos...", "TEST")
+            assert ml.decompressMessage(b"nao comprimido") is None
+            ml.limit.maxMessageSize = 1024 * 1024
+            compressor = zlib.compressobj(zdict=MissionLink.zlibDictionary)
+            bomb = compressor.compress(bytes(4 * 1024 * 1024)) + compressor.flush()
+            assert ml.decompressMessage(bomb) is None, "Mensagem acima de maxMessageSize aceite"
+            debug_print("✓ Dados inválidos e mensagens acima de maxMessageSize rejeitados", "SUCCESS")
+        finally:
+            ml.sock.close()
+
+        # Teste 30.4: SyncMissionLink recebe mensagens comprimidas
+        debug_print("Teste 30.4: SyncMissionLink...", "TEST")
+        packed, packed_data = transfer(True, sync_server=True)
+        assert [lista[3] for lista in packed] == ["registo", mission_json, progress_json], "Mensagens corrompidas"
+        assert len(packed_data) * 2 < len(raw_data), f"Datagramas de dados: {len(packed_data)} vs {len(raw_data)}"
+        debug_print("✓ Mensagens comprimidas entregues pelo SyncMissionLink", "SUCCESS")
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_telemetry_stream():
+    """TESTE 31: TelemetryStream com ligação persistente
+
+    Um rover em modo persistente envia várias amostras pela mesma ligação TCP, cada uma
+    num registo com tamanho. Se o servidor fechar a ligação, a amostra seguinte abre outra
+    sem se perder. Clientes no formato antigo (uma ligação por ficheiro) continuam a funcionar.
+    """
+    print("\n" + "="*70)
+    print("TESTE 31: TelemetryStream persistente")
+    print("="*70)
+
+    from protocol import TelemetryStream
+    import shutil
+
+    server_folder = "./debug/test_files/telemetry/"
+    client_folder = "./debug/test_files/telemetry_client/"
+    shutil.rmtree(server_folder, ignore_errors=True)
+    os.makedirs(client_folder, exist_ok=True)
+    server = TelemetryStream.TelemetryStream("127.0.0.1", server_folder)
+    client = TelemetryStream.TelemetryStream("127.0.0.1", client_folder, persistent=True)
+    connections = []
+    handle = server._handle_client
+    def counting(clientSocket, ip, port):
+        connections.append(clientSocket)
+        handle(clientSocket, ip, port)
+    server._handle_client = counting
+
+    def sample(index, rover="r1"):
+        path = os.path.join(client_folder, f"telemetry_{rover}_{index}.json")
+        with open(path, "w") as f:
+            json.dump({"rover_id": rover, "position": {"x": index, "y": 0, "z": 0}, "operational_status": "ativo"}, f)
+        return path
+
+    def wait_files(rover, count, timeout=5):
+        folder = os.path.join(server_folder, rover)
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if os.path.isdir(folder) and len(os.listdir(folder)) >= count:
+                break
+            time.sleep(0.02)
+        return sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+
+    try:
+        threading.Thread(target=server.server, daemon=True).start()
+        time.sleep(0.2)
+
+        # Teste 31.1: Várias amostras, uma única ligação
+        debug_print("Teste 31.1: Amostras pela mesma ligação...", "TEST")
+        for i in range(20):
+            assert client.send("127.0.0.1", sample(i)), f"Amostra {i} não enviada"
+        files = wait_files("r1", 20)
+        assert len(files) == 20, f"Amostras recebidas: {len(files)}"
+        assert len(connections) == 1, f"Ligações abertas: {len(connections)}"
+        with open(os.path.join(server_folder, "r1", "telemetry_r1_7.json")) as f:
+            assert json.load(f)["position"]["x"] == 7, "Conteúdo da amostra incorreto"
+        debug_print("✓ 20 amostras numa única ligação TCP", "SUCCESS")
+
+        # Teste 31.2: O servidor fecha a ligação - a amostra seguinte volta a ligar
+        debug_print("Teste 31.2: Religação automática...", "TEST")
+        connections[0].shutdown(socket.SHUT_RDWR)
+        time.sleep(0.1)
+        assert client.send("127.0.0.1", sample(20)), "Amostra depois do fecho não enviada"
+        files = wait_files("r1", 21)
+        assert len(files) == 21 and len(connections) == 2, f"Amostras: {len(files)}, ligações: {len(connections)}"
+        debug_print("✓ Ligação reaberta e amostra entregue", "SUCCESS")
+
+        # Teste 31.3: Registos inválidos e clientes no formato antigo
+        debug_print("Teste 31.3: Limites e formato antigo...", "TEST")
+        try:
+            client.sendRecord("127.0.0.1", "x" * 300, b"{}")
+            assert False, "Nome demasiado longo aceite"
+        except ValueError:
+            pass
+        legacy = TelemetryStream.TelemetryStream("127.0.0.1", client_folder)
+        for i in range(3):
+            assert legacy.send("127.0.0.1", sample(i, "r2")), f"Amostra antiga {i} não enviada"
+        files = wait_files("r2", 3)
+        assert len(files) == 3 and len(connections) == 5, f"Amostras: {len(files)}, ligações: {len(connections)}"
+        debug_print("✓ Nomes inválidos rejeitados; formato antigo continua aceite", "SUCCESS")
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        client.endConnection()
+        server.endConnection()
+        shutil.rmtree(server_folder, ignore_errors=True)
+        shutil.rmtree(client_folder, ignore_errors=True)
+
+
+def test_telemetry_records():
+    """TESTE 32: Telemetria enviada a partir da memória (NMS_Agent)
+
+    As amostras de telemetria do rover seguem em JSON compacto, pela ligação persistente,
+    sem ficheiros temporários. Com a Nave-Mãe inacessível ficam guardadas em disco e são
+    reenviadas, por ordem, quando a ligação volta.
+    """
+    print("\n" + "="*70)
+    print("TESTE 32: Telemetria a partir da memória")
+    print("="*70)
+
+    from protocol import TelemetryStream
+    from client import NMS_Agent
+    import shutil
+
+    server_folder = "./debug/test_files/telemetry/"
+    agent_folder = "./debug/test_files/agent/"
+    shutil.rmtree(server_folder, ignore_errors=True)
+    shutil.rmtree(agent_folder, ignore_errors=True)
+    os.makedirs(agent_folder, exist_ok=True)
+    connections = []
+
+    def start_server():
+        server = TelemetryStream.TelemetryStream("127.0.0.1", server_folder)
+        handle = server._handle_client
+        def counting(clientSocket, ip, port):
+            connections.append(clientSocket)
+            handle(clientSocket, ip, port)
+        server._handle_client = counting
+        threading.Thread(target=server.server, daemon=True).start()
+        time.sleep(0.2)
+        return server
+
+    def received(count, timeout=5):
+        folder = os.path.join(server_folder, agent.id)
+        deadline = time.time() + timeout
+        while time.time() < deadline and not (os.path.isdir(folder) and len(os.listdir(folder)) >= count):
+            time.sleep(0.02)
+        return sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+
+    agent = None
+    server = start_server()
+    try:
+        agent = NMS_Agent.NMS_Agent("127.0.0.1", storeFolder=agent_folder)
+        agent.telemetryStream = TelemetryStream.TelemetryStream("127.0.0.1", agent_folder, persistent=True)
+
+        # Teste 32.1: Amostras enviadas sem tocar no disco do rover
+        debug_print("Teste 32.1: Amostras a partir da memória...", "TEST")
+        before = set(os.listdir(".")) | set(os.listdir(agent_folder))
+        for i in range(5):
+            agent.updatePosition(i, 2 * i)
+            assert agent.createAndSendTelemetry("127.0.0.1"), f"Amostra {i} não enviada"
+        files = received(5)
+        assert len(files) == 5 and len(connections) == 1, f"Amostras: {len(files)}, ligações: {len(connections)}"
+        after = set(os.listdir(".")) | set(os.listdir(agent_folder))
+        assert after == before, f"Ficheiros criados no rover: {after - before}"
+        with open(os.path.join(server_folder, agent.id, files[-1])) as f:
+            text = f.read()
+        assert "\n" not in text and ", " not in text, "JSON não compacto"
+        assert json.loads(text)["position"]["x"] == 4.0, "Conteúdo incorreto"
+        debug_print(f"✓ 5 amostras em JSON compacto ({len(text)} bytes), sem ficheiros temporários", "SUCCESS")
+
+        # Teste 32.2: Nave-Mãe inacessível - amostras guardadas e reenviadas por ordem
+        debug_print("Teste 32.2: Ligação em baixo...", "TEST")
+        server.endConnection()
+        time.sleep(0.1)
+        for i in range(3):
+            assert not agent.createAndSendTelemetry("127.0.0.1"), "Amostra enviada sem servidor"
+        assert len(os.listdir(agent.telemetry_spool)) == 3, "Amostras não guardadas"
+        assert agent.telemetry_spooled == 3, f"Contador: {agent.telemetry_spooled}"
+        server = start_server()
+        assert agent.createAndSendTelemetry("127.0.0.1"), "Amostra não enviada depois de o servidor voltar"
+        files = received(9)
+        assert len(files) == 9, f"Amostras recebidas: {len(files)}"
+        assert os.listdir(agent.telemetry_spool) == [], "Amostras guardadas não reenviadas"
+        assert agent.telemetry_spooled == 0, f"Contador: {agent.telemetry_spooled}"
+        # Sem amostras guardadas, a próxima amostra não lê a pasta
+        listdir = os.listdir
+        def no_listdir(*args):
+            raise AssertionError("Pasta lida sem amostras guardadas")
+        os.listdir = no_listdir
+        try:
+            assert agent.createAndSendTelemetry("127.0.0.1"), "Amostra não enviada"
+        finally:
+            os.listdir = listdir
+        debug_print("✓ 3 amostras guardadas durante a falha e entregues quando a ligação voltou", "SUCCESS")
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        server.endConnection()
+        if agent is not None:
+            agent.telemetryStream.endConnection()
+            agent.missionLink.sock.close()
+        shutil.rmtree(server_folder, ignore_errors=True)
+        shutil.rmtree(agent_folder, ignore_errors=True)
+
+
+def test_telemetry_sinks():
+    """TESTE 33: Destinos da telemetria recebida (FileSink, LogSegmentSink, MemorySink)
+
+    O servidor lê cada amostra para memória, descodifica-a uma vez e entrega-a ao destino
+    pelo rover_id, sem escrever, voltar a abrir e mover ficheiros. Cada destino guarda uma
+    amostra com no máximo uma escrita.
+    """
+    print("\n" + "="*70)
+    print("TESTE 33: Destinos da telemetria")
+    print("="*70)
+
+    from protocol import TelemetryStream
+    from otherEntities import FileSink, LogSegmentSink, MemorySink
+    import shutil
+
+    sink_folder = "./debug/test_files/telemetry_sinks/"
+    server_folder = "./debug/test_files/telemetry/"
+    client_folder = "./debug/test_files/telemetry_client/"
+    shutil.rmtree(sink_folder, ignore_errors=True)
+    shutil.rmtree(server_folder, ignore_errors=True)
+    os.makedirs(client_folder, exist_ok=True)
+    server = client = None
+    logs = None
+    try:
+        # Teste 33.1: FileSink - uma escrita por amostra, pasta do rover criada uma vez
+        debug_print("Teste 33.1: FileSink...", "TEST")
+        os.makedirs(sink_folder)
+        files = FileSink.FileSink(sink_folder)
+        created = []
+        makedirs = os.makedirs
+        def counting_makedirs(path, *args, **kwargs):
+            created.append(path)
+            return makedirs(path, *args, **kwargs)
+        os.makedirs = counting_makedirs
+        try:
+            for i in range(10):
+                content = json.dumps({"rover_id": "r1", "i": i}).encode()
+                files.store("r1", f"t_{i}.json", content, json.loads(content))
+            files.store("r2", "t_0.json", b"{}", {})
+            # rover_id que não serve de nome de pasta: recusado, nada escrito fora de sink_folder
+            for rover_id in ("", ".", "..", "../r3"):
+                try:
+                    files.store(rover_id, "t_0.json", b"{}", {})
+                    raise AssertionError(f"rover_id {rover_id!r} aceite")
+                except ValueError:
+                    pass
+        finally:
+            os.makedirs = makedirs
+        assert len(created) == 2, f"Pastas criadas: {created}"
+        assert len(os.listdir(os.path.join(sink_folder, "r1"))) == 10, "Amostras em falta"
+        assert sorted(os.listdir(sink_folder)) == ["r1", "r2"], f"Pastas: {os.listdir(sink_folder)}"
+        assert not os.path.exists(os.path.join(sink_folder, "..", "t_0.json")), "Amostra escrita fora da pasta"
+        debug_print("✓ 11 amostras, 2 pastas criadas (uma por rover); rover_id inválidos recusados", "SUCCESS")
+
+        # Teste 33.2: LogSegmentSink - uma linha por amostra, segmentos limitados
+        debug_print("Teste 33.2: LogSegmentSink...", "TEST")
+        logs = LogSegmentSink.LogSegmentSink(os.path.join(sink_folder, "logs"), segmentSize=200)
+        for i in range(10):
+            record = {"rover_id": "r1", "i": i}
+            logs.store("r1", f"t_{i}.json", json.dumps(record).encode(), record)
+        logs.store("r1", "bad.json", b"not json", None)
+        for rover_id in ("", ".", ".."):
+            try:
+                logs.store(rover_id, "t_0.json", b"{}", {})
+                raise AssertionError(f"rover_id {rover_id!r} aceite")
+            except ValueError:
+                pass
+        logs.close()
+        assert os.listdir(os.path.join(sink_folder, "logs")) == ["r1"], "Segmento aberto para um rover_id inválido"
+        folder = os.path.join(sink_folder, "logs", "r1")
+        segments = sorted(os.listdir(folder), key=lambda name: int(name[10:-4]))
+        lines = []
+        for name in segments:
+            with open(os.path.join(folder, name)) as f:
+                lines += [json.loads(line) for line in f]
+        assert len(segments) > 1, f"Segmentos: {segments}"
+        assert [line["record"]["i"] for line in lines[:10]] == list(range(10)), "Ordem das amostras incorreta"
+        assert lines[10] == {"file": "bad.json", "content": "not json"}, f"Amostra não JSON: {lines[10]}"
+        logs = LogSegmentSink.LogSegmentSink(os.path.join(sink_folder, "logs"), segmentSize=200)
+        logs.store("r1", "t_10.json", b"{}", {})
+        logs.close()
+        total = 0
+        for name in os.listdir(folder):
+            with open(os.path.join(folder, name)) as f:
+                total += len(f.readlines())
+        assert total == 12, f"Amostras depois de reabrir: {total}"
+        debug_print(f"✓ 12 amostras em {len(os.listdir(folder))} segmentos, sem perdas ao reabrir", "SUCCESS")
+
+        # Teste 33.3: MemorySink pelo TelemetryStream - nada escrito em disco
+        debug_print("Teste 33.3: MemorySink no servidor...", "TEST")
+        memory = MemorySink.MemorySink(maxRecords=5)
+        server = TelemetryStream.TelemetryStream("127.0.0.1", server_folder, sink=memory)
+        client = TelemetryStream.TelemetryStream("127.0.0.1", client_folder, persistent=True)
+        threading.Thread(target=server.server, daemon=True).start()
+        time.sleep(0.2)
+        for i in range(8):
+            assert client.sendRecord("127.0.0.1", f"t_{i}.json", {"rover_id": "r1", "i": i}), f"Amostra {i} não enviada"
+        path = os.path.join(client_folder, "legacy.json")
+        with open(path, "w") as f:
+            json.dump({"rover_id": "r2", "i": 0}, f)
+        assert TelemetryStream.TelemetryStream("127.0.0.1", client_folder).send("127.0.0.1", path), "Amostra antiga não enviada"
+        deadline = time.time() + 5
+        while time.time() < deadline and (memory.getLatest("r1") is None or memory.getLatest("r1")["i"] != 7 or memory.getLatest("r2") is None):
+            time.sleep(0.02)
+        assert [record["i"] for _, record in memory.getRecords("r1")] == [3, 4, 5, 6, 7], f"Amostras: {memory.getRecords('r1')}"
+        assert memory.getRecords("r2") == [("legacy.json", {"rover_id": "r2", "i": 0})], "Amostra antiga não entregue"
+        assert not os.path.exists(server_folder), "Servidor escreveu em disco"
+        debug_print("✓ Últimas 5 amostras em memória; nenhum ficheiro no servidor", "SUCCESS")
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        if logs is not None:
+            logs.close()
+        if client is not None:
+            client.endConnection()
+        if server is not None:
+            server.endConnection()
+        shutil.rmtree(sink_folder, ignore_errors=True)
+        shutil.rmtree(server_folder, ignore_errors=True)
+        shutil.rmtree(client_folder, ignore_errors=True)
+
+
+def test_telemetry_event_loop():
+    """TESTE 34: Servidor TelemetryStream com ciclo de eventos
+
+    O servidor aceita e lê todas as ligações numa única thread (selectors) e guarda as
+    amostras num conjunto fixo de workers, em vez de criar uma thread por ligação. Acima de
+    Limit.maxConnections as ligações novas esperam na fila do kernel; um registo inválido
+    fecha só a ligação que o enviou.
+    """
+    print("\n" + "="*70)
+    print("TESTE 34: TelemetryStream com ciclo de eventos")
+    print("="*70)
+
+    from protocol import TelemetryStream
+    from otherEntities import MemorySink
+    import shutil
+
+    client_folder = "./debug/test_files/telemetry_client/"
+    os.makedirs(client_folder, exist_ok=True)
+    memory = MemorySink.MemorySink(maxRecords=1000)
+    threads = set()
+    store = memory.store
+    def recording(roverId, filename, content, record):
+        threads.add(threading.current_thread().name)
+        store(roverId, filename, content, record)
+    memory.store = recording
+    server = TelemetryStream.TelemetryStream("127.0.0.1", client_folder, sink=memory)
+    server.limit.maxConnections = 2
+    accepted = []
+    handle = server._handle_client
+    def counting(clientSocket, ip, port):
+        accepted.append(clientSocket)
+        handle(clientSocket, ip, port)
+    server._handle_client = counting
+    server_thread = threading.Thread(target=server.server, daemon=True)
+    raw = []
+
+    def wait_for(condition, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline and not condition():
+            time.sleep(0.02)
+        return condition()
+
+    try:
+        before = threading.active_count()
+        server_thread.start()
+        time.sleep(0.2)
+
+        # Teste 34.1: Muitas ligações no formato antigo - número de threads fixo
+        debug_print("Teste 34.1: 100 ligações no formato antigo...", "TEST")
+        legacy = TelemetryStream.TelemetryStream("127.0.0.1", client_folder)
+        path = os.path.join(client_folder, "sample.json")
+        peak = 0
+        for i in range(100):
+            with open(path, "w") as f:
+                json.dump({"rover_id": f"r{i % 10}", "i": i}, f)
+            assert legacy.send("127.0.0.1", path), f"Amostra {i} não enviada"
+            peak = max(peak, threading.active_count())
+        assert wait_for(lambda: sum(len(memory.getRecords(f"r{i}")) for i in range(10)) == 100), "Amostras em falta"
+        assert peak <= before + 1 + server.limit.ingestWorkers, f"Threads: {peak} (antes: {before})"
+        assert all(name.startswith("TelemetryIngest") for name in threads) and len(threads) <= server.limit.ingestWorkers, f"Threads: {threads}"
+        assert sorted(record["i"] for _, record in memory.getRecords("r3")) == list(range(3, 100, 10)), "Amostras do rover r3 incorretas"
+        debug_print(f"✓ 100 ligações, no máximo {peak - before} threads novas, amostras guardadas em {len(threads)} workers", "SUCCESS")
+
+        # Teste 34.2: Limite de ligações abertas
+        debug_print("Teste 34.2: Limite de ligações...", "TEST")
+        accepted.clear()
+        for _ in range(3):
+            sock = socket.create_connection(("127.0.0.1", server.port))
+            sock.sendall(TelemetryStream.streamPreface)
+            raw.append(sock)
+        assert wait_for(lambda: len(accepted) == 2), f"Ligações aceites: {len(accepted)}"
+        time.sleep(0.2)
+        assert len(accepted) == 2, f"Limite ultrapassado: {len(accepted)} ligações aceites"
+        raw[0].close()
+        assert wait_for(lambda: len(accepted) == 3), "Ligação em espera não aceite depois de outra fechar"
+        debug_print("✓ 2 ligações abertas; a terceira aceite quando uma fechou", "SUCCESS")
+
+        # Teste 34.3: Registo inválido fecha só a sua ligação
+        debug_print("Teste 34.3: Registo inválido...", "TEST")
+        raw[1].sendall(TelemetryStream.recordHeader.pack(0, 2) + b"{}")
+        raw[1].settimeout(5)
+        assert raw[1].recv(1) == b"", "Ligação com registo inválido não fechada"
+        name = b"ok.json"
+        content = json.dumps({"rover_id": "r99"}).encode()
+        # Registo partido em dois envios: só é entregue quando estiver completo
+        record = TelemetryStream.recordHeader.pack(len(name), len(content)) + name + content
+        raw[2].sendall(record[:5])
+        time.sleep(0.1)
+        assert memory.getLatest("r99") is None, "Registo incompleto entregue"
+        raw[2].sendall(record[5:])
+        assert wait_for(lambda: memory.getLatest("r99") is not None), "Registo válido não entregue"
+        # Uma exceção inesperada ao tratar uma ligação também fecha só essa ligação
+        parseRecords = server.parseRecords
+        def failing(connection):
+            if b"boom" in connection.buffer:
+                raise KeyError("boom")
+            return parseRecords(connection)
+        server.parseRecords = failing
+        sock = socket.create_connection(("127.0.0.1", server.port))
+        raw.append(sock)
+        sock.sendall(TelemetryStream.streamPreface + b"boom")
+        sock.settimeout(5)
+        assert sock.recv(1) == b"", "Ligação com erro inesperado não fechada"
+        assert server_thread.is_alive(), "Erro numa ligação parou o ciclo do servidor"
+        content = json.dumps({"rover_id": "r97"}).encode()
+        raw[2].sendall(TelemetryStream.recordHeader.pack(len(name), len(content)) + name + content)
+        assert wait_for(lambda: memory.getLatest("r97") is not None), "Registo não entregue depois do erro noutra ligação"
+        debug_print("✓ Ligações com erro fechadas; registos entregues na outra", "SUCCESS")
+
+        # Teste 34.4: endConnection() para o ciclo; o destino só fecha depois dos workers
+        debug_print("Teste 34.4: Fecho do servidor...", "TEST")
+        events = []
+        storing = threading.Event()
+        def slow(roverId, filename, content, record):
+            storing.set()
+            time.sleep(0.5)
+            store(roverId, filename, content, record)
+            events.append("store")
+        memory.store = slow
+        memory.close = lambda: events.append("close")
+        server.limit.timeout = 0.1
+        content = json.dumps({"rover_id": "r98"}).encode()
+        raw[2].sendall(TelemetryStream.recordHeader.pack(len(name), len(content)) + name + content)
+        assert storing.wait(5), "Registo não entregue ao worker"
+        server.endConnection()
+        server_thread.join(5)
+        assert not server_thread.is_alive(), "Ciclo do servidor não terminou"
+        assert events == ["store", "close"], f"Destino fechado com um worker a guardar: {events}"
+        raw[2].settimeout(5)
+        assert raw[2].recv(1) == b"", "Ligação não fechada com o servidor"
+        debug_print("✓ Ciclo terminado, ligações fechadas e destino fechado depois dos workers", "SUCCESS")
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        for sock in raw:
+            sock.close()
+        server.endConnection()
+        shutil.rmtree(client_folder, ignore_errors=True)
+
+
+def test_telemetry_binary():
+    """TESTE 35: Amostras de telemetria em binário (TelemetryCodec)
+
+    As amostras do rover seguem num formato binário versionado (campos fixos sem nomes e um
+    mapa de extensões para as métricas), acordado em cada ligação persistente. Sem acordo
+    (servidor antigo ou binário desligado) seguem em JSON, e o servidor guarda o mesmo JSON.
+    """
+    print("\n" + "="*70)
+    print("TESTE 35: Telemetria em binário")
+    print("="*70)
+
+    from protocol import TelemetryStream
+    from otherEntities import MemorySink, TelemetryCodec
+    from client import NMS_Agent
+    import shutil
+
+    agent_folder = "./debug/test_files/agent/"
+    os.makedirs(agent_folder, exist_ok=True)
+    agent = server = client = None
+    servers = []
+
+    def start_server(binary=True):
+        memory = MemorySink.MemorySink()
+        server = TelemetryStream.TelemetryStream("127.0.0.1", agent_folder, sink=memory)
+        server.limit.binaryTelemetry = binary
+        decoded = []
+        decode = server.codec.decode
+        def counting(content):
+            decoded.append(len(content))
+            return decode(content)
+        server.codec.decode = counting
+        threading.Thread(target=server.server, daemon=True).start()
+        time.sleep(0.2)
+        servers.append(server)
+        return server, memory, decoded
+
+    def wait_for(condition, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline and not condition():
+            time.sleep(0.02)
+        return condition()
+
+    try:
+        agent = NMS_Agent.NMS_Agent("127.0.0.1", storeFolder=agent_folder)
+        agent.updatePosition(12.3, -4.5, 0.25)
+        agent.updateBattery(87.3)
+        metrics = {"cpu_usage": 12.5, "ram_usage": 40, "interfaces": ["eth0", "wlan0"], "alert": None, "ok": True}
+        sample = agent.createTelemetryMessage(metrics)
+        codec = TelemetryCodec.TelemetryCodec()
+
+        # Teste 35.1: Codificação e descodificação
+        debug_print("Teste 35.1: TelemetryCodec...", "TEST")
+        encoded = codec.encode(sample)
+        assert codec.isRecord(encoded) and codec.decode(encoded) == sample, "Amostra alterada pela codificação"
+        compact = len(json.dumps(sample, separators=(",", ":")))
+        pretty = len(json.dumps(sample, indent=4))
+        plain = codec.encode(agent.createTelemetryMessage())
+        assert len(plain) * 3 < len(json.dumps(agent.createTelemetryMessage(), separators=(",", ":"))), f"Registo binário com {len(plain)} bytes"
+        other = dict(sample, operational_status="em manutenção", system_health="degradado")
+        assert codec.decode(codec.encode(other)) == other, "Textos fora das enumerações alterados"
+        assert codec.encode(dict(sample, battery=100)) is None, "Tipo diferente codificado"
+        assert codec.encode({"rover_id": "r1", "i": 1}) is None, "Amostra incompleta codificada"
+        assert codec.encode(dict(sample, timestamp="2025-01-01T10:00:00+01:00")) is None, "Timestamp com fuso codificado"
+        for bad in (encoded[:-3], encoded + b"\0", bytes([2]) + encoded[1:]):
+            try:
+                codec.decode(bad)
+                assert False, "Registo inválido aceite"
+            except ValueError:
+                pass
+        debug_print(f"✓ {len(encoded)} bytes em binário vs {compact} em JSON compacto e {pretty} em JSON indentado", "SUCCESS")
+
+        # Teste 35.2: Formato binário acordado na ligação
+        debug_print("Teste 35.2: Negociação...", "TEST")
+        server, memory, decoded = start_server()
+        client = TelemetryStream.TelemetryStream("127.0.0.1", agent_folder, persistent=True)
+        assert client.sendRecord("127.0.0.1", "t_0.json", sample), "Amostra não enviada"
+        assert client.recordVersions["127.0.0.1"] == TelemetryCodec.codecVersion, "Formato binário não acordado"
+        assert client.sendRecord("127.0.0.1", "t_1.json", {"rover_id": agent.id, "i": 1}), "Amostra JSON não enviada"
+        assert wait_for(lambda: len(memory.getRecords(agent.id)) == 2), "Amostras em falta"
+        assert memory.getRecords(agent.id) == [("t_0.json", sample), ("t_1.json", {"rover_id": agent.id, "i": 1})], "Amostras alteradas"
+        assert decoded == [len(encoded)], f"Registos binários: {decoded}"
+        debug_print("✓ Amostra em binário e amostra fora do formato em JSON na mesma ligação", "SUCCESS")
+
+        # Teste 35.3: Servidor sem formato binário - JSON
+        debug_print("Teste 35.3: Servidor só com JSON...", "TEST")
+        client.endConnection()
+        server.endConnection()
+        server, memory, decoded = start_server(binary=False)
+        client = TelemetryStream.TelemetryStream("127.0.0.1", agent_folder, persistent=True)
+        assert client.sendRecord("127.0.0.1", "t_0.json", sample), "Amostra não enviada"
+        assert client.recordVersions["127.0.0.1"] == 0, "Formato binário usado sem acordo"
+        assert wait_for(lambda: memory.getLatest(agent.id) == sample), "Amostra JSON não recebida"
+        assert decoded == [], "Registo binário enviado sem acordo"
+        client.endConnection()
+        server.endConnection()
+        debug_print("✓ Sem acordo a amostra segue em JSON", "SUCCESS")
+
+        # Teste 35.4: Servidor antigo (só conhece streamPreface) - volta a ligar em JSON
+        debug_print("Teste 35.4: Servidor antigo...", "TEST")
+        old = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        old.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        old.bind(("127.0.0.1", 8081))
+        old.listen()
+        received = []
+        def old_server():
+            for _ in range(2):
+                sock, _ = old.accept()
+                data = b""
+                chunk = sock.recv(65536)
+                while chunk:
+                    data += chunk
+                    if not data.startswith(TelemetryStream.streamPreface):
+                        break   # formato desconhecido: fecha a ligação
+                    chunk = sock.recv(65536)
+                received.append(data)
+                sock.close()
+        old_thread = threading.Thread(target=old_server, daemon=True)
+        old_thread.start()
+        client = TelemetryStream.TelemetryStream("127.0.0.1", agent_folder, persistent=True)
+        try:
+            assert client.sendRecord("127.0.0.1", "t_0.json", sample), "Amostra não enviada ao servidor antigo"
+            client.endConnection()
+            old_thread.join(5)
+        finally:
+            old.close()
+        assert len(received) == 2 and received[0].startswith(TelemetryStream.streamPrefaceBinary), f"Ligações: {received}"
+        data = received[1]
+        assert data.startswith(TelemetryStream.streamPreface), "Segunda ligação sem streamPreface"
+        header = len(TelemetryStream.streamPreface) + TelemetryStream.recordHeader.size + len("t_0.json")
+        assert json.loads(data[header:]) == sample, "Amostra não enviada em JSON ao servidor antigo"
+        debug_print("✓ Servidor antigo: nova ligação com streamPreface e amostra em JSON", "SUCCESS")
+
+        # Teste 35.5: Servidor lento (não responde a tempo) - JSON só nesta ligação
+        debug_print("Teste 35.5: Servidor lento...", "TEST")
+        slow = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        slow.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        slow.bind(("127.0.0.1", 8081))
+        slow.listen()
+        received = []
+        def slow_server():
+            for _ in range(4):
+                sock, _ = slow.accept()
+                data = b""
+                chunk = sock.recv(65536)
+                while chunk:
+                    data += chunk
+                    chunk = sock.recv(65536)
+                received.append(data)
+                sock.close()
+        slow_thread = threading.Thread(target=slow_server, daemon=True)
+        slow_thread.start()
+        client = TelemetryStream.TelemetryStream("127.0.0.1", agent_folder, persistent=True)
+        client.limit.timeout = 0.3
+        try:
+            assert client.sendRecord("127.0.0.1", "t_0.json", sample), "Amostra não enviada ao servidor lento"
+            assert client.recordVersions.get("127.0.0.1") == 0, "Ligação sem acordo não seguiu em JSON"
+            client.closeConnections()
+            assert "127.0.0.1" not in client.recordVersions, "Versão 0 guardada depois de um timeout"
+            assert client.sendRecord("127.0.0.1", "t_1.json", sample), "Segunda amostra não enviada"
+            client.endConnection()
+            slow_thread.join(5)
+        finally:
+            slow.close()
+        assert len(received) == 4, f"Ligações: {received}"
+        assert received[0].startswith(TelemetryStream.streamPrefaceBinary), "Primeira ligação sem proposta binária"
+        assert received[1].startswith(TelemetryStream.streamPreface), "Segunda ligação sem streamPreface"
+        assert received[2].startswith(TelemetryStream.streamPrefaceBinary), "Proposta binária não repetida na ligação seguinte"
+        header = len(TelemetryStream.streamPreface) + TelemetryStream.recordHeader.size + len("t_1.json")
+        assert json.loads(received[3][header:]) == sample, "Amostra não enviada em JSON ao servidor lento"
+        debug_print("✓ Servidor lento: JSON nesta ligação e nova proposta na seguinte", "SUCCESS")
+        return True
+
+    except Exception as e:
+        debug_print(f"[ERRO] ERRO: {e}", "ERROR")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        if client is not None:
+            client.endConnection()
+        for server in servers:
+            server.endConnection()
+        if agent is not None:
+            agent.telemetryStream.endConnection()
+            agent.missionLink.sock.close()
+        shutil.rmtree(agent_folder, ignore_errors=True)
+
+
 def test_recv_message():
     """TESTE 10: recv() - Receção de Mensagem
     
@@ -847,6 +3398,30 @@ def main():
         "send_file": ("send() - Ficheiro", test_send_file),
         "recv_message": ("recv() - Mensagem", test_recv_message),
         "recv_file": ("recv() - Ficheiro", test_recv_file),
+        "window": ("send()/recv() - Selective-Repeat", test_window_transfer),
+        "rto": ("RTO adaptativo", test_adaptive_rto),
+        "sessions": ("Sessões concorrentes", test_concurrent_sessions),
+        "persistent": ("Sessões persistentes", test_persistent_sessions),
+        "async": ("AsyncMissionLink / SyncMissionLink", test_async_missionlink),
+        "mtu": ("Tamanho de datagrama negociado", test_datagram_size),
+        "binary": ("sendFile() - Ficheiros binários", test_binary_file),
+        "reassembly": ("recv() - Mensagens grandes", test_message_reassembly),
+        "wrap": ("Números de sequência de 32 bits", test_sequence_wraparound),
+        "sack": ("SACK e fast retransmit", test_fast_retransmit),
+        "congestion": ("Controlo de congestionamento", test_congestion_control),
+        "zerortt": ("Dados 0-RTT no SYN", test_zero_rtt),
+        "fec": ("FEC (paridade XOR)", test_forward_error_correction),
+        "reader": ("Thread de leitura dedicada", test_reader_thread),
+        "timers": ("Roda de temporizadores", test_timer_wheel),
+        "batch": ("Receção em lote", test_batched_receive),
+        "rpc": ("Pedido/resposta", test_request_reply),
+        "replay": ("Mensagens idempotentes", test_replay_cache),
+        "zlib": ("Mensagens comprimidas", test_compression),
+        "telemetry": ("TelemetryStream persistente", test_telemetry_stream),
+        "records": ("Telemetria a partir da memória", test_telemetry_records),
+        "sinks": ("Destinos da telemetria", test_telemetry_sinks),
+        "eventloop": ("TelemetryStream com ciclo de eventos", test_telemetry_event_loop),
+        "telemetrybin": ("Telemetria em binário", test_telemetry_binary),
     }
     
     results = {}
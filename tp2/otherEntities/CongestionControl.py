@@ -0,0 +1,70 @@
+class CongestionControl:
+    """
+    Janela de congestionamento de uma sessão MissionLink (AIMD, como no TCP Reno).
+    A janela conta chunks em voo; o emissor usa o menor entre ela e a janela negociada
+    com o peer (controlo de fluxo).
+
+    - Slow start: até ssthresh, cada chunk confirmado aumenta a janela em um chunk
+      (a janela duplica a cada RTT)
+    - Congestion avoidance: acima de ssthresh, a janela cresce um chunk por RTT
+      (additive increase)
+    - Perda detetada por ACKs duplicados: a janela passa a metade (multiplicative decrease)
+    - Temporizador expirado: a janela volta a um chunk e recomeça em slow start
+    """
+    def __init__(self,initialWindow = 4,maxWindow = 8):
+        """
+        Inicializa a janela em slow start.
+
+        Args:
+            initialWindow (int, optional): Janela inicial em chunks. Defaults to 4
+            maxWindow (int, optional): Janela máxima em chunks (a janela negociada com o peer). Defaults to 8
+
+        Atributos criados:
+            self.cwnd (float): Janela de congestionamento em chunks
+            self.ssthresh (float): Limiar entre slow start e congestion avoidance
+        """
+        self.maxWindow = max(1, maxWindow)
+        self.cwnd = float(max(1, min(initialWindow, self.maxWindow)))
+        self.ssthresh = float(self.maxWindow)
+
+    def onAck(self,count):
+        """
+        Aumenta a janela depois de chunks novos serem confirmados.
+
+        COMO FUNCIONA:
+        - Slow start (cwnd < ssthresh): cwnd += 1 por chunk confirmado
+        - Congestion avoidance: cwnd += 1 / cwnd por chunk confirmado (+1 por RTT)
+        - A janela nunca passa maxWindow (o peer não aceita mais chunks em voo)
+
+        Args:
+            count (int): Número de chunks confirmados por este ACK
+        """
+        for _ in range(count):
+            if self.cwnd < self.ssthresh:
+                self.cwnd += 1
+            else:
+                self.cwnd += 1 / self.cwnd
+        self.cwnd = min(self.cwnd, float(self.maxWindow))
+
+    def onLoss(self):
+        """
+        Reduz a janela para metade depois de uma perda detetada por ACKs duplicados
+        (fast retransmit): os chunks seguintes continuam a chegar, a ligação não está parada.
+        """
+        self.ssthresh = max(2.0, self.cwnd / 2)
+        self.cwnd = self.ssthresh
+
+    def onTimeout(self):
+        """
+        Volta a um chunk em voo depois de um temporizador expirar (nenhum ACK chegou:
+        congestionamento forte) e recomeça em slow start até metade da janela anterior.
+        """
+        self.ssthresh = max(2.0, self.cwnd / 2)
+        self.cwnd = 1.0
+
+    def getWindow(self):
+        """
+        Returns:
+            int: Número de chunks que podem estar em voo
+        """
+        return max(1, int(self.cwnd))
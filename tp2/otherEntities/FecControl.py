@@ -0,0 +1,58 @@
+class FecControl:
+    """
+    Redundância de uma sessão MissionLink com correção de erros (FEC por paridade XOR).
+    A cada grupo de K chunks de dados o emissor junta um pacote de paridade, e o recetor
+    reconstrói um chunk perdido por grupo sem esperar por uma retransmissão.
+
+    O K adapta-se à taxa de perda observada pela sessão (média móvel exponencial):
+    - Sem perdas (abaixo de minLoss) não há paridade
+    - Com perda p, cada grupo tem cerca de 1 / (2p) chunks: em média há no máximo meia
+      perda por grupo, e a paridade recupera-a (mais perdas, grupos menores)
+    """
+    def __init__(self,minLoss = 0.01,gain = 1 / 16):
+        """
+        Inicializa a taxa de perda a zero (sem paridade até haver perdas).
+
+        Args:
+            minLoss (float, optional): Taxa de perda abaixo da qual não se envia paridade. Defaults to 0.01
+            gain (float, optional): Peso de cada amostra na média móvel. Defaults to 1/16
+
+        Atributos criados:
+            self.lossRate (float): Fração estimada de chunks perdidos
+        """
+        self.minLoss = minLoss
+        self.gain = gain
+        self.lossRate = 0.0
+
+    def onAck(self,count):
+        """
+        Regista chunks entregues (amostras sem perda).
+
+        Args:
+            count (int): Número de chunks confirmados por este ACK
+        """
+        self.lossRate *= (1 - self.gain) ** count
+
+    def onLoss(self,count = 1):
+        """
+        Regista chunks perdidos: reenviados (temporizador ou fast retransmit) ou
+        reconstruídos pelo recetor a partir da paridade.
+
+        Args:
+            count (int, optional): Número de chunks perdidos. Defaults to 1
+        """
+        for _ in range(count):
+            self.lossRate += self.gain * (1 - self.lossRate)
+
+    def getGroupSize(self,maxGroup):
+        """
+        Args:
+            maxGroup (int): Maior grupo permitido (a janela da sessão: o grupo inteiro tem de
+                            caber na janela do recetor para a paridade ser enviada e aceite)
+
+        Returns:
+            int: Chunks de dados por pacote de paridade (0 = sem paridade)
+        """
+        if self.lossRate < self.minLoss or maxGroup < 2:
+            return 0
+        return max(2, min(maxGroup, int(0.5 / self.lossRate)))
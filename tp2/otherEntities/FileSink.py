@@ -0,0 +1,69 @@
+import json
+import os
+
+
+def checkRoverId(roverId):
+    """
+    Valida o rover_id de uma amostra antes de o usar como nome da pasta do rover
+    (como TelemetryStream.checkFilename() faz com o nome do ficheiro).
+
+    Args:
+        roverId (str): Identificador do rover
+
+    Returns:
+        str: Identificador do rover
+
+    Raises:
+        ValueError: Se o identificador for vazio, "." ou ".." ou incluir um caminho
+    """
+    if not roverId or os.path.basename(roverId) != roverId or roverId in (".", ".."):
+        raise ValueError(f"rover_id inválido: {roverId!r}")
+    return roverId
+
+
+class FileSink:
+    """
+    Destino da telemetria recebida pelo TelemetryStream: um ficheiro por amostra, na pasta
+    do rover que a enviou (<pasta>/<rover_id>/<nome do ficheiro>).
+
+    Os destinos (FileSink, LogSegmentSink, MemorySink) têm a mesma interface: store() recebe
+    a amostra já lida para memória e descodificada uma única vez pelo TelemetryStream, e
+    close() liberta os recursos. Cada amostra custa uma única escrita: a pasta de cada rover
+    só é criada na primeira amostra desse rover.
+    """
+    def __init__(self,folder):
+        """
+        Args:
+            folder (str): Pasta base (uma subpasta por rover)
+        """
+        self.folder = folder
+        self.roverFolders = set()   # pastas de rover já criadas
+
+    def store(self,roverId,filename,content,record):
+        """
+        Guarda uma amostra.
+
+        Args:
+            roverId (str): Identificador do rover ("unknown" se a amostra não o indicar)
+            filename (str): Nome do ficheiro enviado pelo rover (sem caminho)
+            content (bytes or None): Conteúdo tal como foi recebido, ou None se a amostra chegou no
+                                     formato binário (ver TelemetryCodec): é guardada em JSON compacto
+            record (dict or None): Conteúdo descodificado, ou None se não for JSON
+
+        Raises:
+            ValueError: Se o rover_id não servir de nome de pasta (ver checkRoverId())
+        """
+        folder = os.path.join(self.folder,checkRoverId(roverId))
+        if folder not in self.roverFolders:
+            os.makedirs(folder,exist_ok=True)
+            self.roverFolders.add(folder)
+        if content is None:
+            content = json.dumps(record,separators=(",",":")).encode()
+        with open(os.path.join(folder,filename),"wb") as file:
+            file.write(content)
+
+    def close(self):
+        """
+        Não há recursos abertos entre amostras.
+        """
+        pass
@@ -1,9 +1,9 @@
 class Limit:
     """
     Classe que define limites e configurações para os protocolos de comunicação.
-    Armazena o tamanho do buffer e o timeout para operações de rede.
+    Armazena o tamanho do buffer, o timeout para operações de rede e os limites do RTO.
     """
-    def __init__(self,buffersize = 1024):
+    def __init__(self,buffersize = 1024,windowSize = 8,maxDatagramSize = 1472):
         """
         Inicializa os limites do protocolo.
         
@@ -11,12 +11,83 @@ class Limit:
             buffersize (int, optional): Tamanho máximo do buffer em bytes. Defaults to 1024.
                                        Este valor define o tamanho máximo de dados que podem ser
                                        enviados num único pacote UDP ou chunk TCP.
+            windowSize (int, optional): Número máximo de chunks em voo no modo selective-repeat
+                                        do MissionLink. Defaults to 8. Com 1, o envio é stop-and-wait.
+            maxDatagramSize (int, optional): Maior datagrama MissionLink proposto no handshake, em bytes.
+                                             Defaults to 1472 (MTU Ethernet de 1500 menos 28 bytes de
+                                             cabeçalhos IP/UDP). Numa rede com jumbo frames pode ser
+                                             maior (ex: 8972 para MTU 9000).
         
         Atributos criados:
             self.buffersize (int): Tamanho do buffer em bytes (fixo em 1024, independente do parâmetro)
-            self.timeout (int): Timeout em segundos para operações de rede (2 segundos)
+            self.timeout (int): Timeout em segundos para operações de rede (2 segundos). No MissionLink
+                                é só o RTO inicial de cada peer: depois da primeira amostra de RTT,
+                                as retransmissões usam o RTO calculado (ver RttEstimator)
+            self.minRto (float): Limite inferior do RTO em segundos (0.05)
+            self.maxRto (float): Limite superior do RTO em segundos, também limita o backoff (16)
+            self.sessionTimeout (int): Segundos sem pacotes do peer até uma sessão MissionLink
+                                       ser descartada (30)
+            self.idleTimeout (int): Segundos sem mensagens até uma sessão MissionLink aberta
+                                    localmente ser fechada (60)
+            self.keepaliveInterval (int): Intervalo em segundos entre keepalives de uma sessão
+                                          MissionLink inativa (10, menor que sessionTimeout)
+            self.windowSize (int): Janela de envio proposta no handshake do MissionLink
+            self.maxDatagramSize (int): Tamanho máximo de datagrama proposto no handshake do MissionLink.
+                                        O valor usado é o menor entre este, o MTU do caminho e o do
+                                        peer; se os datagramas grandes se perderem, volta-se a buffersize
+            self.probeInterval (int): Segundos até voltar a propor datagramas grandes a um peer
+                                      depois de um recuo para buffersize (600)
+            self.initialWindow (int): Janela de congestionamento inicial de uma sessão MissionLink, em
+                                      chunks (4); cresce em slow start até à janela negociada
+            self.pacingRate (float or None): Taxa máxima de envio do endpoint MissionLink em bytes/s
+                                             (token bucket partilhado por todas as sessões).
+                                             None (omissão) desliga o pacing
+            self.pacingBurst (int): Maior rajada enviada sem espaçamento quando há pacing (64 KiB)
+            self.maxMessageSize (int): Maior tamanho de mensagem anunciado pelo emissor para o qual o
+                                       MissionLink reserva logo o buffer de receção (64 MiB); acima
+                                       disso os chunks são guardados à medida que chegam
+            self.fec (bool): Propor FEC nas sessões MissionLink abertas localmente: pacotes de paridade
+                             XOR a cada grupo de chunks, com o grupo adaptado às perdas (False)
+            self.fecMinLoss (float): Taxa de perda observada abaixo da qual não se envia paridade (0.01)
+            self.socketBuffer (int): Tamanho pedido para os buffers de receção e envio do socket
+                                     MissionLink (SO_RCVBUF/SO_SNDBUF), limitado pelo kernel (4 MiB)
+            self.requestTimeout (int): Segundos que MissionLink.request() espera por defeito pelo
+                                       envio do pedido e pela resposta (10)
+            self.compression (bool): Propor mensagens comprimidas (zlib) nas sessões MissionLink e
+                                     comprimir as mensagens para os peers que as aceitem (True)
+            self.compressMinSize (int): Mensagens MissionLink com menos bytes vão sem compressão (128)
+            self.listenBacklog (int): Ligações TelemetryStream à espera de accept() no kernel (128)
+            self.maxConnections (int): Ligações TelemetryStream abertas em simultâneo no servidor; acima
+                                       disso as novas ficam na fila do kernel até outra fechar (1024)
+            self.ingestWorkers (int): Threads do servidor TelemetryStream que descodificam e guardam
+                                      as amostras recebidas (4)
+            self.binaryTelemetry (bool): Propor (cliente) e aceitar (servidor) amostras de telemetria no
+                                         formato binário nas ligações persistentes do TelemetryStream;
+                                         sem acordo seguem em JSON (True)
         
         NOTA: Se precisares de outro tamanho, passa via buffersize.
         """
         self.buffersize = buffersize  # Usa o valor passado (padrão 1024)
-        self.timeout = 2        # Timeout de 2 segundos para operações de rede
\ No newline at end of file
+        self.timeout = 2        # Timeout de 2 segundos para operações de rede
+        self.minRto = 0.05      # RTO mínimo: numa LAN o RTT é inferior a 1 ms
+        self.maxRto = 16        # RTO máximo depois de backoffs sucessivos
+        self.sessionTimeout = 30  # Sessão sem pacotes do peer durante 30s é descartada
+        self.idleTimeout = 60     # Sessão sem mensagens durante 60s é fechada (FIN)
+        self.keepaliveInterval = 10  # Keepalive a cada 10s numa sessão inativa
+        self.windowSize = windowSize  # Janela selective-repeat (negociada no SYN/SYN-ACK)
+        self.maxDatagramSize = maxDatagramSize  # Datagrama máximo (negociado no SYN/SYN-ACK)
+        self.probeInterval = 600  # Depois de um recuo, só volta a sondar datagramas grandes ao fim de 10 min
+        self.maxMessageSize = 64 * 1024 * 1024  # Buffer de receção reservado de uma só vez até 64 MiB
+        self.initialWindow = 4    # Janela de congestionamento inicial (slow start)
+        self.pacingRate = None    # Pacing desligado: sem limite de débito do endpoint
+        self.pacingBurst = 64 * 1024
+        self.fec = False          # FEC desligada: um chunk perdido é sempre reenviado
+        self.fecMinLoss = 0.01
+        self.socketBuffer = 4 * 1024 * 1024  # Absorve rajadas de muitos rovers sem perdas no kernel
+        self.requestTimeout = 10  # Pedido + resposta (request()) em 10s
+        self.compression = True   # Missões e relatórios em JSON comprimem várias vezes
+        self.compressMinSize = 128
+        self.listenBacklog = 128  # Rajada de rovers a ligar ao mesmo tempo (reinício da Nave-Mãe)
+        self.maxConnections = 1024
+        self.ingestWorkers = 4
+        self.binaryTelemetry = True  # Amostras em binário: cerca de 1/4 dos bytes do JSON compacto
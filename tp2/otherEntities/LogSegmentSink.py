@@ -0,0 +1,84 @@
+import json
+import os
+import threading
+
+from otherEntities import FileSink
+
+
+class LogSegmentSink:
+    """
+    Destino da telemetria recebida pelo TelemetryStream: um log por rover, em segmentos de
+    tamanho limitado (<pasta>/<rover_id>/telemetry_<n>.log), com uma amostra por linha.
+
+    Cada linha é um objeto JSON {"file": nome, "record": amostra} (ou "content" com o texto,
+    se a amostra não for JSON). O segmento atual de cada rover fica aberto em modo append,
+    por isso cada amostra custa uma única escrita, sem criar nem abrir ficheiros; quando o
+    segmento passa de segmentSize bytes, o seguinte é aberto.
+    Ver FileSink para a interface comum dos destinos.
+    """
+    def __init__(self,folder,segmentSize = 64 * 1024 * 1024):
+        """
+        Args:
+            folder (str): Pasta base (uma subpasta por rover)
+            segmentSize (int, optional): Tamanho a partir do qual se muda de segmento. Defaults to 64 MiB
+        """
+        self.folder = folder
+        self.segmentSize = segmentSize
+        self.segments = dict()      # rover_id -> [ficheiro aberto, número do segmento, bytes escritos]
+        self.lock = threading.Lock()
+
+    def store(self,roverId,filename,content,record):
+        """
+        Acrescenta uma amostra ao segmento atual do rover (ver FileSink.store()).
+        """
+        if record is not None:
+            entry = {"file": filename, "record": record}
+        else:
+            entry = {"file": filename, "content": content.decode(errors="replace")}
+        line = (json.dumps(entry,separators=(",",":")) + "\n").encode()
+        FileSink.checkRoverId(roverId)
+        with self.lock:
+            segment = self.segments.get(roverId)
+            if segment is None or segment[2] >= self.segmentSize:
+                segment = self.openSegment(roverId,segment)
+            segment[0].write(line)
+            segment[2] += len(line)
+
+    def openSegment(self,roverId,previous):
+        """
+        Abre o segmento seguinte de um rover (o primeiro a seguir aos que já existem em disco).
+        Chamado com o lock adquirido.
+
+        Args:
+            roverId (str): Identificador do rover
+            previous (list or None): Segmento atual (fechado aqui), ou None
+
+        Returns:
+            list: [ficheiro aberto, número do segmento, bytes escritos]
+        """
+        folder = os.path.join(self.folder,roverId)
+        if previous is None:
+            os.makedirs(folder,exist_ok=True)
+            numbers = [
+                int(name[10:-4]) for name in os.listdir(folder)
+                if name.startswith("telemetry_") and name.endswith(".log") and name[10:-4].isdigit()
+            ]
+            number = max(numbers,default=0)
+        else:
+            previous[0].close()
+            number = previous[1] + 1
+        path = os.path.join(folder,f"telemetry_{number}.log")
+        # Sem buffer: cada amostra é escrita (e fica visível) logo que chega
+        file = open(path,"ab",buffering=0)
+        segment = [file,number,file.tell()]
+        self.segments[roverId] = segment
+        return segment
+
+    def close(self):
+        """
+        Fecha os segmentos abertos.
+        """
+        with self.lock:
+            for file,_,_ in self.segments.values():
+                file.close()
+            self.segments.clear()
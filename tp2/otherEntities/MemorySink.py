@@ -0,0 +1,57 @@
+import collections
+import threading
+
+
+class MemorySink:
+    """
+    Destino da telemetria recebida pelo TelemetryStream: as últimas amostras de cada rover
+    em memória, sem escritas em disco (ex: para a API de Observação ou para testes).
+    Ver FileSink para a interface comum dos destinos.
+    """
+    def __init__(self,maxRecords = 1000):
+        """
+        Args:
+            maxRecords (int, optional): Amostras guardadas por rover (as mais antigas são esquecidas). Defaults to 1000
+        """
+        self.maxRecords = maxRecords
+        self.records = dict()       # rover_id -> deque de (nome do ficheiro, amostra)
+        self.lock = threading.Lock()
+
+    def store(self,roverId,filename,content,record):
+        """
+        Guarda uma amostra (ver FileSink.store()). Fica o conteúdo descodificado, ou os
+        bytes recebidos se a amostra não for JSON.
+        """
+        with self.lock:
+            if roverId not in self.records:
+                self.records[roverId] = collections.deque(maxlen=self.maxRecords)
+            self.records[roverId].append((filename,record if record is not None else content))
+
+    def getRecords(self,roverId):
+        """
+        Args:
+            roverId (str): Identificador do rover
+
+        Returns:
+            list: Amostras guardadas do rover, da mais antiga para a mais recente: (nome, amostra)
+        """
+        with self.lock:
+            return list(self.records.get(roverId,()))
+
+    def getLatest(self,roverId):
+        """
+        Args:
+            roverId (str): Identificador do rover
+
+        Returns:
+            dict or bytes or None: Amostra mais recente do rover, ou None se não houver
+        """
+        with self.lock:
+            records = self.records.get(roverId)
+            return records[-1][1] if records else None
+
+    def close(self):
+        """
+        As amostras continuam disponíveis depois de fechar.
+        """
+        pass
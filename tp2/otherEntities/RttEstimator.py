@@ -0,0 +1,94 @@
+class RttEstimator:
+    """
+    Estimador de RTT e cálculo do timeout de retransmissão (RTO) de um peer.
+    Segue o algoritmo do TCP (RFC 6298): RTT suavizado, variância do RTT,
+    regra de Karn (feita por quem mede) e backoff exponencial de cada sessão
+    (ver getBackoffTimeout()).
+    """
+    # Pesos do RFC 6298
+    alpha = 1 / 8   # peso de cada amostra no RTT suavizado
+    beta = 1 / 4    # peso de cada amostra na variância
+    k = 4           # número de variâncias somadas ao RTT suavizado
+
+    def __init__(self,initialRto = 1.0,minRto = 0.05,maxRto = 16.0):
+        """
+        Inicializa o estimador sem amostras de RTT.
+
+        Args:
+            initialRto (float, optional): RTO em segundos até haver a primeira amostra. Defaults to 1.0
+            minRto (float, optional): Limite inferior do RTO em segundos. Defaults to 0.05
+            maxRto (float, optional): Limite superior do RTO em segundos (também limita o backoff). Defaults to 16.0
+
+        Atributos criados:
+            self.srtt (float or None): RTT suavizado (None até à primeira amostra)
+            self.rttvar (float or None): Variância do RTT (None até à primeira amostra)
+            self.rto (float): Timeout de retransmissão atual
+        """
+        self.minRto = minRto
+        self.maxRto = maxRto
+        self.srtt = None
+        self.rttvar = None
+        self.rto = self.clamp(initialRto)
+
+    def clamp(self,rto):
+        """
+        Limita um RTO ao intervalo [minRto, maxRto].
+
+        Args:
+            rto (float): RTO em segundos
+
+        Returns:
+            float: RTO limitado
+        """
+        return min(self.maxRto, max(self.minRto, rto))
+
+    def addSample(self,rtt):
+        """
+        Atualiza o RTT suavizado, a variância e o RTO com uma nova amostra.
+
+        COMO FUNCIONA:
+        - Primeira amostra: srtt = rtt, rttvar = rtt / 2
+        - Seguintes: rttvar = (1 - beta) * rttvar + beta * |srtt - rtt|
+                     srtt = (1 - alpha) * srtt + alpha * rtt
+        - rto = srtt + k * rttvar (limitado a [minRto, maxRto])
+
+        NOTA (regra de Karn): só devem ser passadas amostras de pacotes que foram
+              enviados uma única vez. O ACK de um pacote retransmitido não diz a
+              qual das transmissões corresponde.
+
+        Args:
+            rtt (float): Tempo em segundos entre o envio e a confirmação
+        """
+        rtt = max(0.0, rtt)
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - self.beta) * self.rttvar + self.beta * abs(self.srtt - rtt)
+            self.srtt = (1 - self.alpha) * self.srtt + self.alpha * rtt
+        self.rto = self.clamp(self.srtt + self.k * self.rttvar)
+
+    def getBackoffTimeout(self,retries):
+        """
+        Timeout de retransmissão de quem já reenviou `retries` vezes (backoff exponencial
+        próprio de cada sessão, limitado a maxRto).
+
+        PORQUÊ:
+        - O estimador é partilhado por todas as sessões com o mesmo peer: se cada expiração
+          duplicasse o RTO partilhado, uma rajada de sessões a expirar ao mesmo tempo
+          levava o RTO de todas logo a maxRto (como no TCP, o backoff é de cada ligação)
+
+        Args:
+            retries (int): Número de reenvios já feitos sem confirmação
+
+        Returns:
+            float: RTO * 2^retries, em segundos
+        """
+        return self.clamp(self.rto * 2 ** min(retries, 32))
+
+    def getTimeout(self):
+        """
+        Returns:
+            float: Timeout de retransmissão atual em segundos
+        """
+        return self.rto
@@ -0,0 +1,101 @@
+import collections
+import time
+
+
+class Session:
+    """
+    Estado de uma sessão MissionLink com um peer, identificada por (ip, porta, connId).
+    O MissionLink guarda as sessões numa tabela e encaminha cada datagrama recebido
+    para a sessão a que pertence (ver MissionLink.dispatch()).
+
+    - Sessões iniciadas localmente (send()) são conduzidas pela thread que chamou send():
+      os pacotes recebidos ficam em `inbox` até essa thread os consumir.
+    - Sessões iniciadas pelo peer são uma máquina de estados conduzida pelo próprio
+      dispatcher: SYN_RCVD -> ESTABLISHED -> CLOSING -> CLOSED.
+    - Uma sessão estabelecida transporta várias mensagens seguidas: só é fechada quando
+      fica inativa (Limit.idleTimeout) ou o peer deixa de responder.
+    """
+    # Estados da sessão
+    SYN_SENT = "SYN_SENT"          # SYN enviado, à espera do SYN-ACK (sessão local)
+    SYN_RCVD = "SYN_RCVD"          # SYN-ACK enviado, à espera do ACK ou dos primeiros dados
+    ESTABLISHED = "ESTABLISHED"    # Handshake concluído, a trocar dados
+    CLOSING = "CLOSING"            # FIN enviado, à espera do ACK final
+    CLOSED = "CLOSED"              # Sessão terminada (já fora da tabela)
+
+    def __init__(self,ip,port,connId,sendConnId,initiator):
+        """
+        Inicializa uma sessão.
+
+        Args:
+            ip (str): Endereço IP do peer
+            port (int): Porta do peer
+            connId (int): connId dos pacotes recebidos nesta sessão (chave na tabela)
+            sendConnId (int): connId a colocar nos pacotes enviados nesta sessão
+            initiator (bool): True se a sessão foi iniciada localmente (send())
+        """
+        self.ip = ip
+        self.port = port
+        self.connId = connId
+        self.sendConnId = sendConnId
+        self.initiator = initiator
+        self.state = Session.SYN_SENT if initiator else Session.SYN_RCVD
+
+        # Identificação e parâmetros negociados no handshake
+        self.idAgent = None
+        self.window = 1
+        self.datagramSize = None  # tamanho máximo dos datagramas de dados (capacidade "dgram")
+        self.sack = False         # ACKs cumulativos com mapa de bits (capacidade "sack")
+        self.congestion = None    # janela de congestionamento (sessão local, criada no primeiro envio)
+        self.fec = False          # pacotes de paridade (capacidade "fec")
+        self.fecControl = None    # redundância adaptada às perdas (sessão local, criada no primeiro envio)
+        self.rpc = False          # mensagens podem ser pedidos ou respostas (capacidade "rpc")
+        self.zlib = False         # mensagens podem ir comprimidas (capacidade "zlib")
+        self.early = False        # o SYN pode levar uma mensagem (capacidade "early", 0-RTT)
+        self.earlyDelivered = False  # o SYN-ACK confirmou a mensagem enviada no SYN (0-RTT)
+
+        # Sessão local: pacotes à espera da thread que conduz a sessão
+        self.inbox = collections.deque()
+        self.ready = None         # condição notificada quando chega um pacote à inbox (MissionLink com thread de leitura)
+        self.busy = initiator     # True enquanto uma thread está a enviar nesta sessão
+        self.lastUsed = time.time()  # fim da última mensagem enviada (para o idleTimeout)
+
+        # Sessão do peer: receção e reordenação dos chunks
+        # (sessão local: seq é o número de sequência do próximo chunk a enviar)
+        self.seq = 0              # último número de sequência entregue por ordem
+        self.pending = dict()     # buffer de reordenação: seq -> pacote (lista de campos)
+        self.fecChunks = dict()   # FEC: seq -> (flag, payload) dos chunks recentes (para reconstruir outros)
+        self.parity = dict()      # FEC: seq do primeiro chunk do grupo -> pacote de paridade à espera
+        self.resetMessage()
+
+        # Temporização (retransmissão do SYN-ACK/FIN e inatividade)
+        self.lastPacket = None    # último pacote de controlo enviado (reenviado quando o temporizador expira)
+        self.sentAt = 0.0
+        self.sends = 0            # envios de lastPacket (regra de Karn: só há amostra com 1 envio)
+        self.retries = 0
+        self.deadline = None      # instante em que o temporizador da sessão expira (None = sem temporizador)
+        self.lastActivity = time.time()
+
+    def resetMessage(self):
+        """
+        Limpa o estado da mensagem em receção (chamado no fim de cada mensagem).
+        O número de sequência continua: a mensagem seguinte usa a mesma sessão.
+        """
+        self.idMission = None
+        self.missionType = ""
+        self.compressed = False   # mensagem comprimida (missionType com compressedBit, ver MissionLink.compressMessage())
+        self.parts = []           # chunks da mensagem em bytes, por ordem (tamanho não anunciado)
+        self.buffer = None        # mensagem com tamanho anunciado: bytearray preenchido por offset
+        self.file = None
+        self.fileName = None
+        self.dataSeq = None       # seq do primeiro chunk de dados (offset 0 no buffer/ficheiro)
+        self.chunkSize = None     # bytes de dados em cada chunk (exceto o último)
+        self.dataSize = None      # tamanho anunciado do ficheiro/buffer: nenhum chunk é escrito para lá dele
+        self.invalid = False      # chegou um chunk fora do tamanho anunciado: a mensagem é descartada no fim
+        self.firstDelivered = False
+
+    def getKey(self):
+        """
+        Returns:
+            tuple: Chave da sessão na tabela (ip, porta, connId)
+        """
+        return (self.ip,self.port,self.connId)
@@ -0,0 +1,28 @@
+class StreamConnection:
+    """
+    Estado de uma ligação TCP de um rover ao servidor TelemetryStream.
+    O servidor lê todas as ligações no mesmo ciclo (ver TelemetryStream.server()): cada
+    leitura junta os bytes recebidos ao buffer, e os registos completos são retirados
+    do buffer e entregues a um worker (ver TelemetryStream.parseRecords()).
+    """
+    def __init__(self,sock,ip,worker):
+        """
+        Inicializa o estado de uma ligação acabada de aceitar.
+
+        Args:
+            sock (socket.socket): Socket da ligação (não bloqueante)
+            ip (str): Endereço IP do rover
+            worker (concurrent.futures.Executor): Worker que guarda as amostras desta ligação.
+                                                  É sempre o mesmo, por isso as amostras de uma
+                                                  ligação são guardadas pela ordem de chegada
+        """
+        self.sock = sock
+        self.ip = ip
+        self.worker = worker
+        self.buffer = bytearray() # bytes recebidos ainda não consumidos
+        self.persistent = None    # None até ler os 4 primeiros bytes (preâmbulo ou tamanho do nome)
+        self.version = None       # versão do formato binário aceite (0 = só JSON, None = por negociar)
+
+        # Formato antigo (um ficheiro por ligação): o conteúdo termina com o fecho da ligação
+        self.nameLen = None
+        self.filename = None
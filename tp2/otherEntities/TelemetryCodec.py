@@ -0,0 +1,233 @@
+import datetime
+import json
+import struct
+
+# Versão do formato binário (primeiro byte de cada registo). Um registo JSON começa por "{"
+# ou espaço, nunca por um byte de controlo, por isso os dois formatos não se confundem.
+codecVersion = 1
+
+# Formato v1 (big-endian):
+#   versão(1) | rover_id | timestamp(8) | x, y, z, battery, velocity, temperature(6 x 8) |
+#   operational_status | direction | system_health | número de extensões(2) | extensões
+# Textos: tamanho(1) + UTF-8. Campos com valores conhecidos (enumerações abaixo): índice(1),
+# ou 255 seguido do texto. timestamp: microssegundos desde 1970-01-01 (hora local, sem fuso,
+# como datetime.now().isoformat()). Extensões (métricas): nome + tipo(1) + valor.
+fixedFields = struct.Struct("!q6d")
+# Caso comum (enumerações com valores conhecidos): campos fixos e enumerações numa só leitura
+fixedFieldsEnums = struct.Struct("!q6d3BH")
+extensionCount = struct.Struct("!H")
+textLength = struct.Struct("!B")
+longTextLength = struct.Struct("!I")
+enumText = 255
+
+statuses = ("em missão", "a caminho", "parado", "erro")
+directions = ("Norte", "Este", "Sul", "Oeste")
+healthStates = ("operacional",)
+
+# Chaves do registo com lugar fixo no formato, pela ordem de NMS_Agent.createTelemetryMessage()
+fixedKeys = ("rover_id", "position", "operational_status", "timestamp",
+             "battery", "velocity", "direction", "temperature", "system_health")
+epoch = datetime.datetime(1970, 1, 1)
+microsecond = datetime.timedelta(microseconds=1)
+
+
+class TelemetryCodec:
+    """
+    Codificação binária das amostras de telemetria (NMS_Agent.createTelemetryMessage()),
+    usada pelo TelemetryStream quando o servidor a aceita na ligação (ver streamPrefaceBinary).
+
+    Os campos fixos vão em binário sem nomes (ver `fixedFields` no topo do módulo); as restantes
+    chaves (métricas técnicas) vão num mapa de extensões com o tipo de cada valor. Uma amostra
+    que não cabe no formato (campo em falta, tipo diferente, timestamp com fuso) não é
+    codificada: encode() devolve None e segue em JSON.
+    """
+    def __init__(self,version = codecVersion):
+        """
+        Args:
+            version (int, optional): Versão do formato usada em encode(). Defaults to codecVersion
+        """
+        self.version = version
+
+    def isRecord(self,content):
+        """
+        Args:
+            content (bytes): Conteúdo de um registo
+
+        Returns:
+            bool: True se o conteúdo está no formato binário (e não em JSON)
+        """
+        return len(content) > 0 and 1 <= content[0] <= codecVersion
+
+    def encode(self,record):
+        """
+        Codifica uma amostra de telemetria.
+
+        Args:
+            record (dict): Amostra (ver NMS_Agent.createTelemetryMessage())
+
+        Returns:
+            bytes or None: Amostra codificada, ou None se não couber no formato (enviar em JSON)
+        """
+        try:
+            position = record["position"]
+            numbers = (position["x"], position["y"], position["z"],
+                       record["battery"], record["velocity"], record["temperature"])
+            if len(position) != 3 or not all(type(value) is float for value in numbers):
+                return None
+            timestamp = datetime.datetime.fromisoformat(record["timestamp"])
+            if timestamp.tzinfo is not None:
+                return None
+            parts = [bytes([self.version]), self.encodeText(record["rover_id"])]
+            parts.append(fixedFields.pack((timestamp - epoch) // microsecond, *numbers))
+            parts.append(self.encodeEnum(record["operational_status"], statuses))
+            parts.append(self.encodeEnum(record["direction"], directions))
+            parts.append(self.encodeEnum(record["system_health"], healthStates))
+            extensions = [key for key in record if key not in fixedKeys]
+            parts.append(extensionCount.pack(len(extensions)))
+            for key in extensions:
+                parts.append(self.encodeText(key))
+                parts.append(self.encodeValue(record[key]))
+        except (KeyError, TypeError, ValueError, OverflowError, struct.error):
+            return None
+        return b"".join(parts)
+
+    def encodeText(self,text):
+        """
+        Raises:
+            TypeError: Se não for um texto
+            struct.error: Se tiver mais de 255 bytes
+        """
+        if not isinstance(text, str):
+            raise TypeError(f"Texto esperado: {text!r}")
+        data = text.encode()
+        return textLength.pack(len(data)) + data
+
+    def encodeEnum(self,text,values):
+        """
+        Codifica um texto com valores conhecidos: o índice em `values`, ou o texto completo.
+        """
+        if text in values:
+            return bytes([values.index(text)])
+        return bytes([enumText]) + self.encodeText(text)
+
+    def encodeValue(self,value):
+        """
+        Codifica o valor de uma extensão com o respetivo tipo:
+        n (None), b (bool), q (inteiro de 64 bits), d (float), s (texto), j (outro valor, em JSON).
+        """
+        if value is None:
+            return b"n"
+        if type(value) is bool:
+            return b"b" + bytes([value])
+        if type(value) is int and -2**63 <= value < 2**63:
+            return b"q" + struct.pack("!q", value)
+        if type(value) is float:
+            return b"d" + struct.pack("!d", value)
+        if type(value) is str:
+            data = value.encode()
+            return b"s" + longTextLength.pack(len(data)) + data
+        data = json.dumps(value, separators=(",", ":")).encode()
+        return b"j" + longTextLength.pack(len(data)) + data
+
+    def decode(self,content):
+        """
+        Descodifica uma amostra no formato binário.
+
+        Args:
+            content (bytes): Registo (ver isRecord())
+
+        Returns:
+            dict: Amostra, com as mesmas chaves e valores que a versão JSON
+
+        Raises:
+            ValueError: Se o registo for de uma versão desconhecida ou estiver truncado/inválido
+        """
+        try:
+            view = memoryview(content)
+            if not self.isRecord(content):
+                raise ValueError(f"Versão do registo desconhecida: {content[:1]!r}")
+            rover_id, offset = self.decodeText(view, 1)
+            (timestamp, x, y, z, battery, velocity, temperature,
+             status, direction, health, count) = fixedFieldsEnums.unpack_from(view, offset)
+            if enumText in (status, direction, health):
+                # Algum texto fora das enumerações: ler campo a campo
+                offset += fixedFields.size
+                status, offset = self.decodeEnum(view, offset, statuses)
+                direction, offset = self.decodeEnum(view, offset, directions)
+                health, offset = self.decodeEnum(view, offset, healthStates)
+                (count,) = extensionCount.unpack_from(view, offset)
+                offset += extensionCount.size
+            else:
+                status, direction, health = statuses[status], directions[direction], healthStates[health]
+                offset += fixedFieldsEnums.size
+            record = {
+                "rover_id": rover_id,
+                "position": {"x": x, "y": y, "z": z},
+                "operational_status": status,
+                "timestamp": (epoch + timestamp * microsecond).isoformat(),
+                "battery": battery,
+                "velocity": velocity,
+                "direction": direction,
+                "temperature": temperature,
+                "system_health": health,
+            }
+            for _ in range(count):
+                key, offset = self.decodeText(view, offset)
+                record[key], offset = self.decodeValue(view, offset)
+            if offset != len(content):
+                raise ValueError(f"Registo com {len(content) - offset} bytes a mais")
+            return record
+        except (struct.error, IndexError, OverflowError, UnicodeDecodeError) as e:
+            raise ValueError(f"Registo binário inválido: {e}")
+
+    def decodeText(self,view,offset):
+        """
+        Returns:
+            tuple: (texto, offset a seguir ao texto)
+        """
+        (length,) = textLength.unpack_from(view, offset)
+        offset += textLength.size
+        return self.decodeBytes(view, offset, length)
+
+    def decodeBytes(self,view,offset,length):
+        """
+        Returns:
+            tuple: (texto com `length` bytes a partir de offset, offset a seguir)
+
+        Raises:
+            IndexError: Se o registo terminar antes
+        """
+        if offset + length > len(view):
+            raise IndexError("Registo truncado")
+        return bytes(view[offset:offset + length]).decode(), offset + length
+
+    def decodeEnum(self,view,offset,values):
+        """
+        Returns:
+            tuple: (texto, offset a seguir)
+        """
+        index = view[offset]
+        if index == enumText:
+            return self.decodeText(view, offset + 1)
+        return values[index], offset + 1
+
+    def decodeValue(self,view,offset):
+        """
+        Returns:
+            tuple: (valor de uma extensão, offset a seguir) - ver encodeValue()
+        """
+        tag = bytes(view[offset:offset + 1])
+        offset += 1
+        if tag == b"n":
+            return None, offset
+        if tag == b"b":
+            return bool(view[offset]), offset + 1
+        if tag == b"q":
+            return struct.unpack_from("!q", view, offset)[0], offset + 8
+        if tag == b"d":
+            return struct.unpack_from("!d", view, offset)[0], offset + 8
+        if tag in (b"s", b"j"):
+            (length,) = longTextLength.unpack_from(view, offset)
+            text, offset = self.decodeBytes(view, offset + longTextLength.size, length)
+            return (text if tag == b"s" else json.loads(text)), offset
+        raise ValueError(f"Tipo de extensão desconhecido: {tag!r}")
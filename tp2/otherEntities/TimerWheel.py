@@ -0,0 +1,106 @@
+import math
+import time
+
+
+class TimerWheel:
+    """
+    Roda de temporizadores (hashed timing wheel) das sessões de um endpoint MissionLink.
+    Cada objeto tem no máximo um temporizador: agendar de novo substitui o anterior.
+
+    O tempo é dividido em ticks de duração fixa e cada tick cai numa das ranhuras da roda
+    (tick % ranhuras). Um temporizador fica na ranhura do tick em que expira; quando a roda
+    avança um tick só é vista essa ranhura, e os temporizadores dela que são de uma volta
+    seguinte da roda ficam onde estão.
+
+    - Agendar, reagendar e cancelar são O(1) (um dicionário por ranhura)
+    - Avançar custa O(1) por tick mais os temporizadores da ranhura, seja qual for o número
+      de sessões (runTimers() deixa de percorrer a tabela inteira a cada leitura)
+
+    Não é thread-safe: o MissionLink usa-a sempre com sessionsLock adquirido.
+    """
+    def __init__(self,tick,slots = 512):
+        """
+        Inicializa a roda vazia no tick atual.
+
+        Args:
+            tick (float): Duração de cada tick em segundos (resolução dos temporizadores)
+            slots (int, optional): Número de ranhuras (uma volta da roda = tick * slots segundos). Defaults to 512
+        """
+        self.tick = tick
+        self.slots = [dict() for _ in range(slots)]
+        self.slotOf = dict()      # objeto -> índice da ranhura onde está o seu temporizador
+        self.current = self.getTick(time.time())  # último tick processado por expire()
+
+    def getTick(self,when):
+        """
+        Args:
+            when (float): Instante em segundos (time.time())
+
+        Returns:
+            int: Tick em que o instante cai (o temporizador dispara no fim desse tick)
+        """
+        return math.floor(when / self.tick)
+
+    def schedule(self,obj,when):
+        """
+        Agenda (ou reagenda) o temporizador de um objeto.
+
+        Args:
+            obj (object): Objeto (ex: Session) devolvido por expire() quando o temporizador expirar
+            when (float or None): Instante em que expira (time.time()), ou None para cancelar
+        """
+        self.cancel(obj)
+        if when is None:
+            return
+        # Um instante já passado fica no tick atual (as ranhuras anteriores só voltam a
+        # ser vistas daqui a uma volta)
+        index = max(self.getTick(when), self.current) % len(self.slots)
+        self.slots[index][obj] = when
+        self.slotOf[obj] = index
+
+    def cancel(self,obj):
+        """
+        Cancela o temporizador de um objeto (não faz nada se não houver).
+
+        Args:
+            obj (object): Objeto agendado com schedule()
+        """
+        index = self.slotOf.pop(obj, None)
+        if index is not None:
+            del self.slots[index][obj]
+
+    def expire(self,now):
+        """
+        Avança a roda até ao instante atual e retira os temporizadores expirados.
+
+        COMO FUNCIONA:
+        - Percorre as ranhuras dos ticks desde a última chamada até ao atual (no máximo
+          uma volta: depois disso as ranhuras repetem-se)
+        - Em cada ranhura retira os temporizadores com instante <= now; os restantes são
+          de voltas seguintes (ou do resto do tick atual) e ficam à espera
+
+        Args:
+            now (float): Instante atual (time.time())
+
+        Returns:
+            list: Objetos cujos temporizadores expiraram (já sem temporizador)
+        """
+        tick = self.getTick(now)
+        start = self.current
+        self.current = max(self.current, tick)
+        expired = []
+        for t in range(max(start, tick - len(self.slots) + 1), tick + 1):
+            slot = self.slots[t % len(self.slots)]
+            for obj,when in list(slot.items()):
+                if when <= now:
+                    del slot[obj]
+                    del self.slotOf[obj]
+                    expired.append(obj)
+        return expired
+
+    def __len__(self):
+        """
+        Returns:
+            int: Número de temporizadores agendados
+        """
+        return len(self.slotOf)
@@ -0,0 +1,46 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Balde de tokens para espaçar (pacing) os datagramas enviados por um endpoint.
+    Os tokens são bytes: enchem à taxa configurada até ao tamanho do balde (rajada máxima)
+    e cada datagrama gasta o seu tamanho.
+
+    O balde pode ficar em dívida (tokens negativos): um datagrama que tem de sair já
+    (ex: uma retransmissão) gasta os tokens na mesma, e os envios seguintes esperam
+    até a dívida ser paga. Partilhado por todas as sessões (e threads) do endpoint.
+    """
+    def __init__(self,rate,burst):
+        """
+        Inicializa o balde cheio.
+
+        Args:
+            rate (float): Taxa de envio em bytes por segundo
+            burst (int): Tamanho do balde em bytes (maior rajada enviada sem espera)
+        """
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self,amount):
+        """
+        Gasta os tokens de um datagrama.
+
+        Args:
+            amount (int): Tamanho do datagrama em bytes
+
+        Returns:
+            float: Segundos que o envio deve esperar (0 se havia tokens suficientes)
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
@@ -0,0 +1,481 @@
+import asyncio
+import threading
+import time
+from protocol import MissionLink
+from protocol.MissionLink import header,waitPacket,waitPause
+
+
+class AsyncMissionLink(MissionLink.MissionLink,asyncio.DatagramProtocol):
+    """
+    Protocolo MissionLink sobre asyncio (asyncio.DatagramProtocol).
+
+    Usa o mesmo formato de pacotes, o mesmo handshake e a mesma tabela de sessões que
+    MissionLink, mas sem threads: todas as sessões correm num único event loop.
+    - A receção é feita pelo event loop (datagram_received()), que entrega cada datagrama
+      com o dispatch() herdado: as sessões do peer avançam sem nenhuma thread a ler
+    - send(), recv(), acceptConnection() e closeSessions() são corrotinas; o protocolo
+      (handshake, janela, retransmissões, fecho) são os passos herdados (geradores *Steps(),
+      ver runSteps()), e só as esperas por ACKs e as retransmissões usam futures e
+      temporizadores do event loop em vez da thread de leitura
+    - Os temporizadores das sessões do peer (runTimers()) correm periodicamente no loop
+
+    Assim um só processo (ex: a Nave-Mãe) atende milhares de sessões sem uma thread por
+    transferência. Para código bloqueante (NMS_Server/NMS_Agent) ver SyncMissionLink.
+    """
+    def __init__(self,serverAddress,storeFolder = ".",port = 8080):
+        """
+        Inicializa o protocolo e faz bind do socket (ver MissionLink.__init__()).
+        O socket só passa a ser lido pelo event loop depois de start().
+
+        Args:
+            serverAddress (str): Endereço IP local
+            storeFolder (str, optional): Pasta onde armazenar ficheiros recebidos. Defaults to "."
+            port (int, optional): Porta UDP local. Defaults to 8080
+        """
+        MissionLink.MissionLink.__init__(self,serverAddress,storeFolder,port)
+        self.loop = None
+        self.transport = None
+        # Corrotinas à espera de pacotes: chave (sessão, "delivered" ou "accepted") -> lista de futures
+        self.waiters = dict()
+        # Intervalo entre execuções de runTimers() (o RTO nunca é menor do que minRto)
+        self.timerInterval = self.limit.minRto
+        self.timerHandle = None
+        # Tarefas lançadas em segundo plano (ex: replayReply()): o asyncio só guarda referências
+        # fracas às tarefas, por isso ficam aqui até terminarem para não serem recolhidas a meio
+        self.tasks = set()
+
+    async def start(self):
+        """
+        Liga o socket ao event loop atual.
+
+        Returns:
+            AsyncMissionLink: A própria instância (permite `ml = await AsyncMissionLink(...).start()`)
+        """
+        self.loop = asyncio.get_running_loop()
+        await self.loop.create_datagram_endpoint(lambda: self,sock=self.sock)
+        return self
+
+    def close(self):
+        """
+        Fecha o transporte (e o socket). As corrotinas à espera terminam com timeout.
+        """
+        if self.transport is not None:
+            self.transport.close()
+
+
+    # ============================================================
+    # asyncio.DatagramProtocol
+    # ============================================================
+
+    def connection_made(self,transport):
+        """
+        Chamado pelo event loop quando o socket fica ligado ao loop.
+        Os métodos herdados enviam com self.sock.sendto(): passam a enviar pelo transporte.
+        """
+        self.transport = transport
+        self.sock = transport
+        self.scheduleTimers()
+
+    def datagram_received(self,data,address):
+        """
+        Chamado pelo event loop para cada datagrama recebido: entrega-o à sessão a que
+        pertence (dispatch()) e acorda as corrotinas que estavam à espera dele.
+        """
+        with self.sessionsCond:
+            self.dispatch(data,address)
+            if len(data) >= header.size:
+                session = self.sessions.get((address[0],address[1],header.unpack_from(data)[2]))
+                if session is not None and session.inbox:
+                    self.notify(session)
+            if self.delivered:
+                self.notify("delivered")
+            if self.accepted:
+                self.notify("accepted")
+
+    def error_received(self,exc):
+        """
+        Chamado pelo event loop quando o envio ou a receção falha (ex: ICMP port unreachable).
+        As retransmissões tratam da perda.
+        """
+        print(f"Erro ao receber datagrama: {exc}")
+
+    def connection_lost(self,exc):
+        """
+        Chamado pelo event loop quando o transporte fecha: pára os temporizadores.
+        """
+        if self.timerHandle is not None:
+            self.timerHandle.cancel()
+            self.timerHandle = None
+
+
+    # ============================================================
+    # ESPERAS E TEMPORIZADORES
+    # ============================================================
+
+    def scheduleTimers(self):
+        """
+        Agenda a próxima execução de runTimers() no event loop.
+        """
+        self.timerHandle = self.loop.call_later(self.timerInterval,self.onTimers)
+
+    def onTimers(self):
+        """
+        Corre os temporizadores das sessões (retransmissão do SYN-ACK/FIN, keepalives,
+        inatividade) e volta a agendar-se.
+        """
+        with self.sessionsCond:
+            self.runTimers()
+        if self.transport is not None and not self.transport.is_closing():
+            self.scheduleTimers()
+
+    def notify(self,key):
+        """
+        Acorda as corrotinas à espera de uma chave (ver waitFor()).
+
+        Args:
+            key (object): Sessão, "delivered", "accepted" ou "replies"
+        """
+        for future in self.waiters.pop(key,[]):
+            if not future.done():
+                future.set_result(None)
+
+    def replyReady(self):
+        """
+        Acorda as corrotinas request() à espera de resposta (ver MissionLink.replyReady()).
+        """
+        self.notify("replies")
+
+    def replayReply(self,ip,port,idAgent,requestId,cached):
+        """
+        Reenvia a resposta guardada a um pedido repetido (ver MissionLink.replayReply()),
+        numa tarefa do event loop.
+        """
+        task = self.loop.create_task(self.runSteps(self.replayReplySteps(ip,port,idAgent,requestId,cached)))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def waitFor(self,ready,timeout = None,key = None):
+        """
+        Aguarda até ready() devolver um valor (versão assíncrona de MissionLink.waitFor()).
+
+        COMO FUNCIONA:
+        - Não há leitura do socket: os datagramas chegam por datagram_received()
+        - Enquanto ready() devolver None, a corrotina fica suspensa num future registado
+          em `key`, que é resolvido quando chega um pacote para essa chave
+        - Cada datagrama só acorda quem espera pela sessão a que pertence, por isso o custo
+          de um pacote não cresce com o número de sessões
+
+        Args:
+            ready (callable): Função sem argumentos que devolve o valor pretendido ou None
+            timeout (float, optional): Tempo máximo de espera em segundos. Defaults to None (sem limite)
+            key (object, optional): Chave notificada quando ready() pode ter mudado
+
+        Returns:
+            object or None: Valor devolvido por ready(), ou None se o tempo esgotou
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            value = ready()
+            if value is not None:
+                return value
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                return None
+            future = self.loop.create_future()
+            waiters = self.waiters.setdefault(key,[])
+            waiters.append(future)
+            try:
+                await asyncio.wait_for(future,remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                waiters = self.waiters.get(key)
+                if waiters is not None and future in waiters:
+                    waiters.remove(future)
+                    if not waiters:
+                        del self.waiters[key]
+
+    async def nextPacket(self,session,deadline):
+        """
+        Devolve o próximo pacote de uma sessão iniciada localmente.
+
+        Args:
+            session (Session): Sessão
+            deadline (float): Instante (time.time()) até ao qual esperar
+
+        Returns:
+            list or None: Pacote (lista de campos, ver parseMessage()) ou None se o tempo esgotou
+        """
+        return await self.waitFor(lambda: session.inbox.popleft() if session.inbox else None,max(0.0,deadline - time.time()),session)
+
+
+    async def runSteps(self,steps):
+        """
+        Conduz os passos de uma operação (gerador *Steps() herdado, ex: sendSteps()) até ao
+        fim, cumprindo cada espera com await (versão assíncrona de MissionLink.runSteps()).
+
+        Args:
+            steps (generator): Passos da operação
+
+        Returns:
+            object: Valor devolvido pelo gerador (as exceções são propagadas)
+        """
+        value = None
+        while True:
+            try:
+                wait = steps.send(value)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                value = await self.waitStep(wait)
+            except BaseException:
+                # Ex: a corrotina foi cancelada durante a espera - os finally do gerador correm já
+                steps.close()
+                raise
+
+    async def waitStep(self,wait):
+        """
+        Cumpre uma espera pedida pelos passos de uma operação (ver MissionLink.waitStep()).
+
+        Args:
+            wait (tuple): Espera cedida pelo gerador
+
+        Returns:
+            object or None: Valor a devolver ao gerador
+        """
+        if wait[0] == waitPacket:
+            return await self.nextPacket(wait[1],wait[2])
+        if wait[0] == waitPause:
+            await asyncio.sleep(max(0.0,wait[1] - time.time()))
+            return None
+        requestId = wait[1]
+        return await self.waitFor(lambda: self.replies.get(requestId),max(0.0,wait[2] - time.time()),"replies")
+
+
+    # ============================================================
+    # SESSÕES INICIADAS LOCALMENTE (EMISSOR)
+    # ============================================================
+
+    async def openSession(self,idAgent,destAddress,destPort,retryLimit = 5,early = None):
+        """
+        Abre uma sessão com handshake de 3 vias (ver MissionLink.openSessionSteps()).
+
+        Returns:
+            Session: Sessão estabelecida (session.seq é o número de sequência do primeiro chunk)
+
+        Raises:
+            TimeoutError: Se não conseguir estabelecer conexão após múltiplas tentativas
+        """
+        return await self.runSteps(self.openSessionSteps(idAgent,destAddress,destPort,retryLimit,early))
+
+    async def startConnection(self,idAgent,destAddress,destPort,retryLimit = 5):
+        """
+        Abre uma sessão e deixa-a inativa para o próximo send() (ver MissionLink.startConnection()).
+
+        Returns:
+            tuple: ((destAddress, destPort), idAgent, seq, ack) - Informação da conexão estabelecida
+
+        Raises:
+            TimeoutError: Se não conseguir estabelecer conexão após múltiplas tentativas
+        """
+        session = await self.openSession(idAgent,destAddress,destPort,retryLimit)
+        self.releaseSession(session)
+        return (destAddress,destPort),idAgent,session.seq,session.seq
+
+    async def closeSessions(self):
+        """
+        Fecha todas as sessões locais inativas, em paralelo (ver MissionLink.closeSessions()).
+        """
+        sessions = self.takeIdleSessions()
+        await asyncio.gather(*(self.runSteps(self.closeSessionSteps(session)) for session in sessions))
+
+    async def send(self,ip,port,missionType,idAgent,idMission,message,requestId = None):
+        """
+        Envia uma mensagem ou ficheiro (ver MissionLink.send()).
+        Vários send() em simultâneo no mesmo loop correm em paralelo, cada um na sua sessão.
+
+        Args:
+            ip (str): Endereço IP do destinatário
+            port (int): Porta do destinatário
+            missionType (str): Tipo de missão/operação
+            idAgent (str): Identificador do agente/rover (usado apenas no handshake)
+            idMission (str): Identificador da missão ("000" se não aplicável)
+            message (str): Mensagem ou caminho do ficheiro a enviar
+            requestId (str, optional): Id da mensagem, igual em todos os reenvios (ver MissionLink.send()). Defaults to None
+
+        Returns:
+            bool: True se a mensagem foi enviada com sucesso
+
+        Raises:
+            TimeoutError: Se não conseguir estabelecer conexão ou o peer deixar de confirmar os chunks
+        """
+        return await self.runSteps(self.sendSteps(ip,port,missionType,idAgent,idMission,message,requestId))
+
+    async def sendFile(self,ip,port,missionType,idAgent,idMission,path):
+        """
+        Envia um ficheiro qualquer mapeado em memória (ver MissionLink.sendFile()).
+
+        Returns:
+            bool: True se o ficheiro foi enviado com sucesso
+
+        Raises:
+            TimeoutError: Se não conseguir estabelecer conexão ou o peer deixar de confirmar os chunks
+        """
+        return await self.runSteps(self.sendFileSteps(ip,port,missionType,idAgent,idMission,path))
+
+
+    # ============================================================
+    # RECEÇÃO
+    # ============================================================
+
+    async def acceptConnection(self,timeout = None):
+        """
+        Aguarda que um peer conclua o handshake (ver MissionLink.acceptConnection()).
+
+        Returns:
+            tuple: ((ip, port), idAgent, seq, ack) - Informação da conexão estabelecida
+
+        Raises:
+            TimeoutError: Se nenhum handshake terminar dentro do tempo
+        """
+        info = await self.waitFor(lambda: self.accepted.popleft() if self.accepted else None,timeout,"accepted")
+        if info is None:
+            raise TimeoutError("MissionLink: nenhuma conexão aceite dentro do tempo")
+        return info
+
+    async def recv(self,timeout = None):
+        """
+        Devolve a próxima mensagem completa (ver MissionLink.recv()).
+
+        Returns:
+            list: [idAgent, idMission, missionType, mensagem ou nome do ficheiro, ip]
+
+        Raises:
+            TimeoutError: Se nenhuma mensagem chegar dentro do tempo
+        """
+        result = await self.waitFor(lambda: self.delivered.popleft() if self.delivered else None,timeout,"delivered")
+        if result is None:
+            raise TimeoutError(f"MissionLink: nenhuma mensagem recebida após {timeout}s")
+        return result
+
+    async def request(self,ip,port,missionType,idAgent,idMission,message,timeout = None,requestId = None):
+        """
+        Envia um pedido e espera pela resposta correlacionada (ver MissionLink.request()).
+
+        Returns:
+            list or None: Resposta, no formato de recv() (None se o peer não suportar "rpc")
+
+        Raises:
+            TimeoutError: Se a resposta não chegar dentro do tempo
+        """
+        return await self.runSteps(self.requestSteps(ip,port,missionType,idAgent,idMission,message,timeout,requestId))
+
+    async def reply(self,request,missionType,idMission,message):
+        """
+        Responde a um pedido recebido por recv() (ver MissionLink.reply()).
+
+        Returns:
+            bool: True se a resposta foi entregue
+        """
+        return await self.runSteps(self.replySteps(request,missionType,idMission,message))
+
+
+class SyncMissionLink:
+    """
+    Interface bloqueante sobre AsyncMissionLink, com a mesma API que MissionLink.
+
+    O event loop corre numa única thread (daemon); cada chamada submete a corrotina a esse
+    loop e espera pelo resultado. Várias threads podem chamar send()/recv() ao mesmo tempo,
+    mas todas as sessões são servidas pela mesma thread do loop.
+    Os restantes atributos (port, limit, taskRequest, ...) são os da instância assíncrona.
+    """
+    def __init__(self,serverAddress,storeFolder = ".",port = 8080):
+        """
+        Cria o event loop, a thread que o corre e a instância AsyncMissionLink.
+
+        Args:
+            serverAddress (str): Endereço IP local
+            storeFolder (str, optional): Pasta onde armazenar ficheiros recebidos. Defaults to "."
+            port (int, optional): Porta UDP local. Defaults to 8080
+        """
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever,daemon=True)
+        self.thread.start()
+        try:
+            self.missionLink = self.run(self.create(serverAddress,storeFolder,port))
+        except BaseException:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            raise
+
+    async def create(self,serverAddress,storeFolder,port):
+        """
+        Cria a instância AsyncMissionLink dentro do loop (start() precisa do loop a correr).
+        """
+        return await AsyncMissionLink(serverAddress,storeFolder,port).start()
+
+    def run(self,coroutine):
+        """
+        Corre uma corrotina no event loop e espera pelo resultado.
+
+        Args:
+            coroutine (coroutine): Corrotina a executar
+
+        Returns:
+            object: Resultado da corrotina (as exceções são propagadas)
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine,self.loop).result()
+
+    def __getattr__(self,name):
+        # Só é chamado para atributos que não existem neste objeto
+        if name == "missionLink":
+            raise AttributeError(name)
+        return getattr(self.missionLink,name)
+
+    def send(self,ip,port,missionType,idAgent,idMission,message,requestId = None):
+        """Ver AsyncMissionLink.send()."""
+        return self.run(self.missionLink.send(ip,port,missionType,idAgent,idMission,message,requestId))
+
+    def sendFile(self,ip,port,missionType,idAgent,idMission,path):
+        """Ver AsyncMissionLink.sendFile()."""
+        return self.run(self.missionLink.sendFile(ip,port,missionType,idAgent,idMission,path))
+
+    def recv(self,timeout = None):
+        """Ver AsyncMissionLink.recv()."""
+        return self.run(self.missionLink.recv(timeout))
+
+    def request(self,ip,port,missionType,idAgent,idMission,message,timeout = None,requestId = None):
+        """Ver AsyncMissionLink.request()."""
+        return self.run(self.missionLink.request(ip,port,missionType,idAgent,idMission,message,timeout,requestId))
+
+    def reply(self,request,missionType,idMission,message):
+        """Ver AsyncMissionLink.reply()."""
+        return self.run(self.missionLink.reply(request,missionType,idMission,message))
+
+    def acceptConnection(self,timeout = None):
+        """Ver AsyncMissionLink.acceptConnection()."""
+        return self.run(self.missionLink.acceptConnection(timeout))
+
+    def startConnection(self,idAgent,destAddress,destPort,retryLimit = 5):
+        """Ver AsyncMissionLink.startConnection()."""
+        return self.run(self.missionLink.startConnection(idAgent,destAddress,destPort,retryLimit))
+
+    def closeSessions(self):
+        """Ver AsyncMissionLink.closeSessions()."""
+        return self.run(self.missionLink.closeSessions())
+
+    async def shutdown(self):
+        """
+        Fecha o transporte dentro do loop. O transporte só fecha o socket na iteração
+        seguinte do loop, por isso a corrotina cede uma vez antes de terminar.
+        """
+        self.missionLink.close()
+        await asyncio.sleep(0)
+
+    def close(self):
+        """
+        Fecha o socket e pára o event loop.
+        """
+        self.run(self.shutdown())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+        self.loop.close()
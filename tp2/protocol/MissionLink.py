@@ -1,11 +1,89 @@
 import socket
 from otherEntities import Limit
+from otherEntities import RttEstimator
+from otherEntities import CongestionControl
+from otherEntities import TokenBucket
+from otherEntities import FecControl
+from otherEntities import Session
+from otherEntities import TimerWheel
 import time
 import threading
+import os
+import struct
+import random
+import collections
+import errno
+import sys
+import mmap
+import weakref
+import zlib
 
 
-# [flag,idMission,seq,ack,size,missionType,message]
-#   0       1      2   3   4        5           6
+# Cabeçalho binário de tamanho fixo (network byte order), seguido de idMission e do payload:
+#   flag(1) | missionType(1) | connId(2) | seq(4) | ack(4) | size(2) | idLen(1) | idMission(idLen) | message(size)
+# flag e missionType são um carácter ASCII; size é o tamanho do payload em bytes.
+header = struct.Struct("!BBHIIHB")
+
+# connId identifica a sessão entre dois peers: é escolhido por quem envia o SYN (1 a 0x7FFF)
+# e os pacotes enviados por quem respondeu ao SYN levam este bit ligado. Assim, uma sessão
+# iniciada por cada lado com o mesmo connId nunca colide na tabela de sessões.
+responderBit = 0x8000
+
+# Números de sequência: 32 bits no cabeçalho, com aritmética de números de série (RFC 1982).
+# Cada sessão conta com inteiros sem limite; no cabeçalho vai o valor módulo 2^32, e quem
+# recebe recupera o valor completo a partir do último que conhece (ver unwrapSeq()).
+# Assim uma sessão transporta qualquer volume de dados (4G chunks antes de dar a volta).
+seqModulus = 1 << 32
+seqMask = seqModulus - 1
+
+# Tamanho dos datagramas: os cabeçalhos IPv4 + UDP ocupam 28 bytes do MTU, e 548 bytes
+# (576 - 28) é o maior datagrama que qualquer caminho IPv4 tem de transportar.
+# IP_MTU (Linux) dá o MTU do caminho de um socket UDP ligado; o módulo socket não a exporta.
+# Os datagramas são lidos com maxUdpPayload (o maior payload UDP em IPv4), para que uma sonda
+# maior que o tamanho local não seja truncada: o tamanho efetivo é limitado na negociação.
+ipUdpHeaderSize = 28
+minDatagramSize = 548
+maxUdpPayload = 65507
+IP_MTU = getattr(socket,"IP_MTU",14 if sys.platform.startswith("linux") else None)
+
+# A thread de leitura acorda pelo menos a cada readerTick segundos para correr os temporizadores
+# das sessões: um temporizador armado por outra thread (ex: keepalive em releaseSession())
+# não interrompe a espera no socket, por isso dispara com um atraso máximo de readerTick.
+readerTick = 0.05
+# Depois de cada espera a thread de leitura esvazia o socket sem bloquear: lê até readerBatch
+# datagramas seguidos e entrega-os de uma só vez (ver handleDatagrams()).
+readerBatch = 64
+
+# Esperas dos passos do protocolo: os métodos *Steps() são geradores que decidem o que enviar
+# e cedem (yield) cada espera a quem os conduz (ver runSteps()), que a cumpre bloqueando a
+# thread (MissionLink) ou com await (AsyncMissionLink). A resposta é enviada de volta ao gerador.
+#   (waitPacket, sessão, instante)    -> próximo pacote da sessão, ou None se o instante passou
+#   (waitPause, instante)             -> None, depois do instante (pacing)
+#   (waitReply, id do pedido, instante) -> resposta ao pedido, ou None se o instante passou
+waitPacket = "packet"
+waitPause = "pause"
+waitReply = "reply"
+
+# Compressão das mensagens (capacidade "zlib"): missionType é um carácter ASCII, por isso o
+# bit mais alto do seu byte no cabeçalho fica livre e marca os chunks de uma mensagem cujo
+# payload vai comprimido com zlib. Missões e relatórios de progresso são JSON com as mesmas
+# chaves, por isso a compressão usa um dicionário pré-definido com esses fragmentos: uma
+# mensagem curta já comprime bem à primeira ocorrência de cada chave.
+# Mudar o dicionário obriga a mudar zlibVersion (os dois peers têm de usar o mesmo).
+compressedBit = 0x80
+zlibVersion = 1
+zlibDictionary = (
+    '"instructions": "", "priority": "low", "priority": "medium", "priority": "high", '
+    '"geographic_area": {"x1": , "y1": , "x2": , "y2": }, "duration_minutes": , '
+    '"task": "capture_images", "task": "sample_collection", "task": "environmental_analysis", '
+    '"velocity": , "battery": , "operational_status": "em missão", "elapsed_time_seconds": , '
+    '"current_position": {"x": , "y": , "z": }, "status": "in_progress", "status": "completed", '
+    '"progress_percent": , "rover_id": "r", "mission_id": "M'
+).encode()
+
+# parseMessage() devolve os campos por esta ordem:
+# [flag,idMission,seq,ack,size,missionType,message,connId]
+#   0       1      2   3   4        5           6      7
 # NOTA: No handshake, idMission contém temporariamente o ID do rover
 #       Após handshake, idMission contém o ID da missão
 flagPos = 0
@@ -15,6 +93,46 @@ ackPos = 3
 sizePos = 4
 missionTypePos = 5
 messagePos = 6
+connIdPos = 7
+
+
+class MissionLinkSocket(socket.socket):
+    """
+    Socket UDP de um MissionLink, lido por uma única thread de leitura (ver MissionLink.readLoop()).
+
+    Fechar o socket com a thread bloqueada em recvfrom() não liberta a porta até a espera
+    terminar (o kernel só liberta o socket quando a thread sai do recvfrom()): close()
+    acorda-a primeiro com um datagrama vazio enviado ao próprio socket e espera que termine.
+    """
+    def startReader(self,target,*args):
+        """
+        Cria e arranca a thread de leitura deste socket.
+
+        Args:
+            target (callable): Função da thread
+            *args: Argumentos da função
+
+        Returns:
+            threading.Thread: Thread de leitura
+        """
+        self.reader = threading.Thread(target=target,args=args,name=f"MissionLink-{self.getsockname()[1]}",daemon=True)
+        self.closing = False
+        self.reader.start()
+        return self.reader
+
+    def close(self):
+        """
+        Fecha o socket, acordando e esperando pela thread de leitura (se houver).
+        """
+        reader = getattr(self,"reader",None)
+        if reader is not None and reader.is_alive() and reader is not threading.current_thread() and self.fileno() >= 0:
+            self.closing = True
+            try:
+                self.sendto(b"",self.getsockname())
+            except OSError:
+                pass
+            reader.join(1.0)
+        super().close()
 
 
 class MissionLink:
@@ -23,22 +141,22 @@ class MissionLink:
     entre a Nave-Mãe e os rovers. Implementa mecanismos de fiabilidade a nível aplicacional
     incluindo handshake, números de sequência, acknowledgments e retransmissão.
     """
-    def __init__(self,serverAddress,storeFolder = "."):
+    def __init__(self,serverAddress,storeFolder = ".",port = 8080):
         """
         Inicializa o protocolo MissionLink.
         
         Args:
             serverAddress (str): Endereço IP do servidor
             storeFolder (str, optional): Pasta onde armazenar ficheiros recebidos. Defaults to "."
+            port (int, optional): Porta UDP local. Defaults to 8080 (outra porta só é útil em testes locais)
         """
         self.serverAddress = serverAddress
-        self.port = 8080
-        self.sock = socket.socket(socket.AF_INET,socket.SOCK_DGRAM)
+        self.port = port
+        self.sock = MissionLinkSocket(socket.AF_INET,socket.SOCK_DGRAM)
         self.server()
         self.limit = Limit.Limit()
         self.sock.settimeout(self.limit.timeout)
-        # Lock para proteger operações críticas do socket (evitar race conditions entre startConnection e acceptConnection)
-        self.sock_lock = threading.Lock()
+        self.setBufferSizes()
         if storeFolder.endswith("/"):
             self.storeFolder = storeFolder
         else:
@@ -75,8 +193,126 @@ class MissionLink:
         self.ackkey = "A"            # ACK: Confirmação de receção
         self.finkey = "F"            # FIN: Fecha conexão
         self.synackkey = "Z"         # SYN-ACK: Resposta ao SYN no handshake
+        self.endkey = "E"            # End: Último chunk de dados de uma mensagem (a sessão continua aberta)
+        self.keepalivekey = "K"      # Keepalive: Mantém viva uma sessão inativa (o peer responde com K)
+        self.resetkey = "X"          # Reset: O peer não conhece a sessão (ex: foi reiniciado)
+        self.filekey = "H"           # Header: Primeiro chunk de um ficheiro (nome, tamanho e tamanho dos chunks)
+        self.paritykey = "C"         # Correção: Paridade XOR de um grupo de chunks (FEC, ver formatParity())
+        # Primeiro byte dos datagramas de dados (e ACKs) que não obrigam a enviar já os ACKs
+        # pendentes de um lote (ver handleDatagrams())
+        self.batchFlags = {key.encode() for key in (self.datakey, self.endkey, self.filekey, self.paritykey, self.ackkey)}
         # Constante para fim de mensagem - melhora manutenibilidade
         self.eofkey = '\0'
+        # Payload do SYN/SYN-ACK quando não há capacidades a negociar (formato antigo)
+        self.nocapkey = "-.-"
+        # Pedido/resposta (capacidade "rpc"): a mensagem começa pelo marcador, o id do pedido
+        # e outra vez o marcador (ver request() e reply()). Numa sessão que negociou "rpc" todas
+        # as mensagens levam marcador, e uma mensagem normal começa por rpcPlainKey: o primeiro
+        # byte do conteúdo nunca é confundido com um marcador. Um peer sem "rpc" recebe a
+        # mensagem tal como foi escrita
+        self.rpcRequestKey = "\x01"
+        self.rpcReplyKey = "\x02"
+        self.rpcPlainKey = "\x03"
+        # Nos dados 0-RTT o id vai nas capacidades do SYN (ignoradas por um peer sem "rpc"),
+        # porque ao enviar o SYN ainda não se sabe se o peer aceita "rpc" (ver formatSyn())
+        self.rpcSynKeys = {self.rpcRequestKey: "req", self.rpcReplyKey: "rep"}
+
+        # ============================================================
+        # CAPACIDADES NEGOCIADAS NO HANDSHAKE
+        # ============================================================
+        # O SYN leva as capacidades do cliente no campo message ("chave=valor;...")
+        # e o SYN-ACK devolve as capacidades aceites pelo servidor.
+        #   - win: janela de envio (chunks em voo) do modo selective-repeat
+        #   - dgram: tamanho máximo dos datagramas (chunks maiores em redes com MTU maior)
+        #   - sack: ACKs cumulativos com mapa de bits dos chunks recebidos fora de ordem
+        #   - early: o SYN leva uma mensagem curta (0-RTT), confirmada pelo SYN-ACK (ver formatSyn())
+        #   - fec: o emissor junta pacotes de paridade aos chunks de dados (ver formatParity())
+        #   - rpc: pedidos com id e respostas encaminhadas para quem fez o pedido (ver request())
+        #   - zlib: mensagens comprimidas com o dicionário zlibDictionary (ver compressMessage())
+        # Um peer que não anuncie uma capacidade fica com o comportamento antigo
+        # (win=1, stop-and-wait; datagramas de Limit.buffersize; um ACK por chunk).
+        # Guardado por peer: (ip, porta) -> dict de capacidades do último handshake. Cada sessão
+        # guarda as do seu próprio handshake e é com essas que envia (ver applyCapabilities())
+        self.peerCaps = dict()
+        # O SYN vai com o tamanho proposto (sonda do caminho): as primeiras probeAttempts
+        # tentativas usam-no, as seguintes recuam para Limit.buffersize
+        self.probeAttempts = 2
+        # Reenvios de um chunk grande sem ACK até se concluir que o caminho não o transporta
+        self.probeRetries = 3
+        # Peers para os quais os datagramas grandes se perderam: (ip, porta) -> instante do recuo
+        self.sizeFallbacks = dict()
+        # SYNs com dados 0-RTT já entregues: (ip, porta, connId, seq) -> instante da entrega.
+        # Um SYN duplicado que chegue depois de a sessão ter sido descartada não volta a
+        # entregar a mensagem (ver deliverEarly())
+        self.earlySeen = collections.OrderedDict()
+        self.earlySeenSize = 4096
+        # Pedidos à espera de resposta (ver request()): id do pedido -> resposta (None até chegar)
+        self.replies = dict()
+        # Pedidos já recebidos (LRU, ver deliverMessage()): (ip, porta, idAgent, id do pedido) ->
+        # resposta enviada (missionType, idMission, mensagem), ou None se ainda não houver.
+        # Um pedido repetido (o emissor reenviou porque o ACK se perdeu) não volta a ir para
+        # recv(): é descartado, ou respondido outra vez com a resposta guardada
+        self.replayCache = collections.OrderedDict()
+        self.replayCacheSize = 4096
+        # Respostas a ser enviadas por reply() (só vão para replayCache depois de entregues):
+        # chave do pedido -> True se o pedido se repetiu entretanto (responde-se no fim)
+        self.replying = dict()
+        self.nextRequestId = random.randint(0,0xFFFFFFFF)
+        # ACKs duplicados (o ACK cumulativo não avança) até reenviar o chunk em falta sem
+        # esperar pelo RTO (fast retransmit, como no TCP)
+        self.dupAckThreshold = 3
+
+        # ============================================================
+        # TEMPORIZAÇÃO DAS RETRANSMISSÕES
+        # ============================================================
+        # Cada peer tem o seu estimador de RTT (RTT suavizado + variância, RFC 6298).
+        # Os reenvios de SYN, SYN-ACK, dados e FIN esperam o RTO calculado em vez de um
+        # timeout fixo, e cada sessão duplica o seu RTO a cada timeout (backoff exponencial).
+        # Guardado por peer: (ip, porta) -> RttEstimator
+        self.rttEstimators = dict()
+
+        # ============================================================
+        # CONTROLO DE CONGESTIONAMENTO
+        # ============================================================
+        # Cada sessão local tem a sua janela de congestionamento (AIMD, ver CongestionControl):
+        # os chunks em voo são limitados pela menor entre ela e a janela negociada com o peer.
+        # Com Limit.pacingRate, todos os envios do endpoint passam por um token bucket
+        # (ver getPacingDelay()), para não encher a fila do uplink numa rajada.
+        self.pacer = None
+        # Com Limit.fec, as sessões locais propõem FEC: cada grupo de chunks de dados leva um
+        # pacote de paridade, com o tamanho do grupo adaptado às perdas da sessão (FecControl)
+
+        # ============================================================
+        # TABELA DE SESSÕES (DESMULTIPLEXAGEM)
+        # ============================================================
+        # Todas as sessões ativas, por (ip, porta, connId). Só a thread de leitura lê o socket
+        # (ver readLoop()) e entrega cada datagrama à sessão a que pertence, por isso várias
+        # transferências decorrem em paralelo na mesma porta sem disputarem o socket.
+        self.sessions = dict()
+        # Sessões locais estabelecidas e sem envio em curso, por (ip, porta, idAgent): reutilizadas
+        # pelo próximo send() para o mesmo peer, sem novo handshake
+        self.idleSessions = dict()
+        # Temporizadores das sessões (retransmissão do SYN-ACK/FIN, keepalives, inatividade),
+        # disparados por runTimers() a cada tick da thread de leitura (ver setTimer())
+        self.timers = TimerWheel.TimerWheel(readerTick)
+        # Protege a tabela de sessões e as filas abaixo. sessionsCond acorda as threads à espera
+        # de mensagens (recv()) ou handshakes (acceptConnection()); cada sessão local tem a sua
+        # condição sobre o mesmo lock (session.ready), para a thread que a conduz só acordar
+        # com os pacotes dessa sessão
+        self.sessionsLock = threading.RLock()
+        self.sessionsCond = threading.Condition(self.sessionsLock)
+        # Thread de leitura: dona do socket, criada na primeira espera (ver waitFor())
+        self.reader = None
+        # ACKs de dados à espera do fim do lote de datagramas em tratamento (None = envio
+        # imediato) e, por sessão, o último deles (ver sendAck())
+        self.ackBatch = None
+        self.ackPending = dict()
+        # Mensagens completas recebidas, pela ordem em que terminaram (consumidas por recv())
+        self.delivered = collections.deque()
+        # Handshakes concluídos de sessões iniciadas pelo peer (consumidos por acceptConnection())
+        self.accepted = collections.deque(maxlen=32)
+        # Reenvios do SYN-ACK/FIN de uma sessão do peer antes de a descartar
+        self.controlRetries = 10
 
     
     def server(self):
@@ -101,45 +337,60 @@ class MissionLink:
         self.sock.bind((self.serverAddress,self.port))
 
 
-    def getHeaderSize(self):
+    def setBufferSizes(self):
+        """
+        Aumenta os buffers de receção e envio do socket para Limit.socketBuffer.
+
+        PORQUÊ:
+        - Com rajadas de muitos rovers ao mesmo tempo, o buffer de receção por omissão
+          (~200 KiB no Linux) enche antes de a thread de leitura o esvaziar: o kernel descarta
+          os datagramas seguintes e cada perda custa uma retransmissão
+        - O kernel limita o valor (net.core.rmem_max/wmem_max): o pedido é um máximo, e
+          um valor recusado mantém o tamanho por omissão
+        """
+        for option in (socket.SO_RCVBUF, socket.SO_SNDBUF):
+            try:
+                self.sock.setsockopt(socket.SOL_SOCKET,option,self.limit.socketBuffer)
+            except OSError as e:
+                print(f"Aviso: não foi possível aumentar o buffer do socket: {e}")
+
+
+    def getHeaderSize(self,idMission = ""):
         """
         Calcula o tamanho do cabeçalho da mensagem do protocolo.
         
         COMO FUNCIONA:
-        - Soma o tamanho de todos os campos do cabeçalho do protocolo
-        - Formato: flag|idMission|seq|ack|size|missionType|message
-        - Cada campo tem tamanho fixo, separados por "|" (1 byte cada)
+        - Parte fixa: struct "!BBHIIHB" (15 bytes, ver `header` no topo do módulo)
+        - Parte variável: os bytes do idMission (o seu tamanho vai no campo idLen)
         
         PORQUÊ:
         - Necessário para calcular quanto espaço sobra para dados úteis
         - Quando enviamos mensagens grandes, precisamos saber quantos bytes podemos enviar por chunk
         - Tamanho útil = buffersize - headerSize
         
+        Args:
+            idMission (str, optional): Identificador que vai no pacote. Defaults to "" (só a parte fixa)
+        
         Returns:
-            int: Tamanho do cabeçalho em bytes (flag + separadores + idMission + seq + ack + size + missionType)
+            int: Tamanho do cabeçalho em bytes
         
         Cálculo detalhado:
             flag: 1 byte (S, Z, A, F, D)
-            |: 1 byte (separador)
-            idMission: 3 bytes (ex: "M01")
-            |: 1 byte
-            seq: 4 bytes (número de sequência)
-            |: 1 byte
-            ack: 4 bytes (acknowledgment)
-            |: 1 byte
-            size: 4 bytes (tamanho da mensagem)
-            |: 1 byte
             missionType: 1 byte (R, T, M, Q, P, N)
-            |: 1 byte
-            Total: 1+1+3+1+4+1+4+1+4+1+1+1 = 23 bytes
+            connId: 2 bytes (identificador da sessão)
+            seq: 4 bytes (número de sequência, inteiro sem sinal)
+            ack: 4 bytes (acknowledgment, inteiro sem sinal)
+            size: 2 bytes (tamanho do payload)
+            idLen: 1 byte (tamanho do idMission)
+            idMission: idLen bytes (ex: 3 para "M01")
+            Total: 15 + len(idMission) bytes (18 para "M01", contra 23 no formato de texto antigo)
         """
-        # flag + | + idMission + | + seq + | + ack + | + size + | + missionType + |
-        return 1 + 1 + 3 + 1 + 4 + 1 + 4 + 1 + 4 + 1 + 1 + 1
+        return header.size + len(idMission.encode())
     
-    def formatMessage(self,missionType,flag,idMission,seqNum,ackNum,message):
+    def formatMessage(self,missionType,flag,idMission,seqNum,ackNum,message,connId = 0):
         """
         Formata uma mensagem segundo o protocolo MissionLink.
-        Formato: flag|idMission|seq|ack|size|missionType|message
+        Formato: cabeçalho binário fixo + idMission + payload (ver `header` no topo do módulo)
         
         NOTA: No handshake, idMission contém temporariamente o ID do rover.
               Nas mensagens de dados, idMission contém o ID da missão.
@@ -188,36 +439,119 @@ class MissionLink:
         Args:
             missionType (str or None): Tipo de operação do protocolo (R=Register, T=Task, M=Metrics, Q=Request, P=Progress) ou None
             flag (str): Flag de controlo (S=SYN, A=ACK, F=FIN, Z=SYN-ACK, D=Data)
-            idMission (str): Identificador da missão (3 caracteres) ou ID do rover no handshake
-            seqNum (int): Número de sequência
-            ackNum (int): Número de acknowledgment
-            message (str): Conteúdo da mensagem (JSON string quando missionType="T", onde o JSON contém o campo "task")
+            idMission (str): Identificador da missão (até 255 bytes) ou ID do rover no handshake
+            seqNum (int): Número de sequência (enviado módulo 2^32)
+            ackNum (int): Número de acknowledgment (enviado módulo 2^32)
+            message (str or bytes): Conteúdo da mensagem (JSON string quando missionType="T", onde o JSON contém o campo "task").
+                                    Bytes/memoryview são enviados tal como estão (sem cópia para string)
+            connId (int, optional): Identificador da sessão (ver `responderBit`). Defaults to 0
             
         Returns:
             bytes: Mensagem formatada e codificada em bytes
+
+        Raises:
+            ValueError: Se idMission tiver mais de 255 bytes ou o payload mais de 65535 bytes
         """
+        if isinstance(message, str):
+            message = message.encode()
+        idBytes = str(idMission).encode()
+        if len(idBytes) > 255:
+            raise ValueError(f"idMission demasiado longo ({len(idBytes)} bytes, máximo 255)")
+        if len(message) > 0xFFFF:
+            raise ValueError(f"Payload demasiado grande ({len(message)} bytes, máximo 65535)")
         # Bug fix: Quando missionType=None, codificar como "N" apenas para ACKs/FINs
         #          Para mensagens de dados, preservar o missionType original passado ao send()
         #          Isto garante que quando o servidor envia missões com taskRequest ("T"),
         #          o rover recebe "T" em vez de "N", permitindo roteamento correto do protocolo
-        if missionType != None: 
-            return f"{flag}|{idMission}|{seqNum}|{ackNum}|{len(message)}|{missionType}|{message}".encode()
-        # missionType=None é usado apenas para ACKs/FINs, codificar como "N"
-        return f"{flag}|{idMission}|{seqNum}|{ackNum}|{len(message)}|N|{message}".encode()
+        if missionType == None:
+            missionType = self.noneType
+        return b"".join((
+            header.pack(ord(flag),ord(missionType),connId,seqNum & seqMask,ackNum & seqMask,len(message),len(idBytes)),
+            idBytes,
+            message
+        ))
+
+    def parseMessage(self,data):
+        """
+        Descodifica um datagrama do protocolo MissionLink (inverso de formatMessage()).
+
+        COMO FUNCIONA:
+        - Lê a parte fixa do cabeçalho com struct.unpack_from() diretamente sobre um memoryview
+        - flag e missionType passam a str de um carácter (chr() de um byte ASCII, sem alocação)
+        - O payload é devolvido como memoryview sobre o datagrama recebido (sem cópia)
+        - Datagramas truncados ou com tamanho inconsistente são rejeitados
+
+        PORQUÊ:
+        - O formato de texto obrigava a decode() + split("|") em cada pacote
+        - Um payload com "|" partia o pacote em mais de 7 campos e era rejeitado
+
+        Args:
+            data (bytes): Datagrama recebido
+
+        Returns:
+            list or None: [flag,idMission,seq,ack,size,missionType,message,connId] (usar flagPos, idMissionPos, ...),
+                          ou None se o datagrama for inválido
+        """
+        view = memoryview(data)
+        if len(view) < header.size:
+            return None
+        flag,missionType,connId,seqNum,ackNum,size,idLen = header.unpack_from(view)
+        start = header.size + idLen
+        if len(view) != start + size:
+            return None
+        idMission = str(view[header.size:start],"utf-8","replace")
+        return [chr(flag),idMission,seqNum,ackNum,size,chr(missionType),view[start:],connId]
         
 
-    def splitMessage(self,message):
+    def seqDistance(self,seq,reference):
+        """
+        Distância entre dois números de sequência em aritmética de números de série (RFC 1982).
+
+        COMO FUNCIONA:
+        - A diferença é calculada módulo 2^32 e interpretada com sinal: um seq até 2^31 à
+          frente de reference dá uma distância positiva, até 2^31 atrás dá uma negativa
+        - Por isso 5 está 11 à frente de 2^32 - 6 (o contador deu a volta)
+
+        Args:
+            seq (int): Número de sequência (do cabeçalho ou completo)
+            reference (int): Número de sequência de referência
+
+        Returns:
+            int: Distância com sinal de reference até seq
+        """
+        distance = (seq - reference) & seqMask
+        if distance >= seqModulus >> 1:
+            distance -= seqModulus
+        return distance
+
+    def unwrapSeq(self,seq,reference):
+        """
+        Recupera o número de sequência completo de um valor do cabeçalho (32 bits),
+        escolhendo o mais próximo de reference (ex: o último seq entregue da sessão).
+
+        Args:
+            seq (int): Número de sequência recebido (módulo 2^32)
+            reference (int): Número de sequência completo de referência
+
+        Returns:
+            int: Número de sequência completo
+        """
+        return reference + self.seqDistance(seq,reference)
+
+
+    def splitMessage(self,message,idMission = "",datagramSize = None):
         """
         Divide uma mensagem em chunks se exceder o tamanho máximo do buffer.
         
         COMO FUNCIONA:
-        - Calcula o tamanho máximo útil (buffersize - headerSize)
+        - Calcula o tamanho máximo útil (datagramSize - headerSize; por omissão buffersize - headerSize)
         - Se a mensagem for maior, divide em pedaços (chunks) desse tamanho
         - Se couber num pacote, retorna a mensagem original como string
         - Se não couber, retorna uma lista de strings (chunks)
         
         PORQUÊ:
-        - UDP tem limite de tamanho de pacote (geralmente 65507 bytes, mas usamos 1024)
+        - UDP tem limite de tamanho de pacote (65507 bytes, mas sem fragmentação IP só cabe o MTU
+          do caminho: por isso o tamanho usado é negociado no handshake, ver openSession())
         - Mensagens grandes precisam ser fragmentadas em múltiplos pacotes
         - Cada chunk será enviado separadamente e reconstruído no destino
         
@@ -225,14 +559,21 @@ class MissionLink:
             Mensagem de 2500 bytes, buffer útil = 1000 bytes
             Retorna: ["bytes 0-999", "bytes 1000-1999", "bytes 2000-2499"]
         
+        NOTA: O send() passa a mensagem já codificada como memoryview, por isso os chunks
+              são fatias do mesmo buffer (sem cópias) e o tamanho é contado em bytes.
+        
         Args:
-            message (str): Mensagem a dividir
+            message (str, bytes or memoryview): Mensagem a dividir
+            idMission (str, optional): Identificador que vai no cabeçalho (conta para o tamanho). Defaults to ""
+            datagramSize (int, optional): Tamanho máximo do datagrama. Defaults to None (Limit.buffersize)
             
         Returns:
             str or list: Mensagem original se couber num pacote, ou lista de chunks
         """
-        # Calcula tamanho máximo útil (tamanho total do buffer menos o cabeçalho)
-        max_useful_size = self.limit.buffersize - self.getHeaderSize()
+        if datagramSize is None:
+            datagramSize = self.limit.buffersize
+        # Calcula tamanho máximo útil (tamanho total do datagrama menos o cabeçalho)
+        max_useful_size = datagramSize - self.getHeaderSize(idMission)
         
         # Se a mensagem for maior que o tamanho útil, divide em chunks
         if len(message) > max_useful_size:
@@ -245,757 +586,2568 @@ class MissionLink:
             return message
 
 
-    def startConnection(self, idAgent, destAddress, destPort, retryLimit=5):
+    def formatCapabilities(self,capabilities):
         """
-        Inicia uma conexão com handshake de 3 vias (SYN, SYN-ACK, ACK).
-        Implementa mecanismo de fiabilidade sobre UDP.
-        
-        NOTA: No handshake, o campo idMission é usado temporariamente para enviar o ID do rover.
-              A Nave-Mãe guarda o mapeamento (IP, porta) -> ID do rover.
-        
+        Codifica as capacidades a anunciar no payload do SYN/SYN-ACK.
+
+        Formato: "chave=valor;chave=valor" (ex: "win=8").
+        Sem capacidades, usa o payload antigo ("-.-").
+
         Args:
-            idAgent (str): Identificador do agente/rover (3 caracteres)
-            destAddress (str): Endereço IP do destino
-            destPort (int): Porta do destino
-            retryLimit (int, optional): Número máximo de tentativas. Defaults to 5
-            
+            capabilities (dict): Capacidades a anunciar
+
         Returns:
-            tuple: ((destAddress, destPort), idAgent, seq, ack) - Informação da conexão estabelecida
-            
-        Raises:
-            TimeoutError: Se não conseguir estabelecer conexão após múltiplas tentativas
+            str: Payload do SYN/SYN-ACK
         """
-        seqinicial = 100
-        retries = 0
-        
-        while retries < retryLimit:
-            try:
-                # Send SYN - no handshake, idMission contém o ID do rover
-                self.sock.sendto(
-                    f"{self.synkey}|{idAgent}|{seqinicial}|0|_|0|-.-".encode(),
-                    (destAddress, destPort)
-                )
-                try:
-                    # Aguardar um pouco antes de receber para dar tempo ao servidor enviar SYN-ACK
-                    time.sleep(0.3)
-                    # Usar lock para evitar que acceptConnection() consuma o SYN-ACK
-                    synack_received = False
-                    synack_retries = 0
-                    max_synack_retries = 10  # Aguardar até 10 tentativas de receber SYN-ACK
-                    
-                    while not synack_received and synack_retries < max_synack_retries:
-                        try:
-                            with self.sock_lock:
-                                # Timeout aumentado para dar mais tempo ao servidor responder
-                                original_timeout_inner = self.sock.gettimeout()
-                                self.sock.settimeout(3.0)  # Timeout de 3s para receber SYN-ACK
-                                try:
-                                    message, (recv_ip, recv_port) = self.sock.recvfrom(self.limit.buffersize)
-                                finally:
-                                    self.sock.settimeout(original_timeout_inner)
-                            
-                            lista = message.decode().split("|")
-                            if len(lista) < 7:
-                                synack_retries += 1
-                                # Reenviar SYN se não recebeu resposta válida
-                                if synack_retries % 3 == 0:  # Reenviar a cada 3 tentativas
-                                    self.sock.sendto(
-                                        f"{self.synkey}|{idAgent}|{seqinicial}|0|_|0|-.-".encode(),
-                                        (destAddress, destPort)
-                                    )
-                                time.sleep(0.5)
-                                continue
-                            
-                            # Verificar se o pacote veio do destino correto
-                            if recv_ip != destAddress or recv_port != destPort:
-                                synack_retries += 1
-                                time.sleep(0.2)
-                                continue  # Continuar a aguardar sem incrementar retries principais
-                            
-                            # Verificar se recebeu SYN-ACK válido
-                            if lista[flagPos] == self.synackkey:
-                                synack_received = True
-                                break
-                            else:
-                                # Recebeu outro tipo de pacote, continuar a aguardar
-                                synack_retries += 1
-                                time.sleep(0.2)
-                                continue
-                                
-                        except socket.timeout:
-                            synack_retries += 1
-                            # Reenviar SYN periodicamente
-                            if synack_retries % 2 == 0:  # Reenviar a cada 2 timeouts
-                                self.sock.sendto(
-                                    f"{self.synkey}|{idAgent}|{seqinicial}|0|_|0|-.-".encode(),
-                                    (destAddress, destPort)
-                                )
-                            time.sleep(0.3)
-                            continue
-                        except Exception:
-                            synack_retries += 1
-                            time.sleep(0.3)
-                            continue
-                    
-                    # Se não recebeu SYN-ACK após múltiplas tentativas, incrementar retry principal
-                    if not synack_received:
-                        retries += 1
-                        if retries >= retryLimit:
-                            break
-                        continue
-
-                except socket.timeout:
-                    retries += 1
-                    if retries >= retryLimit:
-                        break
-                    continue
-                except Exception:
-                    retries += 1
-                    if retries >= retryLimit:
-                        break
-                    continue
+        if not capabilities:
+            return self.nocapkey
+        return ";".join(f"{key}={value}" for key,value in capabilities.items())
 
-                # Send ACK
-                self.sock.sendto(
-                    f"{self.ackkey}|{idAgent}|{seqinicial}|{seqinicial}|_|0|-.-".encode(),
-                    (destAddress, destPort)
-                )
-                return  (destAddress,destPort),idAgent,seqinicial + 1,seqinicial + 1 # Handshake successful
+    def parseCapabilities(self,text):
+        """
+        Descodifica o payload de um SYN/SYN-ACK (inverso de formatCapabilities()).
+        Entradas que não estejam no formato chave=valor são ignoradas, por isso o
+        payload antigo ("-.-") dá um dicionário vazio.
 
-            
-        
-            except socket.timeout:
-                retries += 1
-            except Exception:
-                retries += 1
-        
-        error_msg = f"Falha ao estabelecer conexão com {destAddress}:{destPort} após {retryLimit} tentativas"
-        raise TimeoutError(error_msg)
+        Args:
+            text (str, bytes or memoryview): Payload do SYN/SYN-ACK
 
+        Returns:
+            dict: Capacidades anunciadas pelo peer (valores em string)
+        """
+        if not isinstance(text, str):
+            text = str(text,"utf-8","replace")
+        capabilities = dict()
+        for item in text.split(";"):
+            key,sep,value = item.partition("=")
+            if sep:
+                capabilities[key] = value
+        return capabilities
 
-    def acceptConnection(self):
+    def negotiateCapabilities(self,offered):
         """
-        Aceita uma conexão recebendo um pedido SYN e respondendo com handshake de 3 vias.
-        Deve ser executado pelo servidor (Nave-Mãe).
-        
-        NOTA: No handshake, o campo idMission contém temporariamente o ID do rover.
-              O servidor deve guardar o mapeamento (IP, porta) -> ID do rover.
-        
+        Escolhe as capacidades a aceitar a partir das oferecidas num SYN (lado do servidor).
+
+        COMO FUNCIONA:
+        - win: usa a menor das duas janelas (a do cliente e a local)
+        - dgram: usa o menor dos dois tamanhos de datagrama (o proposto pelo cliente, que já
+          chegou até aqui no próprio SYN, e Limit.maxDatagramSize local)
+        - sack: aceite se o cliente o propuser (ACKs cumulativos com mapa de bits)
+        - early: aceite se o SYN trouxer dados 0-RTT (a mensagem é entregue com o SYN)
+        - fec: aceite se o cliente o propuser (o recetor reconstrói chunks com a paridade)
+        - rpc: aceite se o cliente o propuser (pedidos e respostas correlacionados)
+        - zlib: aceite se o cliente propuser a mesma versão do dicionário (zlibVersion) e
+          Limit.compression estiver ligado
+        - Capacidades desconhecidas ou ausentes não são devolvidas, e o peer
+          fica com o comportamento antigo
+
+        Args:
+            offered (dict): Capacidades recebidas no SYN
+
         Returns:
-            tuple: ((ip, port), idAgent, seq, ack) - Informação da conexão estabelecida
-                - ip (str): Endereço IP do cliente
-                - port (int): Porta do cliente
-                - idAgent (str): Identificador do agente/rover (extraído de idMission no handshake)
-                - seq (int): Número de sequência inicial
-                - ack (int): Número de acknowledgment inicial (igual a seq)
+            dict: Capacidades aceites (enviadas no SYN-ACK)
         """
-        # RECEBER O SYN
-        # NOTA: Usar lock APENAS durante recvfrom() para evitar race conditions
-        #       Mas libertar lock imediatamente após receber pacote para dar oportunidade ao startConnection()
-        original_timeout = self.sock.gettimeout()
-        self.sock.settimeout(1.0)  # Timeout de 1s para dar mais oportunidades ao startConnection()
-        
-        while True:
-            try:
-                # Usar lock APENAS durante recvfrom(), não durante todo o processamento
-                with self.sock_lock:
-                    message,(ip,port) = self.sock.recvfrom(self.limit.buffersize)
-                # Lock libertado aqui - startConnection() pode agora receber pacotes
-                
-                lista = message.decode().split("|")
-                if len(lista) < 7:
-                    continue
-                flag = lista[flagPos]
-                if flag == self.synkey:
-                    # Restaurar timeout original antes de continuar
-                    self.sock.settimeout(original_timeout)
-                    break
-                elif flag == self.synackkey:
-                    # SYN-ACK é para startConnection(), não para acceptConnection()
-                    # Delay maior para dar tempo ao startConnection() de receber o próximo SYN-ACK do servidor
-                    time.sleep(1.0)
-                    continue
-                else:
-                    continue
-            except socket.timeout:
-                # Timeout é normal - lock já foi libertado, então startConnection() pode receber SYN-ACK
-                time.sleep(0.1)
-                continue
-        
-        # Restaurar timeout original
-        self.sock.settimeout(original_timeout)
-        # No handshake, idMission contém o ID do rover
-        idAgent = lista[idMissionPos]
-        # ENVIAR SYNACK 
-        lista[flagPos] = self.synackkey
-        prevLista = lista.copy()
-        self.sock.sendto("|".join(lista).encode(),(ip,port))
-        # RECEBER ACK
-        ack_retries = 0
-        max_ack_retries = 10
-        while ack_retries < max_ack_retries:
-            try:
-                # Usar lock para evitar race conditions
-                with self.sock_lock:
-                    message, (recv_ip, recv_port) = self.sock.recvfrom(self.limit.buffersize)
-                # Verificar se o pacote veio do cliente correto
-                if recv_ip != ip or recv_port != port:
-                    ack_retries += 1
-                    time.sleep(0.1)
-                    continue
-                lista = message.decode().split("|")
-                if len(lista) < 7:
-                    self.sock.sendto("|".join(prevLista).encode(),(ip,port))
-                    ack_retries += 1
-                    time.sleep(0.1)
-                    continue
-                if (lista[flagPos] == self.ackkey and 
-                lista[idMissionPos] == idAgent and 
-                lista[ackPos] == lista[seqPos]):
-                    return (ip,port),idAgent,int(lista[seqPos]),int(lista[ackPos])
-                else:
-                    self.sock.sendto("|".join(prevLista).encode(),(ip,port))
-                    ack_retries += 1
-                    time.sleep(0.1)
-            except socket.timeout:
-                self.sock.sendto("|".join(prevLista).encode(),(ip,port))
-                ack_retries += 1
-            except Exception:
-                self.sock.sendto("|".join(prevLista).encode(),(ip,port))
-                ack_retries += 1
+        accepted = dict()
+        try:
+            if "win" in offered:
+                accepted["win"] = max(1, min(int(offered["win"]), self.limit.windowSize))
+        except ValueError:
+            pass
+        try:
+            if "dgram" in offered:
+                accepted["dgram"] = max(minDatagramSize, min(int(offered["dgram"]), self.limit.maxDatagramSize))
+        except ValueError:
+            pass
+        if offered.get("sack") == "1":
+            accepted["sack"] = 1
+        if offered.get("early") == "1":
+            accepted["early"] = 1
+        if offered.get("fec") == "1":
+            accepted["fec"] = 1
+        if offered.get("rpc") == "1":
+            accepted["rpc"] = 1
+        if self.limit.compression and offered.get("zlib") == str(zlibVersion):
+            accepted["zlib"] = zlibVersion
+        return accepted
 
-        
-        
-    def send(self,ip,port,missionType,idAgent,idMission,message):
+    def readCapabilities(self,capabilities):
         """
-        Envia uma mensagem ou ficheiro através do protocolo MissionLink.
-        Estabelece conexão, envia dados com confirmação e fecha conexão.
-        
+        Interpreta as capacidades negociadas num handshake (valores inválidos ou ausentes dão
+        o comportamento antigo).
+
         Args:
-            ip (str): Endereço IP do destinatário
-            port (int): Porta do destinatário
-            missionType (str): Tipo de missão/operação (R=Register, T=Task, M=Metrics, Q=Request, P=Progress)
-            idAgent (str): Identificador do agente/rover (usado apenas no handshake)
-            idMission (str): Identificador da missão (3 caracteres, "000" se não aplicável)
-            message (str): Mensagem ou caminho do ficheiro a enviar
-            
+            capabilities (dict): Capacidades aceites (SYN-ACK recebido ou enviado)
+
         Returns:
-            bool: True se a mensagem foi enviada com sucesso
+            dict: window (int, 1 = stop-and-wait), datagramSize (int, Limit.buffersize sem "dgram"),
+                  sack, fec, rpc, zlib, early (bool)
         """
-        # Bug fix: Garantir que message é string antes de chamar métodos de string
-        if not isinstance(message, str):
-            message = str(message)
-        
-        # The connection starts with an handshake to assure it has a somewhat reliable 
-        # transfers between the client and the server 
-        _,idAgent,seq,ack = self.startConnection(idAgent,ip,port)
+        try:
+            window = max(1, int(capabilities.get("win", 1)))
+        except ValueError:
+            window = 1
+        try:
+            datagramSize = max(minDatagramSize, int(capabilities.get("dgram", self.limit.buffersize)))
+        except ValueError:
+            datagramSize = self.limit.buffersize
+        return {
+            "window": window,
+            "datagramSize": datagramSize,
+            "sack": capabilities.get("sack") in (1, "1"),
+            "fec": capabilities.get("fec") in (1, "1"),
+            "rpc": capabilities.get("rpc") in (1, "1"),
+            "zlib": str(capabilities.get("zlib")) == str(zlibVersion),
+            "early": capabilities.get("early") in (1, "1"),
+        }
 
-        if message.endswith(".json"):
-            # First cycle is to send the filename
-            while True:
-                self.sock.sendto(self.formatMessage(missionType,self.datakey,idMission,seq,ack,message),(ip,port))
-                try:
-                    text,(responseIp,responsePort) = self.sock.recvfrom(self.limit.buffersize)
-                    lista = text.decode().split("|")
-                    # Validar formato da mensagem
-                    if len(lista) < 7:
-                        # Mensagem malformada - retransmitir nome do ficheiro
-                        continue
-                    if(
-                        responseIp == ip and
-                        responsePort == port and
-                        lista[flagPos] == self.ackkey and
-                        lista[ackPos] == str(seq) and
-                        lista[idMissionPos] == idMission  # Validação de segurança: verifica idMission
-                    ):
-                        seq += 1
-                        ack = seq
-                        print("File name sent")
-                        break
-                except socket.timeout:
-                    # Timeout ao aguardar ACK - retransmitir nome do ficheiro
-                    continue
-                except Exception as e:
-                    print(f"Erro ao aguardar ACK do nome do ficheiro: {e}")
-                    continue
+    def applyCapabilities(self,session,capabilities):
+        """
+        Guarda numa sessão as capacidades negociadas no seu handshake, e em peerCaps como as
+        últimas negociadas com o peer. Chamado com sessionsCond adquirido.
 
-            with open(message,"r") as file:
-                buffer = file.read(self.limit.buffersize-self.getHeaderSize())
-                i = 1
-                while buffer:
-                    i+=1
-                    self.sock.sendto(self.formatMessage(missionType,self.datakey,idMission,seq,ack,buffer),(ip,port))
-                    try:
-                        text,(responseIp,responsePort) = self.sock.recvfrom(self.limit.buffersize)
-                        lista = text.decode().split("|")
-                        # Bug fix: Validar formato da mensagem antes de aceder a índices
-                        if len(lista) < 7:
-                            # Mensagem malformada - retransmitir chunk
-                            self.sock.sendto(self.formatMessage(missionType,self.datakey,idMission,seq,ack,buffer),(ip,port))
-                            continue
-                        if(
-                            responseIp == ip and
-                            responsePort == port and
-                            lista[flagPos] == self.ackkey and
-                            lista[ackPos] == str(seq) and
-                            lista[idMissionPos] == idMission  # Validação de segurança: verifica idMission
-                        ):
-                            seq += 1
-                            ack = seq
-                            buffer = file.read(self.limit.buffersize - self.getHeaderSize())
-                    except socket.timeout:
-                        # Retransmitir chunk em caso de timeout
-                        self.sock.sendto(self.formatMessage(missionType,self.datakey,idMission,seq,ack,buffer),(ip,port))
-                        continue
-            # Incrementar seq antes de enviar FIN para garantir número de sequência diferente
-            # Evita ambiguidade entre último chunk e FIN
-            seq += 1
-            ack = seq
-            self.sock.sendto(self.formatMessage(None,self.finkey,idMission,seq,ack,self.eofkey),(ip,port))
-            while True:
-                try:
-                    text,(responseIp,responsePort) = self.sock.recvfrom(self.limit.buffersize)
-                    lista = text.decode().split("|")
-                    # Validação do pacote FIN recebido
-                    if(
-                        len(lista) == 7 and
-                        responseIp == ip and
-                        responsePort == port and
-                        lista[ackPos] == str(seq) and
-                        lista[flagPos] == self.finkey and
-                        lista[idMissionPos] == idMission  # Validação de segurança: verifica idMission
-                    ):
-                        seq += 1
-                        ack = seq
-                        # Confirmação FIN recebida corretamente
-                        self.sock.sendto(self.formatMessage(None,self.ackkey,idMission,seq,ack,self.eofkey),(ip,port))
-                        return True
-                except socket.timeout:
-                    self.sock.sendto(self.formatMessage(None,self.finkey,idMission,seq,ack,self.eofkey),(ip,port))
-                    
+        PORQUÊ:
+        - Cada envio usa as capacidades da própria sessão: um handshake em curso com o mesmo
+          peer (noutra thread ou no sentido inverso) não as muda a meio de uma mensagem
+        - peerCaps só serve para decidir o que pôr no SYN de uma sessão nova (ex: comprimir
+          os dados 0-RTT) e para consulta (getPeerWindow(), ...)
 
-        else:
-            chunks = self.splitMessage(message)
-
-            # If chunks is a string, only a packet with data is sent
-            # The next one is a connection closing one
-            if isinstance(chunks,str):
-                self.sock.sendto(self.formatMessage(missionType,self.datakey,idMission,seq,ack,chunks),(ip,port))
-                while True: 
-                    try:
-                        # Usar lock para evitar que acceptConnection() consuma o ACK
-                        with self.sock_lock:
-                            text,(responseIp,responsePort) = self.sock.recvfrom(self.limit.buffersize)
-                        lista = text.decode().split("|")
-                        # Bug fix: Validar formato da mensagem antes de aceder a índices
-                        if len(lista) < 7:
-                            # Mensagem malformada - retransmitir mensagem
-                            self.sock.sendto(self.formatMessage(missionType,self.datakey,idMission,seq,ack,chunks),(ip,port))
-                            continue
-                        if (responseIp == ip and
-                            responsePort == port and
-                            lista[ackPos] == str(seq) and 
-                            lista[flagPos] == self.ackkey and
-                            lista[idMissionPos] == idMission  # Validação de segurança: verifica idMission
-                            ):
-                            seq += 1
-                            ack = seq
-                            self.sock.sendto(self.formatMessage(None,self.finkey,idMission,seq,ack,self.eofkey),(ip,port))
-                            # Fechamento bidirecional completo (4-way handshake)
-                            # Aguarda ACK do FIN enviado OU FIN do outro lado
-                            while True:
-                                try:
-                                    # Usar lock para evitar que acceptConnection() consuma pacotes
-                                    with self.sock_lock:
-                                        text,(responseIp,responsePort) = self.sock.recvfrom(self.limit.buffersize)
-                                    lista = text.decode().split("|")
-                                    # Validar formato da mensagem
-                                    if len(lista) < 7:
-                                        # Mensagem malformada - reenviar FIN
-                                        self.sock.sendto(self.formatMessage(None,self.finkey,idMission,seq,ack,self.eofkey),(ip,port))
-                                        continue
-                                    if (
-                                        responseIp == ip and
-                                        responsePort == port and
-                                        len(lista) == 7 and
-                                        lista[idMissionPos] == idMission
-                                    ):
-                                        if lista[flagPos] == self.finkey:
-                                            # Recebeu FIN do outro lado - responder com ACK e terminar
-                                            # Bug fix: Deve reconhecer o número de sequência do FIN recebido (lista[seqPos])
-                                            #          e incrementar o nosso próprio seq para o próximo pacote
-                                            seq += 1
-                                            ack = int(lista[seqPos])  # Reconhecer o seq do FIN recebido
-                                            self.sock.sendto(self.formatMessage(None,self.ackkey,idMission,seq,ack,self.eofkey),(ip,port))
-                                            return True
-                                        elif (lista[flagPos] == self.ackkey and 
-                                              lista[ackPos] == str(seq) and
-                                              lista[idMissionPos] == idMission):  # Validação de segurança: verifica idMission
-                                            # Recebeu ACK do FIN enviado - agora esperar FIN do outro lado
-                                            # Continuar loop para aguardar FIN
-                                            continue
-                                except socket.timeout:
-                                    # Reenvia FIN se timeout (pode ser que o outro lado ainda não recebeu)
-                                    self.sock.sendto(self.formatMessage(None,self.finkey,idMission,seq,ack,self.eofkey),(ip,port))
-                                    continue
-                                except Exception as e:
-                                    print(f"Erro ao aguardar resposta FIN: {e}")
-                                    # Reenviar FIN
-                                    self.sock.sendto(self.formatMessage(None,self.finkey,idMission,seq,ack,self.eofkey),(ip,port))
-                                    continue
-                        continue
-                    except socket.timeout:
-                        # Timeout ao aguardar ACK - retransmitir mensagem
-                        self.sock.sendto(self.formatMessage(missionType,self.datakey,idMission,seq,ack,chunks),(ip,port))
-                        continue
-                    except Exception as e:
-                        print(f"Erro ao aguardar ACK: {e}")
-                        # Retransmitir mensagem
-                        self.sock.sendto(self.formatMessage(missionType,self.datakey,idMission,seq,ack,chunks),(ip,port))
-                        continue
-            # In case the message is big enough, 
-            # we must send each element of the list
-            i = 0
-            while i != len(chunks):
-                self.sock.sendto(self.formatMessage(missionType,self.datakey,idMission,seq,ack,chunks[i]),(ip,port))
-                try:
-                    response,(responseIp,responsePort) = self.sock.recvfrom(self.limit.buffersize)
-                    lista = response.decode().split("|")
-                    if(
-                        len(lista) == 7 and
-                        responseIp == ip and
-                        responsePort == port and
-                        lista[ackPos] == str(seq) and 
-                        lista[flagPos] == self.ackkey and
-                        lista[idMissionPos] == idMission  # Validação de segurança: verifica idMission
-                    ):
-                        seq += 1
-                        ack = seq
-                        i += 1
-                        continue
-                except socket.timeout:
-                    # Timeout ao aguardar ACK - retransmitir chunk
-                    self.sock.sendto(self.formatMessage(missionType,self.datakey,idMission,seq,ack,chunks[i]),(ip,port))
-                    continue
-                except Exception as e:
-                    print(f"Erro ao receber ACK do chunk: {e}")
-                    # Retransmitir chunk
-                    self.sock.sendto(self.formatMessage(missionType,self.datakey,idMission,seq,ack,chunks[i]),(ip,port))
-                    continue
-            self.sock.sendto(self.formatMessage(None,self.finkey,idMission,seq,ack,self.eofkey),(ip,port))
-            while True:
-                try:
-                    text,(responseIp,responsePort) = self.sock.recvfrom(self.limit.buffersize)
-                    lista = text.decode().split("|")
-                    # Validar formato da mensagem
-                    if len(lista) < 7:
-                        # Mensagem malformada - reenviar FIN
-                        self.sock.sendto(self.formatMessage(None,self.finkey,idMission,seq,ack,self.eofkey),(ip,port))
-                        continue
-                    if(
-                        responseIp == ip and
-                        responsePort == port and
-                        lista[ackPos] == str(seq) and
-                        lista[flagPos] == self.finkey and
-                        lista[idMissionPos] == idMission  # Validação de segurança: verifica idMission
-                    ):
-                        return True                  
-                # Bug fix: Socket operations raise socket.timeout, not TimeoutError
-                #          Todos os outros timeout handlers neste ficheiro usam socket.timeout corretamente
-                #          (linhas 238, 257, 325, 383, etc.). Esta inconsistência significa que timeouts
-                #          durante a troca de FIN não serão tratados, causando exceções não tratadas
-                #          e falhas de conexão em vez de retransmitir o pacote FIN
-                except socket.timeout:
-                    self.sock.sendto(self.formatMessage(None,self.finkey,idMission,seq,ack,self.eofkey),(ip,port))
-                    
-                
+        Args:
+            session (Session): Sessão do handshake
+            capabilities (dict): Capacidades aceites (SYN-ACK recebido ou enviado)
+        """
+        self.peerCaps[(session.ip,session.port)] = capabilities
+        for name,value in self.readCapabilities(capabilities).items():
+            setattr(session,name,value)
 
+    def getPeerCaps(self,ip,port):
+        """
+        Args:
+            ip (str): Endereço IP do peer
+            port (int): Porta do peer
 
+        Returns:
+            dict: Cópia das capacidades do último handshake com o peer (vazio se não houve nenhum)
+        """
+        with self.sessionsLock:
+            return dict(self.peerCaps.get((ip,port), {}))
 
-    # Method to receive messages/files
-    # Will either return the message or the name of the transfered file
-    # along with the agent ID 
-    def recv(self):
+    def getPeerWindow(self,ip,port):
         """
-        Returns a list with 5 items by order
-            - 0 - idAgent (ID do rover)
-            - 1 - idMission (ID da missão)
-            - 2 - missionType (tipo de missão/operação)
-            - 3 - file name or the message in string
-            - 4 - ip address
+        Devolve a janela negociada no último handshake com um peer (1 = stop-and-wait).
+
+        Returns:
+            int: Número máximo de chunks em voo
         """
-        message = ""
-        # Establish connection, com timeout total de ~10s para não ficar infinito
-        start_wait = time.time()
-        while True:
-            try:
-                (ipDest,portDest),idAgent,seq,ack = self.acceptConnection()
-                break
-            except socket.timeout:
-                elapsed = time.time() - start_wait
-                if elapsed >= 10:
-                    raise TimeoutError("MissionLink: sem ligação após 10s à espera de SYN")
-                continue
-            except Exception as e:
-                elapsed = time.time() - start_wait
-                if elapsed >= 10:
-                    raise TimeoutError(f"MissionLink: sem ligação após 10s ({e})")
-                continue
-        idMission = None  # Será extraído da primeira mensagem
+        return self.readCapabilities(self.getPeerCaps(ip,port))["window"]
 
-        fileName = None
-        missionType = ""
+    def getPeerSack(self,ip,port):
+        """
+        Indica se o último handshake com um peer negociou ACKs cumulativos com mapa de bits ("sack").
 
-        # We get the first message with data to know if it is a message or a file 
-        firstMessage = None
-        while firstMessage == None:
-            try:
-                # Usar lock para evitar race conditions com send()
-                with self.sock_lock:
-                    firstMessage,(ip,port) = self.sock.recvfrom(self.limit.buffersize)
-                lista = firstMessage.decode().split("|")
-                # Validar formato da mensagem
-                if len(lista) < 7:
-                    # Mensagem malformada - ignorar e continuar
-                    firstMessage = None
-                    continue
-                # Bug fix: Extrair idMission apenas quando a validação de IP/porta/seq passar
-                #          Se extrairmos idMission de uma mensagem com formato válido mas IP/porta/seq incorretos,
-                #          podemos extrair o idMission errado de um emissor diferente, causando rejeição de mensagens válidas
-                #          Solução: Extrair idMission apenas quando a validação completa passar (IP/porta/seq corretos)
-                #          Isto garante que idMission seja sempre do emissor correto
-                if (
-                    ip == ipDest and 
-                    port == portDest and
-                    lista[seqPos] == str(seq + 1)
-                ):
-                    # Extrair idMission apenas quando validação completa passar
-                    if idMission is None:
-                        idMission = lista[idMissionPos]  # Extrai idMission da primeira mensagem válida
-                    # Bug fix: missionType deve ser atualizado sempre que uma mensagem válida é recebida
-                    #          Se a primeira mensagem falhar na validação (linhas 615-619), missionType permanece ""
-                    #          e quando o método retorna (linha 727 ou 816), passa "" em vez do tipo de mensagem real
-                    #          causando identificação incorreta do tipo de mensagem no código de chamada
-                    #          (ex: if lista[2] == self.missionLink.taskRequest falhará mesmo que uma mensagem tenha sido recebida)
-                    #          Solução: missionType é atualizado aqui quando uma mensagem válida é finalmente recebida
-                    missionType = lista[missionTypePos]
-                    seq += 1
-                    ack = seq
-                    if lista[messagePos].endswith(".json"):
-                        # É um ficheiro
-                        fileName = lista[messagePos]
-                    else:
-                        # É uma mensagem
-                        firstMessage = lista[messagePos]
-                    self.sock.sendto(self.formatMessage(None,self.ackkey,idMission,seq,ack,self.eofkey),(ip,port))
-                    break
-                else:
-                    # Bug fix: Se validação falhar, resetar firstMessage para None
-                    #          mas NÃO resetar missionType - ele será atualizado quando uma mensagem válida for recebida
-                    #          O problema é que missionType permanece "" se a primeira mensagem falhar,
-                    #          mas isso é correto porque ainda não recebemos uma mensagem válida
-                    firstMessage = None
-            except socket.timeout:
-                firstMessage = None
-                continue
-            except Exception as e:
-                print(f"Erro ao receber primeira mensagem: {e}")
-                firstMessage = None
-                continue
+        Returns:
+            bool: True se os ACKs são cumulativos (ver formatDataAck())
+        """
+        return self.readCapabilities(self.getPeerCaps(ip,port))["sack"]
 
-        # firstMessage pode ser string (mensagem), None (ficheiro), ou bytes (se validação falhou)
-        # Bug fix: Garantir que prevMessage é sempre string ou None, nunca bytes
-        # Se for string, usar como prevMessage; se for None ou bytes, prevMessage será None
-        # NOTA: Se fileName foi definido, firstMessage será None (é ficheiro, não mensagem)
-        if isinstance(firstMessage, str) and fileName is None:
-            prevMessage = firstMessage
-        else:
-            prevMessage = None
-
-        if fileName == None:
-            # Bug fix: Se firstMessage contém o primeiro chunk, concatená-lo imediatamente
-            #          para evitar perder o primeiro chunk em mensagens multi-chunk
-            if prevMessage is not None:
-                message = prevMessage
-                prevMessage = None  # Reset para usar estratégia de escrita atrasada
-            else:
-                message = ""
-            
-            # Catch packets until the fin packet arrives
-            while True:
-                # Try to receive a packet until timeout
-                try:
-                    chunks, (ip,port) = self.sock.recvfrom(self.limit.buffersize)
-                    lista = chunks.decode().split("|")
-                    # When receiving a packet, the packet is accepted if:
-                    # the length of the list is 7
-                    # the mission id matches the connection's mission (se idMission já foi extraído)
-                    # the seq is greater 1 unit the whats stored on receiver side
-                    # the IP address and Port must be the same (identifica o rover)
-                    # Bug fix: Verificar se idMission não é None antes de comparar
-                    #          Se a primeira mensagem falhar na validação, idMission permanece None
-                    #          e a comparação lista[idMissionPos] == idMission falhará para mensagens válidas
-                    if(
-                        len(lista) == 7 and
-                        (idMission is None or lista[idMissionPos] == idMission) and
-                        lista[seqPos] == str(seq + 1) and
-                        ipDest == ip and
-                        port == portDest
-                    ):
-                        # Se idMission ainda não foi extraído, extrair agora (primeira mensagem válida)
-                        if idMission is None:
-                            idMission = lista[idMissionPos]
-                        # Estratégia anti-duplicação: escrever chunk anterior quando próximo chega
-                        # Previne duplicação em caso de retransmissão
-                        if prevMessage is not None:
-                            message += prevMessage
-                        prevMessage = lista[messagePos]
-
-                        # Increase the seq num to the new value (+1)
-                        seq += 1
-                        # The acknowledge number becomnes the same as the new sequence number
-                        ack = seq
-                        # The new acknowledge number is put in the list of fields
-                        lista[ackPos] = str(ack)
-
-                        #Check if the client send a connection closing message
-                        if lista[flagPos] == self.finkey:
-                            # Bug fix: Concatenar último chunk (prevMessage) antes de fechar conexão
-                            #          para evitar perder o último chunk da mensagem
-                            if prevMessage is not None:
-                                message += prevMessage
-                            self.sock.sendto(self.formatMessage(None,self.finkey,idMission,seq,ack,self.eofkey),(ip,port))
-                            # Aguardar ACK do FIN enviado para garantir fechamento robusto
-                            while True:
-                                try:
-                                    ack_response, (ack_ip, ack_port) = self.sock.recvfrom(self.limit.buffersize)
-                                    ack_lista = ack_response.decode().split("|")
-                                    if (
-                                        ack_ip == ipDest and
-                                        ack_port == portDest and
-                                        len(ack_lista) == 7 and
-                                        ack_lista[flagPos] == self.ackkey and
-                                        ack_lista[idMissionPos] == idMission and
-                                        ack_lista[ackPos] == str(seq)
-                                    ):
-                                        # Recebeu ACK do FIN - conexão fechada corretamente
-                                        # Bug fix: Remover \x00 (EOF) do final da mensagem se existir
-                                        #          O eofkey é usado apenas em ACKs/FINs, não deve aparecer no conteúdo da mensagem
-                                        #          Mas pode aparecer incorretamente devido a bugs anteriores ou retransmissões
-                                        if message and message.endswith(self.eofkey):
-                                            message = message[:-1]
-                                        return [idAgent,idMission,missionType,message,ip]
-                                except socket.timeout:
-                                    # Reenvia FIN se não receber ACK
-                                    self.sock.sendto(self.formatMessage(None,self.finkey,idMission,seq,ack,self.eofkey),(ip,port))
-                                    continue
-                                except Exception as e:
-                                    print(f"Erro ao aguardar ACK do FIN: {e}")
-                                    # Reenviar FIN
-                                    self.sock.sendto(self.formatMessage(None,self.finkey,idMission,seq,ack,self.eofkey),(ip,port))
-                                    continue
-                        # Enviar ACK do chunk recebido
-                        # Bug fix: ACK deve ter missionType=None, não o missionType do chunk recebido
-                        #          Todos os outros ACKs no código usam None corretamente
-                        self.sock.sendto(self.formatMessage(None,self.ackkey,idMission,seq,ack,self.eofkey),(ip,port))
-                    
-
-
-
-                # In case of a timeout, it means the
-                # either the message did not reach the destination
-                # or the message do not correspond to the expected sequence
-                # So, to make sure, we sent the previous message that was supposed to be sent
-                except socket.timeout:
-                    # Reenviar último ACK para solicitar retransmissão
-                    self.sock.sendto(self.formatMessage(None,self.ackkey,idMission,seq,ack,self.eofkey),(ip,port))
-                    continue
-                except Exception as e:
-                    print(f"Erro ao receber chunk: {e}")
-                    # Reenviar último ACK
-                    self.sock.sendto(self.formatMessage(None,self.ackkey,idMission,seq,ack,self.eofkey),(ip,port))
-                    continue
+    def getPeerZlib(self,ip,port):
+        """
+        Indica se o último handshake com um peer negociou mensagens comprimidas ("zlib").
+
+        Returns:
+            bool: True se as mensagens para o peer podem ir comprimidas (ver compressMessage())
+        """
+        return self.readCapabilities(self.getPeerCaps(ip,port))["zlib"]
 
+    def getPeerDatagramSize(self,ip,port):
+        """
+        Devolve o tamanho máximo de datagrama negociado no último handshake com um peer.
 
-        ## Comentário explicativo sobre estratégia de escrita de ficheiros
-        # Com retransmissão, há probabilidade de escrever o mesmo texto 2 vezes
-        # Portanto, quando os chunks chegam, guardamos a mensagem antes de escrever
-        # assim só quando o próximo chunk chega, guardamos o próximo e escrevemos o anterior
-        # Esta estratégia previne duplicação de dados em caso de retransmissão
-        else:
-            # Usar with para garantir fechamento do ficheiro mesmo em caso de erro
-            with open(self.storeFolder + fileName,"w") as file:
-                previous = None
-                while True:
-                    try:
-                        text,(ip,port) = self.sock.recvfrom(self.limit.buffersize)
-                        lista = text.decode().split("|")
-                        # Validar formato da mensagem
-                        if len(lista) < 7:
-                            # Mensagem malformada - reenviar ACK e continuar
-                            self.sock.sendto(self.formatMessage(None,self.ackkey,idMission,seq,ack,self.eofkey),(ip,port))
-                            continue
-                        if(
-                            len(lista) == 7 and
-                            lista[idMissionPos] == idMission and
-                            ip == ipDest and
-                            port == portDest and
-                            lista[seqPos] == str(seq + 1) 
-                        ):
-                            seq += 1
-                            ack = seq
-                            # Estratégia anti-duplicação: escrever chunk anterior quando próximo chega
-                            # Previne duplicação em caso de retransmissão
-                            if previous != None:
-                                file.write(previous)
-                            
-                            if lista[flagPos] == self.finkey:
-                                # Bug fix: Escrever último chunk que está em lista[messagePos] quando recebe FIN
-                                #          O chunk final nunca era escrito, apenas previous (penúltimo chunk)
-                                if lista[messagePos] != self.eofkey:
-                                    file.write(lista[messagePos])
-                                # Ficheiro será fechado automaticamente pelo with
-                                self.sock.sendto(self.formatMessage(None,self.finkey,idMission,seq,ack,self.eofkey),(ip,port))
-                                while True:
-                                    try:
-                                        text,(ip,port) = self.sock.recvfrom(self.limit.buffersize)
-                                        lista = text.decode().split("|")
-                                        # Validação do pacote FIN recebido
-                                        # Bug fix: Deve verificar lista[ackPos] == str(seq) para validar que o FIN recebido
-                                        #          está a reconhecer o nosso número de sequência FIN (consistente com linha 701 e 419)
-                                        if(
-                                            len(lista) == 7 and
-                                            ip == ipDest and
-                                            port == portDest and 
-                                            lista[idMissionPos] == idMission and
-                                            lista[ackPos] == str(seq) and
-                                            lista[flagPos] == self.finkey
-                                        ):
-                                            # Ficheiro recebido e conexão fechada
-                                            return [idAgent,idMission,missionType,fileName,ip]
-                                    except socket.timeout:
-                                        # Reenviar FIN se timeout
-                                        self.sock.sendto(self.formatMessage(None,self.finkey,idMission,seq,ack,self.eofkey),(ip,port))
-                                        continue
-                                    except Exception as e:
-                                        print(f"Erro ao aguardar confirmação FIN: {e}")
-                                        # Reenviar FIN
-                                        self.sock.sendto(self.formatMessage(None,self.finkey,idMission,seq,ack,self.eofkey),(ip,port))
-                                        continue
-                            else:
-                                # Atualizar previous para o próximo chunk (estratégia anti-duplicação)
-                                previous = lista[messagePos]
-                                # Enviar ACK do chunk recebido
-                                self.sock.sendto(self.formatMessage(None,self.ackkey,idMission,seq,ack,self.eofkey),(ip,port))
-
-                    except socket.timeout:
-                        # Reenviar último ACK para solicitar retransmissão
-                        self.sock.sendto(self.formatMessage(None,self.ackkey,idMission,seq,ack,self.eofkey),(ip,port))
-                        continue
-                    except Exception as e:
-                        print(f"Erro ao receber chunk de ficheiro: {e}")
-                        # Reenviar último ACK
-                        self.sock.sendto(self.formatMessage(None,self.ackkey,idMission,seq,ack,self.eofkey),(ip,port))
-                        continue
+        Returns:
+            int: Tamanho em bytes (Limit.buffersize se o peer não negociou "dgram")
+        """
+        return self.readCapabilities(self.getPeerCaps(ip,port))["datagramSize"]
+
+    def getPathDatagramSize(self,ip,port):
+        """
+        Estima o maior datagrama UDP que chega ao peer sem fragmentação (MTU do caminho - 28).
+
+        COMO FUNCIONA:
+        - Liga (connect()) um socket UDP temporário ao peer, sem enviar nada, e lê a opção
+          IP_MTU: o MTU da interface de saída ou o MTU do caminho já descoberto pelo kernel
+        - Fora do Linux (sem IP_MTU) devolve Limit.maxDatagramSize
+
+        Args:
+            ip (str): Endereço IP do peer
+            port (int): Porta do peer
 
+        Returns:
+            int: Tamanho em bytes
+        """
+        if IP_MTU is None:
+            return self.limit.maxDatagramSize
+        try:
+            with socket.socket(socket.AF_INET,socket.SOCK_DGRAM) as probe:
+                probe.connect((ip,port))
+                return probe.getsockopt(socket.IPPROTO_IP,IP_MTU) - ipUdpHeaderSize
+        except OSError:
+            return self.limit.maxDatagramSize
+
+    def getProbeSize(self,ip,port):
+        """
+        Tamanho de datagrama a propor no SYN de uma nova sessão com o peer.
+
+        Returns:
+            int: min(Limit.maxDatagramSize, MTU do caminho - 28), ou Limit.buffersize durante
+                 Limit.probeInterval depois de os datagramas grandes se terem perdido
+        """
+        fallbackAt = self.sizeFallbacks.get((ip,port))
+        if fallbackAt is not None and time.time() - fallbackAt < self.limit.probeInterval:
+            return self.limit.buffersize
+        return max(minDatagramSize, min(self.limit.maxDatagramSize, self.getPathDatagramSize(ip,port)))
+
+    def fallbackDatagramSize(self,ip,port):
+        """
+        Regista que os datagramas grandes não chegam ao peer: as próximas sessões usam
+        Limit.buffersize até passar Limit.probeInterval.
+
+        Args:
+            ip (str): Endereço IP do peer
+            port (int): Porta do peer
+        """
+        with self.sessionsLock:
+            self.sizeFallbacks[(ip,port)] = time.time()
+            self.peerCaps.setdefault((ip,port), {})["dgram"] = self.limit.buffersize
+
+    def formatProbe(self,payload,idAgent,size):
+        """
+        Preenche o payload de um SYN até o datagrama ter `size` bytes (sonda do tamanho).
+        O enchimento é um item sem "=", ignorado por parseCapabilities().
+
+        Args:
+            payload (str): Capacidades do SYN (ver formatCapabilities())
+            idAgent (str): ID que vai no cabeçalho do SYN
+            size (int): Tamanho pretendido do datagrama
+
+        Returns:
+            str: Payload com enchimento (ou o original, se já tiver o tamanho)
+        """
+        padding = size - self.getHeaderSize(idAgent) - len(payload.encode()) - 1
+        if padding <= 0:
+            return payload
+        return payload + ";" + "-" * padding
+
+    def formatSyn(self,idAgent,seq,connId,size,early = None):
+        """
+        Formata o SYN de uma sessão nova, opcionalmente com uma mensagem curta (0-RTT).
+
+        COMO FUNCIONA:
+        - O payload são as capacidades do cliente (win, dgram, sack, rpc, zlib se
+          Limit.compression e, com Limit.fec, fec), preenchidas até `size`
+          bytes (sonda do tamanho de datagrama, ver formatProbe())
+        - Com dados 0-RTT, as capacidades levam "early=1" e são seguidas de um byte \\0 e de
+          idLen(1) | idMission | mensagem; o campo missionType do cabeçalho é o da mensagem.
+          O id de um pedido ou resposta vai nas capacidades ("req" ou "rep"): a mensagem vai
+          sem prefixo, e só um peer que aceite "rpc" a trata como pedido ou resposta
+          As capacidades nunca têm \\0, por isso o recetor separa-as do resto sem ambiguidade
+        - Os dados só vão no SYN se o datagrama couber em Limit.buffersize (o tamanho que
+          qualquer tentativa do handshake transporta, mesmo depois de um recuo)
+
+        PORQUÊ:
+        - Registos, pedidos de missão e respostas curtas cabem num datagrama: a mensagem
+          chega com o SYN e o SYN-ACK confirma-a, por isso a primeira mensagem para um
+          peer custa um RTT em vez de handshake + dados
+
+        Args:
+            idAgent (str): ID que vai no cabeçalho do SYN
+            seq (int): Número de sequência inicial
+            connId (int): connId da sessão
+            size (int): Tamanho de datagrama proposto (e sondado)
+            early (tuple, optional): (missionType, idMission, mensagem em bytes, rpc) a enviar no SYN,
+                                     com rpc = (marcador, id do pedido) ou None. Defaults to None
+
+        Returns:
+            tuple: (packet, early) - SYN formatado e True se leva os dados 0-RTT
+        """
+        capabilities = {"win": self.limit.windowSize, "dgram": size, "sack": 1, "rpc": 1}
+        if self.limit.compression:
+            capabilities["zlib"] = zlibVersion
+        if self.limit.fec:
+            capabilities["fec"] = 1
+        if early is not None:
+            missionType,idMission,message,rpc = early
+            if rpc is not None:
+                capabilities[self.rpcSynKeys[rpc[0]]] = rpc[1]
+            idBytes = str(idMission).encode()
+            tail = b"".join((bytes((len(idBytes) & 0xFF,)),idBytes,message))
+            capabilities["early"] = 1
+            payload = self.formatCapabilities(capabilities)
+            if len(idBytes) <= 255 and self.getHeaderSize(idAgent) + len(payload) + 1 + len(tail) <= self.limit.buffersize:
+                padded = self.formatProbe(payload,idAgent,size - 1 - len(tail)).encode()
+                return self.formatMessage(missionType,self.synkey,idAgent,seq,0,b"".join((padded,b"\0",tail)),connId),True
+            del capabilities["early"]
+        payload = self.formatCapabilities(capabilities)
+        return self.formatMessage("0",self.synkey,idAgent,seq,0,self.formatProbe(payload,idAgent,size),connId),False
+
+    def parseSyn(self,payload):
+        """
+        Separa o payload de um SYN nas capacidades e nos dados 0-RTT (inverso de formatSyn()).
 
+        Args:
+            payload (bytes or memoryview): Payload do SYN
+
+        Returns:
+            tuple: (capabilities, early) - capacidades oferecidas e (idMission, mensagem em bytes),
+                   ou None se o SYN não trouxer dados (ou se estiverem mal formados)
+        """
+        text,sep,tail = bytes(payload).partition(b"\0")
+        capabilities = self.parseCapabilities(text)
+        if not sep or capabilities.get("early") != "1" or not tail or len(tail) < 1 + tail[0]:
+            capabilities.pop("early",None)
+            return capabilities,None
+        idLen = tail[0]
+        return capabilities,(str(tail[1:1 + idLen],"utf-8","replace"),tail[1 + idLen:])
+
+    def getRttEstimator(self,ip,port):
+        """
+        Devolve o estimador de RTT de um peer, criando-o na primeira utilização.
+        O RTO inicial é Limit.timeout, até haver a primeira amostra de RTT.
+
+        Args:
+            ip (str): Endereço IP do peer
+            port (int): Porta do peer
+
+        Returns:
+            RttEstimator: Estimador de RTT/RTO do peer
+        """
+        estimator = self.rttEstimators.get((ip,port))
+        if estimator is None:
+            estimator = RttEstimator.RttEstimator(self.limit.timeout,self.limit.minRto,self.limit.maxRto)
+            self.rttEstimators[(ip,port)] = estimator
+        return estimator
+
+
+    # ============================================================
+    # SESSÕES E LEITURA DO SOCKET
+    # ============================================================
+
+    def getCongestionControl(self,session):
+        """
+        Devolve a janela de congestionamento de uma sessão local, criando-a no primeiro envio
+        (janela inicial Limit.initialWindow, máximo a janela negociada com o peer).
+        Fica na sessão: as mensagens seguintes continuam com a janela já aprendida.
+
+        Args:
+            session (Session): Sessão local
+
+        Returns:
+            CongestionControl: Janela de congestionamento da sessão
+        """
+        if session.congestion is None:
+            session.congestion = CongestionControl.CongestionControl(self.limit.initialWindow,session.window)
+        return session.congestion
+
+    def getFecControl(self,session):
+        """
+        Devolve o controlo de redundância (FEC) de uma sessão local, criando-o no primeiro envio.
+        Fica na sessão: as mensagens seguintes começam com a taxa de perda já observada.
+
+        Args:
+            session (Session): Sessão local
+
+        Returns:
+            FecControl or None: Controlo da paridade, ou None se o peer não negociou "fec"
+        """
+        if not session.fec:
+            return None
+        if session.fecControl is None:
+            session.fecControl = FecControl.FecControl(self.limit.fecMinLoss)
+        return session.fecControl
+
+    def getPacingDelay(self,size):
+        """
+        Gasta os tokens de um datagrama de dados no token bucket do endpoint.
+
+        COMO FUNCIONA:
+        - Sem Limit.pacingRate não há pacing (devolve sempre 0)
+        - O balde é criado (ou recriado, se a taxa mudar) no primeiro envio com pacing
+        - Os chunks novos esperam o tempo devolvido antes de sair; as retransmissões
+          saem logo mas gastam os tokens na mesma (atrasam os chunks seguintes)
+
+        Args:
+            size (int): Tamanho do datagrama em bytes
+
+        Returns:
+            float: Segundos a esperar antes de enviar
+        """
+        if self.limit.pacingRate is None:
+            return 0.0
+        pacer = self.pacer
+        if pacer is None or pacer.rate != self.limit.pacingRate or pacer.burst != self.limit.pacingBurst:
+            pacer = self.pacer = TokenBucket.TokenBucket(self.limit.pacingRate,self.limit.pacingBurst)
+        return pacer.consume(size)
+
+    def waitFor(self,ready,timeout = None,cond = None):
+        """
+        Aguarda até ready() devolver um valor. O socket é lido pela thread de leitura
+        (ver readLoop()), que notifica a condição quando entrega um pacote.
+
+        COMO FUNCIONA:
+        - ready() é avaliado com sessionsLock adquirido e devolve None enquanto não houver nada
+          (ex: retira o próximo pacote da inbox de uma sessão)
+        - A thread fica em cond.wait() até ser notificada ou o tempo esgotar
+        - A thread de leitura é criada na primeira espera (as subclasses com outro mecanismo
+          de receção, como AsyncMissionLink, nunca a criam)
+
+        Args:
+            ready (callable): Função sem argumentos que devolve o valor pretendido ou None
+            timeout (float, optional): Tempo máximo de espera em segundos. Defaults to None (sem limite)
+            cond (threading.Condition, optional): Condição notificada quando ready() pode mudar
+                                                  (ex: session.ready). Defaults to None (sessionsCond)
+
+        Returns:
+            object or None: Valor devolvido por ready(), ou None se o tempo esgotou
+        """
+        self.startReader()
+        cond = self.sessionsCond if cond is None else cond
+        deadline = None if timeout is None else time.time() + timeout
+        with self.sessionsLock:
+            while True:
+                value = ready()
+                if value is not None:
+                    return value
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return None
+                cond.wait(remaining)
+
+    def startReader(self):
+        """
+        Cria a thread de leitura do socket, se ainda não existir (ver readLoop()).
+        A thread só guarda uma referência fraca para o endpoint: quando o MissionLink é
+        descartado, o socket é fechado e a thread termina.
+        """
+        with self.sessionsLock:
+            if self.reader is None:
+                weakref.finalize(self,self.sock.close)
+                self.reader = self.sock.startReader(MissionLink.readLoop,weakref.ref(self))
+
+    @staticmethod
+    def readLoop(ref):
+        """
+        Thread de leitura: a única que lê o socket.
+
+        COMO FUNCIONA:
+        - Espera pelo primeiro datagrama e lê sem bloquear os que já estiverem no socket
+          (até readerBatch)
+        - Entrega cada datagrama à sessão a que pertence (handleDatagrams()): os pacotes
+          de uma sessão local vão para a sua inbox e acordam só a thread que a conduz
+          (session.ready); as sessões do peer avançam aqui mesmo
+        - Corre os temporizadores das sessões (runTimers()) entre leituras
+        - Termina quando o socket é fechado (ver MissionLinkSocket.close()) ou o endpoint é
+          descartado (durante a espera no socket não guarda nenhuma referência para o endpoint)
+
+        PORQUÊ:
+        - Com várias threads a ler o mesmo socket, quem ganhasse a leitura ficava com
+          datagramas de outra transferência. Com uma única leitora, os envios e as receções
+          em paralelo (ex: a thread de missão e a de escuta de um rover) nunca disputam o
+          socket nem perdem os pacotes uns dos outros
+
+        Args:
+            ref (weakref.ref): Referência fraca para o MissionLink
+        """
+        while True:
+            link = ref()
+            if link is None:
+                return
+            sock = link.sock
+            wait = link.getPollTimeout()
+            del link
+            datagrams = []
+            try:
+                if sock.fileno() < 0:
+                    return
+                sock.settimeout(wait)
+                datagrams.append(sock.recvfrom(maxUdpPayload))
+                # Esvaziar o que já está no socket sem voltar a esperar
+                sock.settimeout(0.0)
+                while len(datagrams) < readerBatch:
+                    datagrams.append(sock.recvfrom(maxUdpPayload))
+            except (socket.timeout, BlockingIOError):
+                pass
+            except OSError as e:
+                if sock.fileno() < 0:
+                    return
+                print(f"Erro ao receber datagrama: {e}")
+            if sock.closing:
+                return
+            link = ref()
+            if link is None:
+                return
+            try:
+                link.handleDatagrams(datagrams)
+            except OSError as e:
+                if sock.fileno() < 0:
+                    return
+                print(f"Erro na thread de leitura: {e}")
+            del link
+
+    def getPollTimeout(self):
+        """
+        Tempo máximo de espera da thread de leitura no socket: até ao fim do tick atual da
+        roda de temporizadores (ver setTimer()).
+
+        Returns:
+            float: Segundos
+        """
+        return max(0.001, readerTick - time.time() % readerTick)
+
+    def handleDatagrams(self,datagrams):
+        """
+        Entrega um lote de datagramas lidos pela thread de leitura e corre os temporizadores
+        das sessões. Acorda as threads em recv()/acceptConnection() se ficou uma mensagem ou
+        um handshake disponível (as de uma sessão local são acordadas por dispatch()).
+
+        COMO FUNCIONA:
+        - O lote é tratado com uma só aquisição de sessionsLock
+        - Os ACKs dos chunks de dados são enviados no fim do lote, um por sessão sempre
+          que o ACK cumulativo avançou (ver sendAck()); antes de um pacote de controlo
+          (SYN, FIN, ...) os ACKs pendentes são enviados, para não trocar a ordem das respostas
+
+        Args:
+            datagrams (list): Lista de (datagrama, (ip, porta)) - vazia se a espera esgotou
+        """
+        with self.sessionsLock:
+            if datagrams:
+                pending = len(self.delivered) + len(self.accepted)
+                self.ackBatch = []
+                try:
+                    for data,address in datagrams:
+                        if data[:1] not in self.batchFlags:
+                            self.flushAcks()
+                        self.dispatch(data,address)
+                finally:
+                    self.flushAcks()
+                    self.ackBatch = None
+                if len(self.delivered) + len(self.accepted) != pending:
+                    self.sessionsCond.notify_all()
+            self.runTimers()
+
+    def sendAck(self,session,idMission,seq,recovered = False):
+        """
+        Envia o ACK de um chunk de dados de uma sessão do peer (ver formatDataAck()).
+        Chamado com sessionsLock adquirido.
+
+        COMO FUNCIONA:
+        - Fora de um lote (handleDatagrams()) o ACK sai logo
+        - Num lote, fica pendente até ao fim. Com "sack", um ACK cumulativo que avança
+          substitui o último ACK pendente da sessão (confirma tudo o que ele confirmava e o
+          mapa de bits é o mais recente); ACKs duplicados e de chunks reconstruídos (FEC)
+          nunca são substituídos, porque são eles que sinalizam perdas ao emissor
+
+        Args:
+            session (Session): Sessão do peer
+            idMission (str): Identificador da missão do chunk
+            seq (int): Número de sequência do chunk recebido
+            recovered (bool, optional): True se o chunk foi reconstruído com a paridade. Defaults to False
+        """
+        packet = self.formatDataAck(session,idMission,seq,recovered)
+        address = (session.ip,session.port)
+        if self.ackBatch is None:
+            self.sock.sendto(packet,address)
+            return
+        key = session.getKey()
+        last = self.ackPending.get(key)
+        if session.sack and not recovered and last is not None and not last[3] and last[2] < session.seq:
+            last[0] = packet
+            last[2] = session.seq
+            return
+        entry = [packet,address,session.seq,recovered]
+        self.ackBatch.append(entry)
+        self.ackPending[key] = entry
+
+    def flushAcks(self):
+        """
+        Envia os ACKs pendentes do lote atual (ver sendAck()).
+        """
+        batch = self.ackBatch
+        if not batch:
+            return
+        self.ackBatch = []
+        self.ackPending.clear()
+        for packet,address,_,_ in batch:
+            self.sock.sendto(packet,address)
+
+    def dispatch(self,data,address):
+        """
+        Entrega um datagrama à sessão (ip, porta, connId) a que pertence.
+        Chamado com sessionsCond adquirido.
+
+        COMO FUNCIONA:
+        - Sessão iniciada localmente: o pacote fica na inbox, para a thread que a conduz
+        - Sessão iniciada pelo peer: o pacote avança a máquina de estados (handlePeerPacket())
+        - Sessão local sem nenhuma thread a enviar (inativa, à espera da próxima mensagem):
+          tratada aqui mesmo (handleIdlePacket())
+        - SYN de uma sessão desconhecida: cria uma nova sessão do peer (acceptSession())
+        - FIN de uma sessão local que já terminou: o nosso ACK final perdeu-se, responder
+          com ACK para o peer não ficar a reenviar o FIN
+        - Dados, keepalive ou FIN de uma sessão do peer desconhecida (ex: este endpoint foi
+          reiniciado): responder com reset para o peer abrir uma sessão nova
+        - Outros pacotes de sessões desconhecidas são ignorados
+
+        Args:
+            data (bytes): Datagrama recebido
+            address (tuple): (ip, porta) de origem
+        """
+        lista = self.parseMessage(data)
+        if lista is None:
+            return
+        ip,port = address
+        connId = lista[connIdPos]
+        session = self.sessions.get((ip,port,connId))
+        if session is None:
+            if lista[flagPos] == self.synkey and not connId & responderBit:
+                self.acceptSession(ip,port,lista)
+            elif lista[flagPos] == self.finkey and connId & responderBit:
+                self.sock.sendto(self.formatMessage(None,self.ackkey,lista[idMissionPos],lista[seqPos] + 1,lista[seqPos],self.eofkey,connId ^ responderBit),address)
+            elif lista[flagPos] in (self.datakey, self.endkey, self.filekey, self.keepalivekey, self.finkey) and not connId & responderBit:
+                self.sock.sendto(self.formatMessage(None,self.resetkey,lista[idMissionPos],lista[seqPos],lista[seqPos],self.eofkey,connId | responderBit),address)
+            return
+        session.lastActivity = time.time()
+        if not session.initiator:
+            self.handlePeerPacket(session,lista)
+        elif session.busy:
+            session.inbox.append(lista)
+            if session.ready is not None:
+                session.ready.notify()
+        else:
+            self.handleIdlePacket(session,lista)
+
+    def nextPacket(self,session,deadline):
+        """
+        Devolve o próximo pacote de uma sessão iniciada localmente.
+
+        Args:
+            session (Session): Sessão
+            deadline (float): Instante (time.time()) até ao qual esperar
+
+        Returns:
+            list or None: Pacote (lista de campos, ver parseMessage()) ou None se o tempo esgotou
+        """
+        return self.waitFor(lambda: session.inbox.popleft() if session.inbox else None, max(0.0, deadline - time.time()), session.ready)
+
+    def runSteps(self,steps):
+        """
+        Conduz os passos de uma operação (gerador *Steps(), ex: sendSteps()) até ao fim,
+        cumprindo cada espera com a thread atual bloqueada (ver waitStep()).
+
+        PORQUÊ:
+        - O protocolo (handshake, janela, retransmissões, fecho) está uma única vez nos
+          geradores: esta classe e AsyncMissionLink só diferem na forma de esperar
+
+        Args:
+            steps (generator): Passos da operação
+
+        Returns:
+            object: Valor devolvido pelo gerador (as exceções são propagadas)
+        """
+        value = None
+        while True:
+            try:
+                wait = steps.send(value)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                value = self.waitStep(wait)
+            except BaseException:
+                # Ex: KeyboardInterrupt durante a espera - os finally do gerador correm já
+                steps.close()
+                raise
+
+    def waitStep(self,wait):
+        """
+        Cumpre uma espera pedida pelos passos de uma operação (ver waitPacket no topo do módulo).
+
+        Args:
+            wait (tuple): Espera cedida pelo gerador
+
+        Returns:
+            object or None: Valor a devolver ao gerador
+        """
+        if wait[0] == waitPacket:
+            return self.nextPacket(wait[1],wait[2])
+        if wait[0] == waitPause:
+            time.sleep(max(0.0, wait[1] - time.time()))
+            return None
+        requestId = wait[1]
+        return self.waitFor(lambda: self.replies.get(requestId), max(0.0, wait[2] - time.time()))
+
+    def removeSession(self,session):
+        """
+        Retira uma sessão da tabela e fecha o ficheiro que estivesse a receber.
+
+        Args:
+            session (Session): Sessão a retirar
+        """
+        with self.sessionsCond:
+            if self.sessions.get(session.getKey()) is session:
+                del self.sessions[session.getKey()]
+            if self.idleSessions.get((session.ip,session.port,session.idAgent)) is session:
+                del self.idleSessions[(session.ip,session.port,session.idAgent)]
+            session.state = Session.Session.CLOSED
+            self.setTimer(session,None)
+            if session.file is not None:
+                session.file.close()
+                session.file = None
+
+    def newConnId(self,ip,port):
+        """
+        Escolhe um connId livre para uma nova sessão iniciada localmente com um peer.
+        Chamado com sessionsCond adquirido.
+
+        Args:
+            ip (str): Endereço IP do peer
+            port (int): Porta do peer
+
+        Returns:
+            int: connId entre 1 e responderBit - 1
+        """
+        while True:
+            connId = random.randint(1, responderBit - 1)
+            if (ip,port,connId | responderBit) not in self.sessions:
+                return connId
+
+
+    # ============================================================
+    # SESSÕES INICIADAS LOCALMENTE (EMISSOR)
+    # ============================================================
+
+    def openSession(self, idAgent, destAddress, destPort, retryLimit=5, early=None):
+        """
+        Abre uma sessão com handshake de 3 vias (ver openSessionSteps()).
+
+        Returns:
+            Session: Sessão estabelecida (session.seq é o número de sequência do primeiro chunk)
+
+        Raises:
+            TimeoutError: Se não conseguir estabelecer conexão após múltiplas tentativas
+        """
+        return self.runSteps(self.openSessionSteps(idAgent,destAddress,destPort,retryLimit,early))
+
+    def openSessionSteps(self, idAgent, destAddress, destPort, retryLimit=5, early=None):
+        """
+        Passos do handshake de 3 vias (SYN, SYN-ACK, ACK) de uma sessão nova (ver runSteps()).
+        Implementa mecanismo de fiabilidade sobre UDP.
+        
+        NOTA: No handshake, o campo idMission é usado temporariamente para enviar o ID do rover.
+              A Nave-Mãe guarda o mapeamento (IP, porta) -> ID do rover.
+
+        COMO FUNCIONA:
+        - Regista a sessão na tabela com um connId novo e envia o SYN
+        - Aguarda o SYN-ACK (entregue na inbox da sessão) durante o RTO atual do peer
+        - Se o RTO expirar, reenvia o SYN e duplica o tempo de espera (backoff exponencial)
+        - Se o SYN-ACK responder a um SYN enviado uma só vez, o tempo decorrido é
+          uma amostra de RTT (regra de Karn)
+        - O SYN propõe o tamanho de datagrama ("dgram", ver getProbeSize()) e vai preenchido
+          até esse tamanho: se chegar, o caminho transporta-o. Se as primeiras probeAttempts
+          tentativas falharem, os SYN seguintes propõem apenas Limit.buffersize
+        - Com `early`, uma mensagem curta vai no próprio SYN (0-RTT, ver formatSyn()): se o
+          SYN-ACK a confirmar ("early" aceite), session.earlyDelivered fica True e a mensagem
+          já foi entregue ao peer
+        
+        Args:
+            idAgent (str): Identificador do agente/rover (3 caracteres)
+            destAddress (str): Endereço IP do destino
+            destPort (int): Porta do destino
+            retryLimit (int, optional): Número máximo de envios do SYN. Defaults to 5
+            early (tuple, optional): (missionType, idMission, mensagem em bytes) a enviar no SYN. Defaults to None
+            
+        Returns:
+            Session: Sessão estabelecida (session.seq é o número de sequência do primeiro chunk)
+            
+        Raises:
+            TimeoutError: Se não conseguir estabelecer conexão após múltiplas tentativas
+        """
+        # Número de sequência inicial aleatório (como no TCP): pacotes atrasados de uma
+        # sessão antiga dificilmente caem na janela desta
+        seqinicial = random.getrandbits(32)
+        rtt = self.getRttEstimator(destAddress,destPort)
+        with self.sessionsCond:
+            connId = self.newConnId(destAddress,destPort)
+            session = Session.Session(destAddress,destPort,connId | responderBit,connId,True)
+            session.idAgent = idAgent
+            # Notificada por dispatch() para a espera bloqueante (o AsyncMissionLink usa futures)
+            session.ready = threading.Condition(self.sessionsLock)
+            self.sessions[session.getKey()] = session
+        probeSize = self.getProbeSize(destAddress,destPort)
+
+        for attempt in range(retryLimit):
+            # Capacidades do cliente anunciadas no SYN (janela e tamanho de datagrama)
+            size = probeSize if attempt < self.probeAttempts else self.limit.buffersize
+            synPacket,earlySent = self.formatSyn(idAgent,seqinicial,connId,size,early)
+            # Send SYN - no handshake, idMission contém o ID do rover
+            self.sock.sendto(synPacket,(destAddress,destPort))
+            sentAt = time.time()
+            deadline = sentAt + rtt.getBackoffTimeout(attempt)
+            synack = None
+            while synack is None:
+                lista = yield (waitPacket,session,deadline)
+                if lista is None:
+                    break
+                if lista[flagPos] == self.synackkey:
+                    synack = lista
+
+            if synack is None:
+                # RTO expirou sem SYN-ACK: o próximo SYN espera o dobro
+                continue
+
+            if attempt == 0:
+                # Regra de Karn: só há amostra se o SYN foi enviado uma única vez
+                rtt.addSample(time.time() - sentAt)
+            # Guardar as capacidades aceites pelo servidor
+            with self.sessionsCond:
+                self.applyCapabilities(session,self.parseCapabilities(synack[messagePos]))
+            session.datagramSize = min(size, session.datagramSize)
+            session.earlyDelivered = earlySent and session.early
+            if size < probeSize:
+                # A sonda não chegou: as próximas sessões já não a tentam
+                self.fallbackDatagramSize(destAddress,destPort)
+
+            # Send ACK
+            self.sock.sendto(
+                self.formatMessage("0",self.ackkey,idAgent,seqinicial,seqinicial,self.nocapkey,connId),
+                (destAddress, destPort)
+            )
+            session.state = Session.Session.ESTABLISHED
+            session.seq = seqinicial + 1
+            return session # Handshake successful
+
+        self.removeSession(session)
+        error_msg = f"Falha ao estabelecer conexão com {destAddress}:{destPort} após {retryLimit} tentativas"
+        raise TimeoutError(error_msg)
+
+
+    def startConnection(self, idAgent, destAddress, destPort, retryLimit=5):
+        """
+        Inicia uma conexão com handshake de 3 vias (ver openSession()).
+        Mantido para compatibilidade: devolve a informação da conexão em vez da sessão.
+        A sessão fica aberta e é reutilizada pelo próximo send() para o mesmo destino.
+        
+        Args:
+            idAgent (str): Identificador do agente/rover (3 caracteres)
+            destAddress (str): Endereço IP do destino
+            destPort (int): Porta do destino
+            retryLimit (int, optional): Número máximo de tentativas. Defaults to 5
+            
+        Returns:
+            tuple: ((destAddress, destPort), idAgent, seq, ack) - Informação da conexão estabelecida
+            
+        Raises:
+            TimeoutError: Se não conseguir estabelecer conexão após múltiplas tentativas
+        """
+        session = self.openSession(idAgent,destAddress,destPort,retryLimit)
+        self.releaseSession(session)
+        return (destAddress,destPort),idAgent,session.seq,session.seq
+
+
+    def takeIdleSession(self,idAgent,ip,port):
+        """
+        Reutiliza uma sessão inativa com o peer e idAgent para enviar uma mensagem (sem handshake).
+        A sessão fica ocupada (busy) até releaseSession(): outro send() em paralelo para o
+        mesmo peer abre a sua própria sessão (openSessionSteps()).
+
+        Args:
+            idAgent (str): Identificador do agente/rover
+            ip (str): Endereço IP do peer
+            port (int): Porta do peer
+
+        Returns:
+            Session or None: Sessão ocupada, ou None se não houver nenhuma inativa
+        """
+        with self.sessionsCond:
+            session = self.idleSessions.pop((ip,port,idAgent), None)
+            if session is not None:
+                session.busy = True
+                self.setTimer(session,None)
+                session.inbox.clear()
+            return session
+
+    def releaseSession(self,session):
+        """
+        Devolve uma sessão depois de enviada a mensagem: fica inativa, à espera do próximo send().
+
+        COMO FUNCIONA:
+        - Arma o temporizador de keepalive da sessão (ver runTimers())
+        - Se já houver outra sessão inativa com o mesmo peer e idAgent, esta é fechada
+
+        Args:
+            session (Session): Sessão ocupada (ver takeIdleSession() e openSessionSteps())
+        """
+        with self.sessionsCond:
+            if session.state != Session.Session.ESTABLISHED:
+                return
+            now = time.time()
+            session.busy = False
+            session.inbox.clear()
+            session.lastUsed = now
+            key = (session.ip,session.port,session.idAgent)
+            if key in self.idleSessions:
+                self.closeIdleSession(session)
+                return
+            self.idleSessions[key] = session
+            self.setTimer(session,now + self.limit.keepaliveInterval)
+
+    def closeIdleSession(self,session):
+        """
+        Fecha uma sessão local inativa sem esperar pela resposta: envia FIN e retira-a da tabela.
+        O FIN do peer que chegar depois é confirmado por dispatch() (sessão desconhecida).
+        Chamado com sessionsCond adquirido.
+
+        Args:
+            session (Session): Sessão local inativa
+        """
+        self.sock.sendto(self.formatMessage(None,self.finkey,"000",session.seq,session.seq,self.eofkey,session.sendConnId),(session.ip,session.port))
+        self.removeSession(session)
+
+    def closeSessions(self):
+        """
+        Fecha todas as sessões locais inativas (FIN/FIN/ACK, ver closeSenderSteps()).
+        Útil antes de terminar o processo: o peer liberta as sessões sem esperar pelo timeout.
+        """
+        for session in self.takeIdleSessions():
+            self.runSteps(self.closeSessionSteps(session))
+
+    def takeIdleSessions(self):
+        """
+        Retira todas as sessões locais inativas, que ficam ocupadas para serem fechadas
+        (ver closeSessions()).
+
+        Returns:
+            list: Sessões retiradas
+        """
+        with self.sessionsCond:
+            sessions = list(self.idleSessions.values())
+            self.idleSessions.clear()
+            for session in sessions:
+                session.busy = True
+                self.setTimer(session,None)
+                session.inbox.clear()
+        return sessions
+
+    def closeSessionSteps(self,session):
+        """
+        Passos para fechar uma sessão retirada por takeIdleSessions() e a tirar da tabela.
+
+        Args:
+            session (Session): Sessão local ocupada
+
+        Returns:
+            bool: True se o peer confirmou o fecho (ver closeSenderSteps())
+        """
+        try:
+            return (yield from self.closeSenderSteps(session,"000",session.seq))
+        finally:
+            self.removeSession(session)
+
+    def handleIdlePacket(self,session,lista):
+        """
+        Trata um pacote de uma sessão local inativa (nenhuma thread a enviar).
+        Chamado por dispatch() com sessionsCond adquirido.
+
+        - Reset: o peer já não conhece a sessão, que é descartada (o próximo send() abre outra)
+        - Resposta ao keepalive e pacotes atrasados: basta o lastActivity já atualizado
+
+        Args:
+            session (Session): Sessão local inativa
+            lista (list): Pacote recebido (lista de campos, ver parseMessage())
+        """
+        if lista[flagPos] == self.resetkey:
+            self.removeSession(session)
+
+        
+    def send(self,ip,port,missionType,idAgent,idMission,message,requestId = None):
+        """
+        Envia uma mensagem ou ficheiro através do protocolo MissionLink.
+
+        COMO FUNCIONA:
+        - A primeira mensagem para um peer abre uma sessão com handshake (SYN/SYN-ACK/ACK)
+          que negoceia a janela de envio e o tamanho dos datagramas ("win" e "dgram" nas capacidades)
+        - A sessão fica aberta: as mensagens seguintes para o mesmo peer usam-na sem handshake
+          nem fecho, por isso uma mensagem curta custa um pacote de dados e um ACK
+        - A mensagem é codificada uma vez em bytes e dividida em chunks do tamanho negociado
+          (fatias memoryview do mesmo buffer); um caminho ".json" é enviado como ficheiro (sendFile())
+        - Os chunks são enviados por sendChunksSteps() em modo selective-repeat
+          (janela = 1 equivale ao antigo stop-and-wait); o último leva a flag E (fim da mensagem)
+        - Se o peer já não conhecer a sessão reutilizada (reset), ou se os datagramas grandes não
+          chegarem ao peer, a mensagem é reenviada numa sessão nova (ver canResend())
+        - Várias chamadas a send() em threads diferentes correm em paralelo, cada uma na sua sessão
+        - Com requestId (ver newRequestId()) a mensagem é idempotente: reenviá-la com o mesmo id
+          depois de uma falha não a entrega duas vezes ao peer (ver deliverMessage())
+
+        Args:
+            ip (str): Endereço IP do destinatário
+            port (int): Porta do destinatário
+            missionType (str): Tipo de missão/operação (R=Register, T=Task, M=Metrics, Q=Request, P=Progress)
+            idAgent (str): Identificador do agente/rover (usado apenas no handshake)
+            idMission (str): Identificador da missão (3 caracteres, "000" se não aplicável)
+            message (str): Mensagem ou caminho do ficheiro a enviar
+            requestId (str, optional): Id da mensagem, igual em todos os reenvios (não se aplica a ficheiros). Defaults to None
+
+        Returns:
+            bool: True se a mensagem foi enviada com sucesso
+
+        Raises:
+            TimeoutError: Se não conseguir estabelecer conexão ou o peer deixar de confirmar os chunks
+        """
+        return self.runSteps(self.sendSteps(ip,port,missionType,idAgent,idMission,message,requestId))
+
+    def sendSteps(self,ip,port,missionType,idAgent,idMission,message,requestId = None):
+        """
+        Passos de send() (ver runSteps()).
+
+        Returns:
+            bool: True se a mensagem foi enviada com sucesso
+        """
+        # Bug fix: Garantir que message é string antes de chamar métodos de string
+        if not isinstance(message, str):
+            message = str(message)
+
+        if message.endswith(".json"):
+            return (yield from self.sendFileSteps(ip,port,missionType,idAgent,idMission,message))
+        rpc = (self.rpcRequestKey,requestId) if requestId is not None else None
+        yield from self.sendContentSteps(ip,port,missionType,idAgent,idMission,memoryview(message.encode()),None,rpc)
+        return True
+
+    def sendFile(self,ip,port,missionType,idAgent,idMission,path):
+        """
+        Envia um ficheiro qualquer (JSON, imagens, binários) através do protocolo MissionLink.
+
+        COMO FUNCIONA:
+        - O ficheiro é mapeado em memória (mmap, só leitura) em vez de ser lido para um buffer:
+          os chunks são fatias memoryview do mapeamento, por isso o conteúdo só é copiado
+          quando cada chunk é colocado no datagrama
+        - O primeiro chunk (flag H) anuncia o nome, o tamanho e o tamanho dos chunks de dados;
+          o recetor escreve cada chunk de dados na sua posição (ver writeFileChunk())
+        - Os bytes do ficheiro nunca são descodificados: o ficheiro chega idêntico
+
+        Args:
+            ip (str): Endereço IP do destinatário
+            port (int): Porta do destinatário
+            missionType (str): Tipo de missão/operação
+            idAgent (str): Identificador do agente/rover (usado apenas no handshake)
+            idMission (str): Identificador da missão
+            path (str): Caminho do ficheiro (o recetor guarda-o com o mesmo nome, sem o caminho)
+
+        Returns:
+            bool: True se o ficheiro foi enviado com sucesso
+
+        Raises:
+            TimeoutError: Se não conseguir estabelecer conexão ou o peer deixar de confirmar os chunks
+        """
+        return self.runSteps(self.sendFileSteps(ip,port,missionType,idAgent,idMission,path))
+
+    def sendFileSteps(self,ip,port,missionType,idAgent,idMission,path):
+        """
+        Passos de sendFile() (ver runSteps()).
+
+        Returns:
+            bool: True se o ficheiro foi enviado com sucesso
+        """
+        with open(path,"rb") as file:
+            # Um ficheiro vazio não pode ser mapeado
+            mapped = mmap.mmap(file.fileno(),0,access=mmap.ACCESS_READ) if os.fstat(file.fileno()).st_size else None
+        try:
+            content = memoryview(mapped) if mapped is not None else memoryview(b"")
+            yield from self.sendContentSteps(ip,port,missionType,idAgent,idMission,content,os.path.basename(path))
+            return True
+        finally:
+            if mapped is not None:
+                try:
+                    mapped.close()
+                except BufferError:
+                    # Ainda há fatias vivas (ex: num traceback): o mapeamento fecha-se quando forem libertadas
+                    pass
+
+    def sendContentSteps(self,ip,port,missionType,idAgent,idMission,content,fileName,rpc = None):
+        """
+        Passos para enviar uma mensagem já codificada ou o conteúdo de um ficheiro
+        (ver send(), sendFile() e runSteps()).
+
+        Args:
+            ip (str): Endereço IP do destinatário
+            port (int): Porta do destinatário
+            missionType (str): Tipo de missão/operação
+            idAgent (str): Identificador do agente/rover (usado apenas no handshake)
+            idMission (str): Identificador da missão
+            content (memoryview): Mensagem codificada ou conteúdo do ficheiro
+            fileName (str or None): Nome do ficheiro ou None para uma mensagem
+            rpc (tuple, optional): (marcador, id) de um pedido ou resposta (ver formatRpc()). Defaults to None
+
+        Returns:
+            Session: Sessão em que a mensagem foi entregue (já devolvida por releaseSession())
+        """
+        firstFlag = self.filekey if fileName is not None else None
+        session = self.takeIdleSession(idAgent,ip,port)
+        reused = session is not None
+        if session is None:
+            # The connection starts with an handshake to assure it has a somewhat reliable
+            # transfers between the client and the server (apenas na primeira mensagem da sessão)
+            early = None
+            if fileName is None:
+                # Mensagem curta: vai no SYN (0-RTT). A sessão ainda não tem capacidades,
+                # por isso a compressão segue o último handshake com o peer
+                earlyType,earlyContent = self.compressMessage(self.getPeerZlib(ip,port),missionType,content)
+                if len(earlyContent) < self.limit.buffersize:
+                    early = (earlyType,idMission,earlyContent,rpc)
+            session = yield from self.openSessionSteps(idAgent,ip,port,early=early)
+            if session.earlyDelivered:
+                # O SYN-ACK confirmou a mensagem
+                session.earlyDelivered = False
+                self.releaseSession(session)
+                return session
+        try:
+            while True:
+                try:
+                    # O prefixo, a compressão e os chunks dependem das capacidades da sessão
+                    messageType,payload = (missionType,content) if fileName is not None else self.formatContent(session,missionType,content,rpc)
+                    chunks = self.toMessageChunks(payload,fileName,idMission,session.datagramSize)
+                    session.seq = yield from self.sendChunksSteps(session,messageType,idMission,chunks,session.seq,firstFlag)
+                    break
+                except OSError as e:
+                    if not self.canResend(session,reused,e):
+                        raise
+                # Reenviar a mensagem inteira numa sessão nova
+                self.removeSession(session)
+                session = yield from self.openSessionSteps(idAgent,ip,port)
+                reused = False
+        except BaseException:
+            self.removeSession(session)
+            raise
+        self.releaseSession(session)
+        return session
+
+    def formatContent(self,session,missionType,content,rpc):
+        """
+        Prepara uma mensagem para uma sessão: com o marcador de pedido, resposta ou mensagem
+        normal se a sessão negociou "rpc" (ver formatRpc()) e comprimida se negociou "zlib"
+        (ver compressMessage()).
+
+        Args:
+            session (Session): Sessão em que a mensagem vai ser enviada
+            missionType (str): Tipo de missão/operação
+            content (memoryview): Mensagem codificada
+            rpc (tuple or None): (marcador, id) de um pedido ou resposta
+
+        Returns:
+            tuple: (missionType, content) a enviar
+        """
+        if session.rpc:
+            content = memoryview(self.formatRpc(rpc,content))
+        return self.compressMessage(session.zlib,missionType,content)
+
+    def toMessageChunks(self,content,fileName,idMission,datagramSize):
+        """
+        Divide uma mensagem (ou o conteúdo de um ficheiro) nos chunks a enviar numa sessão.
+        Um ficheiro tem sempre o chunk de cabeçalho (ver formatFileHeader()) e pelo menos
+        um chunk de dados (vazio se o ficheiro for vazio).
+
+        Args:
+            content (memoryview): Mensagem codificada ou conteúdo do ficheiro
+            fileName (str or None): Nome do ficheiro ou None
+            idMission (str): Identificador da missão
+            datagramSize (int or None): Tamanho máximo de datagrama da sessão
+
+        Returns:
+            list: Chunks (fatias memoryview de content, precedidas do cabeçalho do ficheiro)
+        """
+        if fileName is None:
+            return self.toChunkList(content,idMission,datagramSize)
+        chunkSize = (datagramSize or self.limit.buffersize) - self.getHeaderSize(idMission)
+        return [self.formatFileHeader(fileName,len(content),chunkSize)] + self.toChunkList(content,idMission,datagramSize)
+
+    def compressMessage(self,accepted,missionType,content):
+        """
+        Comprime uma mensagem para um peer que negociou "zlib" (ver zlibDictionary).
+
+        COMO FUNCIONA:
+        - Mensagens com menos de Limit.compressMinSize bytes não são comprimidas (o ganho não
+          paga o custo), nem as que já vão comprimidas ou que não diminuem
+        - A mensagem comprimida é dividida em chunks como qualquer outra: todos levam o
+          missionType com compressedBit, e o recetor descomprime-a no fim (ver finishMessage())
+
+        PORQUÊ:
+        - Missões e relatórios de progresso são JSON repetitivo: uma missão grande cabe em
+          muito menos chunks, e cada chunk poupado é um datagrama e um ACK a menos
+
+        Args:
+            accepted (bool): True se o peer aceita "zlib" (ex: session.zlib)
+            missionType (str or None): Tipo de missão/operação
+            content (memoryview): Mensagem codificada
+
+        Returns:
+            tuple: (missionType, content) - com compressedBit e a mensagem comprimida, ou
+                   os argumentos inalterados se a mensagem não for comprimida
+        """
+        if (
+            not self.limit.compression or
+            len(content) < self.limit.compressMinSize or
+            (missionType is not None and self.parseMissionType(missionType)[1]) or
+            not accepted
+        ):
+            return missionType,content
+        compressor = zlib.compressobj(zdict=zlibDictionary)
+        data = compressor.compress(content) + compressor.flush()
+        if len(data) >= len(content):
+            return missionType,content
+        missionType = self.noneType if missionType is None else missionType
+        return chr(ord(missionType) | compressedBit),memoryview(data)
+
+    def parseMissionType(self,missionType):
+        """
+        Separa o missionType recebido no cabeçalho e a marca de compressão (compressedBit).
+
+        Args:
+            missionType (str): Campo missionType de um pacote (ver parseMessage())
+
+        Returns:
+            tuple: (missionType, compressed) - tipo de operação original e True se a
+                   mensagem vem comprimida
+        """
+        code = ord(missionType)
+        if code & compressedBit:
+            return chr(code & ~compressedBit),True
+        return missionType,False
+
+    def decompressMessage(self,data):
+        """
+        Descomprime uma mensagem recebida com compressedBit (inverso de compressMessage()).
+
+        Args:
+            data (bytes, bytearray or memoryview): Mensagem comprimida
+
+        Returns:
+            bytes or None: Mensagem original, ou None se os dados forem inválidos ou a mensagem
+                           original ultrapassar Limit.maxMessageSize
+        """
+        decompressor = zlib.decompressobj(zdict=zlibDictionary)
+        try:
+            result = decompressor.decompress(data,self.limit.maxMessageSize)
+        except zlib.error:
+            return None
+        if not decompressor.eof or decompressor.unconsumed_tail:
+            return None
+        return result
+
+    def formatFileHeader(self,fileName,size,chunkSize):
+        """
+        Codifica o payload do chunk de cabeçalho de um ficheiro (flag H).
+
+        Formato: "size=<bytes>;chunk=<bytes por chunk>;name=<nome>" (o nome vai no fim,
+        por isso pode conter ";" e "=").
+
+        Args:
+            fileName (str): Nome do ficheiro (sem caminho)
+            size (int): Tamanho do ficheiro em bytes
+            chunkSize (int): Bytes do ficheiro em cada chunk de dados (exceto o último)
+
+        Returns:
+            bytes: Payload do chunk de cabeçalho
+        """
+        return f"size={size};chunk={chunkSize};name={fileName}".encode()
+
+    def parseFileHeader(self,payload):
+        """
+        Descodifica o payload do chunk de cabeçalho de um ficheiro (inverso de formatFileHeader()).
+        O nome perde qualquer caminho, para o ficheiro ficar sempre em storeFolder.
+
+        Args:
+            payload (bytes or memoryview): Payload do chunk de cabeçalho
+
+        Returns:
+            dict: {"name": str, "size": int, "chunk": int} (0 nos campos inválidos)
+        """
+        text,_,name = str(payload,"utf-8","replace").partition(";name=")
+        info = {"name": os.path.basename(name)}
+        fields = self.parseCapabilities(text)
+        for key in ("size","chunk"):
+            try:
+                info[key] = max(0, int(fields.get(key,0)))
+            except ValueError:
+                info[key] = 0
+        return info
+
+    def canResend(self,session,reused,error):
+        """
+        Decide se uma mensagem que falhou numa sessão deve ser reenviada numa sessão nova.
+
+        - Reset (ConnectionResetError) numa sessão reutilizada: o peer já não a conhecia
+          (ex: foi reiniciado)
+        - Datagrama demasiado grande (EMSGSIZE, ver sendChunksSteps()) numa sessão com datagramas
+          maiores que Limit.buffersize: recua para Limit.buffersize (fallbackDatagramSize())
+
+        Args:
+            session (Session): Sessão em que o envio falhou
+            reused (bool): True se a sessão já existia antes deste send()
+            error (OSError): Erro do envio
+
+        Returns:
+            bool: True se a mensagem deve ser reenviada numa sessão nova
+        """
+        if isinstance(error,ConnectionResetError):
+            return reused
+        if error.errno == errno.EMSGSIZE and (session.datagramSize or 0) > self.limit.buffersize:
+            self.fallbackDatagramSize(session.ip,session.port)
+            return True
+        return False
+
+
+    def toChunkList(self,message,idMission = "",datagramSize = None):
+        """
+        Igual a splitMessage(), mas devolve sempre uma lista de chunks
+        (uma mensagem que cabe num pacote dá uma lista com um único elemento).
+
+        Args:
+            message (str, bytes or memoryview): Mensagem a dividir
+            idMission (str, optional): Identificador que vai no cabeçalho. Defaults to ""
+            datagramSize (int, optional): Tamanho máximo do datagrama. Defaults to None (Limit.buffersize)
+
+        Returns:
+            list: Lista de chunks
+        """
+        chunks = self.splitMessage(message,idMission,datagramSize)
+        if not isinstance(chunks,list):
+            return [chunks]
+        return chunks
+
+
+    def formatParity(self,session,missionType,idMission,seq,group):
+        """
+        Formata o pacote de paridade (flag C) de um grupo de chunks consecutivos (FEC).
+
+        COMO FUNCIONA:
+        - O payload é o XOR dos payloads do grupo (os mais curtos completados com zeros), por
+          isso nunca é maior que um chunk de dados
+        - O campo seq é o do primeiro chunk do grupo e o campo ack leva
+          k(8) | XOR das flags(8) | XOR dos tamanhos(16): com os outros k - 1 chunks, o
+          recetor recupera o payload, a flag e o tamanho do chunk em falta
+          (ver recoverChunks())
+        - missionType e idMission são os da mensagem
+
+        Args:
+            session (Session): Sessão local
+            missionType (str): Tipo de operação da mensagem
+            idMission (str): Identificador da missão
+            seq (int): Número de sequência do primeiro chunk do grupo
+            group (list): Chunks do grupo por ordem: (flag em byte, payload)
+
+        Returns:
+            bytes: Pacote de paridade
+        """
+        flags = 0
+        sizes = 0
+        parity = 0
+        length = 0
+        for flag,chunk in group:
+            flags ^= flag
+            sizes ^= len(chunk)
+            parity ^= int.from_bytes(chunk,"little")
+            length = max(length, len(chunk))
+        meta = (len(group) << 24) | (flags << 16) | sizes
+        return self.formatMessage(missionType,self.paritykey,idMission,seq,meta,parity.to_bytes(length,"little"),session.sendConnId)
+
+    def sendParity(self,session,missionType,idMission,seq,group):
+        """
+        Envia o pacote de paridade de um grupo (ver formatParity()). Não tem temporizador
+        nem é reenviado: se se perder, os chunks em falta são reenviados como sem FEC.
+
+        Args:
+            session (Session): Sessão local
+            missionType (str): Tipo de operação da mensagem
+            idMission (str): Identificador da missão
+            seq (int): Número de sequência do primeiro chunk do grupo
+            group (list): Chunks do grupo por ordem: (flag em byte, payload)
+        """
+        data = self.formatParity(session,missionType,idMission,seq,group)
+        self.getPacingDelay(len(data))  # sai já, mas gasta os tokens
+        self.sock.sendto(data,(session.ip,session.port))
+
+    def sendChunksSteps(self,session,missionType,idMission,chunks,seq,firstFlag = None):
+        """
+        Passos para enviar uma lista de chunks (uma mensagem) em modo selective-repeat (ver runSteps()).
+
+        COMO FUNCIONA:
+        - Mantém chunks em voo (enviados mas ainda não confirmados) dentro da janela negociada
+          (session.window) e até à janela de congestionamento da sessão (AIMD, ver
+          CongestionControl): cada confirmação aumenta-a, um fast retransmit reduz-a a metade
+          e um temporizador expirado volta a um chunk
+        - Com Limit.pacingRate, os chunks novos esperam pelos tokens do endpoint (getPacingDelay())
+        - O chunk i leva o número de sequência seq + i; o último leva a flag E (fim da mensagem)
+        - O primeiro chunk de uma mensagem de vários chunks leva o tamanho total no campo ack
+          (nos outros ack = seq), para o recetor montar a mensagem num buffer já reservado
+        - Cada chunk em voo tem o seu próprio temporizador: quando expira, só esse chunk é reenviado
+        - Com "sack", cada ACK é cumulativo (todos os chunks até ao campo ack chegaram) e traz o
+          mapa de bits dos chunks recebidos depois dele (ver formatDataAck()); sem "sack", cada
+          ACK confirma exatamente um chunk. A base da janela avança quando o chunk mais antigo
+          em voo é confirmado
+        - dupAckThreshold ACKs duplicados (o ACK cumulativo não avança) indicam que o chunk da
+          base se perdeu: é reenviado logo (fast retransmit), sem esperar pelo seu temporizador
+        - Os temporizadores usam o RTO do peer (RttEstimator): o ACK de um chunk enviado
+          uma só vez dá uma amostra de RTT (regra de Karn), e cada expiração duplica o tempo
+          de espera desta mensagem (a próxima amostra repõe-no)
+        - Com "fec", depois de cada grupo de chunks novos segue um pacote de paridade (ver
+          formatParity()), com o tamanho do grupo adaptado às perdas da sessão (FecControl).
+          Enquanto a paridade do grupo do chunk em falta não tiver sido enviada, os ACKs
+          duplicados não contam para o fast retransmit: o recetor ainda o pode reconstruir
+
+        PORQUÊ:
+        - Em stop-and-wait o débito fica limitado a um buffer por RTT
+        - Com a janela, ficheiros e missões grandes ocupam a ligação em vez de esperar
+          por cada ACK, e uma perda só obriga a reenviar o chunk perdido
+        - Com o fast retransmit, uma perda custa cerca de um RTT em vez de um RTO
+        - Com a janela de congestionamento, muitas sessões em simultâneo (ex: uma missão para
+          toda a frota) partilham o uplink sem o inundar: cada uma recua quando há perdas
+
+        Args:
+            session (Session): Sessão estabelecida e ocupada (ver takeIdleSession())
+            missionType (str): Tipo de operação do protocolo
+            idMission (str): Identificador da missão
+            chunks (list): Chunks a enviar (por ordem)
+            seq (int): Número de sequência do primeiro chunk
+            firstFlag (str, optional): Flag do primeiro chunk (ex: H, cabeçalho de um ficheiro). Defaults to None (D)
+
+        Returns:
+            int: Número de sequência seguinte ao último chunk (primeiro chunk da próxima mensagem)
+
+        Raises:
+            ConnectionResetError: Se o peer não conhecer a sessão (reset)
+            OSError: EMSGSIZE se um chunk maior que Limit.buffersize for reenviado probeRetries
+                     vezes sem ACK (o caminho não transporta datagramas desse tamanho)
+            TimeoutError: Se um chunk for reenviado mais de controlRetries vezes sem ACK
+        """
+        address = (session.ip,session.port)
+        base = seq
+        total = len(chunks)
+        window = max(1, session.window)
+        congestion = self.getCongestionControl(session)
+        rtt = self.getRttEstimator(session.ip,session.port)
+        acked = set()
+        inFlight = dict()       # índice do chunk -> instante do último envio (temporizador por pacote)
+        retransmitted = dict()  # chunk -> número de reenvios (sem amostra de RTT, regra de Karn)
+        nextIndex = 0           # próximo chunk ainda não enviado
+        lowest = 0              # chunk mais antigo ainda não confirmado (base da janela)
+        backoffs = 0            # expirações desde a última amostra de RTT (backoff desta sessão)
+        dupAcks = 0             # ACKs seguidos sem avançar a base da janela (ACKs cumulativos)
+        fec = self.getFecControl(session)
+        group = []              # grupo de paridade atual (FEC): (flag, chunk) já enviados
+        groupSize = 0
+        protected = 0           # chunks com índice inferior já têm a paridade do grupo enviada
+        # Mensagem de vários chunks: o primeiro anuncia o tamanho total no campo ack
+        # (o recetor reserva logo o buffer, ver openBuffer())
+        announced = sum(len(chunk) for chunk in chunks) if firstFlag is None and total > 1 else None
+        if announced is not None and announced > 0xFFFFFFFF:
+            announced = None    # não cabe no campo ack (32 bits): o recetor usa a lista de chunks
+
+        def packet(index):
+            ack = base + index
+            if index == total - 1:
+                flag = self.endkey
+            elif index == 0 and firstFlag is not None:
+                flag = firstFlag
+            else:
+                flag = self.datakey
+                if index == 0 and announced is not None:
+                    ack = announced
+            return self.formatMessage(missionType,flag,idMission,base + index,ack,chunks[index],session.sendConnId)
+
+        def resend(index):
+            retransmitted[index] = retransmitted.get(index, 0) + 1
+            if retransmitted[index] == self.probeRetries and self.getHeaderSize(idMission) + len(chunks[index]) > self.limit.buffersize:
+                raise OSError(errno.EMSGSIZE, f"MissionLink: datagramas de {session.datagramSize} bytes não chegam a {session.ip}:{session.port}")
+            if retransmitted[index] > self.controlRetries:
+                raise TimeoutError(f"MissionLink: chunk {base + index} sem confirmação de {session.ip}:{session.port}")
+            data = packet(index)
+            self.getPacingDelay(len(data))  # sai já, mas gasta os tokens
+            self.sock.sendto(data,address)
+            inFlight[index] = time.time()
+
+        while lowest < total:
+            # Encher a janela: a negociada limita o intervalo de seq em voo, a de
+            # congestionamento o número de chunks em voo (e o pacing espaça os envios)
+            while nextIndex < total and nextIndex < lowest + window and len(inFlight) < congestion.getWindow():
+                data = packet(nextIndex)
+                delay = self.getPacingDelay(len(data))
+                if delay:
+                    yield (waitPause,time.time() + delay)
+                self.sock.sendto(data,address)
+                inFlight[nextIndex] = time.time()
+                nextIndex += 1
+                if fec is not None:
+                    # Paridade no fim de cada grupo (ou no fim da mensagem)
+                    if not group:
+                        groupSize = fec.getGroupSize(window)
+                    if groupSize > 1:
+                        group.append((data[0],chunks[nextIndex - 1]))
+                        if len(group) == groupSize or nextIndex == total:
+                            self.sendParity(session,missionType,idMission,base + nextIndex - len(group),group)
+                            group = []
+                    if not group:
+                        protected = nextIndex
+
+            # Aguardar um ACK até expirar o temporizador mais antigo
+            lista = yield (waitPacket,session,min(inFlight.values()) + rtt.getBackoffTimeout(backoffs))
+            if lista is not None and lista[flagPos] == self.resetkey:
+                raise ConnectionResetError(f"MissionLink: sessão desconhecida em {session.ip}:{session.port}")
+            if(
+                lista is not None and
+                lista[flagPos] == self.ackkey and
+                lista[idMissionPos] == idMission  # Validação de segurança: verifica idMission
+            ):
+                cumulative,selective = self.parseDataAck(session,lista,base)
+                confirmed = [index for index in selective if lowest <= index < nextIndex and index not in acked]
+                if cumulative is not None:
+                    confirmed += [index for index in range(lowest, min(cumulative, nextIndex)) if index not in acked]
+                # Amostra de RTT: o envio mais recente entre os chunks agora confirmados que
+                # foram enviados uma só vez (regra de Karn)
+                sampleSentAt = None
+                for index in confirmed:
+                    acked.add(index)
+                    sentAt = inFlight.pop(index)
+                    if index not in retransmitted and (sampleSentAt is None or sentAt > sampleSentAt):
+                        sampleSentAt = sentAt
+                if sampleSentAt is not None:
+                    rtt.addSample(time.time() - sampleSentAt)
+                    backoffs = 0
+                if confirmed:
+                    congestion.onAck(len(confirmed))
+                if fec is not None:
+                    fec.onAck(len(confirmed))
+                    if lista[missionTypePos] == self.paritykey:
+                        # O recetor reconstruiu um chunk com a paridade: houve uma perda
+                        fec.onLoss()
+                previous = lowest
+                while lowest in acked:
+                    lowest += 1
+                if cumulative is not None and lowest == previous and lowest < nextIndex and (fec is None or lowest < protected):
+                    # ACK duplicado: chegaram chunks depois de um buraco. Ao fim de dupAckThreshold,
+                    # reenviar já o chunk em falta (fast retransmit), uma vez por buraco
+                    dupAcks += 1
+                    if dupAcks == self.dupAckThreshold and lowest in inFlight:
+                        congestion.onLoss()
+                        if fec is not None:
+                            fec.onLoss()
+                        resend(lowest)
+                else:
+                    dupAcks = 0
+
+            # Retransmitir apenas os chunks cujo temporizador expirou
+            now = time.time()
+            expired = [index for index, sentAt in inFlight.items() if now - sentAt >= rtt.getBackoffTimeout(backoffs)]
+            if expired:
+                # Um backoff por expiração (não por chunk), como o temporizador único do TCP
+                backoffs += 1
+                congestion.onTimeout()
+                if fec is not None:
+                    fec.onLoss(len(expired))
+            for index in expired:
+                resend(index)
+
+        return base + total
+
+
+    def closeSenderSteps(self,session,idMission,seq,retryLimit = 10):
+        """
+        Passos para fechar uma sessão local (4-way: FIN -> FIN -> ACK, ver runSteps()).
+
+        COMO FUNCIONA:
+        - Envia FIN com o número de sequência seguinte ao último chunk
+        - Aguarda o FIN do recetor (que reconhece o nosso FIN no campo ack)
+        - Responde com ACK e termina
+        - Um ACK do nosso FIN sem FIN do outro lado é ignorado (continua a aguardar)
+
+        Args:
+            session (Session): Sessão local ocupada
+            idMission (str): Identificador da missão
+            seq (int): Número de sequência do FIN
+            retryLimit (int, optional): Número máximo de reenvios do FIN. Defaults to 10
+
+        Returns:
+            bool: True se o recetor confirmou o fecho, False se esgotou as tentativas
+        """
+        address = (session.ip,session.port)
+        fin = self.formatMessage(None,self.finkey,idMission,seq,seq,self.eofkey,session.sendConnId)
+        rtt = self.getRttEstimator(session.ip,session.port)
+        self.sock.sendto(fin,address)
+        sentAt = time.time()
+        retries = 0
+        while retries < retryLimit:
+            lista = yield (waitPacket,session,sentAt + rtt.getBackoffTimeout(retries))
+            if lista is None:
+                # RTO expirou: reenviar o FIN e duplicar o tempo de espera
+                retries += 1
+                self.sock.sendto(fin,address)
+                sentAt = time.time()
+                continue
+            if lista[flagPos] == self.resetkey:
+                # O peer já tinha descartado a sessão
+                return True
+            if(
+                lista[idMissionPos] == idMission and  # Validação de segurança: verifica idMission
+                lista[flagPos] == self.finkey and
+                self.seqDistance(lista[ackPos],seq) == 0
+            ):
+                # Recebeu FIN do outro lado - responder com ACK e terminar
+                self.sock.sendto(self.formatMessage(None,self.ackkey,idMission,seq + 1,seq,self.eofkey,session.sendConnId),address)
+                return True
+        return False
+
+
+    # ============================================================
+    # SESSÕES INICIADAS PELO PEER (RECETOR)
+    # ============================================================
+
+    def acceptSession(self,ip,port,lista):
+        """
+        Cria a sessão de um SYN recebido e responde com SYN-ACK.
+        Chamado por dispatch() com sessionsCond adquirido.
+
+        NOTA: No handshake, o campo idMission contém temporariamente o ID do rover.
+              Um SYN com dados 0-RTT entrega logo a mensagem (ver deliverEarly()).
+
+        Args:
+            ip (str): Endereço IP do cliente
+            port (int): Porta do cliente
+            lista (list): SYN recebido (lista de campos, ver parseMessage())
+        """
+        session = Session.Session(ip,port,lista[connIdPos],lista[connIdPos] | responderBit,False)
+        session.idAgent = lista[idMissionPos]
+        session.seq = lista[seqPos]
+        # Negociar capacidades: o SYN-ACK leva as capacidades aceites
+        offered,early = self.parseSyn(lista[messagePos])
+        capabilities = self.negotiateCapabilities(offered)
+        self.applyCapabilities(session,capabilities)
+        self.sessions[session.getKey()] = session
+        if early is not None and session.early:
+            rpc = None
+            if session.rpc:
+                rpc = next(((kind,offered[key]) for kind,key in self.rpcSynKeys.items() if key in offered), None)
+            self.deliverEarly(session,lista[missionTypePos],early,rpc)
+        # ENVIAR SYNACK
+        synack = self.formatMessage(lista[missionTypePos],self.synackkey,session.idAgent,lista[seqPos],lista[ackPos],self.formatCapabilities(capabilities),session.sendConnId)
+        self.sendControl(session,synack)
+
+    def deliverEarly(self,session,missionType,early,rpc = None):
+        """
+        Entrega a recv() a mensagem 0-RTT de um SYN (ver formatSyn()).
+        Chamado por acceptSession() com sessionsCond adquirido.
+
+        COMO FUNCIONA:
+        - Os SYN reenviados de uma sessão que já existe não chegam aqui (dispatch() trata-os
+          como SYN repetido e só reenvia o SYN-ACK)
+        - Um SYN atrasado que chegue depois de a sessão ter sido descartada é reconhecido
+          por (ip, porta, connId, seq) em earlySeen e a mensagem não é entregue outra vez
+        - Entradas mais antigas que 2 * Limit.sessionTimeout (ou além de earlySeenSize) são
+          esquecidas: o cliente já deixou de reenviar esse SYN muito antes
+
+        Args:
+            session (Session): Sessão do peer acabada de criar
+            missionType (str): Tipo de operação da mensagem (campo missionType do SYN)
+            early (tuple): (idMission, mensagem em bytes)
+            rpc (tuple, optional): (marcador, id) de um pedido ou resposta (ver formatSyn()). Defaults to None
+        """
+        now = time.time()
+        while self.earlySeen and (
+            len(self.earlySeen) >= self.earlySeenSize or
+            now - next(iter(self.earlySeen.values())) > 2 * self.limit.sessionTimeout
+        ):
+            self.earlySeen.popitem(last=False)
+        key = (session.ip,session.port,session.connId,session.seq)
+        if key in self.earlySeen:
+            return
+        self.earlySeen[key] = now
+        idMission,message = early
+        missionType,compressed = self.parseMissionType(missionType)
+        if compressed:
+            message = self.decompressMessage(message)
+            if message is None:
+                print(f"MissionLink: mensagem comprimida inválida de {session.ip}:{session.port} descartada")
+                return
+        result = message.decode(errors="replace")
+        if result.endswith(self.eofkey):
+            result = result[:-1]
+        self.deliverMessage(session,idMission,missionType,result,rpc)
+
+    def deliverMessage(self,session,idMission,missionType,result,rpc = None):
+        """
+        Entrega uma mensagem completa de uma sessão do peer.
+        Chamado com sessionsCond adquirido.
+
+        COMO FUNCIONA:
+        - Mensagem normal: fica em delivered, para recv()
+        - Com "rpc", um pedido (ver request()) também vai para recv(), com o id do pedido
+          como sexto campo (usado por reply()); o marcador já foi separado da mensagem
+          (ver parseRpc(), ou as capacidades do SYN nos dados 0-RTT)
+        - Um pedido com um id já visto deste peer (em replayCache) é um reenvio: não vai
+          outra vez para recv(); se já houver resposta, é reenviada (ver replayReply()), e se
+          estiver a ser enviada, é reenviada quando reply() terminar
+        - Uma resposta vai diretamente para o request() que está à espera dela, e nunca para
+          recv(): a thread que escuta o endpoint não a "rouba". Uma resposta que chegue depois
+          de o pedido ter desistido é descartada
+
+        Args:
+            session (Session): Sessão do peer
+            idMission (str): Identificador da missão
+            missionType (str): Tipo de operação
+            result (str): Mensagem ou nome do ficheiro recebido
+            rpc (tuple, optional): (marcador, id) de um pedido ou resposta. Defaults to None
+        """
+        lista = [session.idAgent,idMission,missionType,result,session.ip]
+        if rpc is not None:
+            kind,requestId = rpc
+            if kind == self.rpcReplyKey:
+                if requestId in self.replies and self.replies[requestId] is None:
+                    self.replies[requestId] = lista
+                    self.replyReady()
+                return
+            key = (session.ip,session.port,session.idAgent,requestId)
+            if key in self.replayCache:
+                self.replayCache.move_to_end(key)
+                if self.replayCache[key] is not None:
+                    self.replayReply(session.ip,session.port,session.idAgent,requestId,self.replayCache[key])
+                elif key in self.replying:
+                    self.replying[key] = True
+                return
+            self.replayCache[key] = None
+            while len(self.replayCache) > self.replayCacheSize:
+                self.replayCache.popitem(last=False)
+            lista.append((session.port,requestId))
+        self.delivered.append(lista)
+
+    def replyReady(self):
+        """
+        Acorda os request() à espera de resposta (chegou uma).
+        Chamado com sessionsCond adquirido.
+        """
+        self.sessionsCond.notify_all()
+
+    def replayReply(self,ip,port,idAgent,requestId,cached):
+        """
+        Reenvia a resposta guardada a um pedido repetido (ver deliverMessage()).
+        Chamado com sessionsCond adquirido, na thread de leitura: o envio corre noutra thread.
+
+        Args:
+            ip (str): Endereço IP do peer
+            port (int): Porta do peer
+            idAgent (str): Identificador do agente/rover
+            requestId (str): Id do pedido
+            cached (tuple): Resposta guardada por cacheReply(): (missionType, idMission, mensagem)
+        """
+        steps = self.replayReplySteps(ip,port,idAgent,requestId,cached)
+        threading.Thread(target=self.runSteps,args=(steps,),daemon=True).start()
+
+    def replayReplySteps(self,ip,port,idAgent,requestId,cached):
+        """
+        Passos para reenviar a resposta guardada a um pedido repetido (ver replayReply()).
+        Uma falha só é registada: o pedido, se se repetir, volta a ter a resposta.
+        """
+        missionType,idMission,message = cached
+        rpc = (self.rpcReplyKey,requestId)
+        try:
+            yield from self.sendContentSteps(ip,port,missionType,idAgent,idMission,memoryview(str(message).encode()),None,rpc)
+        except (TimeoutError,OSError) as e:
+            print(f"MissionLink: falha ao reenviar a resposta ao pedido {requestId}: {e}")
+
+    def sendControl(self,session,packet):
+        """
+        Envia um pacote de controlo (SYN-ACK ou FIN) de uma sessão do peer e arma o
+        temporizador de retransmissão com o RTO do peer.
+
+        Args:
+            session (Session): Sessão do peer
+            packet (bytes): Pacote a enviar (reenviado se o temporizador expirar)
+        """
+        session.lastPacket = packet
+        session.sentAt = time.time()
+        session.sends = 1
+        session.retries = 0
+        self.setTimer(session,session.sentAt + self.getRttEstimator(session.ip,session.port).getTimeout())
+        self.sock.sendto(packet,(session.ip,session.port))
+
+    def resendControl(self,session):
+        """
+        Reenvia o último pacote de controlo de uma sessão do peer (o peer não o recebeu).
+
+        Args:
+            session (Session): Sessão do peer
+        """
+        if session.lastPacket is not None:
+            session.sends += 1
+            self.sock.sendto(session.lastPacket,(session.ip,session.port))
+
+    def establishSession(self,session,sample):
+        """
+        Marca uma sessão do peer como estabelecida e notifica acceptConnection().
+
+        Args:
+            session (Session): Sessão do peer
+            sample (bool): True se o pacote recebido confirma o SYN-ACK (amostra de RTT possível)
+        """
+        now = time.time()
+        rtt = self.getRttEstimator(session.ip,session.port)
+        if sample and session.sends == 1:
+            # Regra de Karn: só há amostra se o SYN-ACK foi enviado uma única vez
+            rtt.addSample(now - session.sentAt)
+        session.state = Session.Session.ESTABLISHED
+        session.retries = 0
+        self.setTimer(session,now + rtt.getTimeout())
+        self.accepted.append(((session.ip,session.port),session.idAgent,session.seq,session.seq))
+
+    def handlePeerPacket(self,session,lista):
+        """
+        Máquina de estados de uma sessão iniciada pelo peer.
+        Chamado por dispatch() com sessionsCond adquirido.
+
+        COMO FUNCIONA:
+        - SYN_RCVD: SYN repetido -> reenviar SYN-ACK; ACK do handshake -> ESTABLISHED.
+                    Dados, FIN ou keepalive também estabelecem a sessão (o ACK perdeu-se,
+                    mas o connId mostra que o SYN-ACK chegou)
+        - ESTABLISHED: dados e FIN seguem para handleData(), paridade para handleParity();
+                       keepalive -> responder com keepalive
+        - CLOSING: ACK do nosso FIN -> sessão terminada; FIN repetido -> reenviar o nosso FIN;
+                   dados repetidos voltam a ser confirmados
+
+        Args:
+            session (Session): Sessão do peer
+            lista (list): Pacote recebido (lista de campos, ver parseMessage())
+        """
+        flag = lista[flagPos]
+        if session.state == Session.Session.SYN_RCVD:
+            if flag == self.synkey:
+                # SYN repetido: o nosso SYN-ACK perdeu-se
+                self.resendControl(session)
+                return
+            if (flag == self.ackkey and
+            lista[idMissionPos] == session.idAgent and
+            lista[ackPos] == lista[seqPos]):
+                self.establishSession(session,True)
+                return
+            if flag not in (self.datakey, self.endkey, self.filekey, self.finkey, self.keepalivekey, self.paritykey):
+                return
+            self.establishSession(session,False)
+
+        if session.state == Session.Session.ESTABLISHED:
+            if flag in (self.datakey, self.endkey, self.filekey, self.finkey):
+                self.handleData(session,lista)
+            elif flag == self.paritykey:
+                self.handleParity(session,lista)
+            elif flag == self.keepalivekey:
+                self.sock.sendto(self.formatMessage(None,self.keepalivekey,lista[idMissionPos],lista[seqPos],lista[seqPos],self.eofkey,session.sendConnId),(session.ip,session.port))
+            elif flag == self.synkey:
+                self.resendControl(session)
+            return
+
+        if session.state == Session.Session.CLOSING:
+            if flag == self.ackkey and self.seqDistance(lista[ackPos],session.seq) == 0:
+                # Recebeu ACK do FIN - conexão fechada corretamente
+                self.removeSession(session)
+            elif flag == self.finkey:
+                # O emissor não recebeu o nosso FIN
+                self.resendControl(session)
+            elif flag in (self.datakey, self.endkey, self.filekey) and self.seqDistance(lista[seqPos],session.seq) <= 0:
+                self.sendAck(session,lista[idMissionPos],lista[seqPos])
+
+    def handleData(self,session,lista,recovered = False):
+        """
+        Trata um chunk de dados ou o FIN de uma sessão do peer estabelecida.
+
+        COMO FUNCIONA:
+        - Aceita pacotes com seq dentro da janela negociada [seq+1, seq+window]
+          (em aritmética de números de série: o seq de 32 bits pode dar a volta, ver unwrapSeq())
+        - Cada chunk aceite é confirmado depois da entrega (ver formatDataAck()): com "sack",
+          o ACK é cumulativo e leva o mapa de bits dos chunks recebidos fora de ordem;
+          sem "sack", confirma exatamente este chunk (ack = seq do chunk)
+        - Chunks fora de ordem ficam num buffer de reordenação até os anteriores chegarem
+        - Chunks duplicados (seq já entregue) voltam a ser confirmados, porque o ACK perdeu-se
+        - Os chunks são entregues por ordem: um primeiro chunk com a flag H anuncia um ficheiro
+          (ver openFile()), caso contrário é uma mensagem; o primeiro chunk de uma mensagem de
+          vários chunks anuncia o tamanho total no campo ack (ver openBuffer())
+        - Os payloads são bytes: a mensagem é descodificada uma única vez, no fim
+          (um carácter multibyte partido entre dois chunks não corrompe a mensagem)
+        - Conhecido o tamanho, os chunks são escritos logo que chegam, mesmo fora de ordem, na
+          posição calculada a partir do número de sequência (ver writeChunk()): o buffer de
+          reordenação só guarda o cabeçalho do pacote, e a receção é linear em tempo e memória
+        - Quando o chunk com a flag E é entregue, a mensagem completa fica disponível para
+          recv() e a sessão fica à espera da mensagem seguinte
+        - Quando o FIN é entregue, a sessão responde com o seu FIN (estado CLOSING)
+        - Com "fec", guarda uma cópia de cada chunk novo enquanto puder ser preciso para
+          reconstruir outro do mesmo grupo (ver recoverChunks())
+
+        Args:
+            session (Session): Sessão do peer
+            lista (list): Pacote recebido (lista de campos, ver parseMessage())
+            recovered (bool, optional): True se o chunk foi reconstruído com a paridade
+                                        (o ACK indica-o ao emissor). Defaults to False
+        """
+        address = (session.ip,session.port)
+        # Número de sequência completo (o cabeçalho só leva 32 bits): a partir daqui,
+        # o pacote guardado no buffer de reordenação usa o valor completo
+        packetSeq = lista[seqPos] = self.unwrapSeq(lista[seqPos],session.seq)
+        if packetSeq <= session.seq:
+            # Duplicado de um chunk já entregue: o ACK perdeu-se, reconhecer de novo
+            if lista[flagPos] in (self.datakey, self.endkey, self.filekey):
+                self.sendAck(session,lista[idMissionPos],packetSeq)
+            return
+        if packetSeq > session.seq + session.window:
+            # Fora da janela - o emissor volta a enviar quando o temporizador expirar
+            return
+        # the mission id matches the message's mission (se idMission já foi extraído)
+        if(
+            session.idMission is not None and
+            lista[flagPos] != self.finkey and
+            lista[idMissionPos] != session.idMission
+        ):
+            return
+
+        if session.idMission is None and lista[flagPos] != self.finkey:
+            session.idMission = lista[idMissionPos]
+        session.retries = 0
+        self.setTimer(session,time.time() + self.getRttEstimator(session.ip,session.port).getTimeout())
+        if packetSeq not in session.pending:
+            session.pending[packetSeq] = lista
+            if session.fec and lista[flagPos] != self.finkey:
+                # Cópia antes de writeChunk() libertar o payload
+                session.fecChunks[packetSeq] = (lista[flagPos],bytes(lista[messagePos]))
+            if session.dataSeq is not None:
+                self.writeChunk(session,packetSeq,lista)
+        # O FIN é confirmado com o FIN desta ponta, os dados com um ACK (depois da entrega)
+        ackMission = lista[idMissionPos] if lista[flagPos] != self.finkey else None
+
+        # Entregar, por ordem, todos os chunks consecutivos já recebidos
+        while session.seq + 1 in session.pending:
+            lista = session.pending.pop(session.seq + 1)
+            session.seq += 1
+
+            #Check if the client send a connection closing message
+            if lista[flagPos] == self.finkey:
+                if session.file is not None:
+                    # Mensagem incompleta: descartada
+                    session.file.close()
+                session.resetMessage()
+                session.pending.clear()
+                session.fecChunks.clear()
+                session.parity.clear()
+                session.state = Session.Session.CLOSING
+                self.sendControl(session,self.formatMessage(None,self.finkey,lista[idMissionPos],session.seq,session.seq,self.eofkey,session.sendConnId))
+                break
+
+            if not session.firstDelivered:
+                # We get the first message with data to know if it is a message or a file
+                session.firstDelivered = True
+                session.missionType,session.compressed = self.parseMissionType(lista[missionTypePos])
+                if lista[flagPos] == self.filekey:
+                    self.openFile(session,lista)
+                    continue
+                if lista[flagPos] == self.datakey:
+                    self.openBuffer(session,lista)
+
+            if session.dataSeq is not None:
+                self.writeChunk(session,session.seq,lista)
+            else:
+                session.parts.append(lista[messagePos])
+
+            if lista[flagPos] == self.endkey:
+                self.finishMessage(session)
+
+        if ackMission is not None:
+            self.sendAck(session,ackMission,packetSeq,recovered)
+        if session.fec and not recovered:
+            # O chunk pode ser o que faltava para reconstruir outro de um grupo anterior
+            self.recoverChunks(session)
+
+    def handleParity(self,session,lista):
+        """
+        Trata o pacote de paridade de um grupo de chunks (FEC, ver formatParity()).
+
+        COMO FUNCIONA:
+        - Ignorado se todos os chunks do grupo já foram entregues ou se o grupo sai da janela
+        - Caso contrário fica guardado até faltar um único chunk do grupo, que é reconstruído
+          de imediato (ver recoverChunks())
+
+        Args:
+            session (Session): Sessão do peer
+            lista (list): Pacote de paridade (lista de campos, ver parseMessage())
+        """
+        if not session.fec:
+            return
+        first = lista[seqPos] = self.unwrapSeq(lista[seqPos],session.seq)
+        last = first + (lista[ackPos] >> 24) - 1
+        if last <= first or last <= session.seq or last > session.seq + session.window:
+            return
+        session.parity[first] = lista
+        self.recoverChunks(session)
+
+    def recoverChunks(self,session):
+        """
+        Reconstrói os chunks em falta dos grupos com paridade guardada, sem esperar por
+        uma retransmissão.
+
+        COMO FUNCIONA:
+        - Um grupo a que falte exatamente um chunk (nem entregue, nem no buffer de reordenação)
+          recupera-o: o XOR da paridade com as cópias dos outros k - 1 chunks dá o payload, e os
+          XOR do campo ack dão a flag e o tamanho. O chunk segue para handleData() como se
+          tivesse chegado, e o ACK leva missionType C para o emissor contar a perda
+        - Um grupo a que faltem mais chunks fica à espera: um reenvio pode deixá-lo com um só
+        - Um chunk reconstruído perde o campo ack (o tamanho anunciado de uma mensagem), por
+          isso uma mensagem cujo primeiro chunk é reconstruído é montada com a lista de chunks
+        - As cópias dos chunks anteriores à janela (que já não cabem num grupo com chunks em
+          falta) e a paridade de grupos completos são descartadas
+
+        Args:
+            session (Session): Sessão do peer
+        """
+        progress = True
+        while progress:
+            progress = False
+            for first,parity in list(session.parity.items()):
+                members = range(first, first + (parity[ackPos] >> 24))
+                missing = [seq for seq in members if seq > session.seq and seq not in session.pending]
+                if len(missing) > 1:
+                    continue
+                del session.parity[first]
+                if not missing or any(seq not in session.fecChunks for seq in members if seq != missing[0]):
+                    continue
+                flag = (parity[ackPos] >> 16) & 0xFF
+                size = parity[ackPos] & 0xFFFF
+                payload = int.from_bytes(parity[messagePos],"little")
+                for seq in members:
+                    if seq != missing[0]:
+                        chunkFlag,chunk = session.fecChunks[seq]
+                        flag ^= ord(chunkFlag)
+                        size ^= len(chunk)
+                        payload ^= int.from_bytes(chunk,"little")
+                if chr(flag) not in (self.datakey, self.endkey, self.filekey) or size > len(parity[messagePos]):
+                    continue
+                chunk = memoryview(payload.to_bytes(len(parity[messagePos]),"little")[:size])
+                self.handleData(session,[chr(flag),parity[idMissionPos],missing[0],0,size,parity[missionTypePos],chunk,parity[connIdPos]],True)
+                progress = True
+                break
+        for seq in [seq for seq in session.fecChunks if seq <= session.seq - session.window]:
+            del session.fecChunks[seq]
+
+    def formatDataAck(self,session,idMission,seq,recovered = False):
+        """
+        Formata o ACK de um chunk de dados recebido numa sessão do peer.
+
+        COMO FUNCIONA:
+        - Com "sack" (negociado no handshake): ACK cumulativo. O campo ack é o último seq
+          entregue por ordem (todos os anteriores chegaram) e o payload é um mapa de bits
+          dos chunks já recebidos depois dele: o bit i (little-endian) indica o seq ack + 1 + i
+        - Sem "sack": confirma exatamente o chunk recebido (ack = seq), como antes
+        - O ACK de um chunk reconstruído com a paridade (FEC) leva missionType C
+
+        PORQUÊ:
+        - Com um ACK por chunk, o emissor só descobre uma perda quando o temporizador do
+          chunk expira. Com o ACK cumulativo, cada chunk que chega depois de um buraco
+          repete o mesmo ack (ACK duplicado) e o mapa diz o que já chegou: o emissor
+          reenvia só o chunk em falta, logo ao fim de alguns ACKs duplicados (ver sendChunksSteps())
+
+        Args:
+            session (Session): Sessão do peer
+            idMission (str): Identificador da missão do chunk
+            seq (int): Número de sequência do chunk recebido
+            recovered (bool, optional): True se o chunk foi reconstruído com a paridade. Defaults to False
+
+        Returns:
+            bytes: ACK formatado
+        """
+        missionType = self.paritykey if recovered else None
+        if not session.sack:
+            return self.formatMessage(missionType,self.ackkey,idMission,seq,seq,self.eofkey,session.sendConnId)
+        bitmap = 0
+        for offset in range(session.window):
+            if session.seq + 1 + offset in session.pending:
+                bitmap |= 1 << offset
+        return self.formatMessage(missionType,self.ackkey,idMission,session.seq,session.seq,bitmap.to_bytes((session.window + 7) // 8,"little"),session.sendConnId)
+
+    def parseDataAck(self,session,lista,base):
+        """
+        Descodifica o ACK de um chunk de dados (lado do emissor, inverso de formatDataAck()).
+        Os chunks são indicados pelo índice na mensagem (seq - base).
+
+        Args:
+            session (Session): Sessão local
+            lista (list): ACK recebido (lista de campos, ver parseMessage())
+            base (int): Número de sequência do primeiro chunk da mensagem
+
+        Returns:
+            tuple: (cumulative, selective) - com "sack", todos os chunks com índice inferior a
+                   cumulative foram recebidos e selective lista os índices recebidos depois;
+                   sem "sack", cumulative é None e selective tem o único chunk confirmado
+        """
+        index = self.seqDistance(lista[ackPos],base)
+        if not session.sack:
+            return None,[index]
+        cumulative = index + 1
+        bitmap = int.from_bytes(lista[messagePos],"little")
+        selective = []
+        offset = 0
+        while bitmap:
+            if bitmap & 1:
+                selective.append(cumulative + offset)
+            bitmap >>= 1
+            offset += 1
+        return cumulative,selective
+
+    def openFile(self,session,lista):
+        """
+        Cria o ficheiro anunciado pelo chunk de cabeçalho (flag H) de uma transferência.
+
+        COMO FUNCIONA:
+        - O cabeçalho traz o tamanho do ficheiro, o tamanho dos chunks de dados e o nome
+          (ver formatFileHeader())
+        - O ficheiro é criado já com o tamanho final, e os chunks de dados que chegaram
+          antes do cabeçalho (fora de ordem) são escritos de imediato
+
+        Args:
+            session (Session): Sessão do peer
+            lista (list): Chunk de cabeçalho (lista de campos, ver parseMessage())
+        """
+        info = self.parseFileHeader(lista[messagePos])
+        session.fileName = info["name"]
+        session.file = open(self.storeFolder + session.fileName,"wb",buffering=0)
+        session.file.truncate(info["size"])
+        session.dataSize = info["size"]
+        session.dataSeq = lista[seqPos] + 1
+        session.chunkSize = info["chunk"]
+        for pendingSeq,pending in session.pending.items():
+            self.writeChunk(session,pendingSeq,pending)
+
+    def openBuffer(self,session,lista):
+        """
+        Reserva o buffer de uma mensagem de vários chunks a partir do seu primeiro chunk.
+
+        COMO FUNCIONA:
+        - O emissor anuncia o tamanho total da mensagem no campo ack do primeiro chunk
+          (ver sendChunksSteps()); os chunks seguintes têm o tamanho deste, exceto o último
+        - A mensagem é montada num bytearray desse tamanho, e os chunks que chegaram antes
+          (fora de ordem) são copiados de imediato
+        - Um tamanho impossível ou maior que Limit.maxMessageSize não reserva nada: a mensagem
+          é montada com a lista de chunks (session.parts)
+
+        Args:
+            session (Session): Sessão do peer
+            lista (list): Primeiro chunk da mensagem (lista de campos, ver parseMessage())
+        """
+        size = lista[ackPos]
+        chunkSize = len(lista[messagePos])
+        if not 0 < chunkSize < size <= self.limit.maxMessageSize:
+            return
+        session.buffer = bytearray(size)
+        session.dataSize = size
+        session.dataSeq = lista[seqPos]
+        session.chunkSize = chunkSize
+        for pendingSeq,pending in session.pending.items():
+            self.writeChunk(session,pendingSeq,pending)
+
+    def writeChunk(self,session,seq,lista):
+        """
+        Escreve um chunk de dados na posição que lhe corresponde no ficheiro ou no buffer da
+        mensagem. O offset é (seq - seq do primeiro chunk de dados) * tamanho dos chunks, por
+        isso a ordem de chegada não importa e o payload (memoryview sobre o datagrama) é
+        copiado uma única vez. Depois de escrito, o payload é libertado (fica None no pacote).
+        Um chunk que não cabe no tamanho anunciado (ver openFile() e openBuffer()) não é
+        escrito: a mensagem fica marcada como inválida e é descartada em finishMessage().
+
+        Args:
+            session (Session): Sessão do peer com um ficheiro ou um buffer de mensagem
+            seq (int): Número de sequência do chunk
+            lista (list): Chunk (lista de campos, ver parseMessage())
+        """
+        if lista[messagePos] is None or lista[flagPos] not in (self.datakey, self.endkey):
+            return
+        payload = lista[messagePos]
+        offset = (seq - session.dataSeq) * session.chunkSize
+        if not 0 <= offset <= session.dataSize - len(payload):
+            print(f"MissionLink: chunk {seq} de {session.ip}:{session.port} fora do tamanho anunciado ({session.dataSize} bytes)")
+            session.invalid = True
+        elif session.file is not None:
+            if hasattr(os,"pwrite"):
+                os.pwrite(session.file.fileno(),payload,offset)
+            else:
+                session.file.seek(offset)
+                session.file.write(payload)
+        else:
+            # Atribuição com o mesmo tamanho: o bytearray nunca muda de tamanho
+            session.buffer[offset:offset + len(payload)] = payload
+        lista[messagePos] = None
+
+    def finishMessage(self,session):
+        """
+        Entrega a mensagem completa de uma sessão do peer a recv() e prepara a sessão
+        para a mensagem seguinte. Chamado com sessionsCond adquirido.
+
+        Args:
+            session (Session): Sessão do peer
+        """
+        if session.invalid:
+            # Houve um chunk fora do tamanho anunciado: a mensagem teria uma falha
+            print(f"MissionLink: mensagem incompleta de {session.ip}:{session.port} descartada")
+            result = None
+            if session.file is not None:
+                session.file.close()
+                try:
+                    os.remove(self.storeFolder + session.fileName)
+                except OSError:
+                    pass
+        elif session.file is not None:
+            # Ficheiro recebido
+            session.file.close()
+            result = session.fileName
+        else:
+            data = session.buffer if session.buffer is not None else b"".join(session.parts)
+            if session.compressed:
+                data = self.decompressMessage(data)
+            if data is None:
+                print(f"MissionLink: mensagem comprimida inválida de {session.ip}:{session.port} descartada")
+                result = None
+            else:
+                result = data.decode(errors="replace")
+                # Bug fix: Remover \x00 (EOF) do final da mensagem se existir
+                if session.buffer is None and result and result.endswith(self.eofkey):
+                    result = result[:-1]
+        rpc = None
+        if result is not None and session.rpc and session.file is None:
+            parsed = self.parseRpc(result)
+            if parsed is None:
+                print(f"MissionLink: mensagem sem marcador rpc de {session.ip}:{session.port} descartada")
+                result = None
+            else:
+                rpc,result = parsed
+        if result is not None:
+            self.deliverMessage(session,session.idMission,session.missionType,result,rpc)
+        session.resetMessage()
+        # Sessão inativa: só expira se o peer deixar de dar sinal (keepalives)
+        self.setTimer(session,time.time() + self.limit.sessionTimeout)
+
+    def setTimer(self,session,when):
+        """
+        Arma (ou desarma) o temporizador de uma sessão, processado por runTimers().
+        Chamado com sessionsLock adquirido.
+
+        COMO FUNCIONA:
+        - Cada sessão tem no máximo um temporizador, numa roda de temporizadores
+          (TimerWheel) com ticks de readerTick: armar, rearmar e desarmar são O(1)
+        - runTimers() só vê as sessões cujo temporizador expirou, em vez de percorrer a
+          tabela inteira, por isso o custo por tick não cresce com o número de sessões
+
+        Args:
+            session (Session): Sessão
+            when (float or None): Instante (time.time()) em que expira, ou None para desarmar
+        """
+        session.deadline = when
+        self.timers.schedule(session,when)
+
+    def runTimers(self):
+        """
+        Processa os temporizadores expirados das sessões (ver setTimer()).
+        Chamado pela thread de leitura (handleDatagrams()) com sessionsLock adquirido.
+
+        COMO FUNCIONA:
+        - Sessão sem pacotes do peer há mais de Limit.sessionTimeout: descartada
+        - Sessão local inativa: fechada ao fim de Limit.idleTimeout sem mensagens; até lá
+          envia um keepalive sempre que passar Limit.keepaliveInterval sem pacotes do peer
+        - SYN_RCVD/CLOSING: reenvia o SYN-ACK/FIN e duplica o tempo de espera; ao fim de
+          controlRetries reenvios a sessão é descartada
+        - ESTABLISHED com uma mensagem a meio: reenvia o último ACK para pedir retransmissão,
+          com intervalos cada vez maiores enquanto o peer não responder
+        """
+        now = time.time()
+        for session in self.timers.expire(now):
+            session.deadline = None
+            if self.sessions.get(session.getKey()) is not session:
+                continue
+            rtt = self.getRttEstimator(session.ip,session.port)
+            if now - session.lastActivity >= self.limit.sessionTimeout:
+                self.removeSession(session)
+                continue
+            if session.initiator:
+                # Só as sessões locais inativas têm temporizador
+                idleDeadline = session.lastUsed + self.limit.idleTimeout
+                if now >= idleDeadline:
+                    self.closeIdleSession(session)
+                    continue
+                if now - session.lastActivity >= self.limit.keepaliveInterval:
+                    self.sock.sendto(self.formatMessage(None,self.keepalivekey,"000",session.seq,session.seq,self.eofkey,session.sendConnId),(session.ip,session.port))
+                    self.setTimer(session,min(idleDeadline, now + self.limit.keepaliveInterval))
+                else:
+                    self.setTimer(session,min(idleDeadline, session.lastActivity + self.limit.keepaliveInterval))
+            elif session.state in (Session.Session.SYN_RCVD, Session.Session.CLOSING):
+                if session.retries >= self.controlRetries:
+                    self.removeSession(session)
+                    continue
+                session.retries += 1
+                self.resendControl(session)
+                session.sentAt = now
+                self.setTimer(session,now + rtt.getBackoffTimeout(session.retries))
+            elif session.idMission is not None:
+                # Reenviar último ACK para solicitar retransmissão
+                self.sock.sendto(self.formatDataAck(session,session.idMission,session.seq),(session.ip,session.port))
+                session.retries += 1
+                self.setTimer(session,now + rtt.getBackoffTimeout(session.retries))
+            else:
+                self.setTimer(session,session.lastActivity + self.limit.sessionTimeout)
+
+
+    def acceptConnection(self,timeout = None):
+        """
+        Aguarda que um peer conclua o handshake de 3 vias (SYN, SYN-ACK, ACK) com este endpoint.
+        O handshake em si é tratado pela tabela de sessões (acceptSession()/handlePeerPacket()),
+        por isso vários peers podem estar a ligar-se ao mesmo tempo.
+        
+        NOTA: No handshake, o campo idMission contém temporariamente o ID do rover.
+              O servidor deve guardar o mapeamento (IP, porta) -> ID do rover.
+
+        Args:
+            timeout (float, optional): Tempo máximo de espera em segundos. Defaults to None (sem limite)
+        
+        Returns:
+            tuple: ((ip, port), idAgent, seq, ack) - Informação da conexão estabelecida
+                - ip (str): Endereço IP do cliente
+                - port (int): Porta do cliente
+                - idAgent (str): Identificador do agente/rover (extraído de idMission no handshake)
+                - seq (int): Número de sequência inicial
+                - ack (int): Número de acknowledgment inicial (igual a seq)
+
+        Raises:
+            TimeoutError: Se nenhum handshake terminar dentro do tempo
+        """
+        info = self.waitFor(lambda: self.accepted.popleft() if self.accepted else None, timeout)
+        if info is None:
+            raise TimeoutError("MissionLink: nenhuma conexão aceite dentro do tempo")
+        return info
+
+
+    # Method to receive messages/files
+    # Will either return the message or the name of the transfered file
+    # along with the agent ID
+    def recv(self,timeout = None):
+        """
+        Returns a list with 5 items by order
+            - 0 - idAgent (ID do rover)
+            - 1 - idMission (ID da missão)
+            - 2 - missionType (tipo de missão/operação)
+            - 3 - file name or the message in string
+            - 4 - ip address
+        e, se a mensagem for um pedido (ver request()), um sexto item com o id do pedido (usado por reply())
+
+        COMO FUNCIONA:
+        - As transferências de todos os peers decorrem em paralelo, cada uma na sua sessão
+          (ver handlePeerPacket()/handleData())
+        - recv() devolve a próxima mensagem completa, pela ordem em que as transferências terminaram
+
+        Args:
+            timeout (float, optional): Tempo máximo de espera em segundos. Defaults to None (sem limite)
+
+        Raises:
+            TimeoutError: Se nenhuma mensagem chegar dentro do tempo
+        """
+        result = self.waitFor(lambda: self.delivered.popleft() if self.delivered else None, timeout)
+        if result is None:
+            raise TimeoutError(f"MissionLink: nenhuma mensagem recebida após {timeout}s")
+        return result
+
+    def newRequestId(self):
+        """
+        Reserva um id para um pedido ou mensagem idempotente (ver request() e send()).
+        Quem reenvia depois de uma falha deve usar o mesmo id em todas as tentativas.
+
+        Returns:
+            str: Id do pedido
+        """
+        with self.sessionsCond:
+            requestId = str(self.nextRequestId)
+            self.nextRequestId = (self.nextRequestId + 1) & 0xFFFFFFFF
+        return requestId
+
+    def formatRpc(self,rpc,content):
+        """
+        Args:
+            rpc (tuple or None): (marcador, id): rpcRequestKey para um pedido ou rpcReplyKey para
+                                 uma resposta, e o id do pedido (ver newRequestId()); None para
+                                 uma mensagem normal
+            content (memoryview): Mensagem codificada
+
+        Returns:
+            bytes: Mensagem com o prefixo do pedido ou da resposta, ou com rpcPlainKey (ver parseRpc())
+        """
+        if rpc is None:
+            return self.rpcPlainKey.encode() + content
+        kind,requestId = rpc
+        return f"{kind}{requestId}{kind}".encode() + content
+
+    def parseRpc(self,result):
+        """
+        Separa o marcador de uma mensagem recebida numa sessão com "rpc" (inverso de formatRpc()).
+
+        Args:
+            result (str): Mensagem recebida
+
+        Returns:
+            tuple or None: (rpc, mensagem) - rpc é (marcador, id) ou None para uma mensagem
+                           normal; None se a mensagem não começar por um marcador válido
+        """
+        kind = result[:1]
+        if kind == self.rpcPlainKey:
+            return None,result[1:]
+        if kind not in (self.rpcRequestKey, self.rpcReplyKey):
+            return None
+        requestId,sep,body = result[1:].partition(kind)
+        if not sep:
+            return None
+        return (kind,requestId),body
+
+    def formatReply(self,request):
+        """
+        Destino da resposta a um pedido (ver reply()).
+
+        Args:
+            request (list): Pedido devolvido por recv() (com o id do pedido no sexto campo)
+
+        Returns:
+            tuple: (ip, porta, idAgent, id do pedido) - também a chave do pedido em replayCache
+
+        Raises:
+            ValueError: Se a mensagem recebida não for um pedido
+        """
+        if len(request) < 6:
+            raise ValueError("MissionLink: a mensagem não é um pedido (enviada sem request())")
+        port,requestId = request[5]
+        return request[4],port,request[0],requestId
+
+    def cacheReply(self,key,cached):
+        """
+        Guarda a resposta entregue a um pedido, para ser reenviada se o pedido se repetir
+        (ver deliverMessage()), ou esquece o pedido se a resposta não foi entregue.
+
+        Args:
+            key (tuple): Pedido em replayCache (ver formatReply())
+            cached (tuple or None): (missionType, idMission, mensagem), ou None se o envio falhou
+
+        Returns:
+            bool: True se o pedido se repetiu durante o envio e a resposta tem de ser reenviada
+        """
+        with self.sessionsCond:
+            repeated = self.replying.pop(key,False)
+            if cached is None:
+                # Sem resposta guardada, o pedido repetido volta a recv() (ex: a Nave-Mãe
+                # devolveu a missão à fila e atribui-a outra vez a este pedido)
+                self.replayCache.pop(key,None)
+                return False
+            self.replayCache[key] = cached
+            self.replayCache.move_to_end(key)
+            while len(self.replayCache) > self.replayCacheSize:
+                self.replayCache.popitem(last=False)
+            return repeated
+
+    def request(self,ip,port,missionType,idAgent,idMission,message,timeout = None,requestId = None):
+        """
+        Envia um pedido e espera pela resposta correlacionada (ex: o rover pede uma missão).
+
+        COMO FUNCIONA:
+        - A mensagem leva um id de pedido (capacidade "rpc"); o peer recebe-a em recv() e
+          responde com reply(), que envia a resposta ao mesmo peer pela sessão já aberta
+          (ou no SYN, 0-RTT): o pedido custa cerca de um RTT mais a transferência
+        - A resposta é entregue a esta chamada e não a recv() (ver deliverMessage()), por isso
+          não é preciso outra thread a escutar o endpoint, e várias threads podem ter
+          pedidos em curso ao mesmo tempo
+        - Repetir um pedido que falhou com o mesmo requestId não o volta a executar no peer:
+          o peer reenvia a resposta que já deu (ver deliverMessage())
+
+        Args:
+            ip (str): Endereço IP do destinatário
+            port (int): Porta do destinatário
+            missionType (str): Tipo de missão/operação do pedido
+            idAgent (str): Identificador do agente/rover
+            idMission (str): Identificador da missão
+            message (str): Mensagem do pedido
+            timeout (float, optional): Tempo máximo (envio + resposta) em segundos. Defaults to None (Limit.requestTimeout)
+            requestId (str, optional): Id do pedido a repetir (ver newRequestId()). Defaults to None (id novo)
+
+        Returns:
+            list or None: Resposta, no formato de recv(): [idAgent, idMission, missionType, mensagem, ip],
+                          ou None se o peer não suportar pedidos e respostas ("rpc") - o pedido
+                          foi entregue como mensagem normal
+
+        Raises:
+            TimeoutError: Se a resposta não chegar dentro do tempo
+        """
+        return self.runSteps(self.requestSteps(ip,port,missionType,idAgent,idMission,message,timeout,requestId))
+
+    def requestSteps(self,ip,port,missionType,idAgent,idMission,message,timeout = None,requestId = None):
+        """
+        Passos de request() (ver runSteps()).
+
+        Returns:
+            list or None: Resposta, no formato de recv() (None se o peer não suportar "rpc")
+        """
+        timeout = self.limit.requestTimeout if timeout is None else timeout
+        deadline = time.time() + timeout
+        if requestId is None:
+            requestId = self.newRequestId()
+        with self.sessionsCond:
+            self.replies[requestId] = None
+        try:
+            if not isinstance(message, str):
+                message = str(message)
+            rpc = (self.rpcRequestKey,requestId)
+            session = yield from self.sendContentSteps(ip,port,missionType,idAgent,idMission,memoryview(message.encode()),None,rpc)
+            if not session.rpc:
+                # Entregue como mensagem normal: a resposta (se houver) chega por recv()
+                return None
+            result = yield (waitReply,requestId,deadline)
+        finally:
+            with self.sessionsCond:
+                self.replies.pop(requestId,None)
+        if result is None:
+            raise TimeoutError(f"MissionLink: sem resposta ao pedido após {timeout}s")
+        return result
+
+    def reply(self,request,missionType,idMission,message):
+        """
+        Responde a um pedido recebido por recv() (ver request()).
+
+        Args:
+            request (list): Pedido devolvido por recv()
+            missionType (str): Tipo de missão/operação da resposta
+            idMission (str): Identificador da missão
+            message (str): Mensagem da resposta
+
+        Returns:
+            bool: True se a resposta foi entregue
+
+        Raises:
+            ValueError: Se a mensagem recebida não for um pedido
+        """
+        return self.runSteps(self.replySteps(request,missionType,idMission,message))
+
+    def replySteps(self,request,missionType,idMission,message):
+        """
+        Passos de reply() (ver runSteps()).
+
+        Returns:
+            bool: True se a resposta foi entregue
+        """
+        key = self.formatReply(request)
+        ip,port,idAgent,requestId = key
+        rpc = (self.rpcReplyKey,requestId)
+        with self.sessionsCond:
+            self.replying[key] = False
+        try:
+            yield from self.sendContentSteps(ip,port,missionType,idAgent,idMission,memoryview(str(message).encode()),None,rpc)
+        except BaseException:
+            self.cacheReply(key,None)
+            raise
+        # Só depois de entregue: um pedido repetido não recebe uma resposta que o
+        # chamador julga não ter sido dada (e que pode voltar a atribuir)
+        cached = (missionType,idMission,message)
+        if self.cacheReply(key,cached):
+            self.replayReply(ip,port,idAgent,requestId,cached)
+        return True
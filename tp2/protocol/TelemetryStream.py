@@ -2,18 +2,38 @@ import socket
 import os
 import threading
 import json
-from otherEntities import Limit
+import select
+import selectors
+import struct
+import concurrent.futures
+from otherEntities import Limit, FileSink, StreamConnection, TelemetryCodec
 
 lenMessageSize = 4
 
+# Modo persistente: a ligação começa com este preâmbulo, que nunca são 4 dígitos, por isso o
+# servidor distingue-a de uma ligação no formato antigo (um ficheiro por ligação). Depois vêm
+# registos seguidos, cada um com o cabeçalho recordHeader seguido do nome e do conteúdo:
+#   tamanho do nome(2) | tamanho do conteúdo(4) | nome | conteúdo
+# O fim de cada registo é dado pelo tamanho, e não pelo fecho da ligação.
+streamPreface = b"TS1\n"
+# Com streamPrefaceBinary o cliente propõe amostras em binário: a seguir ao preâmbulo envia a
+# maior versão do formato que conhece (1 byte, ver TelemetryCodec) e o servidor responde com a
+# versão aceite (1 byte, 0 = só JSON). Nessa ligação o conteúdo de cada registo pode ser JSON ou
+# binário (TelemetryCodec.isRecord()). Um servidor antigo fecha a ligação sem responder e o
+# cliente volta a ligar com streamPreface.
+streamPrefaceBinary = b"TS2\n"
+recordHeader = struct.Struct("!HI")
+maxRecordSize = 16 * 1024 * 1024
+
 class TelemetryStream:
     """
     Protocolo TelemetryStream (TS) - Protocolo aplicacional sobre TCP para transmissão
     contínua de dados de monitorização dos rovers para a Nave-Mãe.
     
     Formato de mensagem: tamanho_nome(4 bytes) + nome_ficheiro + conteúdo_ficheiro
+    Modo persistente: preâmbulo + registos com tamanho (ver `streamPreface` no topo do módulo)
     """
-    def __init__(self,ip,storefolder = ".",limit = 1024):
+    def __init__(self,ip,storefolder = ".",limit = 1024,persistent = False,sink = None):
         """
         Inicializa o protocolo TelemetryStream.
         
@@ -21,12 +41,19 @@ class TelemetryStream:
             ip (str): Endereço IP do servidor
             storefolder (str, optional): Pasta onde armazenar ficheiros recebidos. Defaults to "."
             limit (int, optional): Tamanho do buffer em bytes. Defaults to 1024
+            persistent (bool, optional): send() envia registos por uma ligação persistente a cada
+                                         servidor, em vez de uma ligação por ficheiro. Defaults to False
+            sink (object, optional): Destino das amostras recebidas (FileSink, LogSegmentSink ou
+                                     MemorySink). Defaults to FileSink na pasta storefolder
         """
         self.ip = ip
         self.port = 8081
         # Criar socket para servidor (bind) - será usado apenas no modo servidor
-        # Para envios (send()), criamos novo socket para cada conexão
+        # Para envios (send()), criamos novo socket para cada conexão (ou reutilizamos a
+        # ligação persistente ao servidor)
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # Permite voltar a abrir o servidor logo depois de o fechar (ligações em TIME_WAIT)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         try:
             # Tentar fazer bind - pode falhar se porta já estiver em uso (normal em testes)
             self.socket.bind((self.ip, self.port))
@@ -39,89 +66,247 @@ class TelemetryStream:
         else: 
             self.storefolder = f"{storefolder}/"
         self.limit = Limit.Limit(limit)
+        # Modo persistente: ligação aberta para cada servidor (ip -> socket). O lock serializa
+        # os envios: os registos de threads diferentes não se misturam na mesma ligação
+        self.persistent = persistent
+        self.connections = dict()
+        self.connectionsLock = threading.Lock()
+        # Formato das amostras: versão binária acordada com cada servidor (ip -> versão, 0 = JSON)
+        self.codec = TelemetryCodec.TelemetryCodec()
+        self.recordVersions = dict()
+        # Servidores que não responderam à proposta a tempo: a versão 0 vale só para a ligação
+        # atual e a negociação repete-se quando voltar a ligar (ver openConnection())
+        self.unsettledVersions = set()
+        # Servidor: as amostras são lidas para memória e entregues ao destino (ver ingest())
+        self.sink = sink if sink is not None else FileSink.FileSink(self.storefolder)
+        # Servidor: ciclo de eventos (ver server()), criado quando o servidor arranca
+        self.selector = None
+        self.clients = dict()       # socket -> StreamConnection
+        self.workers = []
+        self.nextWorker = 0
+        self.accepting = False      # socket de escuta registado no selector
+        self.wakeup = None          # par de sockets para acordar o ciclo (endConnection())
+        self.closed = False
+        self.stopped = threading.Event()
 
     def _handle_client(self, clientSocket, ip, port):
         """
-        Processa uma conexão de cliente em thread separada.
-        Permite processamento paralelo de múltiplos rovers.
+        Regista uma ligação acabada de aceitar no ciclo de eventos do servidor.
+        
+        COMO FUNCIONA:
+        - O socket passa a não bloqueante e fica registado no selector: a partir daqui é
+          lido pelo ciclo de server() quando tiver dados (ver readClient())
+        - A ligação fica associada a um worker, que guarda as amostras dela por ordem
+        
+        Args:
+            clientSocket (socket.socket): Socket do cliente
+            ip (str): Endereço IP do cliente
+            port (int): Porta do servidor
+        """
+        clientSocket.setblocking(False)
+        worker = self.workers[self.nextWorker % len(self.workers)]
+        self.nextWorker += 1
+        connection = StreamConnection.StreamConnection(clientSocket, ip, worker)
+        self.clients[clientSocket] = connection
+        self.selector.register(clientSocket, selectors.EVENT_READ, connection)
+
+    def ingest(self, filename_str, content, ip, binary = False):
+        """
+        Entrega uma amostra de telemetria recebida ao destino, na pasta do rover que a enviou.
         
         COMO FUNCIONA:
-        - Recebe dados de telemetria do cliente
-        - Organiza ficheiros por rover_id (se possível)
-        - Fecha conexão após processamento
+        - O conteúdo já está em memória: é descodificado (JSON) uma única vez para obter
+          o rover_id, e o destino recebe o conteúdo e o dicionário
+        - Conteúdo que não é JSON fica com rover_id "unknown"
+        - Numa ligação com formato binário acordado, os registos binários são descodificados
+          com TelemetryCodec (sem JSON); o destino recebe o dicionário e content=None
         
         PORQUÊ:
-        - Permite processar múltiplas conexões simultaneamente
-        - Não bloqueia outras conexões
-        - Melhora capacidade de lidar com múltiplos rovers em paralelo
+        - Escrever o ficheiro, voltar a abri-lo para ler o rover_id e movê-lo para a pasta
+          do rover custava cerca de 6 chamadas ao sistema de ficheiros por amostra; com o
+          FileSink custa uma escrita, com o MemorySink nenhuma
         
         Args:
-            clientSocket (socket.socket): Socket do cliente
+            filename_str (str): Nome do ficheiro recebido (sem caminho)
+            content (bytes): Conteúdo recebido
             ip (str): Endereço IP do cliente
-            port (int): Porta do cliente
+            binary (bool, optional): A ligação acordou o formato binário. Defaults to False
         """
-        try:
-            filename = self.recv(clientSocket, ip, port)
-            filename_str = filename.decode()
-            
-            # Tentar organizar por rover_id se o ficheiro contém telemetria JSON
-            rover_id = "unknown"
+        rover_id = "unknown"
+        record = None
+        if binary and self.codec.isRecord(content):
             try:
-                file_path = os.path.join(self.storefolder, filename_str)
-                if os.path.exists(file_path):
-                    with open(file_path, "r") as f:
-                        telemetry_data = json.load(f)
-                        rover_id = telemetry_data.get("rover_id", "unknown")
-                        rover_folder = os.path.join(self.storefolder, rover_id)
-                        os.makedirs(rover_folder, exist_ok=True)
-                        new_path = os.path.join(rover_folder, filename_str)
-                        if os.path.exists(file_path) and file_path != new_path:
-                            os.rename(file_path, new_path)
-            except (json.JSONDecodeError, KeyError, OSError):
+                record = self.codec.decode(content)
+            except ValueError as e:
+                print(f"Erro de validação ao receber telemetria de {ip}: {e}")
+                return
+            rover_id = record["rover_id"]
+            content = None
+        else:
+            try:
+                record = json.loads(content)
+                if isinstance(record, dict):
+                    rover_id = str(record.get("rover_id", "unknown"))
+            except (json.JSONDecodeError, UnicodeDecodeError):
                 pass
-            
-            print(f"[INFO] Telemetria recebida de {rover_id} ({ip}): {filename_str}")
-            
-        except Exception:
-            pass
-        finally:
-            clientSocket.close()
+        try:
+            self.sink.store(rover_id, filename_str, content, record)
+        except ValueError as e:
+            print(f"Erro de validação ao receber telemetria de {ip}: {e}")
+            return
+        except OSError as e:
+            print(f"Erro ao guardar telemetria: {e}")
+            return
+        
+        print(f"[INFO] Telemetria recebida de {rover_id} ({ip}): {filename_str}")
     
     def server(self):
         """
-        Inicia o servidor TelemetryStream em modo loop infinito.
-        Aceita conexões TCP de múltiplos rovers e processa em paralelo.
+        Inicia o servidor TelemetryStream: aceita e lê as ligações de todos os rovers num
+        único ciclo de eventos, até endConnection().
         
         COMO FUNCIONA:
-        - Coloca o socket em modo listening
-        - Aceita conexões TCP de clientes (rovers) em loop infinito
-        - Para cada conexão, cria thread separada para processamento paralelo
-        - Threads processam dados de telemetria sem bloquear outras conexões
+        - O socket de escuta e as ligações são não bloqueantes e ficam num selector; cada
+          iteração trata só os sockets prontos (ligações novas ou dados recebidos)
+        - Os registos completos são descodificados e guardados por um conjunto fixo de
+          workers (Limit.ingestWorkers), fora do ciclo: um destino lento não atrasa a leitura
+        - Com Limit.maxConnections ligações abertas deixa de aceitar: as novas esperam na
+          fila do kernel (Limit.listenBacklog) até outra fechar
+        - Um erro numa ligação (registo inválido ou qualquer exceção ao tratá-la) fecha só
+          essa ligação
         
         PORQUÊ:
-        - TCP permite conexões confiáveis para transmissão de telemetria
-        - Threads permitem processar múltiplos rovers simultaneamente
-        - Melhora capacidade de lidar com múltiplos rovers em paralelo
-        - Organiza dados por rover_id automaticamente
+        - Uma thread por ligação criava e destruía milhares de threads por minuto com
+          centenas de rovers a enviar de 5 em 5 segundos (ligações no formato antigo);
+          com o ciclo de eventos o número de threads é fixo, seja qual for o número de rovers
         
-        NOTA: Este método bloqueia indefinidamente - deve ser executado em thread separada
+        NOTA: Este método bloqueia até endConnection() - deve ser executado em thread separada
         """
         print(f"[INFO] Servidor TelemetryStream iniciado em {self.ip}:{self.port}")
-        self.socket.listen()
-        
-        while True:
+        self.socket.listen(self.limit.listenBacklog)
+        self.socket.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.wakeup = socket.socketpair()
+        self.wakeup[0].setblocking(False)
+        self.workers = [
+            concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"TelemetryIngest-{i}")
+            for i in range(max(1, self.limit.ingestWorkers))
+        ]
+        self.selector.register(self.wakeup[0], selectors.EVENT_READ, None)
+        self.selector.register(self.socket, selectors.EVENT_READ, None)
+        self.accepting = True
+        try:
+            while not self.closed:
+                for key, _ in self.selector.select():
+                    if key.fileobj is self.socket:
+                        self.acceptClients()
+                    elif key.fileobj is self.wakeup[0]:
+                        try:
+                            self.wakeup[0].recv(64)
+                        except OSError:
+                            pass
+                    elif key.fileobj in self.clients:
+                        try:
+                            self.readClient(key.data)
+                        except Exception as e:
+                            # Um erro inesperado numa ligação não pode parar o ciclo dos outros rovers
+                            print(f"Erro ao tratar a ligação de telemetria de {key.data.ip}: {e!r}")
+                            self.closeClient(key.data)
+        finally:
+            for clientSocket in list(self.clients):
+                self.closeClient(self.clients[clientSocket])
+            self.selector.close()
+            for worker in self.workers:
+                worker.shutdown(wait=True)
+            # Só agora nenhum worker está a guardar amostras
+            self.sink.close()
+            for sock in self.wakeup:
+                sock.close()
+            self.stopped.set()
+
+    def acceptClients(self):
+        """
+        Aceita as ligações pendentes no socket de escuta (até Limit.maxConnections).
+        """
+        while len(self.clients) < self.limit.maxConnections:
             try:
                 clientSocket, (ip, _) = self.socket.accept()
-                print(f"[INFO] Conexão TelemetryStream estabelecida com {ip}")
-                # Criar thread para processar conexão em paralelo
-                client_thread = threading.Thread(
-                    target=self._handle_client,
-                    args=(clientSocket, ip, self.port),
-                    daemon=True
-                )
-                client_thread.start()
-            except Exception:
-                continue
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                if self.closed or self.socket.fileno() < 0:
+                    return
+                # Ex: limite de descritores - a ligação fica na fila até à próxima iteração
+                print(f"[AVISO] Erro ao aceitar ligação TelemetryStream: {e}")
+                return
+            print(f"[INFO] Conexão TelemetryStream estabelecida com {ip}")
+            self._handle_client(clientSocket, ip, self.port)
+        # Limite atingido: o socket de escuta volta ao selector quando uma ligação fechar
+        self.selector.unregister(self.socket)
+        self.accepting = False
+
+    def readClient(self, connection):
+        """
+        Lê os dados disponíveis numa ligação e entrega os registos completos aos workers.
+        Fecha a ligação no fim dos dados ou se receber um registo inválido.
+        
+        Args:
+            connection (StreamConnection): Ligação pronta para leitura
+        """
+        try:
+            data = connection.sock.recv(max(self.limit.buffersize, 64 * 1024))
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        try:
+            if data == b"":
+                # Formato antigo: o fecho da ligação é o fim do conteúdo
+                if connection.persistent is False and connection.filename is not None:
+                    self.submitRecord(connection, connection.filename, bytes(connection.buffer))
+                self.closeClient(connection)
+                return
+            connection.buffer += data
+            for filename, content in self.parseRecords(connection):
+                self.submitRecord(connection, filename, content)
+        except (ValueError, OSError) as e:
+            print(f"Erro de validação ao receber telemetria de {connection.ip}: {e}")
+            self.closeClient(connection)
+
+    def submitRecord(self, connection, filename, content):
+        """
+        Entrega um registo completo ao worker da ligação (ver ingest()).
+        
+        Args:
+            connection (StreamConnection): Ligação que recebeu o registo
+            filename (str): Nome do ficheiro
+            content (bytes): Conteúdo
+        """
+        try:
+            connection.worker.submit(self.ingest, filename, content, connection.ip, connection.version > 0)
+        except RuntimeError:
+            # Workers já parados (servidor a fechar)
+            pass
+
+    def closeClient(self, connection):
+        """
+        Fecha uma ligação e volta a aceitar ligações se o limite tinha sido atingido.
+        
+        Args:
+            connection (StreamConnection): Ligação a fechar
+        """
+        self.clients.pop(connection.sock, None)
+        try:
+            self.selector.unregister(connection.sock)
+        except (KeyError, ValueError):
+            pass
+        try:
+            connection.sock.close()
+        except OSError:
+            pass
+        if not self.accepting and not self.closed and len(self.clients) < self.limit.maxConnections:
+            self.selector.register(self.socket, selectors.EVENT_READ, None)
+            self.accepting = True
 
     def formatInteger(self,num):
         """
@@ -139,78 +324,98 @@ class TelemetryStream:
             line = "0" + line
         return line
 
-    def recv(self,clientSock:socket.socket,ip,port):
+    def parseRecords(self, connection):
         """
-        Recebe dados de telemetria de um cliente através de uma conexão TCP.
-        Primeiro recebe o tamanho do nome do ficheiro (4 bytes), depois o nome do ficheiro,
-        e finalmente o conteúdo do ficheiro.
+        Retira do buffer de uma ligação os registos completos.
         
         COMO FUNCIONA:
-        - Recebe 4 bytes que indicam o tamanho do nome do ficheiro
-        - Recebe o nome do ficheiro (número de bytes indicado)
-        - Recebe o conteúdo do ficheiro em chunks até receber dados vazios
-        - Escreve o ficheiro na pasta storefolder
-        
-        PORQUÊ:
-        - TCP é stream-oriented, então precisamos saber o tamanho do nome antes de receber
-        - Receção em chunks permite lidar com ficheiros grandes
-        - Validação previne ataques (tamanho excessivo)
+        - Os 4 primeiros bytes indicam o formato: o preâmbulo `streamPreface` ou
+          `streamPrefaceBinary` (ligação persistente; o segundo seguido da versão binária
+          proposta, à qual o servidor responde) ou o tamanho do nome do ficheiro em 4 dígitos
+          (formato antigo)
+        - Ligação persistente: cada registo tem o cabeçalho `recordHeader`, o nome e o conteúdo;
+          um registo incompleto fica no buffer até chegarem os bytes que faltam
+        - Formato antigo: depois do nome, o conteúdo acumula até a ligação fechar (ver readClient())
         
         Args:
-            clientSock (socket.socket): Socket TCP do cliente conectado
-            ip (str): Endereço IP do cliente
-            port (int): Porta do cliente
+            connection (StreamConnection): Ligação com bytes por consumir
             
         Returns:
-            bytes: Nome do ficheiro recebido
+            list: Registos completos (nome do ficheiro, conteúdo em bytes), por ordem
             
         Raises:
-            ValueError: Se o tamanho do nome do ficheiro for inválido
-            OSError: Se houver erro ao escrever o ficheiro
-        """ 
-        try:
-            # Receber tamanho do nome do ficheiro (4 bytes)
-            message = clientSock.recv(lenMessageSize)
-            if len(message) != lenMessageSize:
-                raise ValueError(f"Tamanho do nome do ficheiro inválido: recebidos {len(message)} bytes, esperados {lenMessageSize}")
-            
-            fileNameLen = int(message.decode())
-            
-            # Validar tamanho do nome do ficheiro (prevenir ataques)
-            if fileNameLen < 1 or fileNameLen > 255:
-                raise ValueError(f"Tamanho do nome do ficheiro inválido: {fileNameLen} (deve estar entre 1 e 255)")
-            
-            # Receber nome do ficheiro
-            filename = clientSock.recv(fileNameLen)
-            if len(filename) != fileNameLen:
-                raise ValueError(f"Nome do ficheiro incompleto: recebidos {len(filename)} bytes, esperados {fileNameLen}")
-            
-            filename_str = filename.decode()
-            
-            # Criar pasta se não existir
-            os.makedirs(self.storefolder, exist_ok=True)
-            
-            # Receber e escrever conteúdo do ficheiro
-            file_path = os.path.join(self.storefolder, filename_str)
-            with open(file_path, "w") as file:
-                message = clientSock.recv(self.limit.buffersize)
-                while message != b"":
-                    file.write(message.decode())
-                    message = clientSock.recv(self.limit.buffersize)
+            ValueError: Se o nome ou o tamanho de um registo forem inválidos
+            OSError: Se não for possível responder à proposta de formato binário
+        """
+        records = []
+        buffer = connection.buffer
+        if connection.persistent is None:
+            if len(buffer) < lenMessageSize:
+                return records
+            prefix = bytes(buffer[:lenMessageSize])
+            del buffer[:lenMessageSize]
+            if prefix in (streamPreface, streamPrefaceBinary):
+                # Ligação persistente: o cliente deixa-a aberta entre amostras
+                connection.persistent = True
+                connection.version = 0 if prefix == streamPreface else None
+                connection.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            else:
+                connection.persistent = False
+                connection.version = 0
+                try:
+                    connection.nameLen = int(prefix.decode())
+                except (ValueError, UnicodeDecodeError):
+                    raise ValueError(f"Tamanho do nome do ficheiro inválido: {prefix!r}")
+                if connection.nameLen < 1 or connection.nameLen > 255:
+                    raise ValueError(f"Tamanho do nome do ficheiro inválido: {connection.nameLen} (deve estar entre 1 e 255)")
+
+        if connection.persistent and connection.version is None:
+            # Versão binária proposta pelo cliente: responder com a versão aceite
+            if not buffer:
+                return records
+            offered = buffer[0]
+            del buffer[:1]
+            connection.version = min(offered, TelemetryCodec.codecVersion) if self.limit.binaryTelemetry else 0
+            connection.sock.send(bytes([connection.version]))
+
+        if connection.persistent:
+            while len(buffer) >= recordHeader.size:
+                fileNameLen, size = recordHeader.unpack_from(buffer)
+                if fileNameLen < 1 or fileNameLen > 255:
+                    raise ValueError(f"Tamanho do nome do ficheiro inválido: {fileNameLen} (deve estar entre 1 e 255)")
+                if size > maxRecordSize:
+                    raise ValueError(f"Registo demasiado grande: {size} bytes (máximo {maxRecordSize})")
+                start = recordHeader.size + fileNameLen
+                if len(buffer) < start + size:
+                    break
+                filename = self.checkFilename(bytes(buffer[recordHeader.size:start]))
+                records.append((filename, bytes(buffer[start:start + size])))
+                del buffer[:start + size]
+        else:
+            if connection.filename is None and len(buffer) >= connection.nameLen:
+                connection.filename = self.checkFilename(bytes(buffer[:connection.nameLen]))
+                del buffer[:connection.nameLen]
+            if len(buffer) > maxRecordSize:
+                raise ValueError(f"Ficheiro demasiado grande: mais de {maxRecordSize} bytes")
+        return records
+
+    def checkFilename(self, filename):
+        """
+        Valida o nome de ficheiro de um registo (só o nome, sem caminho).
+        
+        Args:
+            filename (bytes): Nome recebido
             
-            return filename
+        Returns:
+            str: Nome do ficheiro
             
-        except ValueError as e:
-            print(f"Erro de validação ao receber telemetria: {e}")
-            raise
-        except OSError as e:
-            print(f"Erro ao escrever ficheiro de telemetria: {e}")
-            raise
-        except Exception as e:
-            print(f"Erro ao receber telemetria: {e}")
-            raise
-                
-
+        Raises:
+            ValueError: Se o nome não for UTF-8 ou incluir um caminho
+        """
+        filename_str = filename.decode()
+        if os.path.basename(filename_str) != filename_str or filename_str in (".", ".."):
+            raise ValueError(f"Nome de ficheiro inválido: {filename_str}")
+        return filename_str
 
     def send(self,ip,message:str):
         """
@@ -221,6 +426,7 @@ class TelemetryStream:
         - Cria um novo socket TCP para cada envio (evita conflito com socket do servidor)
         - Conecta ao servidor, envia tamanho do nome (4 bytes), nome do ficheiro, e conteúdo
         - Fecha a conexão após envio completo
+        - No modo persistente envia um registo pela ligação já aberta (ver sendRecord())
         
         PORQUÊ:
         - O socket criado no __init__ pode estar ligado ao servidor (bind)
@@ -234,6 +440,14 @@ class TelemetryStream:
         Returns:
             bool: True se o ficheiro foi enviado com sucesso, False em caso de erro
         """
+        if self.persistent:
+            try:
+                with open(message, "rb") as file:
+                    content = file.read()
+                return self.sendRecord(ip, os.path.basename(message), content)
+            except (OSError, ValueError):
+                return False
+        
         # Criar novo socket para cada envio (evita conflito com socket do servidor)
         client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         
@@ -273,6 +487,195 @@ class TelemetryStream:
                 pass
             return False
 
+    def encodeRecord(self,content,version = 0):
+        """
+        Codifica o conteúdo de um registo em bytes.
+        Um dicionário é codificado no formato binário (se `version` o permitir e a amostra couber
+        no formato, ver TelemetryCodec) ou serializado em JSON compacto (sem indentação nem espaços).
+        
+        Args:
+            content (dict, str or bytes): Conteúdo do registo
+            version (int, optional): Versão binária acordada com o servidor (0 = JSON). Defaults to 0
+            
+        Returns:
+            bytes: Conteúdo a enviar
+        """
+        if isinstance(content, dict) and version > 0:
+            encoded = self.codec.encode(content)
+            if encoded is not None:
+                return encoded
+        if isinstance(content, dict):
+            return json.dumps(content, separators=(",", ":")).encode()
+        if isinstance(content, str):
+            return content.encode()
+        return bytes(content)
+
+    def sendRecord(self,ip,filename,content):
+        """
+        Envia um registo (nome e conteúdo) pela ligação persistente a um servidor.
+        
+        COMO FUNCIONA:
+        - A primeira chamada para um servidor abre a ligação e envia o preâmbulo; as seguintes
+          reutilizam-na, por isso cada amostra custa só os bytes do registo
+        - Antes de enviar verifica se o servidor fechou a ligação entretanto (ex: reiniciou):
+          nesse caso, ou se o envio falhar, volta a ligar e reenvia o registo uma vez
+        - O servidor só guarda registos completos, por isso um registo interrompido a meio
+          não deixa um ficheiro truncado
+        - Um dicionário vai no formato binário se o servidor o aceitou ao abrir a ligação
+          (ver openConnection()), senão em JSON
+        
+        PORQUÊ:
+        - Uma ligação por amostra custa um handshake e um fecho TCP, uma entrada em TIME_WAIT
+          e uma thread nova no servidor a cada 5 segundos por rover
+        
+        Args:
+            ip (str): Endereço IP do servidor destinatário
+            filename (str): Nome do ficheiro (sem caminho, até 255 bytes)
+            content (dict, str or bytes): Conteúdo do ficheiro (um dicionário vai em binário ou JSON, ver encodeRecord())
+            
+        Returns:
+            bool: True se o registo foi enviado, False se não foi possível ligar ao servidor
+            
+        Raises:
+            ValueError: Se o nome ou o conteúdo excederem os limites do registo
+        """
+        nameBytes = filename.encode()
+        if not 1 <= len(nameBytes) <= 255:
+            raise ValueError(f"Registo inválido: nome com {len(nameBytes)} bytes")
+        with self.connectionsLock:
+            for _ in range(2):
+                try:
+                    connection = self.connections.get(ip)
+                    if connection is None or self.isConnectionClosed(connection):
+                        self.dropConnection(ip)
+                        connection = self.openConnection(ip)
+                    data = self.encodeRecord(content, self.recordVersions.get(ip, 0))
+                    if len(data) > maxRecordSize:
+                        raise ValueError(f"Registo inválido: conteúdo com {len(data)} bytes")
+                    connection.sendall(b"".join((recordHeader.pack(len(nameBytes), len(data)), nameBytes, data)))
+                    return True
+                except OSError:
+                    self.dropConnection(ip)
+        return False
+
+    def openConnection(self,ip):
+        """
+        Abre a ligação persistente a um servidor, envia o preâmbulo e negoceia o formato
+        das amostras. Chamado com connectionsLock adquirido.
+        
+        COMO FUNCIONA:
+        - Com Limit.binaryTelemetry propõe o formato binário (`streamPrefaceBinary`) e espera
+          pela versão aceite pelo servidor
+        - Se o servidor fechar a ligação sem responder (versão antiga), volta a ligar com
+          `streamPreface` e as amostras para esse servidor seguem em JSON
+        - Se a resposta não chegar dentro de Limit.timeout (servidor lento ou rede com perdas),
+          também segue em JSON, mas só nesta ligação: a versão não fica guardada e a proposta
+          repete-se na próxima ligação (ver dropConnection())
+        
+        PORQUÊ:
+        - Só o fim da ligação indica um servidor antigo; guardar a versão 0 depois de um
+          timeout deixava um servidor recente a receber JSON até o cliente reiniciar
+        
+        Args:
+            ip (str): Endereço IP do servidor
+            
+        Returns:
+            socket.socket: Socket ligado
+            
+        Raises:
+            OSError: Se não for possível ligar
+        """
+        if self.limit.binaryTelemetry and self.recordVersions.get(ip) != 0:
+            connection = self.connect(ip, streamPrefaceBinary + bytes([TelemetryCodec.codecVersion]))
+            try:
+                reply = connection.recv(1)
+            except socket.timeout:
+                reply = None
+            except OSError:
+                # Um servidor antigo pode fechar com RST (havia dados por ler): também é o fim da ligação
+                reply = b""
+            if reply:
+                self.recordVersions[ip] = reply[0]
+                self.connections[ip] = connection
+                return connection
+            connection.close()
+            if reply is None:
+                self.unsettledVersions.add(ip)
+        self.recordVersions[ip] = 0
+        connection = self.connect(ip, streamPreface)
+        self.connections[ip] = connection
+        return connection
+
+    def connect(self,ip,preface):
+        """
+        Liga a um servidor e envia o preâmbulo da ligação persistente.
+        
+        Args:
+            ip (str): Endereço IP do servidor
+            preface (bytes): Preâmbulo (e proposta de formato) a enviar
+            
+        Returns:
+            socket.socket: Socket ligado
+            
+        Raises:
+            OSError: Se não for possível ligar
+        """
+        connection = socket.create_connection((ip, self.port), timeout=self.limit.timeout)
+        try:
+            # Amostras pequenas seguem logo, sem esperar por mais dados (Nagle)
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            connection.sendall(preface)
+        except OSError:
+            connection.close()
+            raise
+        return connection
+
+    def isConnectionClosed(self,connection):
+        """
+        Indica se o servidor fechou uma ligação persistente.
+        Depois da resposta à proposta de formato (lida em openConnection()) o servidor não envia
+        dados, por isso a ligação só fica legível quando é fechada.
+        
+        Args:
+            connection (socket.socket): Socket da ligação
+            
+        Returns:
+            bool: True se a ligação foi fechada ou tem um erro pendente
+        """
+        try:
+            readable, _, _ = select.select([connection], [], [], 0)
+            return bool(readable) and connection.recv(1, socket.MSG_PEEK) == b""
+        except (OSError, ValueError):
+            return True
+
+    def dropConnection(self,ip):
+        """
+        Fecha e esquece a ligação persistente a um servidor (se houver).
+        Se a versão da ligação não foi acordada (timeout em openConnection()), esquece-a também.
+        Chamado com connectionsLock adquirido.
+        
+        Args:
+            ip (str): Endereço IP do servidor
+        """
+        connection = self.connections.pop(ip, None)
+        if ip in self.unsettledVersions:
+            self.unsettledVersions.discard(ip)
+            self.recordVersions.pop(ip, None)
+        if connection is not None:
+            try:
+                connection.close()
+            except OSError:
+                pass
+
+    def closeConnections(self):
+        """
+        Fecha todas as ligações persistentes (o servidor vê o fim da ligação entre registos).
+        """
+        with self.connectionsLock:
+            for ip in list(self.connections):
+                self.dropConnection(ip)
+
     def endConnection(self):
         """
         Fecha a conexão TCP do socket principal.
@@ -282,6 +685,9 @@ class TelemetryStream:
         Este método é útil apenas se precisar fechar o servidor explicitamente.
         
         COMO FUNCIONA:
+        - Para o ciclo de server() (fecha as ligações dos rovers e espera pelos workers);
+          o destino das amostras só é fechado por server() depois de os workers terminarem,
+          mesmo que esta espera acabe antes (Limit.timeout)
         - Verifica se o socket existe e está aberto
         - Fecha o socket
         - Imprime mensagem de confirmação
@@ -290,7 +696,24 @@ class TelemetryStream:
         - Permite fechar o servidor explicitamente se necessário
         - Útil para cleanup ou reinicialização
         """
+        self.closeConnections()
+        self.closed = True
+        if self.selector is not None:
+            # Acordar o ciclo de server(), que fecha as ligações e espera pelos workers
+            try:
+                self.wakeup[1].send(b"\0")
+            except OSError:
+                pass
+            # O destino é fechado por server() depois de os workers terminarem
+            self.stopped.wait(self.limit.timeout)
+        else:
+            self.sink.close()
         if self.socket is not None:
+            try:
+                # Recusar as ligações que ainda estejam na fila do kernel
+                self.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
             try:
                 self.socket.close()
                 print("Connection closed.")
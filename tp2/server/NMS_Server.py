@@ -1,5 +1,5 @@
 import socket
-from protocol import MissionLink,TelemetryStream
+from protocol import AsyncMissionLink,TelemetryStream
 import threading
 import time
 from otherEntities import Limit
@@ -145,7 +145,9 @@ class NMS_Server:
             os.mkdir(netDir)
         except FileExistsError:
             None
-        self.missionLink = MissionLink.MissionLink(self.IPADDRESS,netDir)
+        # MissionLink sobre asyncio: todas as sessões dos rovers correm num único event loop
+        # (SyncMissionLink mantém a API bloqueante usada pelas threads do servidor)
+        self.missionLink = AsyncMissionLink.SyncMissionLink(self.IPADDRESS,netDir)
         alertDir = f"{dir}alerts/"
         try:
             os.mkdir(alertDir)
@@ -156,6 +158,10 @@ class NMS_Server:
         self.tasks = dict()
         self.pendingMissions = []  # Missões pendentes para atribuir quando rover solicitar
         self.missionProgress = dict()  # {mission_id: {rover_id: progress_data}}
+        # As mensagens MissionLink são tratadas em paralelo (uma thread por mensagem):
+        # pendingLock protege pendingMissions e agentLocks mantém por ordem as mensagens de cada rover
+        self.pendingLock = threading.Lock()
+        self.agentLocks = dict()  # {rover_id: threading.Lock}
         
         # Inicializar API de Observação
         try:
@@ -202,6 +208,10 @@ class NMS_Server:
         """
         Recebe e processa mensagens através do MissionLink.
         Processa registos de agentes, envio de métricas, solicitações de missão e reportes de progresso.
+
+        As transferências de vários rovers decorrem em paralelo na mesma porta (tabela de sessões
+        do MissionLink). Cada mensagem completa é tratada numa thread própria, para que a resposta
+        a um rover não atrase as mensagens dos outros.
         """
         while True:
             try:
@@ -211,7 +221,20 @@ class NMS_Server:
             except Exception:
                 continue
 
-            idAgent = lista[0]
+            threading.Thread(target=self.handleMissionLinkMessage, args=(lista,), daemon=True).start()
+
+    def handleMissionLinkMessage(self,lista):
+        """
+        Trata uma mensagem recebida pelo MissionLink (ver recvMissionLink()).
+        As mensagens do mesmo rover nunca são tratadas em simultâneo.
+
+        Args:
+            lista (list): [idAgent, idMission, missionType, message, ip] devolvido por MissionLink.recv()
+        """
+        idAgent = lista[0]
+        with self.pendingLock:
+            agentLock = self.agentLocks.setdefault(idAgent, threading.Lock())
+        with agentLock:
             idMission = lista[1]
             missionType = lista[2]
             message = lista[3]
@@ -219,15 +242,17 @@ class NMS_Server:
             
             if missionType == self.missionLink.registerAgent:  # "R"
                 self.registerAgent(idAgent,ip)
-                continue
+                return
 
             if missionType == self.missionLink.requestMission:  # "Q"
-                self.handleMissionRequest(idAgent, ip)
-                continue
+                # Pedido feito com request(): a resposta segue para a chamada que está à espera
+                request = lista if len(lista) > 5 else None
+                self.handleMissionRequest(idAgent, ip, request)
+                return
 
             if missionType == self.missionLink.reportProgress:  # "P"
                 self.handleMissionProgress(idAgent, idMission, message, ip)
-                continue
+                return
 
     def sendTask(self,ip,idAgent,idMission,task):
         """
@@ -313,10 +338,13 @@ class NMS_Server:
         # Não devemos chamar recv() aqui porque estabeleceria uma nova conexão e poderia receber outras mensagens
         retries = 0
         max_retries = 5
+        # O mesmo id em todas as tentativas: se o rover recebeu a missão mas a confirmação se
+        # perdeu, o reenvio é descartado pelo MissionLink do rover (a missão não fica duplicada)
+        request_id = self.missionLink.newRequestId()
         
         while retries < max_retries:
             try:
-                success = self.missionLink.send(ip, self.missionLink.port, self.missionLink.taskRequest, idAgent, mission_id, mission_json)
+                success = self.missionLink.send(ip, self.missionLink.port, self.missionLink.taskRequest, idAgent, mission_id, mission_json, requestId=request_id)
                 if success:
                     # Missão enviada com sucesso - armazenar em tasks
                     if isinstance(mission_data, dict):
@@ -433,19 +461,20 @@ class NMS_Server:
                     
                     # Verificar se já está na fila para evitar duplicados
                     already_in_queue = False
-                    for pending in self.pendingMissions:
-                        if isinstance(pending, dict):
-                            if pending.get("mission_id") == mission_id:
-                                already_in_queue = True
-                                break
-                        elif isinstance(pending, str):
-                            try:
-                                pending_dict = json.loads(pending)
-                                if pending_dict.get("mission_id") == mission_id:
+                    with self.pendingLock:
+                        for pending in self.pendingMissions:
+                            if isinstance(pending, dict):
+                                if pending.get("mission_id") == mission_id:
                                     already_in_queue = True
                                     break
-                            except:
-                                pass
+                            elif isinstance(pending, str):
+                                try:
+                                    pending_dict = json.loads(pending)
+                                    if pending_dict.get("mission_id") == mission_id:
+                                        already_in_queue = True
+                                        break
+                                except:
+                                    pass
                     
                     if already_in_queue:
                         continue  # Já está na fila, pular
@@ -478,7 +507,8 @@ class NMS_Server:
             
             # Adicionar missões restantes à fila de pendentes
             # (adicionar todas as missões que não foram enviadas)
-            self.pendingMissions.append(mission_data)
+            with self.pendingLock:
+                self.pendingMissions.append(mission_data)
 
 
     def parseConfig(self,filename):
@@ -591,64 +621,113 @@ class NMS_Server:
         
         return stats
 
-    def handleMissionRequest(self, idAgent, ip):
+    def handleMissionRequest(self, idAgent, ip, request=None):
         """
         Processa solicitação de missão de um rover.
         Procura missões pendentes específicas para este rover.
+
+        Um pedido feito com MissionLink.request() recebe a missão (ou "no_mission") como
+        resposta, pela sessão do próprio pedido; um rover sem "rpc" recebe-a numa
+        mensagem nova (escutada pelo recvMissionLink() do rover).
+
+        Args:
+            idAgent (str): ID do rover
+            ip (str): Endereço IP do rover
+            request (list, optional): Pedido devolvido por recv(), se o rover usou request(). Defaults to None
         """
         # Procurar missão pendente específica para este rover
-        mission_to_send = None
-        for i, mission in enumerate(self.pendingMissions):
-            if isinstance(mission, str):
-                try:
-                    mission = json.loads(mission)
-                except:
-                    continue
-            
-            if mission.get("rover_id") == idAgent:
-                # Encontrou missão para este rover
-                mission_to_send = self.pendingMissions.pop(i)
-                break
+        mission_to_send = self._popPendingMission(idAgent)
         
         # NÃO enviar missões de outros rovers - apenas missões específicas para este rover
         # Se não encontrou missão específica, verificar se há mais missões no serverDB para este rover
         if mission_to_send is None:
             # Se não há missões pendentes específicas, verificar se há mais missões no serverDB para este rover
             self._loadMissionsForRover(idAgent)
-            
-            # Tentar novamente após carregar
-            if self.pendingMissions:
-                mission_to_send = None
-                for i, mission in enumerate(self.pendingMissions):
-                    if isinstance(mission, str):
-                        try:
-                            mission = json.loads(mission)
-                        except:
-                            continue
-                    
-                    if mission.get("rover_id") == idAgent:
-                        mission_to_send = self.pendingMissions.pop(i)
-                        break
-                
-                if mission_to_send:
-                    try:
-                        success = self.sendMission(ip, idAgent, mission_to_send)
-                        if not success:
-                            self.pendingMissions.insert(0, mission_to_send)
-                    except Exception:
-                        self.pendingMissions.insert(0, mission_to_send)
-                else:
-                    self.missionLink.send(ip, self.missionLink.port, None, idAgent, "000", "no_mission")
+            # Tentar novamente após carregar (_popPendingMission() devolve None se a fila estiver vazia)
+            mission_to_send = self._popPendingMission(idAgent)
+
+        if mission_to_send is None:
+            if request is not None:
+                self.missionLink.reply(request, None, "000", "no_mission")
             else:
                 self.missionLink.send(ip, self.missionLink.port, None, idAgent, "000", "no_mission")
-        else:
-            # Missão específica encontrada - enviar
-            try:
+            return
+
+        try:
+            if request is not None:
+                success = self.replyMission(request, idAgent, mission_to_send)
+            else:
                 success = self.sendMission(ip, idAgent, mission_to_send)
-                if not success:
-                    self.pendingMissions.insert(0, mission_to_send)
-            except Exception:
-                self.pendingMissions.insert(0, mission_to_send)
+            if not success:
+                self._requeuePendingMission(mission_to_send)
+        except Exception:
+            self._requeuePendingMission(mission_to_send)
+
+    def replyMission(self, request, idAgent, mission_data):
+        """
+        Envia uma missão validada como resposta a um pedido de missão (ver handleMissionRequest()).
+        Não há reenvios aqui: o MissionLink garante a entrega e, se falhar, o rover volta a pedir.
+
+        Args:
+            request (list): Pedido devolvido por recv()
+            idAgent (str): ID do rover
+            mission_data (dict or str): Dicionário ou string JSON com dados da missão
+
+        Returns:
+            bool: True se a resposta foi entregue ao rover
+
+        Raises:
+            ValueError: Se o formato da missão for inválido
+        """
+        is_valid, error_msg = validateMission(mission_data)
+        if not is_valid:
+            raise ValueError(f"Formato de missão inválido: {error_msg}")
+        if isinstance(mission_data, dict):
+            mission_json = json.dumps(mission_data)
+            mission_id = mission_data["mission_id"]
+        else:
+            mission_json = mission_data
+            mission_id = json.loads(mission_json)["mission_id"]
+
+        if not self.missionLink.reply(request, self.missionLink.taskRequest, mission_id, mission_json):
+            return False
+        self.tasks[mission_id] = mission_data
+        print(f"[INFO] Missão {mission_id} entregue ao rover {idAgent} (resposta ao pedido)")
+        return True
+
+    def _popPendingMission(self, idAgent):
+        """
+        Retira da fila a primeira missão pendente destinada a um rover.
+        Protegido por pendingLock, porque pedidos de rovers diferentes são tratados em paralelo.
+
+        Args:
+            idAgent (str): ID do rover
+
+        Returns:
+            dict or str or None: Missão retirada da fila, ou None se não houver nenhuma para o rover
+        """
+        with self.pendingLock:
+            for i, mission in enumerate(self.pendingMissions):
+                if isinstance(mission, str):
+                    try:
+                        mission = json.loads(mission)
+                    except:
+                        continue
+                
+                if mission.get("rover_id") == idAgent:
+                    # Encontrou missão para este rover
+                    return self.pendingMissions.pop(i)
+        return None
+
+    def _requeuePendingMission(self, mission):
+        """
+        Devolve ao início da fila uma missão que não foi possível enviar.
+
+        Args:
+            mission (dict or str): Missão a devolver
+        """
+        with self.pendingLock:
+            self.pendingMissions.insert(0, mission)
 
     def handleMissionProgress(self, idAgent, idMission, progress_json, ip):
         """
@@ -702,7 +781,8 @@ class NMS_Server:
         """
         is_valid, error_msg = validateMission(mission)
         if is_valid:
-            self.pendingMissions.append(mission)
+            with self.pendingLock:
+                self.pendingMissions.append(mission)
             print(f"Missão {mission.get('mission_id')} adicionada à fila de pendentes")
         else:
             print(f"Erro: Missão inválida não pode ser adicionada: {error_msg}")   